@@ -0,0 +1,44 @@
+"""Measure creating many tags one create_tag call at a time against one create_tags_bulk call.
+
+Usage: python benchmarks/bench_bulk_tags.py [--tags N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def _repo(working_dir: Path) -> tuple[Repository, str]:
+    repo = Repository(working_dir)
+    repo.init()
+    (working_dir / 'file.txt').write_text('content')
+    return repo, repo.commit_working_dir('bench', 'Initial commit')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tags', type=int, default=5_000, help='Number of tags')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo, commit = _repo(Path(tmp))
+        start = time.perf_counter()
+        for i in range(args.tags):
+            repo.create_tag(f'release-{i}', commit)
+        single = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo, commit = _repo(Path(tmp))
+        start = time.perf_counter()
+        failures = repo.create_tags_bulk({f'release-{i}': commit for i in range(args.tags)})
+        bulk = time.perf_counter() - start
+        assert not failures
+
+    print(f'{args.tags} tags: create_tag {single:.2f} s   create_tags_bulk {bulk:.2f} s   ({single / bulk:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
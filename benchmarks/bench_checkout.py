@@ -0,0 +1,73 @@
+"""Compare a full checkout with switching between branches that differ in a fraction of their files.
+
+Usage: python benchmarks/bench_checkout.py [--files N] [--per-dir N] [--changed FRACTION] [--workers N]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository, branch_ref
+
+
+def _populate(root: Path, files: int, per_dir: int) -> list[Path]:
+    paths = []
+    for i in range(files):
+        directory = root / f'dir{i // per_dir // per_dir}' / f'sub{i // per_dir}'
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'file{i}.txt'
+        path.write_text(f'content of file {i}\n' * 64)
+        paths.append(path)
+
+    return paths
+
+
+def _time(label: str, func) -> float:
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<28} {elapsed * 1e3:10.1f} ms   {result.written:>7} written   {result.removed:>5} removed')
+
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20_000, help='Number of files in the tree')
+    parser.add_argument('--per-dir', type=int, default=50, help='Number of files per directory')
+    parser.add_argument('--changed', type=float, default=0.01, help='Fraction of files that differ between branches')
+    parser.add_argument('--workers', type=int, default=None, help='Number of writer threads')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(tmp)
+        repo.init()
+        paths = _populate(Path(tmp), args.files, args.per_dir)
+        base = repo.commit_working_dir('bench', 'base')
+
+        repo.add_branch('feature')
+        repo.update_ref(branch_ref('feature'), base)
+        repo.checkout('feature')
+        for path in paths[::max(1, round(1 / args.changed))]:
+            path.write_text('changed on feature\n')
+        repo.commit_working_dir('bench', 'feature')
+
+        # A full checkout starts from an empty working directory on a branch without commits
+        repo.add_branch('empty')
+        repo.checkout('main')
+        for item in Path(tmp).iterdir():
+            if item.name != repo.repo_dir.name:
+                shutil.rmtree(item)
+        repo.dircache_file().unlink(missing_ok=True)
+        repo.head_file().write_text('ref: heads/empty')
+
+        full = _time('full checkout', lambda: repo.checkout('main', workers=args.workers))
+        switch = _time(f'switch ({args.changed:.0%} differs)', lambda: repo.checkout('feature', workers=args.workers))
+        _time('switch back', lambda: repo.checkout('main', workers=args.workers))
+        print(f'switch / full: {switch / full:.1%}')
+
+
+if __name__ == '__main__':
+    main()
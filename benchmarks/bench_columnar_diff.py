@@ -0,0 +1,77 @@
+"""Measure the time and Python memory of a large diff as Diff objects and as columns.
+
+The trees are written directly to the object store: `--dirs` directories of `--files` records each, and every
+record changes between the two trees. Memory is the peak traced by tracemalloc while the diff is built and kept.
+
+Usage: python benchmarks/bench_columnar_diff.py [--dirs N] [--files N]
+"""
+
+import argparse
+import hashlib
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from libcaf.plumbing import hash_object, save_commit, save_tree
+from libcaf.repository import Repository
+
+from libcaf import Commit, Tree, TreeDiffKind, TreeRecord, TreeRecordType
+
+
+def _fake_hash(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()  # noqa: S324
+
+
+def _commit(repo: Repository, dirs: int, files: int, tag: str) -> str:
+    root_records = {}
+    for i in range(dirs):
+        tree = Tree({f'file{j}': TreeRecord(TreeRecordType.BLOB, _fake_hash(f'{tag} {i}/{j}'), f'file{j}')
+                     for j in range(files)})
+        save_tree(repo.objects_dir(), tree)
+        root_records[f'dir{i}'] = TreeRecord(TreeRecordType.TREE, hash_object(tree), f'dir{i}')
+
+    root = Tree(root_records)
+    save_tree(repo.objects_dir(), root)
+    commit = Commit(hash_object(root), 'bench', tag, 0, None)
+    save_commit(repo.objects_dir(), commit)
+    return hash_object(commit)
+
+
+def _measure(label: str, run) -> object:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{label:24} {elapsed:7.2f} s   peak {peak / 2 ** 20:8.1f} MiB')
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=200, help='Number of directories')
+    parser.add_argument('--files', type=int, default=1_000, help='Number of records per directory')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+        commit1 = _commit(repo, args.dirs, args.files, 'old')
+        commit2 = _commit(repo, args.dirs, args.files, 'new')
+        print(f'{args.dirs * (args.files + 1)} diff entries')
+
+        _measure('Diff objects', lambda: repo.diff_commits(commit1, commit2))
+        diff = _measure('columns', lambda: repo.diff_commits_columnar(commit1, commit2))
+
+        start = time.perf_counter()
+        modified = [i for i, kind in enumerate(diff.kinds) if kind == TreeDiffKind.MODIFIED.value]
+        print(f'select {len(modified)} modified entries in Python   {time.perf_counter() - start:7.3f} s')
+        start = time.perf_counter()
+        diff.diffs(modified[:1000])
+        print(f'build 1000 of them as Diff objects   {time.perf_counter() - start:7.3f} s')
+
+
+if __name__ == '__main__':
+    main()
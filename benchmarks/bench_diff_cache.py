@@ -0,0 +1,89 @@
+"""Measure diff_commits with the tree diff cache: a cold run, a warm run, and an overlapping diff.
+
+The trees are written directly to the object store: `--dirs` directories of `--files` records each. The second
+tree changes a few records in a fraction of the directories, and the third tree changes one more directory on top
+of the second, so diffing the first tree against the third shares every other subtree pair with the first diff.
+
+Usage: python benchmarks/bench_diff_cache.py [--dirs N] [--files N] [--changed-dirs FRACTION]
+"""
+
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.plumbing import hash_object, save_commit, save_tree
+from libcaf.repository import Repository
+
+from libcaf import Commit, Tree, TreeRecord, TreeRecordType
+
+
+def _fake_hash(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()  # noqa: S324
+
+
+def _commit(repo: Repository, directories: list[dict[str, TreeRecord]]) -> str:
+    root_records = {}
+    for i, records in enumerate(directories):
+        tree = Tree(records)
+        save_tree(repo.objects_dir(), tree)
+        root_records[f'dir{i}'] = TreeRecord(TreeRecordType.TREE, hash_object(tree), f'dir{i}')
+
+    root = Tree(root_records)
+    save_tree(repo.objects_dir(), root)
+    commit = Commit(hash_object(root), 'bench', 'bench', 0, None)
+    save_commit(repo.objects_dir(), commit)
+    return hash_object(commit)
+
+
+def _change(directories: list[dict[str, TreeRecord]], indices: list[int], tag: str,
+            rng: random.Random) -> list[dict[str, TreeRecord]]:
+    changed = [dict(records) for records in directories]
+    for i in indices:
+        for name in rng.sample(sorted(changed[i]), 5):
+            changed[i][name] = TreeRecord(TreeRecordType.BLOB, _fake_hash(f'{tag} {i}/{name}'), name)
+    return changed
+
+
+def _measure(label: str, run) -> None:
+    start = time.perf_counter()
+    diffs = run()
+    print(f'{label:28} {time.perf_counter() - start:7.3f} s   {len(diffs)} changed directories')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=500, help='Number of directories')
+    parser.add_argument('--files', type=int, default=500, help='Number of records per directory')
+    parser.add_argument('--changed-dirs', type=float, default=0.2, help='Fraction of directories changed')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+
+        base = [{f'file{j}': TreeRecord(TreeRecordType.BLOB, _fake_hash(f'{i}/{j}'), f'file{j}')
+                 for j in range(args.files)} for i in range(args.dirs)]
+        changed = rng.sample(range(args.dirs), max(int(args.dirs * args.changed_dirs), 1))
+        tip = _change(base, changed, 'tip', rng)
+        extra = next(i for i in range(args.dirs) if i not in changed)
+        next_tip = _change(tip, [extra], 'next', rng)
+
+        commit1 = _commit(repo, base)
+        commit2 = _commit(repo, tip)
+        commit3 = _commit(repo, next_tip)
+        print(f'{args.dirs * args.files} records per tree, {len(changed)} directories changed')
+
+        _measure('uncached', lambda: repo.diff_commits(commit1, commit2))
+        _measure('cache cold', lambda: repo.diff_commits(commit1, commit2, use_cache=True))
+        _measure('cache warm', lambda: repo.diff_commits(commit1, commit2, use_cache=True))
+        _measure('overlapping diff, uncached', lambda: repo.diff_commits(commit1, commit3))
+        _measure('overlapping diff, cached', lambda: repo.diff_commits(commit1, commit3, use_cache=True))
+
+
+if __name__ == '__main__':
+    main()
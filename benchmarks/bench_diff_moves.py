@@ -0,0 +1,56 @@
+"""Measure diff_commits on commits that move every file of a large directory into another one.
+
+The unique case gives every file its own content. The duplicate case gives every file the same content, so each
+moved file has as many candidate pairings as there are files.
+
+Usage: python benchmarks/bench_diff_moves.py [--files N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import MovedToDiff, Repository
+
+
+def _run(label: str, files: int, content) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository(root)
+        repo.init()
+
+        src = root / 'src'
+        dst = root / 'dst'
+        src.mkdir()
+        dst.mkdir()
+        # Both directories keep a file, so they are diffed file by file rather than moved as a whole
+        (src / 'keep.txt').write_text('kept')
+        (dst / 'keep.txt').write_text('also kept')
+        for i in range(files):
+            (src / f'file{i}.txt').write_text(content(i))
+        before = repo.commit_working_dir('bench', 'before')
+
+        for i in range(files):
+            (src / f'file{i}.txt').rename(dst / f'file{i}.txt')
+        after = repo.commit_working_dir('bench', 'after')
+
+        start = time.perf_counter()
+        diffs = repo.diff_commits(before, after)
+        elapsed = time.perf_counter() - start
+
+        moves = sum(isinstance(child, MovedToDiff) for diff in diffs for child in diff.children)
+        print(f'{label:<20} {elapsed * 1e3:10.1f} ms   {moves:>8} moves')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20_000, help='Number of files to move')
+    args = parser.parse_args()
+
+    _run('unique content', args.files, lambda i: f'content of file {i}\n')
+    _run('duplicate content', args.files, lambda i: 'same content\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Measure diffing every consecutive pair of a commit range, with diff_commits per pair and with diff_range.
+
+Each commit edits a few files spread over a nested tree. diff_range reports how many tree loads it made and how
+many distinct trees they were, and the pairwise diffs report how many trees they loaded below the roots.
+
+Usage: python benchmarks/bench_diff_range.py [--commits N] [--dirs N] [--files N] [--edits N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commits', type=int, default=500, help='Number of commits in the range')
+    parser.add_argument('--dirs', type=int, default=20, help='Number of directories on each of two levels')
+    parser.add_argument('--files', type=int, default=10, help='Number of files per directory')
+    parser.add_argument('--edits', type=int, default=3, help='Number of files edited per commit')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository(root)
+        repo.init()
+
+        paths = []
+        for i in range(args.dirs):
+            for j in range(args.dirs):
+                directory = root / f'dir{i}' / f'sub{j}'
+                directory.mkdir(parents=True)
+                for k in range(args.files):
+                    path = directory / f'file{k}.txt'
+                    path.write_text(f'{i}/{j}/{k}\n')
+                    paths.append(path)
+
+        commits = [repo.commit_working_dir('bench', 'initial')]
+        for n in range(args.commits):
+            for path in {rng.choice(paths) for _ in range(args.edits)}:
+                path.write_text(f'edit {n}\n')
+            commits.append(repo.commit_working_dir('bench', f'commit {n}'))
+
+        loaded: list[str] = []
+        original = repo._load_stored_tree
+
+        def counting_load(tree_hash: str):
+            loaded.append(tree_hash)
+            return original(tree_hash)
+
+        repo._load_stored_tree = counting_load
+
+        start = time.perf_counter()
+        for parent, commit in zip(commits, commits[1:], strict=False):
+            repo.diff_commits(parent, commit)
+        pairwise = time.perf_counter() - start
+        pairwise_loads = len(loaded)
+        loaded.clear()
+
+        start = time.perf_counter()
+        count = sum(1 for _ in repo.diff_range(commits[0], commits[-1]))
+        streamed = time.perf_counter() - start
+
+        print(f'{count} commits, {len(paths)} files, {args.edits} edits per commit')
+        print(f'diff_commits per pair   {pairwise * 1e3:9.1f} ms   {pairwise_loads} subtree loads, plus '
+              f'{2 * count} root loads')
+        print(f'diff_range              {streamed * 1e3:9.1f} ms   {len(loaded)} tree loads of '
+              f'{len(set(loaded))} distinct trees')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Measure diff_stat on a commit that modifies every file of a large tree.
+
+Usage: python benchmarks/bench_diff_stat.py [--files N] [--lines N] [--workers N ...]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=5_000, help='Number of modified files')
+    parser.add_argument('--lines', type=int, default=200, help='Number of lines per file')
+    parser.add_argument('--per-dir', type=int, default=100, help='Number of files per directory')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16], help='Thread pool sizes to measure')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository(root)
+        repo.init()
+
+        paths = []
+        for i in range(args.files):
+            directory = root / f'dir{i // args.per_dir}'
+            directory.mkdir(exist_ok=True)
+            path = directory / f'file{i}.txt'
+            path.write_text(''.join(f'line {j} of file {i}\n' for j in range(args.lines)))
+            paths.append(path)
+        before = repo.commit_working_dir('bench', 'before')
+
+        for i, path in enumerate(paths):
+            lines = path.read_text().splitlines(keepends=True)
+            lines[i % args.lines] = 'changed\n'
+            lines.insert(args.lines // 2, 'inserted\n')
+            path.write_text(''.join(lines))
+        after = repo.commit_working_dir('bench', 'after')
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            stats = repo.diff_stat(before, after, workers=workers)
+            elapsed = time.perf_counter() - start
+            insertions = sum(stat.additions for stat in stats)
+            print(f'{workers:>3} workers   {elapsed * 1e3:8.1f} ms   {len(stats)} files   +{insertions}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Measure the time and peak memory of exact move detection, in memory and spilling to disk.
+
+A stream of `--entries` added and removed entries, half of them moves scattered across the stream, is paired
+with `pair_moves` and an unbounded window, then with `pair_moves_external` and each `--memory-limit`.
+
+Usage: python benchmarks/bench_external_diff.py [--entries N] [--memory-limit N ...]
+"""
+
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+from pathlib import Path
+
+from libcaf.repository import DiffEntry, DiffKind, pair_moves, pair_moves_external
+
+from libcaf import TreeRecord, TreeRecordType
+
+
+def _entries(count: int) -> Iterator[DiffEntry]:
+    rng = random.Random(0)
+    order = list(range(count))
+    rng.shuffle(order)
+    for i in order:
+        # Every other pair of entries shares a hash, and the removed and added halves are far apart
+        blob_hash = hashlib.sha1(str(i // 4 if i % 4 < 2 else i).encode()).hexdigest()  # noqa: S324
+        name = f'file{i}.txt'
+        record = TreeRecord(TreeRecordType.BLOB, blob_hash, name)
+        if i % 2:
+            yield DiffEntry(DiffKind.ADDED, None, f'new/{i % 97}/{name}', None, record)
+        else:
+            yield DiffEntry(DiffKind.REMOVED, f'old/{i % 89}/{name}', None, record, None)
+
+
+def _measure(label: str, run) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    moves = sum(entry.kind == DiffKind.MOVED for entry in run())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{label:28} {elapsed:7.2f} s   peak {peak / 2 ** 20:8.1f} MiB   {moves} moves')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=400_000, help='Number of added and removed entries')
+    parser.add_argument('--memory-limit', type=int, nargs='+', default=[100_000, 10_000],
+                        help='Entries held in memory by the external diff')
+    args = parser.parse_args()
+
+    _measure('in memory', lambda: pair_moves(_entries(args.entries), window=args.entries))
+    with tempfile.TemporaryDirectory() as tmp:
+        for limit in args.memory_limit:
+            _measure(f'external, limit {limit}',
+                     lambda limit=limit: pair_moves_external(_entries(args.entries), Path(tmp), limit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure resolving abbreviated hashes through the object index against listing the object directory.
+
+Usage: python benchmarks/bench_hash_prefix.py [--objects N] [--lookups N]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.objindex import ObjectIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--objects', type=int, default=200_000, help='Number of stored objects')
+    parser.add_argument('--lookups', type=int, default=2_000, help='Number of prefixes resolved')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        objects_dir = Path(tmp) / 'objects'
+        hashes = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(args.objects)]
+        for object_hash in hashes:
+            (objects_dir / object_hash[:2]).mkdir(parents=True, exist_ok=True)
+            (objects_dir / object_hash[:2] / object_hash).touch()
+
+        # Old directories, as in a repository that is not being written to
+        old = time.time_ns() - 60 * 10**9
+        for fanout in objects_dir.iterdir():
+            os.utime(fanout, ns=(old, old))
+
+        rng = random.Random(0)
+        prefixes = [object_hash[:8] for object_hash in rng.choices(hashes, k=args.lookups)]
+
+        start = time.perf_counter()
+        for prefix in prefixes:
+            [name for name in os.listdir(objects_dir / prefix[:2]) if name.startswith(prefix)]
+        listing = (time.perf_counter() - start) / args.lookups
+
+        index = ObjectIndex(objects_dir, Path(tmp) / 'objindex')
+        start = time.perf_counter()
+        for fanout in objects_dir.iterdir():
+            index.lookup(fanout.name)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.lookup(prefix)
+        lookup = (time.perf_counter() - start) / args.lookups
+
+        start = time.perf_counter()
+        for object_hash in hashes[:args.lookups]:
+            index.shortest_prefix(object_hash)
+        shortest = (time.perf_counter() - start) / args.lookups
+
+        print(f'{args.objects} objects: listing {listing * 1e6:8.1f} us   index lookup {lookup * 1e6:6.1f} us   '
+              f'shortest_prefix {shortest * 1e6:6.1f} us   index build {build:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure the per-path cost of the .cafignore matcher.
+
+Usage: python benchmarks/bench_ignore.py [--paths N] [--rules N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.constants import IGNORE_FILE
+from libcaf.ignore import IgnoreMatcher
+
+
+def _matcher(root: Path, top_rules: list[str], nested_rules: list[str] | None = None) -> IgnoreMatcher:
+    (root / IGNORE_FILE).write_text('\n'.join(top_rules) + '\n')
+    matcher = IgnoreMatcher(frozenset({'.caf'})).child('', root, IGNORE_FILE)
+
+    if nested_rules is not None:
+        sub = root / 'src'
+        sub.mkdir(exist_ok=True)
+        (sub / IGNORE_FILE).write_text('\n'.join(nested_rules) + '\n')
+        matcher = matcher.child('src', sub, IGNORE_FILE)
+
+    return matcher
+
+
+def _paths(count: int) -> list[tuple[str, str, bool]]:
+    rng = random.Random(0)
+    dirs = ['src', 'src/app', 'src/app/models', 'docs', 'tests', 'build']
+    exts = ['.py', '.pyc', '.txt', '.log', '.o', '.c', '.md']
+
+    return [(rng.choice(dirs), f'file{i}{rng.choice(exts)}', rng.random() < 0.1) for i in range(count)]
+
+
+def _run(label: str, matcher: IgnoreMatcher, paths: list[tuple[str, str, bool]]) -> None:
+    start = time.perf_counter()
+    ignored = sum(matcher.is_ignored(key, name, is_dir=is_dir) for key, name, is_dir in paths)
+    elapsed = time.perf_counter() - start
+
+    print(f'{label:<24} {elapsed / len(paths) * 1e9:8.0f} ns/path   {ignored:>8} ignored')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paths', type=int, default=200_000, help='Number of paths to match')
+    parser.add_argument('--rules', type=int, default=200, help='Number of rules in the literal and glob cases')
+    args = parser.parse_args()
+
+    paths = _paths(args.paths)
+    literal_rules = [f'name{i}.txt' for i in range(args.rules)] + ['build/']
+    glob_rules = [f'*.ext{i}' for i in range(args.rules)] + ['*.pyc', '*.log', 'docs/**/*.md', '!keep.log']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _run('no rules', IgnoreMatcher(frozenset({'.caf'})), paths)
+        _run('literal rules', _matcher(root, literal_rules), paths)
+        _run('glob rules', _matcher(root, glob_rules), paths)
+        _run('nested ignore files', _matcher(root, glob_rules, ['!*.pyc', '/generated/', '*.o']), paths)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Measure hashing and ingesting files from 4 KiB to 4 GiB, with the large file mode on and off.
+
+Each size is hashed with hash_file and saved with save_file_content, once with the large file threshold at 0
+(every file takes the large file path) and once with it disabled. The page cache is warm for every run except the
+first read of each file, so the numbers compare buffer sizes and copy paths rather than disk speed.
+
+Usage: python benchmarks/bench_large_files.py [--max-size BYTES] [--dir DIR] [--copy-method METHOD]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.plumbing import (
+    copy_stats,
+    delete_content,
+    hash_file,
+    large_file_threshold,
+    reset_copy_stats,
+    save_file_content,
+    set_large_file_threshold,
+)
+
+SIZES = [4 << 10, 64 << 10, 1 << 20, 16 << 20, 256 << 20, 1 << 30, 4 << 30]
+DISABLED = 2 ** 64 - 1
+CHUNK = 8 << 20
+
+
+def _size_label(size: int) -> str:
+    for unit, shift in (('G', 30), ('M', 20), ('K', 10)):
+        if size >= 1 << shift:
+            return f'{size >> shift}{unit}'
+    return str(size)
+
+
+def _write_file(path: Path, size: int) -> None:
+    block = os.urandom(min(size, CHUNK))
+    with path.open('wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def _time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def _throughput(size: int, seconds: float) -> str:
+    return f'{size / seconds / (1 << 20):9.0f} MiB/s'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-size', type=int, default=256 << 20, help='Largest file size to measure, in bytes')
+    parser.add_argument('--dir', type=Path, default=None, help='Directory to create the files in')
+    parser.add_argument('--copy-method', choices=['reflink', 'copy_file_range', 'buffered'], default=None,
+                        help='The fastest copy method save_file_content may use')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best one is reported')
+    args = parser.parse_args()
+
+    if args.copy_method is not None:
+        os.environ['CAF_COPY_METHOD'] = args.copy_method
+
+    original_threshold = large_file_threshold()
+    print(f'{"size":>6} {"mode":<7} {"hash_file":>15} {"save_file_content":>18}   copy method')
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        root = Path(tmp)
+        objects = root / 'objects'
+        objects.mkdir()
+
+        try:
+            for size in (s for s in SIZES if s <= args.max_size):
+                source = root / f'file{size}'
+                _write_file(source, size)
+                # Small files are timed over many runs, so the per-call overhead is not lost in timer noise
+                repeat = args.repeat * max(1, (1 << 20) // size)
+
+                for mode, threshold in (('large', 0), ('normal', DISABLED)):
+                    set_large_file_threshold(threshold)
+                    hash_time = _time(lambda: hash_file(source), repeat)
+
+                    reset_copy_stats()
+
+                    def save() -> None:
+                        blob = save_file_content(objects, source)
+                        delete_content(objects, blob.hash)
+
+                    save_time = _time(save, repeat)
+                    method = max(copy_stats().items(), key=lambda item: item[1])[0]
+
+                    print(f'{_size_label(size):>6} {mode:<7} {_throughput(size, hash_time)} '
+                          f'{_throughput(size, save_time):>18}   {method}')
+
+                source.unlink()
+        finally:
+            set_large_file_threshold(original_threshold)
+
+
+if __name__ == '__main__':
+    main()
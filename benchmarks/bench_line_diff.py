@@ -0,0 +1,95 @@
+"""Measure the throughput of the native line diff on multi-megabyte files, alone and from several threads.
+
+Each file is source-like text in which a fraction of the lines are changed, inserted or deleted. The native diff is
+compared with difflib on the smallest size, and run from a thread pool to show that it does not hold the GIL.
+
+Usage: python benchmarks/bench_line_diff.py [--sizes MB ...] [--changed FRACTION] [--threads N]
+"""
+
+import argparse
+import difflib
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from libcaf.plumbing import diff_files
+
+
+def _texts(size: int, changed: float, rng: random.Random) -> tuple[bytes, bytes]:
+    old_lines: list[bytes] = []
+    total = 0
+    while total < size:
+        i = len(old_lines)
+        line = rng.choice([b'}', b'', f'    value_{i} = compute({i}, {rng.randint(0, 99)})'.encode(),
+                           f'def function_{i}(argument):'.encode()]) + b'\n'
+        old_lines.append(line)
+        total += len(line)
+
+    new_lines = list(old_lines)
+    for _ in range(int(len(old_lines) * changed)):
+        position = rng.randrange(len(new_lines))
+        operation = rng.random()
+        if operation < 0.4:
+            new_lines[position] = f'    changed = {rng.random()}\n'.encode()
+        elif operation < 0.7:
+            new_lines.insert(position, f'    inserted = {rng.random()}\n'.encode())
+        else:
+            del new_lines[position]
+
+    return b''.join(old_lines), b''.join(new_lines)
+
+
+def _time(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 16], help='File sizes in MB')
+    parser.add_argument('--changed', type=float, default=0.01, help='Fraction of lines that are edited')
+    parser.add_argument('--threads', type=int, default=4, help='Number of threads for the concurrent run')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        for size_mb in args.sizes:
+            old, new = _texts(size_mb << 20, args.changed, rng)
+            old_path = root / 'old'
+            new_path = root / 'new'
+            old_path.write_bytes(old)
+            new_path.write_bytes(new)
+
+            line_diff = diff_files(old_path, new_path)
+            elapsed = _time(lambda: diff_files(old_path, new_path))
+            megabytes = (len(old) + len(new)) / (1 << 20)
+            print(f'{size_mb:>4} MB   {elapsed * 1e3:9.1f} ms   {megabytes / elapsed:8.1f} MB/s   '
+                  f'+{line_diff.additions} -{line_diff.deletions} in {len(line_diff.hunks)} hunks')
+
+            with ThreadPoolExecutor(args.threads) as pool:
+                def concurrent() -> None:
+                    list(pool.map(lambda _: diff_files(old_path, new_path), range(args.threads)))
+
+                concurrent_elapsed = _time(concurrent)
+            print(f'{"":>4}      {args.threads} threads: {concurrent_elapsed * 1e3:9.1f} ms   '
+                  f'{megabytes * args.threads / concurrent_elapsed:8.1f} MB/s')
+
+        old, new = _texts(args.sizes[0] << 20, args.changed, rng)
+        old_lines = old.decode().splitlines(keepends=True)
+        new_lines = new.decode().splitlines(keepends=True)
+        elapsed = _time(lambda: list(difflib.unified_diff(old_lines, new_lines)), repeat=1)
+        print(f'difflib on {args.sizes[0]} MB: {elapsed * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
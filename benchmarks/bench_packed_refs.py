@@ -0,0 +1,56 @@
+"""Measure listing and looking up tags with one file per tag and with a packed-refs file.
+
+Usage: python benchmarks/bench_packed_refs.py [--tags N] [--lookups N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def _measure(label: str, repo: Repository, tags: list[str], lookups: int) -> None:
+    start = time.perf_counter()
+    listed = repo.tags()
+    listing = time.perf_counter() - start
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for tag in rng.choices(tags, k=lookups):
+        repo.tag_exists(tag)
+    lookup = (time.perf_counter() - start) / lookups
+
+    print(f'{label:8} tags() {listing * 1000:8.1f} ms for {len(listed)} tags   '
+          f'tag_exists {lookup * 1e6:7.1f} us')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tags', type=int, default=80_000, help='Number of tags')
+    parser.add_argument('--lookups', type=int, default=2_000, help='Number of tag lookups')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+        (Path(tmp) / 'file.txt').write_text('content')
+        commit = repo.commit_working_dir('bench', 'Initial commit')
+
+        tags = [f'release-{i}' for i in range(args.tags)]
+        for tag in tags:
+            (repo.tags_dir() / tag).write_text(commit)
+
+        _measure('loose', repo, tags, args.lookups)
+
+        start = time.perf_counter()
+        repo.pack_refs()
+        print(f'pack_refs {time.perf_counter() - start:.2f} s')
+
+        _measure('packed', repo, tags, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
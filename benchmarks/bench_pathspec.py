@@ -0,0 +1,85 @@
+"""Measure pathspec-limited diff and log on a wide tree, to show that their cost follows the selected subtree.
+
+Every file of the tree changes between two commits. Each pathspec selects a growing number of top-level directories,
+and the diff and log time and the number of trees loaded are reported next to an unlimited diff.
+
+Usage: python benchmarks/bench_pathspec.py [--dirs N] [--subdirs N] [--files N] [--commits N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def _populate(root: Path, dirs: int, subdirs: int, files: int, version: int) -> None:
+    for i in range(dirs):
+        for j in range(subdirs):
+            directory = root / f'dir{i}' / f'sub{j}'
+            directory.mkdir(parents=True, exist_ok=True)
+            for k in range(files):
+                (directory / f'file{k}.txt').write_text(f'version {version} of {i}/{j}/{k}\n')
+
+
+def _measure(repo: Repository, func) -> tuple[float, int]:
+    loaded = 0
+    original = repo._load_stored_tree
+
+    def counting_load(tree_hash: str):
+        nonlocal loaded
+        loaded += 1
+        return original(tree_hash)
+
+    repo._load_stored_tree = counting_load
+    try:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start, loaded
+    finally:
+        del repo._load_stored_tree
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=100, help='Number of top-level directories')
+    parser.add_argument('--subdirs', type=int, default=10, help='Number of subdirectories per directory')
+    parser.add_argument('--files', type=int, default=10, help='Number of files per subdirectory')
+    parser.add_argument('--commits', type=int, default=5, help='Number of commits walked by the log')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository(root)
+        repo.init()
+
+        commits = []
+        for version in range(args.commits):
+            _populate(root, args.dirs, args.subdirs, args.files, version)
+            commits.append(repo.commit_working_dir('bench', f'version {version}'))
+        before, after = commits[-2], commits[-1]
+
+        print(f'{args.dirs * args.subdirs * args.files} files in {args.dirs} directories, all changed per commit')
+        print(f'{"pathspec":<24}{"diff ms":>10}{"trees":>8}{"log ms":>10}{"trees":>8}')
+
+        selections = sorted({1, max(args.dirs // 10, 1), args.dirs})
+        for count in selections:
+            pathspec = [f'dir{i}' for i in range(count)]
+            label = f'{count} directories'
+
+            diff_elapsed, diff_loaded = _measure(repo, lambda: list(repo.iter_diff(before, after, pathspec=pathspec)))
+            log_elapsed, log_loaded = _measure(repo, lambda: list(repo.log(after, pathspec=pathspec)))
+            print(f'{label:<24}{diff_elapsed * 1e3:>10.1f}{diff_loaded:>8}{log_elapsed * 1e3:>10.1f}{log_loaded:>8}')
+
+        diff_elapsed, diff_loaded = _measure(repo, lambda: list(repo.iter_diff(before, after)))
+        print(f'{"no pathspec":<24}{diff_elapsed * 1e3:>10.1f}{diff_loaded:>8}')
+
+        for pattern in ('dir1/sub1/file1.txt', 'dir*/sub1/*.txt', '**/file1.txt'):
+            diff_elapsed, diff_loaded = _measure(repo,
+                                                 lambda: list(repo.iter_diff(before, after, pathspec=[pattern])))
+            print(f'{pattern:<24}{diff_elapsed * 1e3:>10.1f}{diff_loaded:>8}')
+
+
+if __name__ == '__main__':
+    main()
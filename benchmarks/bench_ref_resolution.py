@@ -0,0 +1,63 @@
+"""Measure resolving tag names and listing refs with a cold and a warm ref table, loose and packed.
+
+Usage: python benchmarks/bench_ref_resolution.py [--tags N] [--lookups N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def _measure(label: str, repo: Repository, tags: list[str], lookups: int) -> None:
+    # Each caf command resolves its references in a new process, with a new Repository and ref table
+    start = time.perf_counter()
+    Repository(repo.working_dir).resolve_ref(tags[len(tags) // 2])
+    first = time.perf_counter() - start
+
+    # A new Repository object starts without a ref table, so the first listing loads it
+    repo = Repository(repo.working_dir)
+    start = time.perf_counter()
+    repo.refs()
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    refs = repo.refs()
+    warm = time.perf_counter() - start
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for tag in rng.choices(tags, k=lookups):
+        repo.resolve_ref(tag)
+    lookup = (time.perf_counter() - start) / lookups
+
+    print(f'{label:8} first resolve_ref {first * 1000:6.2f} ms   refs() cold {cold * 1000:8.1f} ms   '
+          f'warm {warm * 1000:7.1f} ms for {len(refs)} refs   resolve_ref {lookup * 1e6:7.1f} us')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tags', type=int, default=80_000, help='Number of tags')
+    parser.add_argument('--lookups', type=int, default=2_000, help='Number of tag names resolved')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+        (Path(tmp) / 'file.txt').write_text('content')
+        commit = repo.commit_working_dir('bench', 'Initial commit')
+
+        tags = [f'release-{i}' for i in range(args.tags)]
+        for tag in tags:
+            (repo.tags_dir() / tag).write_text(commit)
+
+        _measure('loose', repo, tags, args.lookups)
+        repo.pack_refs()
+        _measure('packed', repo, tags, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure concurrent ref updates through transactions, on one branch per writer and on a shared branch.
+
+Usage: python benchmarks/bench_ref_transactions.py [--writers N] [--updates N]
+"""
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from libcaf.constants import HASH_LENGTH
+from libcaf.ref import HashRef, RefConflictError
+from libcaf.repository import Repository
+
+
+def _update(working_dir: Path, branch: str, worker: int, updates: int) -> int:
+    """Advance a branch with compare-and-swap updates, retrying each conflict.
+
+    :return: The number of conflicts."""
+    repo = Repository(working_dir)
+    conflicts = 0
+
+    for i in range(updates):
+        new_ref = HashRef(f'{worker:08x}{i:0{HASH_LENGTH - 8}x}')
+        while True:
+            transaction = repo.ref_transaction()
+            transaction.update(f'heads/{branch}', new_ref, expected=repo.resolve_ref(branch) or '')
+            try:
+                transaction.commit()
+                break
+            except RefConflictError:
+                conflicts += 1
+
+    return conflicts
+
+
+def _run(label: str, working_dir: Path, branches: list[str], updates: int) -> None:
+    start = time.perf_counter()
+    with ProcessPoolExecutor(len(branches)) as pool:
+        conflicts = sum(pool.map(_update, [working_dir] * len(branches), branches, range(len(branches)),
+                                 [updates] * len(branches)))
+    elapsed = time.perf_counter() - start
+
+    total = updates * len(branches)
+    print(f'{label:16} {total} updates in {elapsed:.2f} s, {total / elapsed:8.0f} updates/s, {conflicts} conflicts')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8, help='Number of concurrent writer processes')
+    parser.add_argument('--updates', type=int, default=500, help='Number of updates per writer')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+        branches = [f'writer-{i}' for i in range(args.writers)]
+        for branch in branches:
+            repo.add_branch(branch)
+
+        _run('distinct', Path(tmp), branches, args.updates)
+        _run('shared', Path(tmp), ['main'] * args.writers, args.updates)
+
+
+if __name__ == '__main__':
+    main()
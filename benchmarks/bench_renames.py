@@ -0,0 +1,71 @@
+"""Measure similarity-based rename detection on a commit that moves and lightly edits many files.
+
+Signatures are computed on the first run and read from the signature cache on the second. The pairing found
+with locality-sensitive hashing is checked against the known renames, and the cost of comparing every removed file
+with every added one is extrapolated from a sample.
+
+Usage: python benchmarks/bench_renames.py [--files N] [--lines N] [--edits N]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import DiffKind, Repository
+from libcaf.similarity import estimate_similarity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=5_000, help='Number of moved and edited files')
+    parser.add_argument('--lines', type=int, default=100, help='Number of lines per file')
+    parser.add_argument('--edits', type=int, default=5, help='Number of lines edited per moved file')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        repo = Repository(root)
+        repo.init()
+        for name in ('old', 'new'):
+            (root / name).mkdir()
+            (root / name / 'keep.txt').write_text(name)
+
+        contents = []
+        for i in range(args.files):
+            lines = [f'file {i} line {j} value {rng.random()}\n' for j in range(args.lines)]
+            (root / 'old' / f'file{i}.txt').write_text(''.join(lines))
+            contents.append(lines)
+        before = repo.commit_working_dir('bench', 'before')
+
+        for i, lines in enumerate(contents):
+            (root / 'old' / f'file{i}.txt').unlink()
+            for _ in range(args.edits):
+                lines[rng.randrange(len(lines))] = f'edited {rng.random()}\n'
+            (root / 'new' / f'renamed{i}.txt').write_text(''.join(lines))
+        after = repo.commit_working_dir('bench', 'after')
+
+        for label in ('cold cache', 'warm cache'):
+            start = time.perf_counter()
+            moves = [entry for entry in repo.iter_diff(before, after, detect_moves=True, rename_threshold=0.5)
+                     if entry.kind == DiffKind.MOVED]
+            elapsed = time.perf_counter() - start
+            correct = sum(entry.old_path.removeprefix('old/file') == entry.new_path.removeprefix('new/renamed')
+                          for entry in moves)
+            print(f'{label:<12} {elapsed * 1e3:9.1f} ms   {len(moves)} moves, {correct} correct of {args.files}')
+
+        signature = tuple(range(128))
+        sample = min(args.files, 200)
+        start = time.perf_counter()
+        for _ in range(sample * sample):
+            estimate_similarity(signature, signature)
+        per_pair = (time.perf_counter() - start) / (sample * sample)
+        print(f'all pairs    {per_pair * args.files * args.files:9.1f} s    extrapolated from {sample}x{sample} '
+              f'signature comparisons')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Measure save_dir on wide and deep synthetic working directories.
+
+Each shape is saved three times: into an empty repository, again with a warm directory cache,
+and again after one file was modified.
+
+Usage: python benchmarks/bench_save_dir.py [--width N] [--depth N] [--files N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+
+
+def _make_wide(root: Path, width: int, files: int) -> Path:
+    for i in range(width):
+        sub = root / f'dir{i}'
+        sub.mkdir()
+        for j in range(files):
+            (sub / f'file{j}.txt').write_text(f'{i} {j}')
+    for j in range(files):
+        (root / f'top{j}.txt').write_text(f'top {j}')
+
+    return root / 'dir0' / 'file0.txt'
+
+
+def _make_deep(root: Path, depth: int, files: int) -> Path:
+    current = root
+    for i in range(depth):
+        for j in range(files):
+            (current / f'file{j}.txt').write_text(f'{i} {j}')
+        current = current / f'level{i}'
+        current.mkdir()
+
+    return current.parent / 'file0.txt'
+
+
+def _time(label: str, repo: Repository) -> None:
+    start = time.perf_counter()
+    repo.save_dir(repo.working_dir)
+    print(f'  {label:<12} {(time.perf_counter() - start) * 1e3:10.1f} ms')
+
+
+def _run(label: str, make) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(tmp)
+        repo.init()
+        changed = make(Path(tmp))
+
+        print(label)
+        _time('cold', repo)
+        _time('warm', repo)
+        changed.write_text('changed')
+        _time('one change', repo)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=2000, help='Number of subdirectories in the wide tree')
+    parser.add_argument('--depth', type=int, default=300, help='Number of levels in the deep tree')
+    parser.add_argument('--files', type=int, default=10, help='Number of files per directory')
+    args = parser.parse_args()
+
+    _run(f'wide: {args.width} subdirectories x {args.files} files',
+         lambda root: _make_wide(root, args.width, args.files))
+    _run(f'deep: {args.depth} levels x {args.files} files',
+         lambda root: _make_deep(root, args.depth, args.files))
+
+
+if __name__ == '__main__':
+    main()
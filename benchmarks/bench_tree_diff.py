@@ -0,0 +1,91 @@
+"""Measure diff_commits on two large trees with the native tree diff and with the Python one.
+
+The trees are written directly to the object store: `--dirs` directories of `--files` records each. The second
+tree changes, moves, removes and adds a fraction of the records in every directory.
+
+Usage: python benchmarks/bench_tree_diff.py [--dirs N] [--files N] [--changed FRACTION] [--skip-python]
+"""
+
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.plumbing import hash_object, save_commit, save_tree
+from libcaf.repository import Repository
+
+from libcaf import Commit, Tree, TreeRecord, TreeRecordType
+
+
+def _fake_hash(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()  # noqa: S324
+
+
+def _commit(repo: Repository, directories: list[dict[str, TreeRecord]]) -> str:
+    root_records = {}
+    for i, records in enumerate(directories):
+        tree = Tree(records)
+        save_tree(repo.objects_dir(), tree)
+        root_records[f'dir{i}'] = TreeRecord(TreeRecordType.TREE, hash_object(tree), f'dir{i}')
+
+    root = Tree(root_records)
+    save_tree(repo.objects_dir(), root)
+    commit = Commit(hash_object(root), 'bench', 'bench', 0, None)
+    save_commit(repo.objects_dir(), commit)
+    return hash_object(commit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=1_000, help='Number of directories')
+    parser.add_argument('--files', type=int, default=1_000, help='Number of records per directory')
+    parser.add_argument('--changed', type=float, default=0.01, help='Fraction of records changed in each way')
+    parser.add_argument('--skip-python', action='store_true', help='Only measure the native diff')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Repository(Path(tmp))
+        repo.init()
+
+        old = [{f'file{j}': TreeRecord(TreeRecordType.BLOB, _fake_hash(f'{i}/{j}'), f'file{j}')
+                for j in range(args.files)} for i in range(args.dirs)]
+        new = [dict(records) for records in old]
+        count = max(int(args.files * args.changed), 1)
+        for i, records in enumerate(new):
+            names = rng.sample(sorted(records), 3 * count)
+            for name in names[:count]:
+                records[name] = TreeRecord(TreeRecordType.BLOB, _fake_hash(f'changed {i}/{name}'), name)
+            for name in names[count:2 * count]:
+                # Moved to another directory under a new name
+                moved = records.pop(name)
+                target = new[rng.randrange(args.dirs)]
+                target[f'moved_{i}_{name}'] = TreeRecord(TreeRecordType.BLOB, moved.hash, f'moved_{i}_{name}')
+            for name in names[2 * count:]:
+                del records[name]
+                records[f'new_{name}'] = TreeRecord(TreeRecordType.BLOB, _fake_hash(f'new {i}/{name}'),
+                                                    f'new_{name}')
+
+        start = time.perf_counter()
+        commit1 = _commit(repo, old)
+        commit2 = _commit(repo, new)
+        print(f'{args.dirs * args.files} records per tree, written in {time.perf_counter() - start:.1f} s')
+
+        start = time.perf_counter()
+        diffs = repo.diff_commits(commit1, commit2)
+        native = time.perf_counter() - start
+        entries = sum(len(diff.children) for diff in diffs)
+        print(f'native diff_commits   {native:7.2f} s   {entries} entries below {len(diffs)} directories')
+
+        if not args.skip_python:
+            start = time.perf_counter()
+            trees = repo._load_commit_trees(commit1, commit2)
+            repo._diff_trees(*trees, repo._load_stored_tree, repo._load_stored_tree)
+            print(f'Python diff           {time.perf_counter() - start:7.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -100,6 +100,19 @@ def cli() -> None:
             'help': 'Add a new tag',
         },
 
+        'create_tags': {
+            'func': cli_commands.create_tags,
+            'args': {
+                **_repo_args,
+                'from_file': {
+                    'type': str,
+                    'help': '📄 File with one "<tag> <commit>" line per tag to add, - for standard input',
+                    'default': '-',
+                },
+            },
+            'help': '🏷️ Add many tags at once',
+        },
+
         'delete_tag': {
             'func': cli_commands.delete_tag,
             'args': {
@@ -120,6 +133,14 @@ def cli() -> None:
             'help': '🏷️ List all tags',
         },
 
+        'pack_refs': {
+            'func': cli_commands.pack_refs,
+            'args': {
+                **_repo_args,
+            },
+            'help': '📦 Pack branch and tag files into one sorted packed-refs file',
+        },
+
         'add_branch': {
             'func': cli_commands.add_branch,
             'args': {
@@ -168,6 +189,18 @@ def cli() -> None:
             'func': cli_commands.log,
             'args': {
                 **_repo_args,
+                'path': {
+                    'type': str,
+                    'help': '🎯 Only show commits that change paths matching this glob, may be repeated',
+                    'append': True,
+                },
+                'abbrev_commit': {
+                    'type': None,
+                    'help': '✂️ Show the shortest unique abbreviation of each commit hash',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'a',
+                },
             },
             'help': '📜 Show commit log',
         },
@@ -182,11 +215,98 @@ def cli() -> None:
                 },
                 'commit2': {
                     'type': str,
-                    'help': '🔄 Second commit hash to diff',
+                    'help': '🔄 Second commit hash to diff, omitted with --worktree',
+                    'optional': True,
+                },
+                'worktree': {
+                    'type': None,
+                    'help': '📂 Diff the first commit against the working directory, without writing objects',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'w',
+                },
+                'patch': {
+                    'type': None,
+                    'help': '🩹 Show the line changes of each modified file as a unified diff',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'p',
+                },
+                'stat': {
+                    'type': None,
+                    'help': '📈 Show the number of changed lines per file instead of the changes',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 's',
+                },
+                'numstat': {
+                    'type': None,
+                    'help': '🔢 Like --stat, but tab-separated and machine readable',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'n',
+                },
+                'find_renames': {
+                    'type': None,
+                    'help': '🔀 Also report moved files whose contents changed when half or more of their lines match',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'M',
+                },
+                'low_memory': {
+                    'type': None,
+                    'help': '💾 Find every move with bounded memory, spilling to disk, instead of within a window',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'l',
+                },
+                'path': {
+                    'type': str,
+                    'help': '🎯 Only diff paths matching this glob, may be repeated',
+                    'append': True,
                 },
             },
             'help': '📊 Display differences between two commits',
         },
+        'status': {
+            'func': cli_commands.status,
+            'args': {
+                **_repo_args,
+            },
+            'help': '🔎 Show changes in the working directory since the HEAD commit',
+        },
+        'checkout': {
+            'func': cli_commands.checkout,
+            'args': {
+                **_repo_args,
+                'ref': {
+                    'type': str,
+                    'help': '🎯 Branch, tag or commit hash to check out',
+                },
+                'force': {
+                    'type': None,
+                    'help': '💥 Overwrite local changes and untracked files in the way',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'f',
+                },
+            },
+            'help': '🚚 Check out a commit into the working directory, writing only the files that differ',
+        },
+        'watch': {
+            'func': cli_commands.watch,
+            'args': {
+                **_repo_args,
+            },
+            'help': '👀 Track changed directories with inotify so commits only revisit them (runs until stopped)',
+        },
+        'watch_status': {
+            'func': cli_commands.watch_status,
+            'args': {
+                **_repo_args,
+            },
+            'help': '📡 Show the queue depth and lag of the watcher',
+        },
         'add_user': {
             'func': cli_commands.add_user,
             'args': {
@@ -316,9 +436,13 @@ def cli() -> None:
                 arg_short_flag = arg_info['short_flag']
                 command_sub.add_argument(f'-{arg_short_flag}', f'--{arg_name}', help=arg_help, action='store_true',
                                          default=arg_default)
+            elif arg_info.get('append', False):
+                command_sub.add_argument(f'--{arg_name}', type=arg_type, help=arg_help, action='append')
             elif arg_default is not None:
                 command_sub.add_argument(f'--{arg_name}', type=arg_type, help=f'{arg_help} (default: %(default)s)',
                                          default=arg_default)
+            elif arg_info.get('optional', False):
+                command_sub.add_argument(arg_name, type=arg_type, help=arg_help, nargs='?')
             else:
                 command_sub.add_argument(arg_name, type=arg_type, help=arg_help)
 
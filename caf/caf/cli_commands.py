@@ -1,15 +1,24 @@
 """CLI command implementations for CAF (Content Addressable File system)."""
 
+import signal
 import sys
+import threading
+import time
 from collections.abc import MutableSequence, Sequence
 from datetime import datetime
 from pathlib import Path
 
-from libcaf.constants import DEFAULT_BRANCH
+from libcaf.constants import DEFAULT_BRANCH, DEFAULT_DIFF_MEMORY_LIMIT, DEFAULT_RENAME_THRESHOLD
+from libcaf.pathspec import Pathspec
+from libcaf.plumbing import copy_stats
 from libcaf.plumbing import hash_file as plumbing_hash_file
-from libcaf.ref import SymRef
-from libcaf.repository import (AddedDiff, Diff, ModifiedDiff, MovedToDiff, RemovedDiff, Repository, RepositoryError,
-                               RepositoryNotFoundError)
+from libcaf.ref import RefError, SymRef
+from libcaf.repository import (AddedDiff, Diff, DiffEntry, DiffKind, FileStat, ModifiedDiff, MovedToDiff, RemovedDiff,
+                               Repository, RepositoryError, RepositoryNotFoundError)
+from libcaf.watch import WatchError
+
+# The widest +/- bar printed by diff --stat
+STAT_BAR_WIDTH = 50
 
 
 def _print_error(message: str) -> None:
@@ -61,8 +70,10 @@ def hash_file(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
 
     try:
+        stats_before = copy_stats()
         repo.save_file_content(path)
         _print_success(f'Saved file {path} to CAF repository')
+        print(f'Copy methods: {_describe_copies(stats_before)}')
         return 0
     except RepositoryNotFoundError:
         _print_error(f'No repository found at {repo.repo_path()}')
@@ -118,6 +129,48 @@ def create_tag(**kwargs) -> int:
         _print_error(f'Value error: {ve}')
         return -1
 
+def create_tags(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+    from_file = kwargs.get('from_file', '-')
+
+    try:
+        manifest = sys.stdin.read() if from_file == '-' else Path(from_file).read_text()
+    except OSError as e:
+        _print_error(f'Cannot read {from_file}: {e}')
+        return -1
+
+    tags = {}
+    malformed = {}
+    for line_number, line in enumerate(manifest.splitlines(), 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        if len(fields) != 2:
+            malformed[f'line {line_number}'] = 'Expected "<tag> <commit>"'
+        elif fields[0] in tags:
+            malformed[f'line {line_number}'] = f'Tag "{fields[0]}" is listed more than once'
+        else:
+            tags[fields[0]] = fields[1]
+
+    try:
+        failures = repo.create_tags_bulk(tags)
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except RefError as e:
+        _print_error(f'Reference error: {e}')
+        return -1
+    except OSError as e:
+        _print_error(f'Cannot write the tags: {e}')
+        return -1
+
+    for entry, reason in (malformed | failures).items():
+        _print_error(f'{entry}: {reason}')
+    _print_success(f'Added {len(tags) - len(failures)} of {len(tags) + len(malformed)} tags.')
+
+    return -1 if malformed or failures else 0
+
+
 def delete_tag(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
     tag_name = kwargs.get('tag_name')
@@ -143,6 +196,21 @@ def delete_tag(**kwargs) -> int:
         _print_error(f'Value error: {ve}')
         return -1
 
+def pack_refs(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+
+    try:
+        packed = repo.pack_refs()
+        _print_success(f'Packed {packed} references into {repo.packed_refs_file()}')
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except RefError as e:
+        _print_error(f'Reference error: {e}')
+        return -1
+
+
 def add_branch(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
     branch_name = kwargs.get('branch_name')
@@ -247,12 +315,14 @@ def commit(**kwargs) -> int:
         return -1
 
     try:
+        stats_before = copy_stats()
         commit_ref = repo.commit_working_dir(author, message)
 
         _print_success(f'Commit created successfully:\n'
                        f'Hash: {commit_ref}\n'
                        f'Author: {author}\n'
                        f'Message: {message}\n')
+        print(f'Copy methods: {_describe_copies(stats_before)}')
         return 0
     except RepositoryNotFoundError:
         _print_error(f'No repository found at {repo.repo_path()}')
@@ -266,7 +336,7 @@ def log(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
 
     try:
-        history = list(repo.log())
+        history = list(repo.log(pathspec=kwargs.get('path')))
         if not history:
             _print_success('No commits in the repository.')
             return 0
@@ -274,8 +344,9 @@ def log(**kwargs) -> int:
         _print_success('Commit history:\n')
         for item in history:
             commit = item.commit
+            commit_hash = repo.abbreviate_hash(item.commit_ref) if kwargs.get('abbrev_commit') else item.commit_ref
 
-            print(f'Commit: {item.commit_ref}')
+            print(f'Commit: {commit_hash}')
             print(f'Author: {commit.author}')
             commit_date = datetime.fromtimestamp(commit.timestamp).strftime('%Y-%m-%d %H:%M:%S')
             print(f'Date: {commit_date}\n')
@@ -290,6 +361,9 @@ def log(**kwargs) -> int:
     except RepositoryError as re:
         _print_error(f'Repository error: {re}')
         return -1
+    except ValueError as ve:
+        _print_error(f'Value error: {ve}')
+        return -1
 
 
 def diff(**kwargs) -> int:
@@ -297,15 +371,101 @@ def diff(**kwargs) -> int:
     commit1 = kwargs.get('commit1')
     commit2 = kwargs.get('commit2')
 
+    if kwargs.get('worktree', False):
+        return _diff_worktree(repo, kwargs)
+
     if not commit1 or not commit2:
         _print_error('Both commit1 and commit2 parameters are required for diff.')
         return -1
 
+    rename_threshold = DEFAULT_RENAME_THRESHOLD if kwargs.get('find_renames', False) else None
+    memory_limit = DEFAULT_DIFF_MEMORY_LIMIT if kwargs.get('low_memory', False) else None
+
+    if memory_limit is not None and (kwargs.get('stat', False) or kwargs.get('numstat', False)):
+        _print_error('--low_memory is not supported with --stat or --numstat.')
+        return -1
+
     try:
-        diffs = repo.diff_commits(commit1, commit2)
+        if kwargs.get('stat', False) or kwargs.get('numstat', False):
+            stats = repo.diff_stat(commit1, commit2, pathspec=kwargs.get('path'), rename_threshold=rename_threshold)
 
-        if not diffs:
+            if not stats:
+                _print_success('No changes detected between commits.')
+            elif kwargs.get('numstat', False):
+                _print_numstat(stats)
+            else:
+                _print_stat(stats)
+
+            return 0
+
+        # Entries are printed as they are found, so large diffs start printing right away
+        printed = False
+        selection = Pathspec(kwargs['path']) if kwargs.get('path') else None
+        entries = repo.iter_diff(commit1, commit2, detect_moves=True, memory_limit=memory_limit,
+                                 pathspec=kwargs.get('path'), rename_threshold=rename_threshold)
+        for entry in entries:
+            if not printed:
+                _print_success('Diff:\n')
+                printed = True
+            _print_diff_entry(entry)
+
+            if kwargs.get('patch', False):
+                _print_patch(repo, entry, selection)
+
+        if not printed:
             _print_success('No changes detected between commits.')
+
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except RepositoryError as e:
+        _print_error(f'Repository error: {e}')
+        return -1
+    except ValueError as ve:
+        _print_error(f'Value error: {ve}')
+        return -1
+
+
+def _diff_worktree(repo: Repository, kwargs: dict) -> int:
+    commit1 = kwargs.get('commit1')
+
+    if not commit1 or kwargs.get('commit2'):
+        _print_error('Exactly one commit is required to diff against the working directory.')
+        return -1
+
+    if (kwargs.get('patch', False) or kwargs.get('stat', False) or kwargs.get('numstat', False)
+            or kwargs.get('find_renames', False) or kwargs.get('low_memory', False) or kwargs.get('path')):
+        _print_error('--patch, --stat, --numstat, --find_renames, --low_memory and --path are not supported with '
+                     '--worktree.')
+        return -1
+
+    try:
+        diffs = repo.diff_working_dir(commit1)
+
+        if not diffs:
+            _print_success('No changes between the commit and the working directory.')
+            return 0
+
+        _print_diffs([(diffs, 0)])
+
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except RepositoryError as e:
+        _print_error(f'Repository error: {e}')
+        return -1
+
+
+def status(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+
+    try:
+        diffs = repo.status()
+
+        if not diffs:
+            _print_success('No changes in the working directory.')
             return 0
 
         _print_diffs([(diffs, 0)])
@@ -319,6 +479,78 @@ def diff(**kwargs) -> int:
         return -1
 
 
+def checkout(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+    ref = kwargs.get('ref')
+
+    if not ref:
+        _print_error('A reference to check out is required.')
+        return -1
+
+    try:
+        result = repo.checkout(ref, force=kwargs.get('force', False))
+
+        if result.branch is not None:
+            _print_success(f'Switched to branch "{result.branch}" at {result.commit_ref}')
+        else:
+            _print_success(f'HEAD is now detached at {result.commit_ref}')
+        print(f'Updated {result.written} files, removed {result.removed} files')
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except RepositoryError as e:
+        _print_error(f'Repository error: {e}')
+        return -1
+
+
+def watch(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+    stop = threading.Event()
+
+    try:
+        watcher = repo.watcher()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        _print_success(f'Watching {repo.working_dir} for changes (send SIGINT or SIGTERM to stop)')
+        watcher.run(stop.is_set)
+        _print_success('Stopped watching.')
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+    except WatchError as e:
+        _print_error(f'Watch error: {e}')
+        return -1
+
+
+def watch_status(**kwargs) -> int:
+    repo = _repo_from_cli_kwargs(kwargs)
+
+    try:
+        tracker = repo.change_tracker()
+        state = tracker.read_state()
+
+        if state is None:
+            _print_success('No watcher has run in this repository.')
+            return 0
+
+        heartbeat_age = (time.time_ns() - state['heartbeat_ns']) / 1e9
+        _print_success(f'Watcher: {"active" if tracker.is_active() else "inactive"} (pid {state["pid"]})')
+        print(f'Watched directories: {state["watches"]}')
+        print(f'Queue depth: {state["queue_bytes"]} bytes')
+        print(f'Lag: {state["lag_ns"] / 1e6:.2f} ms')
+        print(f'Last heartbeat: {heartbeat_age:.1f} s ago')
+        print(f'Queue overflows: {state["overflows"]}')
+        print(f'Pending directories: {tracker.pending_count()}')
+        return 0
+    except RepositoryNotFoundError:
+        _print_error(f'No repository found at {repo.repo_path()}')
+        return -1
+
+
 def _repo_from_cli_kwargs(kwargs: dict[str, str]) -> Repository:
     working_dir_path = kwargs.get('working_dir_path', '.')
     repo_dir = kwargs.get('repo_dir')
@@ -326,6 +558,11 @@ def _repo_from_cli_kwargs(kwargs: dict[str, str]) -> Repository:
     return Repository(working_dir_path, repo_dir)
 
 
+def _describe_copies(stats_before: dict[str, int]) -> str:
+    stats = copy_stats()
+    return ', '.join(f'{count - stats_before.get(method, 0)} {method}' for method, count in stats.items())
+
+
 def _print_diffs(diff_stack: MutableSequence[tuple[Sequence[Diff], int]]) -> None:
     _print_success('Diff:\n')
 
@@ -350,6 +587,79 @@ def _print_diffs(diff_stack: MutableSequence[tuple[Sequence[Diff], int]]) -> Non
             if diff.children:
                 diff_stack.append((diff.children, indent + 3))
 
+
+def _print_diff_entry(entry: DiffEntry) -> None:
+    print(' ' * 3 * entry.path.count('/'), end='')
+
+    match entry.kind:
+        case DiffKind.ADDED:
+            print(f'Added: {entry.new_path}')
+        case DiffKind.REMOVED:
+            print(f'Removed: {entry.old_path}')
+        case DiffKind.MODIFIED:
+            print(f'Modified: {entry.path}')
+        case DiffKind.MOVED:
+            print(f'Moved: {entry.old_path} -> {entry.new_path}')
+
+
+def _print_patch(repo: Repository, entry: DiffEntry, pathspec: Pathspec | None) -> None:
+    # Added and removed directories are printed file by file, as --stat and --numstat count them
+    for old_path, new_path, old_hash, new_hash in repo.file_changes(entry, pathspec):
+        if old_hash == new_hash:
+            continue
+
+        old_name = f'a/{old_path}' if old_hash is not None else '/dev/null'
+        new_name = f'b/{new_path}' if new_hash is not None else '/dev/null'
+        line_diff = repo.diff_blobs(old_hash, new_hash)
+
+        if line_diff.binary:
+            print(f'Binary files {old_name} and {new_name} differ')
+            continue
+
+        print(f'--- {old_name}')
+        print(f'+++ {new_name}')
+        for hunk in line_diff.hunks:
+            print(f'@@ -{hunk.old_start},{hunk.old_count} +{hunk.new_start},{hunk.new_count} @@')
+            for line in hunk.lines:
+                print(line.decode('utf-8', errors='replace'))
+
+
+def _stat_path(stat: FileStat) -> str:
+    return f'{stat.old_path} => {stat.path}' if stat.old_path is not None else stat.path
+
+
+def _print_numstat(stats: Sequence[FileStat]) -> None:
+    for stat in stats:
+        if stat.binary:
+            print(f'-\t-\t{_stat_path(stat)}')
+        else:
+            print(f'{stat.additions}\t{stat.deletions}\t{_stat_path(stat)}')
+
+
+def _print_stat(stats: Sequence[FileStat]) -> None:
+    paths = [_stat_path(stat) for stat in stats]
+    path_width = max(len(path) for path in paths)
+    largest = max(stat.additions + stat.deletions for stat in stats)
+    count_width = len(str(largest))
+    # Bars are scaled down so that the largest change fits in STAT_BAR_WIDTH characters
+    scale = min(1.0, STAT_BAR_WIDTH / largest) if largest else 1.0
+
+    for stat, path in zip(stats, paths, strict=True):
+        if stat.binary:
+            print(f' {path:<{path_width}} | {"Bin":>{count_width}}')
+            continue
+
+        additions = round(stat.additions * scale) if stat.additions else 0
+        deletions = round(stat.deletions * scale) if stat.deletions else 0
+        bar = '+' * max(additions, 1 if stat.additions else 0) + '-' * max(deletions, 1 if stat.deletions else 0)
+        print(f' {path:<{path_width}} | {stat.additions + stat.deletions:>{count_width}} {bar}'.rstrip())
+
+    insertions = sum(stat.additions for stat in stats)
+    deletions = sum(stat.deletions for stat in stats)
+    print(f' {len(stats)} file{"s" if len(stats) != 1 else ""} changed, {insertions} insertions(+), '
+          f'{deletions} deletions(-)')
+
+
 def add_user(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
     username = kwargs.get('username')
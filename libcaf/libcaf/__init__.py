@@ -1,11 +1,29 @@
 """libcaf - Content Addressable File system in Python."""
 
-from _libcaf import Blob, Commit, Tree, TreeRecord, TreeRecordType
+from _libcaf import (
+    Blob,
+    Commit,
+    DiffColumns,
+    DiffHunk,
+    LineDiff,
+    LineStat,
+    Tree,
+    TreeDiff,
+    TreeDiffKind,
+    TreeRecord,
+    TreeRecordType,
+)
 
 __all__ = [
     'Blob',
     'Commit',
+    'DiffColumns',
+    'DiffHunk',
+    'LineDiff',
+    'LineStat',
     'Tree',
+    'TreeDiff',
+    'TreeDiffKind',
     'TreeRecord',
     'TreeRecordType',
 ]
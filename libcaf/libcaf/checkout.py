@@ -0,0 +1,155 @@
+"""Materialization of trees into the working directory."""
+
+import os
+import shutil
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import Tree, TreeRecordType
+from .dircache import FileSignature, child_key, file_signature
+from .plumbing import open_content_for_reading
+
+
+@dataclass
+class CheckoutPlan:
+    """The working directory changes needed to go from one tree to another.
+
+    Keys are paths relative to the working directory. Only subtrees whose hashes differ are visited,
+    so the plan is proportional to the size of the difference between the trees."""
+
+    # Files to remove and directories to remove if they end up empty, deepest first
+    removed_files: list[str] = field(default_factory=list)
+    removed_dirs: list[str] = field(default_factory=list)
+    # Directories to create, parents first, and the blobs to write
+    created_dirs: list[str] = field(default_factory=list)
+    writes: dict[str, str] = field(default_factory=dict)
+    # The blob hash of every file of the old tree that is removed or overwritten
+    tracked: dict[str, str] = field(default_factory=dict)
+    # Every visited directory of the new tree, with its tree and hash
+    trees: dict[str, tuple[Tree, str]] = field(default_factory=dict)
+
+
+@dataclass
+class CheckoutResult:
+    """The outcome of a checkout."""
+
+    commit_ref: str
+    branch: str | None
+    written: int
+    removed: int
+
+
+def plan_checkout(old_tree: Tree | None, new_tree: Tree, new_hash: str,
+                  load_tree: Callable[[str], Tree]) -> CheckoutPlan:
+    """Compute the changes that turn a working directory matching one tree into one matching another.
+
+    :param old_tree: The tree the working directory currently matches, or None if it matches no tree.
+    :param new_tree: The tree to check out.
+    :param new_hash: The hash of the tree to check out.
+    :param load_tree: Loads a subtree by hash.
+    :return: The checkout plan."""
+    plan = CheckoutPlan()
+    stack: list[tuple[str, Tree | None, Tree | None, str | None, bool]] = [('', old_tree, new_tree, new_hash, False)]
+
+    while stack:
+        key, old, new, new_tree_hash, exiting = stack.pop()
+
+        if exiting:
+            plan.removed_dirs.append(key)
+            continue
+
+        if new is not None:
+            plan.trees[key] = (new, new_tree_hash)
+        elif key:
+            # Removed directories are dropped once everything below them is gone
+            stack.append((key, None, None, None, True))
+
+        old_records = old.records if old is not None else {}
+        new_records = new.records if new is not None else {}
+
+        for name in old_records.keys() | new_records.keys():
+            old_record = old_records.get(name)
+            new_record = new_records.get(name)
+            if old_record is not None and new_record is not None and old_record.hash == new_record.hash:
+                continue
+
+            path = child_key(key, name)
+            old_is_tree = old_record is not None and old_record.type == TreeRecordType.TREE
+            new_is_tree = new_record is not None and new_record.type == TreeRecordType.TREE
+
+            if old_record is not None and not old_is_tree:
+                plan.tracked[path] = old_record.hash
+                if new_record is None or new_is_tree:
+                    plan.removed_files.append(path)
+
+            if new_record is not None and not new_is_tree:
+                plan.writes[path] = new_record.hash
+
+            if new_is_tree and not old_is_tree:
+                plan.created_dirs.append(path)
+
+            if old_is_tree or new_is_tree:
+                stack.append((path,
+                              load_tree(old_record.hash) if old_is_tree else None,
+                              load_tree(new_record.hash) if new_is_tree else None,
+                              new_record.hash if new_is_tree else None,
+                              False))
+
+    plan.created_dirs.sort()
+    plan.removed_dirs.sort(reverse=True)
+
+    return plan
+
+
+def remove_paths(working_dir: Path, files: Iterable[str], dirs: Iterable[str]) -> None:
+    """Remove files, then the directories that are left empty.
+
+    Directories that still hold untracked files are kept.
+
+    :param working_dir: The working directory.
+    :param files: The keys of the files to remove.
+    :param dirs: The keys of the directories to remove, deepest first."""
+    for key in files:
+        (working_dir / key).unlink(missing_ok=True)
+
+    for key in dirs:
+        try:
+            (working_dir / key).rmdir()
+        except OSError:
+            pass
+
+
+def write_blobs(working_dir: Path, objects_dir: Path, writes: dict[str, str],
+                workers: int | None = None) -> dict[str, FileSignature]:
+    """Write blobs from the object store into the working directory on a thread pool.
+
+    Each file is written to a temporary file next to it and renamed into place, so readers never see
+    a partially written file.
+
+    :param working_dir: The working directory.
+    :param objects_dir: The object store directory.
+    :param writes: Maps the key of each file to write to its blob hash.
+    :param workers: The number of writer threads. Defaults to the thread pool's default.
+    :return: The stat signature of every written file, taken right after it was written."""
+
+    def write(key: str, blob_hash: str) -> tuple[str, FileSignature]:
+        dest = working_dir / key
+        tmp = dest.with_name(f'.{dest.name}.caf-tmp')
+
+        try:
+            with open_content_for_reading(objects_dir, blob_hash) as src, tmp.open('wb') as out:
+                shutil.copyfileobj(src, out)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        return key, file_signature(dest.stat())
+
+    if not writes:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(write, writes.keys(), writes.values()))
@@ -5,10 +5,26 @@ from _libcaf import hash_length
 DEFAULT_REPO_DIR = '.caf'
 OBJECTS_SUBDIR = 'objects'
 HEAD_FILE = 'HEAD'
+DIRCACHE_FILE = 'dircache'
+WATCH_DIR = 'watch'
+SIGNATURES_FILE = 'signatures'
+DIFFCACHE_DIR = 'diffcache'
+IGNORE_FILE = '.cafignore'
 DEFAULT_BRANCH = 'main'
+DEFAULT_MOVE_WINDOW = 65536
+DEFAULT_TREE_CACHE_SIZE = 4096
+DEFAULT_RENAME_THRESHOLD = 0.5
+MINHASH_SIZE = 128
+MINHASH_BANDS = 32
+DEFAULT_DIFF_CACHE_SIZE = 64 * 1024 * 1024
+DEFAULT_DIFF_MEMORY_LIMIT = 1_000_000
 REFS_DIR = 'refs'
 HEADS_DIR = 'heads'
 TAGS_DIR = 'tags' 
+PACKED_REFS_FILE = 'packed-refs'
+OBJINDEX_DIR = 'objindex'
+REF_LOCK_SUFFIX = '.lock'
+DEFAULT_REF_LOCK_TIMEOUT = 5.0
 
 HASH_LENGTH = hash_length()
 HASH_CHARSET = '0123456789abcdef'
@@ -0,0 +1,154 @@
+"""Persistent, size-bounded cache of the differences between pairs of trees."""
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+DIFFCACHE_VERSION = 1
+
+# One change of a level: kind ('A', 'R' or 'M'), name, then the type and hash of the old and new records,
+# with -1 and '' for a side that has no record
+LevelChange = tuple[str, str, int, str, int, str]
+
+# Eviction removes the least recently used entries until the cache is this fraction of its maximum size
+_EVICTION_TARGET = 0.75
+
+# The file in the cache directory that holds the total size of the entries, so a new cache need not scan them all
+_SIZE_FILE = 'size'
+
+
+class TreeDiffCache:
+    """A cache of the changes between the records of two trees, keyed by the pair of tree hashes.
+
+    Trees never change, so an entry never goes stale. An entry holds only the changes of one level; a modified
+    subdirectory is a change whose two hashes key the entry of the level below it, so diffs that share subtree
+    pairs share their entries. Entries are stored in files fanned out like the object store, and reading an
+    entry refreshes its mtime so that eviction removes the least recently used ones first.
+
+    The total size of the entries is kept in a file next to them. Concurrent writers may each miss the other's
+    addition, so it can fall behind the real size, and every eviction recounts it from the entries."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        """Initialize a cache stored in a directory.
+
+        :param cache_dir: The cache directory. It is created when the first entry is written.
+        :param max_bytes: The size the entries may take up before the least recently used ones are evicted."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def get(self, tree_hash1: str, tree_hash2: str) -> list[LevelChange] | None:
+        """Get the changes between the records of two trees.
+
+        :param tree_hash1: The hash of the first tree.
+        :param tree_hash2: The hash of the second tree.
+        :return: The changes, or None if the pair is not cached or its entry cannot be read."""
+        path = self._entry_path(tree_hash1, tree_hash2)
+
+        try:
+            data = json.loads(path.read_bytes())
+            _touch(path)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get('version') != DIFFCACHE_VERSION:
+            return None
+
+        return [tuple(change) for change in data['changes']]
+
+    def put(self, tree_hash1: str, tree_hash2: str, changes: list[LevelChange]) -> None:
+        """Cache the changes between the records of two trees, evicting old entries if the cache grows too large.
+
+        The cache is only an optimization, so an entry that cannot be written, for example because another
+        process evicts its directory meanwhile, is left out without an error.
+
+        :param tree_hash1: The hash of the first tree.
+        :param tree_hash2: The hash of the second tree.
+        :param changes: The changes, sorted by name."""
+        if self.max_bytes <= 0:
+            return
+
+        data = json.dumps({'version': DIFFCACHE_VERSION, 'changes': changes}, separators=(',', ':')).encode()
+        path = self._entry_path(tree_hash1, tree_hash2)
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(path, data)
+            _touch(path)
+
+            size = self._read_size()
+            size = self._scan()[1] if size is None else size + len(data)
+            if size > self.max_bytes:
+                self._evict()
+            else:
+                self._write_size(size)
+        except OSError:
+            pass
+
+    def _entry_path(self, tree_hash1: str, tree_hash2: str) -> Path:
+        return self.cache_dir / tree_hash1[:2] / f'{tree_hash1}{tree_hash2}'
+
+    def _read_size(self) -> int | None:
+        try:
+            return int((self.cache_dir / _SIZE_FILE).read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _write_size(self, size: int) -> None:
+        _write_atomic(self.cache_dir / _SIZE_FILE, str(size).encode())
+
+    def _scan(self) -> tuple[list[tuple[int, int, str]], int]:
+        """List the entries with their mtimes and sizes.
+
+        :return: The mtime, size and path of each entry, and their total size."""
+        entries = []
+
+        try:
+            with os.scandir(self.cache_dir) as fanout:
+                for fanout_dir in fanout:
+                    if not fanout_dir.is_dir():
+                        continue
+                    with os.scandir(fanout_dir.path) as files:
+                        for file in files:
+                            st = file.stat()
+                            entries.append((st.st_mtime_ns, st.st_size, file.path))
+        except FileNotFoundError:
+            # Another process evicted a directory while it was being listed
+            pass
+
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self) -> None:
+        entries, size = self._scan()
+        entries.sort()
+
+        target = self.max_bytes * _EVICTION_TARGET
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+        self._write_size(size)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # The temporary name is unique, so concurrent writers of the same file never rename each other's files
+    fd, tmp_name = tempfile.mkstemp(prefix=f'{path.name}.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _touch(path: Path) -> None:
+    # File timestamps can be coarser than the clock, which would leave recently used entries tied with old ones
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
@@ -0,0 +1,167 @@
+"""Persistent Merkle cache of working directory snapshots."""
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DIRCACHE_VERSION = 2
+
+# (inode, size, mtime in nanoseconds) of a regular file
+FileSignature = tuple[int, int, int]
+# (inode, mtime in nanoseconds) of a directory
+DirSignature = tuple[int, int]
+
+# Signatures that never match a real file or directory, for entries whose stat data is not known
+UNKNOWN_FILE_SIGNATURE: FileSignature = (0, -1, 0)
+UNKNOWN_DIR_SIGNATURE: DirSignature = (0, 0)
+
+
+def file_signature(st: os.stat_result) -> FileSignature:
+    """Build the stat signature of a regular file.
+
+    :param st: The stat result of the file.
+    :return: The file signature."""
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def dir_signature(st: os.stat_result) -> DirSignature:
+    """Build the stat signature of a directory.
+
+    The mtime of a directory changes whenever an entry is created, removed or renamed in it,
+    so an unchanged signature means the directory listing is unchanged.
+
+    :param st: The stat result of the directory.
+    :return: The directory signature."""
+    return st.st_ino, st.st_mtime_ns
+
+
+@dataclass
+class CachedDir:
+    """The cached snapshot of a single directory.
+
+    `ignore_fp` identifies the ignore rules the listing was filtered with."""
+
+    signature: DirSignature
+    tree_hash: str
+    files: dict[str, tuple[FileSignature, str]] = field(default_factory=dict)
+    dirs: dict[str, str] = field(default_factory=dict)
+    ignore_fp: str = ''
+
+
+class DirCache:
+    """A persistent cache keyed by directory path.
+
+    Each entry records the stat signature of the directory, the stat signatures and blob hashes of the
+    files directly in it, the tree hashes of its subdirectories and the hash of the resulting tree.
+    Entries whose mtime is not strictly older than the cache file itself are treated as racily clean
+    and are never trusted, since the file may have been modified again within the same timestamp tick."""
+
+    def __init__(self, cache_file: Path) -> None:
+        """Initialize an empty cache bound to a file. Use `DirCache.load` to read an existing cache.
+
+        :param cache_file: The path to the cache file."""
+        self.cache_file = cache_file
+        self.entries: dict[str, CachedDir] = {}
+        self._written_ns = 0
+
+    @classmethod
+    def load(cls, cache_file: Path) -> 'DirCache':
+        """Load a cache from disk. A missing, unreadable or outdated cache file yields an empty cache.
+
+        :param cache_file: The path to the cache file.
+        :return: The loaded cache."""
+        cache = cls(cache_file)
+
+        try:
+            written_ns = cache_file.stat().st_mtime_ns
+            with cache_file.open(encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cache
+
+        if not isinstance(data, dict) or data.get('version') != DIRCACHE_VERSION:
+            return cache
+
+        for key, entry in data['dirs'].items():
+            cache.entries[key] = CachedDir(
+                tuple(entry['signature']),
+                entry['tree_hash'],
+                {name: (tuple(sig), blob_hash) for name, (sig, blob_hash) in entry['files'].items()},
+                dict(entry['dirs']),
+                entry['ignore_fp'])
+        cache._written_ns = written_ns
+
+        return cache
+
+    def save(self) -> None:
+        """Atomically write the cache to disk."""
+        data = {
+            'version': DIRCACHE_VERSION,
+            'dirs': {key: {'signature': entry.signature,
+                           'tree_hash': entry.tree_hash,
+                           'files': entry.files,
+                           'dirs': entry.dirs,
+                           'ignore_fp': entry.ignore_fp}
+                     for key, entry in self.entries.items()},
+        }
+
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        # json.dumps uses the C encoder, json.dump to a file does not
+        tmp_file.write_text(json.dumps(data, separators=(',', ':')), encoding='utf-8')
+        os.replace(tmp_file, self.cache_file)
+
+    def lookup_dir(self, key: str, signature: DirSignature) -> CachedDir | None:
+        """Get the cached snapshot of a directory if its listing is known to be unchanged.
+
+        :param key: The cache key of the directory.
+        :param signature: The current signature of the directory.
+        :return: The cached snapshot, or None if the directory must be listed again."""
+        entry = self.entries.get(key)
+        if entry is None or entry.signature != signature or signature[1] >= self._written_ns:
+            return None
+
+        return entry
+
+    def lookup_file(self, key: str, name: str, signature: FileSignature) -> str | None:
+        """Get the cached blob hash of a file if its content is known to be unchanged.
+
+        :param key: The cache key of the directory containing the file.
+        :param name: The name of the file.
+        :param signature: The current signature of the file.
+        :return: The cached blob hash, or None if the file must be hashed again."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        cached = entry.files.get(name)
+        if cached is None or cached[0] != signature or signature[2] >= self._written_ns:
+            return None
+
+        return cached[1]
+
+    def discard_subtree(self, key: str) -> None:
+        """Forget a directory and every directory below it.
+
+        :param key: The cache key of the top directory."""
+        self.entries = {k: v for k, v in self.entries.items() if not is_below(k, key)}
+
+
+def child_key(key: str, name: str) -> str:
+    """Build the cache key of an entry inside a directory.
+
+    :param key: The cache key of the directory.
+    :param name: The name of the entry.
+    :return: The cache key of the entry."""
+    return f'{key}/{name}' if key else name
+
+
+def is_below(key: str, top_key: str) -> bool:
+    """Check whether a cache key is a directory equal to or below another one.
+
+    :param key: The cache key to check.
+    :param top_key: The cache key of the top directory.
+    :return: True if `key` is `top_key` or one of its descendants."""
+    if not top_key:
+        return not key.startswith('/')
+    return key == top_key or key.startswith(top_key + '/')
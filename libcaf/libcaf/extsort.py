@@ -0,0 +1,113 @@
+"""External sorting of more items than fit in memory, through sorted run files merged from disk."""
+
+import heapq
+import os
+import pickle
+import tempfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+# The most runs kept at once; beyond that they are merged into one, which bounds the number of open run files
+MAX_MERGE_RUNS = 64
+
+# Items are written and read in chunks of this many, so a run being merged holds one chunk in memory
+_CHUNK_SIZE = 1024
+
+
+class ExternalSorter:
+    """Sorts tuples while holding at most a fixed number of them in memory.
+
+    Added items are buffered, and a full buffer is sorted and written to a run file in the spill directory. The
+    sorted items are then streamed by merging the runs, with the buffer drained as it goes, so a consumer that
+    buffers what it reads stays within the same bound overall. Items must be picklable and comparable."""
+
+    def __init__(self, spill_dir: Path, memory_limit: int) -> None:
+        """Initialize an empty sorter.
+
+        :param spill_dir: The directory run files are written to.
+        :param memory_limit: The maximum number of items held in memory.
+        :raises ValueError: If the memory limit is less than 1."""
+        if memory_limit < 1:
+            msg = 'The memory limit must be at least 1'
+            raise ValueError(msg)
+
+        self.spill_dir = spill_dir
+        self.memory_limit = memory_limit
+        self._buffer: list[tuple] = []
+        self._runs: list[Path] = []
+
+    @property
+    def runs(self) -> int:
+        """The number of run files written so far and not yet merged."""
+        return len(self._runs)
+
+    def add(self, item: tuple) -> None:
+        """Add an item, spilling the buffer to a run file if it is full.
+
+        :param item: The item to add."""
+        self._buffer.append(item)
+        if len(self._buffer) >= self.memory_limit:
+            self.spill()
+
+    def spill(self) -> None:
+        """Write the buffered items to a run file, if there are any."""
+        if not self._buffer:
+            return
+
+        self._buffer.sort()
+        self._runs.append(self._write_run(self._buffer))
+        self._buffer = []
+
+        if len(self._runs) >= MAX_MERGE_RUNS:
+            runs = self._runs
+            self._runs = [self._write_run(heapq.merge(*(_read_run(run) for run in runs)))]
+            for run in runs:
+                run.unlink()
+
+    def sorted(self) -> Iterator[tuple]:
+        """Stream every added item in sorted order, removing the run files once they are read.
+
+        :return: An iterator over the items. The sorter is empty afterwards."""
+        # Sorted backwards, the smallest item can be popped off the end, so the buffer shrinks as it is read
+        self._buffer.sort(reverse=True)
+        buffered = _drain(self._buffer)
+        runs, self._runs = self._runs, []
+
+        try:
+            if not runs:
+                yield from buffered
+            else:
+                yield from heapq.merge(buffered, *(_read_run(run) for run in runs))
+        finally:
+            for run in runs:
+                run.unlink(missing_ok=True)
+
+    def _write_run(self, items: Iterable[tuple]) -> Path:
+        fd, name = tempfile.mkstemp(suffix='.run', dir=self.spill_dir)
+
+        with os.fdopen(fd, 'wb') as f:
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) == _CHUNK_SIZE:
+                    pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+
+        return Path(name)
+
+
+def _drain(items: list[tuple]) -> Iterator[tuple]:
+    while items:
+        yield items.pop()
+
+
+def _read_run(run: Path) -> Iterator[tuple]:
+    with run.open('rb') as f:
+        while True:
+            try:
+                chunk = pickle.load(f)  # noqa: S301 - run files are written by this process
+            except EOFError:
+                return
+            yield from chunk
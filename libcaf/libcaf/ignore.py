@@ -0,0 +1,242 @@
+"""gitignore-style ignore files compiled into a fast path matcher."""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from .dircache import child_key
+
+_GLOB_CHARS = frozenset('*?[')
+
+# Characters that regular expression classes treat specially, escaped in glob classes; `-` is kept for ranges
+_CLASS_SPECIAL = re.compile(r'([\\\[\]^&~|])')
+
+
+@dataclass(frozen=True)
+class _RuleGroup:
+    """Consecutive rules of an ignore file that share a sign and dir-only flag.
+
+    The order of rules only matters between groups, so the rules of a group are merged into literal sets,
+    a set of literal suffixes for `*suffix` rules, and one alternation regex each for the remaining basename
+    rules and for anchored path rules."""
+
+    negated: bool
+    dir_only: bool
+    names: frozenset[str]
+    suffixes: frozenset[str]
+    suffix_lengths: tuple[int, ...]
+    name_pattern: re.Pattern | None
+    paths: frozenset[str]
+    path_pattern: re.Pattern | None
+
+    def matches(self, name: str, rel_path: str) -> bool:
+        return (name in self.names or rel_path in self.paths or
+                any(name[-length:] in self.suffixes for length in self.suffix_lengths if len(name) >= length) or
+                (self.name_pattern is not None and self.name_pattern.match(name) is not None) or
+                (self.path_pattern is not None and self.path_pattern.match(rel_path) is not None))
+
+
+@dataclass(frozen=True)
+class _RuleSet:
+    """The compiled rules of a single ignore file, with the groups in reverse order of precedence."""
+
+    base: str
+    groups: tuple[_RuleGroup, ...]
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression body.
+
+    `*` and `?` do not match `/`, `**` matches across directories and `[...]` is a character class. A `[` that
+    starts no complete class, such as in `[]`, `[!]` or `a[`, is a literal character.
+
+    :param pattern: The glob pattern.
+    :return: The regular expression, without anchors.
+    :raises ValueError: If a character class holds a range whose ends are out of order."""
+    out: list[str] = []
+    i, n = 0, len(pattern)
+
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif c == '*':
+            out.append('[^/]*')
+            i += 1
+        elif c == '?':
+            out.append('[^/]')
+            i += 1
+        elif c == '[':
+            start = i + 1
+            negated = start < n and pattern[start] in '!^'
+            if negated:
+                start += 1
+            # As in fnmatch, a `]` right after the opening bracket belongs to the class, and a bracket that
+            # closes no class is a literal `[`
+            end = pattern.find(']', start + 1)
+            if start >= n or end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            out.append(_class_to_regex(pattern[start:end], negated))
+            i = end + 1
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+
+    return ''.join(out)
+
+
+def _class_to_regex(body: str, negated: bool) -> str:
+    """Translate the body of a glob character class into a regular expression class.
+
+    :param body: The characters between the brackets, without the negation mark.
+    :param negated: Whether the class is negated.
+    :return: The regular expression class.
+    :raises ValueError: If the class holds a range whose ends are out of order."""
+    regex = f'[{"^" if negated else ""}{_CLASS_SPECIAL.sub(r"\\\1", body)}]'
+
+    try:
+        re.compile(regex)
+    except re.error as e:
+        msg = f'Invalid character class [{body}]: {e}'
+        raise ValueError(msg) from None
+
+    return regex
+
+
+def _literal_tail(pattern: str) -> bool:
+    """Check whether everything after the first character of a pattern is literal."""
+    return not (_GLOB_CHARS & set(pattern[1:])) and '\\' not in pattern
+
+
+def compile_rules(content: str) -> tuple[_RuleGroup, ...]:
+    """Compile the content of an ignore file.
+
+    :param content: The content of the ignore file.
+    :return: The rule groups, last group first."""
+    parsed: list[tuple[bool, bool, bool, str]] = []
+
+    for raw_line in content.splitlines():
+        line = raw_line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        # A separator at the beginning or in the middle anchors the pattern to the ignore file's directory
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if '[' in line:
+            # Like git, a pattern that cannot be compiled, such as one with a reversed range, matches nothing
+            try:
+                glob_to_regex(line)
+            except ValueError:
+                continue
+        if line:
+            parsed.append((negated, dir_only, anchored, line))
+
+    groups: list[_RuleGroup] = []
+    start = 0
+    for end in range(1, len(parsed) + 1):
+        if end < len(parsed) and parsed[end][:2] == parsed[start][:2]:
+            continue
+
+        negated, dir_only = parsed[start][:2]
+        names, suffixes, name_globs, paths, path_globs = set(), set(), [], set(), []
+        for _, _, anchored, pattern in parsed[start:end]:
+            literal = not (_GLOB_CHARS & set(pattern)) and '\\' not in pattern
+            if anchored and literal:
+                paths.add(pattern)
+            elif anchored:
+                path_globs.append(glob_to_regex(pattern))
+            elif literal:
+                names.add(pattern)
+            elif pattern[0] == '*' and len(pattern) > 1 and _literal_tail(pattern):
+                suffixes.add(pattern[1:])
+            else:
+                name_globs.append(glob_to_regex(pattern))
+
+        groups.append(_RuleGroup(
+            negated, dir_only, frozenset(names),
+            frozenset(suffixes), tuple(sorted({len(suffix) for suffix in suffixes})),
+            re.compile(f'(?:{"|".join(name_globs)})\\Z') if name_globs else None,
+            frozenset(paths),
+            re.compile(f'(?:{"|".join(path_globs)})\\Z') if path_globs else None))
+        start = end
+
+    return tuple(reversed(groups))
+
+
+class IgnoreMatcher:
+    """The ignore rules in effect in one directory of the working directory.
+
+    A matcher holds the rules of every ignore file from the top of the working directory down to its directory,
+    deepest first. Rules in deeper files take precedence and, within a file, later rules take precedence,
+    as in gitignore. Ignored directories are meant to be pruned by walkers, so their contents are never matched."""
+
+    __slots__ = ('_always_ignored', '_rule_sets', 'fingerprint')
+
+    def __init__(self, always_ignored: frozenset[str] = frozenset(), rule_sets: tuple[_RuleSet, ...] = (),
+                 fingerprint: str = '') -> None:
+        """Initialize a matcher. Use `child` to descend into subdirectories.
+
+        :param always_ignored: Entry names that are ignored at every level and cannot be re-included.
+        :param rule_sets: The compiled ignore files in effect, deepest first.
+        :param fingerprint: A hash identifying the ignore file contents in effect."""
+        self._always_ignored = always_ignored
+        self._rule_sets = rule_sets
+        self.fingerprint = fingerprint
+
+    def child(self, key: str, directory: Path, ignore_file_name: str) -> 'IgnoreMatcher':
+        """Get the matcher of a subdirectory, adding the rules of its own ignore file if it has one.
+
+        :param key: The key of the subdirectory.
+        :param directory: The path of the subdirectory.
+        :param ignore_file_name: The name of ignore files.
+        :return: The matcher in effect in the subdirectory."""
+        try:
+            content = (directory / ignore_file_name).read_text(encoding='utf-8', errors='surrogateescape')
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return self
+
+        groups = compile_rules(content)
+        fingerprint = hashlib.sha1(f'{self.fingerprint}\0{key}\0{content}'.encode('utf-8', 'surrogateescape'))
+        rule_sets = (_RuleSet(key, groups), *self._rule_sets) if groups else self._rule_sets
+
+        return IgnoreMatcher(self._always_ignored, rule_sets, fingerprint.hexdigest())
+
+    def is_ignored(self, key: str, name: str, *, is_dir: bool) -> bool:
+        """Check whether an entry of this matcher's directory is ignored.
+
+        :param key: The key of the directory containing the entry.
+        :param name: The name of the entry.
+        :param is_dir: Whether the entry is a directory.
+        :return: True if the entry is ignored."""
+        if name in self._always_ignored:
+            return True
+        if not self._rule_sets:
+            return False
+
+        path = child_key(key, name)
+        for rule_set in self._rule_sets:
+            rel_path = path[len(rule_set.base) + 1:] if rule_set.base else path
+            for group in rule_set.groups:
+                if (is_dir or not group.dir_only) and group.matches(name, rel_path):
+                    return not group.negated
+
+        return False
@@ -0,0 +1,163 @@
+"""A sorted index of the stored object hashes, for resolving abbreviated hashes without listing the object store."""
+
+import mmap
+import os
+import struct
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from .constants import HASH_CHARSET, HASH_LENGTH
+
+MIN_ABBREV_LENGTH = 4
+
+# Each index file starts with the mtime of the object directory it was built from, then the sorted hashes
+_HEADER = struct.Struct('<q')
+
+# An object directory modified this recently may still change within the same timestamp, so its index is not
+# saved; otherwise an object written right after the index would leave the mtime, and so the index, unchanged
+_RACY_NS = 2_000_000_000
+
+
+class ObjectIndex:
+    """The hashes of the objects in the store, one sorted index file per fan-out directory.
+
+    Objects are stored under a directory named after the first two characters of their hash, so every hash that
+    starts with a prefix of two or more characters is in the same directory. Each directory has its own index
+    file of fixed-length sorted hashes, searched through an mmap, and rebuilt from that directory alone when its
+    mtime shows that objects were added or removed."""
+
+    def __init__(self, objects_dir: Path, index_dir: Path) -> None:
+        """Initialize the index of an object store.
+
+        :param objects_dir: The objects directory of the repository.
+        :param index_dir: The directory the index files are kept in. It is created when the first one is written."""
+        self.objects_dir = objects_dir
+        self.index_dir = index_dir
+
+    def lookup(self, prefix: str, limit: int = 2) -> list[str]:
+        """Find the stored objects whose hash starts with a prefix.
+
+        :param prefix: The prefix, of at least two lowercase hexadecimal characters.
+        :param limit: The maximum number of hashes to return.
+        :return: The matching hashes, sorted.
+        :raises ValueError: If the prefix is shorter than two characters or is not hexadecimal."""
+        _check_prefix(prefix)
+        key = prefix.encode()
+        matches = []
+
+        with self._bucket(prefix[:2]) as data:
+            start = _lower_bound(data, key)
+            while start < len(data) and len(matches) < limit:
+                object_hash = data[start:start + HASH_LENGTH]
+                if not object_hash.startswith(key):
+                    break
+                matches.append(object_hash.decode('ascii'))
+                start += HASH_LENGTH
+
+        return matches
+
+    def shortest_prefix(self, object_hash: str, min_length: int = MIN_ABBREV_LENGTH) -> str:
+        """Find the shortest prefix of a hash that no other stored object shares.
+
+        :param object_hash: The full hash.
+        :param min_length: The shortest prefix to return.
+        :return: The prefix.
+        :raises ValueError: If the hash is not a full hexadecimal hash."""
+        if len(object_hash) != HASH_LENGTH:
+            msg = f'Not a full hash: {object_hash}'
+            raise ValueError(msg)
+        _check_prefix(object_hash)
+        key = object_hash.encode()
+        length = 0
+
+        # Only the hashes sorted right before and after it can share a longer prefix than any other
+        with self._bucket(object_hash[:2]) as data:
+            start = _lower_bound(data, key)
+            if start > _HEADER.size:
+                length = _common_length(key, data[start - HASH_LENGTH:start])
+            if data[start:start + HASH_LENGTH] == key:
+                start += HASH_LENGTH
+            if start < len(data):
+                length = max(length, _common_length(key, data[start:start + HASH_LENGTH]))
+
+        return object_hash[:min(max(length + 1, min_length), HASH_LENGTH)]
+
+    @contextmanager
+    def _bucket(self, fanout: str) -> Iterator[bytes | mmap.mmap]:
+        try:
+            mtime = os.stat(self.objects_dir / fanout).st_mtime_ns
+        except FileNotFoundError:
+            yield _HEADER.pack(-1)
+            return
+
+        index_file = self.index_dir / fanout
+        try:
+            f = index_file.open('rb')
+        except FileNotFoundError:
+            f = None
+
+        if f is not None:
+            with f:
+                header = f.read(_HEADER.size)
+                if len(header) == _HEADER.size and _HEADER.unpack(header)[0] == mtime:
+                    if os.fstat(f.fileno()).st_size == _HEADER.size:
+                        yield header
+                        return
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        yield data
+                        return
+
+        yield self._rebuild(fanout, mtime)
+
+    def _rebuild(self, fanout: str, mtime: int) -> bytes:
+        hashes = sorted(entry.name.encode('ascii') for entry in os.scandir(self.objects_dir / fanout)
+                        if _is_object_name(entry.name, fanout))
+        data = _HEADER.pack(mtime) + b''.join(hashes)
+
+        if time.time_ns() - mtime >= _RACY_NS:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            index_file = self.index_dir / fanout
+            tmp_file = index_file.with_name(f'{fanout}.{os.getpid()}.tmp')
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, index_file)
+
+        return data
+
+
+def _check_prefix(prefix: str) -> None:
+    if len(prefix) < 2 or not all(c in HASH_CHARSET for c in prefix):
+        msg = f'Invalid hash prefix: {prefix}'
+        raise ValueError(msg)
+
+
+def _is_object_name(name: str, fanout: str) -> bool:
+    # Temporary files written while an object is saved are skipped
+    return len(name) == HASH_LENGTH and name.startswith(fanout) and all(c in HASH_CHARSET for c in name)
+
+
+def _lower_bound(data: bytes | mmap.mmap, key: bytes) -> int:
+    """Find the offset of the first hash that is not less than a key, or the end of the data."""
+    lo = 0
+    hi = (len(data) - _HEADER.size) // HASH_LENGTH
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = _HEADER.size + mid * HASH_LENGTH
+        if data[offset:offset + HASH_LENGTH] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return _HEADER.size + lo * HASH_LENGTH
+
+
+def _common_length(a: bytes, b: bytes) -> int:
+    length = 0
+    for x, y in zip(a, b, strict=True):
+        if x != y:
+            break
+        length += 1
+
+    return length
@@ -0,0 +1,149 @@
+"""The packed-refs file, which stores many hash references in one sorted file instead of one file each."""
+
+import mmap
+import os
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+from .constants import HASH_CHARSET, HASH_LENGTH
+from .ref import HashRef, RefError
+
+PACKED_REFS_HEADER = b'# caf packed-refs, sorted\n'
+
+
+def lookup_packed_ref(packed_file: Path, name: str) -> HashRef | None:
+    """Look up a reference in a packed-refs file with a binary search, reading only a few lines of it.
+
+    :param packed_file: The path to the packed-refs file.
+    :param name: The name of the reference, relative to the refs directory, such as `tags/v1.0`.
+    :return: The hash the reference points to, or None if it is not packed.
+    :raises RefError: If the line of the reference is malformed."""
+    key = name.encode()
+
+    with _mapped(packed_file) as data:
+        start = _lower_bound(data, key)
+        if start < len(data):
+            line = data[start:_line_end(data, start)]
+            if line[HASH_LENGTH + 1:] == key:
+                return _parse_hash(packed_file, line)
+
+    return None
+
+
+def packed_ref_names(packed_file: Path, prefix: str = '') -> list[str]:
+    """List the names of the references in a packed-refs file that start with a prefix.
+
+    :param packed_file: The path to the packed-refs file.
+    :param prefix: The prefix, such as `tags/`. The names keep it.
+    :return: The names, sorted."""
+    key = prefix.encode()
+    names = []
+
+    with _mapped(packed_file) as data:
+        start = _lower_bound(data, key)
+        while start < len(data):
+            end = _line_end(data, start)
+            name = data[start + HASH_LENGTH + 1:end]
+            if not name.startswith(key):
+                break
+            names.append(name.decode())
+            start = end + 1
+
+    return names
+
+
+def read_packed_refs(packed_file: Path) -> dict[str, HashRef]:
+    """Read every reference of a packed-refs file.
+
+    :param packed_file: The path to the packed-refs file.
+    :return: The hashes of the references by name, or an empty dict if the file does not exist.
+    :raises RefError: If a line is malformed."""
+    refs = {}
+
+    with _mapped(packed_file) as data:
+        start = _body_start(data)
+        while start < len(data):
+            end = _line_end(data, start)
+            line = data[start:end]
+            refs[line[HASH_LENGTH + 1:].decode()] = _parse_hash(packed_file, line)
+            start = end + 1
+
+    return refs
+
+
+def write_packed_refs(packed_file: Path, refs: Mapping[str, HashRef]) -> None:
+    """Write a packed-refs file atomically, replacing any previous one.
+
+    :param packed_file: The path to the packed-refs file.
+    :param refs: The hashes of the references by name.
+    :raises RefError: If a name is empty or holds a newline, or a hash is malformed."""
+    lines = []
+    for name, ref_hash in refs.items():
+        if not name or '\n' in name:
+            msg = f'Invalid reference name for packed-refs: {name!r}'
+            raise RefError(msg)
+        if len(ref_hash) != HASH_LENGTH or not all(c in HASH_CHARSET for c in ref_hash):
+            msg = f'Invalid hash for packed reference {name}: {ref_hash}'
+            raise RefError(msg)
+        lines.append(f'{ref_hash} {name}\n'.encode())
+
+    # Lines are sorted by name, which follows the fixed-length hash
+    lines.sort(key=lambda line: line[HASH_LENGTH + 1:])
+
+    tmp_file = packed_file.with_name(packed_file.name + '.tmp')
+    tmp_file.write_bytes(PACKED_REFS_HEADER + b''.join(lines))
+    os.replace(tmp_file, packed_file)
+
+
+@contextmanager
+def _mapped(packed_file: Path) -> Iterator[bytes | mmap.mmap]:
+    try:
+        f = packed_file.open('rb')
+    except FileNotFoundError:
+        yield b''
+        return
+
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _body_start(data: bytes | mmap.mmap) -> int:
+    return len(PACKED_REFS_HEADER) if data[:len(PACKED_REFS_HEADER)] == PACKED_REFS_HEADER else 0
+
+
+def _lower_bound(data: bytes | mmap.mmap, key: bytes) -> int:
+    """Find the start of the first line whose name is not less than a key, or the end of the data."""
+    lo = _body_start(data)
+    hi = len(data)
+
+    # lo and hi are always line starts, and every line before lo has a smaller name than the key
+    while lo < hi:
+        mid = data.rfind(b'\n', lo, (lo + hi) // 2) + 1 or lo
+        end = _line_end(data, mid)
+        if data[mid + HASH_LENGTH + 1:end] < key:
+            lo = end + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+def _line_end(data: bytes | mmap.mmap, start: int) -> int:
+    # A last line without a newline, as left by hand editing, ends with the data
+    end = data.find(b'\n', start)
+    return end if end >= 0 else len(data)
+
+
+def _parse_hash(packed_file: Path, line: bytes) -> HashRef:
+    ref_hash = line[:HASH_LENGTH].decode('ascii', errors='replace')
+    if line[HASH_LENGTH:HASH_LENGTH + 1] != b' ' or not all(c in HASH_CHARSET for c in ref_hash):
+        msg = f'Invalid line in packed-refs file {packed_file}: {line!r}'
+        raise RefError(msg)
+
+    return HashRef(ref_hash)
@@ -0,0 +1,131 @@
+"""Pathspecs that limit diffs and logs to parts of a tree."""
+
+import re
+from collections.abc import Iterable
+
+from .ignore import glob_to_regex
+
+_GLOB_CHARS = frozenset('*?[')
+
+# A pattern segment: a literal name, a compiled glob, or None for `**`
+_Segment = str | re.Pattern | None
+
+
+class Pathspec:
+    """A set of path patterns that select parts of a tree.
+
+    A pattern selects the paths it matches and everything below them, so `services/payments` selects the whole
+    directory. Patterns use the glob syntax of .cafignore: `*`, `?` and `[...]` stay within one path segment and
+    a `**` segment matches any number of segments. Whether a directory can hold selected paths is decided from
+    its path alone, so diffs and logs can skip a subtree before loading it."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        """Compile a pathspec.
+
+        :param patterns: The patterns, relative to the working directory. An empty pattern selects everything.
+        :raises ValueError: If a pattern holds a character class whose range is out of order."""
+        self.patterns = tuple(patterns)
+        self._literals: set[str] = set()
+        self._globs: list[tuple[_Segment, ...]] = []
+        self._everything = False
+
+        for pattern in self.patterns:
+            pattern = pattern.strip('/')
+            while pattern.startswith('./'):
+                pattern = pattern[2:].lstrip('/')
+
+            if pattern in ('', '.', '**'):
+                self._everything = True
+            elif not _GLOB_CHARS & set(pattern):
+                self._literals.add(pattern)
+            else:
+                try:
+                    self._globs.append(tuple(_compile_segment(segment) for segment in pattern.split('/')))
+                except ValueError as e:
+                    msg = f'Invalid pathspec pattern {pattern!r}: {e}'
+                    raise ValueError(msg) from None
+
+    def matches(self, path: str) -> bool:
+        """Check whether a path is selected, either by a pattern matching it or by one matching an ancestor.
+
+        :param path: The path, relative to the working directory.
+        :return: True if the path is selected."""
+        if self._everything:
+            return True
+
+        if self._literals:
+            end = path.find('/')
+            while end >= 0:
+                if path[:end] in self._literals:
+                    return True
+                end = path.find('/', end + 1)
+            if path in self._literals:
+                return True
+
+        if self._globs:
+            parts = path.split('/')
+            return any(_matches(segments, 0, parts, 0) for segments in self._globs)
+
+        return False
+
+    def may_contain(self, path: str) -> bool:
+        """Check whether a directory is selected or may hold selected paths below it.
+
+        :param path: The path of the directory, relative to the working directory.
+        :return: False only if nothing in or below the directory can be selected."""
+        if not path or self._everything or self.matches(path):
+            return True
+
+        prefix = path + '/'
+        if any(literal.startswith(prefix) for literal in self._literals):
+            return True
+
+        parts = path.split('/')
+        return any(_may_contain(segments, parts) for segments in self._globs)
+
+    def selects(self, path: str, is_dir: bool) -> bool:
+        """Check whether an entry of a tree is kept: a file if it is selected, a directory if it may hold
+        selected paths.
+
+        :param path: The path of the entry, relative to the working directory.
+        :param is_dir: Whether the entry is a directory on either side of a diff.
+        :return: True if the entry is kept."""
+        return self.may_contain(path) if is_dir else self.matches(path)
+
+
+def _compile_segment(segment: str) -> _Segment:
+    if segment == '**':
+        return None
+    if not _GLOB_CHARS & set(segment):
+        return segment
+    return re.compile(glob_to_regex(segment) + r'\Z')
+
+
+def _segment_matches(segment: str | re.Pattern, part: str) -> bool:
+    return segment == part if isinstance(segment, str) else segment.match(part) is not None
+
+
+def _matches(segments: tuple[_Segment, ...], i: int, parts: list[str], j: int) -> bool:
+    """Check whether the segments from `i` match the path parts from `j`, or an ancestor path of them."""
+    while i < len(segments):
+        segment = segments[i]
+        if segment is None:
+            return any(_matches(segments, i + 1, parts, k) for k in range(j, len(parts) + 1))
+        if j == len(parts) or not _segment_matches(segment, parts[j]):
+            return False
+        i += 1
+        j += 1
+
+    # The whole pattern matched, so the path is the match or below it
+    return True
+
+
+def _may_contain(segments: tuple[_Segment, ...], parts: list[str]) -> bool:
+    """Check whether the path parts can be a leading part of a path matching the segments."""
+    for segment, part in zip(segments, parts, strict=False):
+        if segment is None:
+            return True
+        if not _segment_matches(segment, part):
+            return False
+
+    return True
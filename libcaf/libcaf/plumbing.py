@@ -5,7 +5,7 @@ from pathlib import Path
 from typing import IO
 
 import _libcaf
-from _libcaf import Blob, Commit, Tree
+from _libcaf import Blob, Commit, DiffColumns, LineDiff, LineStat, Tree, TreeDiff
 
 from .ref import HashRef
 
@@ -66,6 +66,123 @@ def save_file_content(root_dir: str | Path, file_path: str | Path) -> Blob:
     return _libcaf.save_file_content(root_dir, file_path)
 
 
+def copy_stats() -> dict[str, int]:
+    """Count the files copied into object stores by each copy method since the last reset.
+
+    `reflink` shares extents on copy-on-write filesystems, `copy_file_range` copies inside the kernel and
+    `buffered` copies through user space. Setting the CAF_COPY_METHOD environment variable to `copy_file_range`
+    or `buffered` makes that the fastest method tried."""
+    return _libcaf.copy_stats()
+
+
+def reset_copy_stats() -> None:
+    _libcaf.reset_copy_stats()
+
+
+def large_file_threshold() -> int:
+    """Get the size in bytes from which files are hashed and ingested in large file mode.
+
+    Large files are read with multi-megabyte buffers and sequential read-ahead, and their pages are dropped from
+    the page cache once they are hashed or saved. The initial threshold is read from the
+    `CAF_LARGE_FILE_THRESHOLD` environment variable and defaults to 16 MiB.
+
+    :return: The threshold in bytes."""
+    return _libcaf.large_file_threshold()
+
+
+def set_large_file_threshold(threshold: int) -> None:
+    """Set the size in bytes from which files are hashed and ingested in large file mode.
+
+    :param threshold: The threshold in bytes. 0 puts every file in large file mode."""
+    if threshold < 0:
+        msg = 'The large file threshold cannot be negative'
+        raise ValueError(msg)
+    _libcaf.set_large_file_threshold(threshold)
+
+
+def diff_blobs(root_dir: str | Path, old_hash: str | None, new_hash: str | None, context: int = 3) -> LineDiff:
+    """Diff two blobs line by line into unified diff hunks.
+
+    The blobs are memory mapped and diffed natively with the histogram heuristic and Myers as its fallback,
+    without holding the GIL.
+
+    :param root_dir: The object store directory.
+    :param old_hash: The hash of the old blob, or None for an empty blob.
+    :param new_hash: The hash of the new blob, or None for an empty blob.
+    :param context: The number of unchanged lines to show around each change.
+    :return: The hunks and line counts, or a binary marker if either blob looks binary."""
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.diff_blobs(root_dir, old_hash or '', new_hash or '', context)
+
+
+def diff_files(old_path: str | Path | None, new_path: str | Path | None, context: int = 3) -> LineDiff:
+    """Diff two files line by line into unified diff hunks, like diff_blobs.
+
+    :param old_path: The path of the old file, or None for an empty file.
+    :param new_path: The path of the new file, or None for an empty file.
+    :param context: The number of unchanged lines to show around each change.
+    :return: The hunks and line counts, or a binary marker if either file looks binary."""
+    return _libcaf.diff_files(str(old_path or ''), str(new_path or ''), context)
+
+
+def stat_blobs(root_dir: str | Path, old_hash: str | None, new_hash: str | None) -> LineStat:
+    """Count the lines inserted and deleted between two blobs, without building hunks.
+
+    Like diff_blobs, this runs natively without holding the GIL, so it can be spread across threads.
+
+    :param root_dir: The object store directory.
+    :param old_hash: The hash of the old blob, or None for an empty blob.
+    :param new_hash: The hash of the new blob, or None for an empty blob.
+    :return: The line counts, or a binary marker if either blob looks binary."""
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.stat_blobs(root_dir, old_hash or '', new_hash or '')
+
+
+def minhash_blob(root_dir: str | Path, blob_hash: str, num_hashes: int) -> list[int]:
+    """Compute the MinHash signature of the set of lines of a blob.
+
+    Lines are compared without surrounding whitespace and blank lines are ignored. The hash functions are fixed,
+    so signatures can be cached and compared across runs. Like diff_blobs, this runs without holding the GIL.
+
+    :param root_dir: The object store directory.
+    :param blob_hash: The hash of the blob.
+    :param num_hashes: The number of values in the signature.
+    :return: The signature, or an empty list for a binary blob or one without any non-blank line."""
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.minhash_blob(root_dir, blob_hash, num_hashes)
+
+
+def diff_trees(root_dir: str | Path, tree_hash1: str | None, tree_hash2: str | None) -> TreeDiff:
+    """Diff two stored trees natively, without holding the GIL.
+
+    Subtrees with the same hash are skipped, and removed and added records with the same hash are paired into
+    moves, preferring records with the same name, exactly like the Python tree diff.
+
+    :param root_dir: The object store directory.
+    :param tree_hash1: The hash of the first tree, or None for an empty tree.
+    :param tree_hash2: The hash of the second tree, or None for an empty tree.
+    :return: The entries of the diff as parallel columns, in depth-first order with siblings sorted by name."""
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.diff_trees(root_dir, tree_hash1 or '', tree_hash2 or '')
+
+
+def diff_columns(tree_diff: TreeDiff) -> DiffColumns:
+    """Convert a native tree diff to flat columns natively, without holding the GIL.
+
+    :param tree_diff: The native tree diff.
+    :return: The entries of the diff as columns of fixed-size values, with full paths joined into one buffer and
+        distinct hashes stored once."""
+    return _libcaf.diff_columns(tree_diff)
+
+
 def save_commit(root_dir: str | Path, commit: Commit) -> None:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
@@ -96,14 +213,24 @@ def load_tree(root_dir: str | Path, hash_value: str) -> Tree:
 
 __all__ = [
     'content_exists',
+    'copy_stats',
     'delete_content',
+    'diff_blobs',
+    'diff_columns',
+    'diff_files',
+    'diff_trees',
     'hash_file',
     'hash_object',
+    'large_file_threshold',
     'load_commit',
     'load_tree',
+    'minhash_blob',
     'open_content_for_reading',
     'open_content_for_writing',
+    'reset_copy_stats',
     'save_commit',
     'save_file_content',
     'save_tree',
+    'set_large_file_threshold',
+    'stat_blobs',
 ]
@@ -1,14 +1,36 @@
 """Reference objects and operations."""
 
+import os
+import time
 from pathlib import Path
+from types import TracebackType
 
-from .constants import HASH_CHARSET, HASH_LENGTH
+from .constants import DEFAULT_REF_LOCK_TIMEOUT, HASH_CHARSET, HASH_LENGTH, REF_LOCK_SUFFIX
+
+# The longest wait between two attempts to take a held lock
+_MAX_LOCK_BACKOFF = 0.05
 
 
 class RefError(Exception):
     """Exception raised for reference-related errors."""
 
 
+class AmbiguousRefError(RefError):
+    """Exception raised when an abbreviated hash matches more than one object."""
+
+
+class RefConflictError(RefError):
+    """Exception raised when references do not hold the values an update expects."""
+
+    def __init__(self, message: str, names: list[str]) -> None:
+        """Initialize the error.
+
+        :param message: The error message.
+        :param names: The names of the references that hold other values."""
+        super().__init__(message)
+        self.names = names
+
+
 class HashRef(str):
     """A reference that directly points to a commit hash."""
 
@@ -51,17 +73,108 @@ def read_ref(ref_file: Path) -> Ref | None:
 
 
 def write_ref(ref_file: Path, ref: Ref) -> None:
-    """Write a reference to a file.
+    """Write a reference to a file atomically, under the lock of the reference.
 
     :param ref_file: Path to the reference file
     :param ref: Reference to write (HashRef or SymRef)
-    :raises RefError: If the reference type is invalid"""
-    with ref_file.open('w') as f:
+    :raises RefError: If the reference type is invalid or the lock cannot be taken"""
+    with RefLock(ref_file) as lock:
+        lock.acquire()
+        lock.write(ref)
+        lock.commit()
+
+
+class RefLock:
+    """The lock file of a reference, which new contents are written to and then renamed over the reference.
+
+    The lock file is created exclusively, so only one writer holds it at a time, and the rename replaces the
+    reference in one step, so readers see either the old or the new contents, never a partly written file. The
+    lock is the file itself, not an open descriptor, so a process can hold any number of locks at once."""
+
+    def __init__(self, ref_file: Path) -> None:
+        """Initialize a lock that is not taken yet.
+
+        :param ref_file: Path to the reference file."""
+        self.ref_file = ref_file
+        self.lock_file = ref_file.with_name(ref_file.name + REF_LOCK_SUFFIX)
+        self._held = False
+
+    def __enter__(self) -> 'RefLock':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None,
+                 tb: TracebackType | None) -> None:
+        self.release()
+
+    def acquire(self, timeout: float = DEFAULT_REF_LOCK_TIMEOUT) -> None:
+        """Take the lock, waiting while another writer holds it.
+
+        :param timeout: The longest time to wait, in seconds.
+        :raises RefError: If the lock is still held by another writer after the timeout."""
+        deadline = time.monotonic() + timeout
+        backoff = 0.001
+
+        while True:
+            try:
+                os.close(os.open(self.lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                self._held = True
+                return
+            except FileExistsError:
+                if time.monotonic() >= deadline:
+                    msg = f'Cannot lock reference {self.ref_file}, remove {self.lock_file} if no writer is running'
+                    raise RefError(msg) from None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _MAX_LOCK_BACKOFF)
+
+    def write(self, ref: Ref | None, sync: bool = True) -> None:
+        """Write the new contents of the reference to the lock file and flush them to disk.
+
+        :param ref: Reference to write (HashRef or SymRef), or None for an empty reference.
+        :param sync: Whether to flush the lock file to disk. A caller writing many locks can flush them all at once
+            before committing them instead.
+        :raises RefError: If the reference type is invalid."""
         match ref:
             case HashRef():
-                f.write(ref)
+                content = str(ref)
             case SymRef(ref):
-                f.write(f'ref: {ref}')
+                content = f'ref: {ref}'
+            case None:
+                content = ''
             case _:
                 msg = f'Invalid reference type: {type(ref)}'
                 raise RefError(msg)
+
+        fd = os.open(self.lock_file, os.O_WRONLY | os.O_TRUNC)
+        try:
+            os.write(fd, content.encode())
+            if sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def commit(self, sync_dir: bool = True) -> None:
+        """Rename the lock file over the reference, which releases the lock.
+
+        :param sync_dir: Whether to flush the directory of the reference to disk, so the rename survives a crash.
+            A caller committing many locks can flush each directory once instead."""
+        os.replace(self.lock_file, self.ref_file)
+        self._held = False
+        if sync_dir:
+            fsync_dir(self.ref_file.parent)
+
+    def release(self) -> None:
+        """Release the lock without changing the reference, if it is still held."""
+        if self._held:
+            self._held = False
+            self.lock_file.unlink(missing_ok=True)
+
+
+def fsync_dir(directory: Path) -> None:
+    """Flush a directory to disk, so the files renamed or created in it survive a crash.
+
+    :param directory: The directory."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
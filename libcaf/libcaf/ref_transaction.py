@@ -0,0 +1,165 @@
+"""Transactions that update several references at once, each checked against the value it is expected to hold."""
+
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+
+from .constants import DEFAULT_REF_LOCK_TIMEOUT
+from .packed_refs import read_packed_refs, write_packed_refs
+from .ref import HashRef, Ref, RefConflictError, RefError, RefLock, SymRef, fsync_dir, read_ref
+from .reftable import RefTable
+
+# Transactions writing more references than this flush them with one sync of the file system holding the refs
+# instead of one each
+_SYNC_BARRIER_THRESHOLD = 16
+
+_libc_name = ctypes.util.find_library('c')
+# syncfs flushes only the file system of the descriptor it is given, where os.sync flushes every mounted one
+_syncfs = getattr(ctypes.CDLL(_libc_name, use_errno=True), 'syncfs', None) if _libc_name else None
+
+
+class RefTransaction:
+    """A set of reference updates and deletions that are applied together or not at all.
+
+    Committing takes the lock of every reference, in name order so that two transactions cannot wait on each
+    other, then checks the expected values under the locks. Only if every check passes are the new values written
+    and renamed into place. A lock held by another writer is waited for, so transactions on different references
+    never wait at all, and transactions on the same reference run one after the other."""
+
+    def __init__(self, table: RefTable, lock_timeout: float = DEFAULT_REF_LOCK_TIMEOUT) -> None:
+        """Initialize an empty transaction.
+
+        :param table: The ref table of the repository, which is told of the changes once they are made.
+        :param lock_timeout: The longest time to wait for each lock, in seconds."""
+        self.table = table
+        self.lock_timeout = lock_timeout
+        # The new value, the expected value and whether it is a deletion, by reference name
+        self._changes: dict[str, tuple[Ref | None, Ref | None, bool]] = {}
+
+    def update(self, name: str, new_ref: Ref | None, expected: Ref | None = None) -> None:
+        """Stage an update of a reference, which is created if it does not exist.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :param new_ref: The new value, or None for an empty reference.
+        :param expected: The value the reference must hold for the transaction to apply, '' for an empty or
+            missing reference, or None to not check it.
+        :raises RefError: If the new value is not a HashRef, a SymRef or None.
+        :raises ValueError: If the reference already has a staged change."""
+        if new_ref is not None and not isinstance(new_ref, (HashRef, SymRef)):
+            msg = f'Invalid reference type: {type(new_ref)}'
+            raise RefError(msg)
+
+        self._stage(name, new_ref, expected, delete=False)
+
+    def delete(self, name: str, expected: Ref | None = None) -> None:
+        """Stage the deletion of a reference, both its loose file and its packed entry.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :param expected: The value the reference must hold for the transaction to apply, '' for an empty or
+            missing reference, or None to not check it.
+        :raises ValueError: If the reference already has a staged change."""
+        self._stage(name, None, expected, delete=True)
+
+    def commit(self) -> None:
+        """Apply the staged changes. The transaction is empty afterwards, whether it applied or not.
+
+        :raises RefConflictError: If a reference does not hold its expected value. Nothing is changed.
+        :raises RefError: If a lock cannot be taken in time or a reference file is malformed. Nothing is changed."""
+        changes, self._changes = self._changes, {}
+        refs_dir = self.table.refs_dir
+        names = sorted(changes)
+        locks = []
+        # Whether the table can be updated in place instead of rescanned, checked before the lock files are created
+        was_current = self.table.is_current()
+
+        try:
+            for name in names:
+                lock = RefLock(refs_dir / name)
+                lock.acquire(self.lock_timeout)
+                locks.append(lock)
+
+            conflicts = {}
+            for name in names:
+                _, expected, _ = changes[name]
+                if expected is not None:
+                    current = self._current(name)
+                    if (current or '') != expected:
+                        conflicts[name] = f'"{name}" is {current or "empty"}, expected {expected or "empty"}'
+            if conflicts:
+                msg = f'Reference conflict: {", ".join(conflicts.values())}'
+                raise RefConflictError(msg, list(conflicts))
+
+            unpacked = [name for name in names if changes[name][2] and self.table.packed_ref(name) is not None]
+            if unpacked:
+                # Deleted packed entries are removed first, while the locks keep the loose files from changing
+                with RefLock(self.table.packed_refs_file) as packed_lock:
+                    packed_lock.acquire(self.lock_timeout)
+                    packed = dict(read_packed_refs(self.table.packed_refs_file))
+                    for name in unpacked:
+                        packed.pop(name, None)
+                    write_packed_refs(self.table.packed_refs_file, packed)
+
+            # Every new value is on disk before any rename, so a crash never leaves a reference empty
+            barrier = len(names) > _SYNC_BARRIER_THRESHOLD
+            for name, lock in zip(names, locks, strict=True):
+                new_ref, _, delete = changes[name]
+                if not delete:
+                    lock.write(new_ref, sync=not barrier)
+            if barrier:
+                _sync_files(refs_dir, [lock.lock_file for name, lock in zip(names, locks, strict=True)
+                                       if not changes[name][2]])
+
+            for name, lock in zip(names, locks, strict=True):
+                if changes[name][2]:
+                    lock.ref_file.unlink(missing_ok=True)
+                    lock.release()
+                else:
+                    lock.commit(sync_dir=False)
+
+            for directory in {lock.ref_file.parent for lock in locks}:
+                fsync_dir(directory)
+        finally:
+            for lock in locks:
+                lock.release()
+
+        for name in names:
+            if changes[name][2]:
+                self.table.deleted(name, was_current)
+            else:
+                self.table.loose_written(name, was_current)
+
+    def _stage(self, name: str, new_ref: Ref | None, expected: Ref | None, delete: bool) -> None:
+        if name in self._changes:
+            msg = f'Reference "{name}" is already changed in this transaction'
+            raise ValueError(msg)
+
+        self._changes[name] = (new_ref, expected, delete)
+
+    def _current(self, name: str) -> Ref | None:
+        try:
+            return read_ref(self.table.refs_dir / name)
+        except FileNotFoundError:
+            return self.table.packed_ref(name)
+
+
+def _sync_files(refs_dir: Path, files: list[Path]) -> None:
+    """Flush written files to disk with one sync of the file system holding the refs directory, or with one fsync
+    each where syncfs is not available.
+
+    :param refs_dir: The refs directory.
+    :param files: The files to flush, all on the file system of the refs directory."""
+    if _syncfs is not None:
+        fd = os.open(refs_dir, os.O_RDONLY)
+        try:
+            if _syncfs(fd) == 0:
+                return
+        finally:
+            os.close(fd)
+
+    for file in files:
+        fd = os.open(file, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,189 @@
+"""A cached table of the references of a repository, kept valid by cheap checks instead of rescans."""
+
+import os
+import time
+from pathlib import Path
+
+from .constants import REF_LOCK_SUFFIX
+from .packed_refs import lookup_packed_ref, packed_ref_names, read_packed_refs
+from .ref import HashRef
+
+# The identity of a file: its inode, mtime and size, or None if it does not exist
+_FileId = tuple[int, int, int] | None
+
+# A ref directory modified this recently may still change within the same timestamp, so its mtime is not trusted
+# and it is rescanned on the next check; otherwise a ref created right after the scan would leave the mtime unchanged
+_RACY_NS = 2_000_000_000
+
+
+class RefTable:
+    """The names of the loose references and the packed references of a repository, loaded on first use.
+
+    packed-refs is only ever replaced as a whole, so the packed references are reloaded when the identity of the
+    file changes. They are only loaded in full for listing; a single name is looked up with a binary search of the
+    file, so resolving a reference in a new process does not read every packed reference. Creating or removing a
+    loose ref file changes the mtime of its directory, so the loose names are rescanned when the mtime of a ref
+    directory changes, or when it was too recent to be trusted. Each check takes a few stats, whatever the number
+    of references. The contents of loose ref files are read from disk, not cached, and the lock files of
+    references being written are skipped."""
+
+    def __init__(self, refs_dir: Path, packed_refs_file: Path) -> None:
+        """Initialize an empty table for a repository.
+
+        :param refs_dir: The refs directory of the repository.
+        :param packed_refs_file: The packed-refs file of the repository."""
+        self.refs_dir = refs_dir
+        self.packed_refs_file = packed_refs_file
+        self._packed: dict[str, HashRef] | None = None
+        self._packed_id: _FileId = None
+        self._loose: set[str] | None = None
+        # The mtime of each ref directory when it was scanned, or None if it was too recent to be trusted
+        self._dir_mtimes: dict[str, int | None] = {}
+
+    def packed(self) -> dict[str, HashRef]:
+        """Get the packed references, reloading them if packed-refs changed.
+
+        :return: The hashes of the packed references by name, relative to the refs directory.
+        :raises RefError: If packed-refs is malformed."""
+        packed_id = _file_id(self.packed_refs_file)
+        if self._packed is None or packed_id != self._packed_id:
+            self._packed = read_packed_refs(self.packed_refs_file)
+            self._packed_id = packed_id
+
+        return self._packed
+
+    def packed_ref(self, name: str) -> HashRef | None:
+        """Look up a single packed reference, without loading the packed references unless they already are.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :return: The hash of the reference, or None if it is not packed.
+        :raises RefError: If the line of the reference is malformed."""
+        if self._packed is not None and _file_id(self.packed_refs_file) == self._packed_id:
+            return self._packed.get(name)
+
+        return lookup_packed_ref(self.packed_refs_file, name)
+
+    def packed_names(self, prefix: str) -> list[str]:
+        """List the packed references that start with a prefix, reading only their part of packed-refs.
+
+        :param prefix: The prefix, such as `tags/`. The names keep it.
+        :return: The names, relative to the refs directory."""
+        if self._packed is not None and _file_id(self.packed_refs_file) == self._packed_id:
+            return [name for name in self._packed if name.startswith(prefix)]
+
+        return packed_ref_names(self.packed_refs_file, prefix)
+
+    def loose(self) -> set[str]:
+        """Get the names of the loose references, rescanning them if a ref directory changed.
+
+        :return: The names, relative to the refs directory."""
+        if self._loose is None or not self._loose_current():
+            self._scan_loose()
+
+        return self._loose
+
+    def names(self) -> set[str]:
+        """Get the names of every reference, loose or packed.
+
+        :return: The names, relative to the refs directory.
+        :raises RefError: If packed-refs is malformed."""
+        return self.loose() | self.packed().keys()
+
+    def is_current(self) -> bool:
+        """Check whether the loose names are loaded and no ref directory changed since they were.
+
+        Writers call this before changing a reference, and pass the result to `loose_written` or `deleted`.
+
+        :return: True if the loaded loose names are up to date."""
+        return self._loose is not None and self._loose_current()
+
+    def loose_written(self, name: str, was_current: bool) -> None:
+        """Record that a loose reference was written by this process, without rescanning.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :param was_current: Whether `is_current` held right before the write. If not, another process may have
+            changed the references too, so the loose names are scanned again on next use."""
+        if self._loose is None:
+            return
+        if not was_current:
+            self._loose = None
+            return
+
+        self._loose.add(name)
+        self._record_dirs(name)
+
+    def deleted(self, name: str, was_current: bool) -> None:
+        """Record that a reference was deleted by this process, both loose and packed, without rescanning.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :param was_current: Whether `is_current` held right before the deletion. If not, another process may have
+            changed the references too, so the loose names are scanned again on next use."""
+        if self._loose is not None:
+            if was_current:
+                self._loose.discard(name)
+                self._record_dirs(name)
+            else:
+                self._loose = None
+        if self._packed is not None and name in self._packed:
+            # packed-refs was rewritten without it, along with whatever other processes changed in it
+            self._packed = None
+
+    def _loose_current(self) -> bool:
+        for directory, mtime in self._dir_mtimes.items():
+            if mtime is None:
+                return False
+            try:
+                if os.stat(self.refs_dir / directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    def _scan_loose(self) -> None:
+        loose = set()
+        dir_mtimes = {}
+        stack = ['']
+
+        while stack:
+            directory = stack.pop()
+            path = self.refs_dir / directory
+            try:
+                # The mtime is taken before listing, so a change made during the scan is caught by the next check
+                dir_mtimes[directory] = _trusted_mtime(os.stat(path).st_mtime_ns)
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                name = f'{directory}/{entry.name}' if directory else entry.name
+                if entry.is_dir():
+                    stack.append(name)
+                elif entry.is_file() and not name.endswith(REF_LOCK_SUFFIX):
+                    loose.add(name)
+
+        self._loose = loose
+        self._dir_mtimes = dir_mtimes
+
+    def _record_dirs(self, name: str) -> None:
+        # The directories of the reference and above it, which may have been created for it
+        parts = name.split('/')[:-1]
+        for depth in range(len(parts) + 1):
+            directory = '/'.join(parts[:depth])
+            try:
+                self._dir_mtimes[directory] = _trusted_mtime(os.stat(self.refs_dir / directory).st_mtime_ns)
+            except OSError:
+                self._dir_mtimes.pop(directory, None)
+
+
+def _trusted_mtime(mtime: int) -> int | None:
+    return mtime if time.time_ns() - mtime >= _RACY_NS else None
+
+
+def _file_id(path: Path) -> _FileId:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return st.st_ino, st.st_mtime_ns, st.st_size
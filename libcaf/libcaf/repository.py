@@ -1,19 +1,39 @@
 """libcaf repository management."""
 import os
 import shutil
-from collections import deque
-from collections.abc import Callable, Generator, Sequence
+import tempfile
+from collections import OrderedDict, deque
+from collections.abc import Callable, Generator, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from enum import Enum
 from functools import wraps
 from pathlib import Path
 from typing import Concatenate
 
-from . import Blob, Commit, Tree, TreeRecord, TreeRecordType
-from .constants import (DEFAULT_BRANCH, DEFAULT_REPO_DIR, HASH_CHARSET, HASH_LENGTH, HEADS_DIR, HEAD_FILE,
-                        OBJECTS_SUBDIR, REFS_DIR, TAGS_DIR, USERS_DIR, CURRENT_USER_FILE)
-from .plumbing import hash_object, load_commit, load_tree, save_commit, save_file_content, save_tree, content_exists
-from .ref import HashRef, Ref, RefError, SymRef, read_ref, write_ref
+from . import Blob, Commit, DiffColumns, LineDiff, Tree, TreeDiff, TreeDiffKind, TreeRecord, TreeRecordType
+from .constants import (DEFAULT_BRANCH, DEFAULT_DIFF_CACHE_SIZE, DEFAULT_DIFF_MEMORY_LIMIT, DEFAULT_MOVE_WINDOW,
+                        DEFAULT_REPO_DIR, DEFAULT_TREE_CACHE_SIZE, DIFFCACHE_DIR, DIRCACHE_FILE, HASH_CHARSET,
+                        HASH_LENGTH, HEADS_DIR, HEAD_FILE, IGNORE_FILE, MINHASH_SIZE, OBJECTS_SUBDIR, OBJINDEX_DIR,
+                        PACKED_REFS_FILE, REF_LOCK_SUFFIX, REFS_DIR, SIGNATURES_FILE, TAGS_DIR, USERS_DIR,
+                        CURRENT_USER_FILE, WATCH_DIR)
+from .checkout import CheckoutPlan, CheckoutResult, plan_checkout, remove_paths, write_blobs
+from .dircache import (UNKNOWN_DIR_SIGNATURE, UNKNOWN_FILE_SIGNATURE, CachedDir, DirCache, DirSignature, FileSignature,
+                       child_key, dir_signature, file_signature, is_below)
+from .diffcache import LevelChange, TreeDiffCache
+from .extsort import ExternalSorter
+from .ignore import IgnoreMatcher
+from .objindex import MIN_ABBREV_LENGTH, ObjectIndex
+from .packed_refs import read_packed_refs, write_packed_refs
+from .pathspec import Pathspec
+from .plumbing import (content_exists, diff_blobs, diff_columns, diff_trees, hash_file, hash_object, load_commit,
+                       load_tree, minhash_blob, save_commit, save_file_content, save_tree, stat_blobs)
+from .ref import AmbiguousRefError, HashRef, Ref, RefConflictError, RefError, RefLock, SymRef, read_ref, write_ref
+from .ref_transaction import RefTransaction
+from .reftable import RefTable
+from .similarity import SignatureCache, find_similar_pairs
+from .watch import SYNC_COOKIE_PREFIX, ChangeTracker, Watcher, dirty_with_ancestors
 from .likes import add_like, remove_like, likes_by_user, likes_by_commit, init_likes, rebuild_commit_likes_cache
 
 class RepositoryError(Exception):
@@ -24,6 +44,13 @@ class RepositoryNotFoundError(RepositoryError):
     """Exception raised when a repository is not found."""
 
 
+# Record types by their native values, for rebuilding records from native or cached diffs
+_RECORD_TYPES = {record_type.value: record_type for record_type in TreeRecordType.__members__.values()}
+
+# The most matches listed in the error for an ambiguous abbreviated hash
+_AMBIGUOUS_LISTED = 5
+
+
 @dataclass
 class Diff:
     """A class representing a difference between two tree records."""
@@ -62,6 +89,47 @@ class MovedFromDiff(Diff):
     moved_from: MovedToDiff | None
 
 
+class DiffKind(Enum):
+    """The kind of change a DiffEntry describes."""
+
+    ADDED = 'added'
+    REMOVED = 'removed'
+    MODIFIED = 'modified'
+    MOVED = 'moved'
+
+
+@dataclass
+class DiffEntry:
+    """A change to a single path between two trees, as yielded by Repository.iter_diff.
+
+    Added entries only have the new path and record, removed entries only the old ones. Modified entries have
+    the same path on both sides, and moved entries have both paths."""
+
+    kind: DiffKind
+    old_path: str | None
+    new_path: str | None
+    old_record: TreeRecord | None
+    new_record: TreeRecord | None
+
+    @property
+    def path(self) -> str:
+        """The path of the entry: the new path, or the old one if the path was removed."""
+        return self.new_path if self.new_path is not None else self.old_path
+
+
+@dataclass
+class FileStat:
+    """The number of lines inserted and deleted in one file, as computed by Repository.diff_stat.
+
+    Binary files have no line counts. Moved files also have the path they were moved from."""
+
+    path: str
+    additions: int
+    deletions: int
+    binary: bool = False
+    old_path: str | None = None
+
+
 @dataclass
 class LogEntry:
     """A class representing a log entry for a branch or commit history."""
@@ -70,6 +138,188 @@ class LogEntry:
     commit: Commit
 
 
+# The Diff classes by TreeDiffKind value
+_DIFF_CLASSES = (AddedDiff, RemovedDiff, ModifiedDiff, MovedToDiff, MovedFromDiff)
+
+
+class ColumnarDiff:
+    """The differences between two trees kept in parallel columns instead of one object per entry, in depth-first
+    order with siblings sorted by name, as computed by Repository.diff_commits_columnar.
+
+    `kinds` and `types` hold TreeDiffKind and TreeRecordType values. `parents` holds the index of the enclosing
+    entry, and `partners` the index of the other half of a move, or -1. The entries below entry i are those from
+    i + 1 up to `ends[i]`. Its full path is the UTF-8 slice of `paths` between `path_offsets[i]` and
+    `path_offsets[i + 1]`. `old_hashes` and `new_hashes` index the distinct hashes stored back to back in
+    `hashes`, or hold -1 for a side without a record.
+
+    The columns are read-only memoryviews, so NumPy wraps them without copying: `numpy.asarray(diff.kinds)`,
+    or `numpy.frombuffer(diff.hashes, f'S{HASH_LENGTH}')` for the hashes. Entries selected in bulk are turned
+    into Diff objects only when they are passed to `diffs`."""
+
+    def __init__(self, columns: DiffColumns) -> None:
+        """Wrap the columns of a native diff.
+
+        :param columns: The columns, as returned by `plumbing.diff_columns`."""
+        self.kinds = memoryview(columns.kinds)
+        self.types = memoryview(columns.types)
+        self.parents = memoryview(columns.parents).cast('q')
+        self.ends = memoryview(columns.ends).cast('q')
+        self.partners = memoryview(columns.partners).cast('q')
+        self.path_offsets = memoryview(columns.path_offsets).cast('q')
+        self.paths = columns.paths
+        self.old_hashes = memoryview(columns.old_hashes).cast('q')
+        self.new_hashes = memoryview(columns.new_hashes).cast('q')
+        self.hashes = columns.hashes
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, index: int) -> TreeDiffKind:
+        """Get the kind of an entry.
+
+        :param index: The index of the entry.
+        :return: The kind of the entry."""
+        return TreeDiffKind(self.kinds[index])
+
+    def path(self, index: int) -> str:
+        """Get the full path of an entry.
+
+        :param index: The index of the entry.
+        :return: The path, relative to the root of the trees."""
+        return self.paths[self.path_offsets[index]:self.path_offsets[index + 1]].decode()
+
+    def old_hash(self, index: int) -> str | None:
+        """Get the hash of the old record of an entry.
+
+        :param index: The index of the entry.
+        :return: The hash, or None for an added entry."""
+        return self._hash(self.old_hashes[index])
+
+    def new_hash(self, index: int) -> str | None:
+        """Get the hash of the new record of an entry.
+
+        :param index: The index of the entry.
+        :return: The hash, or None for a removed entry."""
+        return self._hash(self.new_hashes[index])
+
+    def children(self, index: int | None = None) -> Iterator[int]:
+        """Iterate over the entries directly below an entry, skipping the entries further down.
+
+        :param index: The index of the entry, or None for the top level entries.
+        :return: An iterator over the indexes of the entries, sorted by name."""
+        child, end = (0, len(self)) if index is None else (index + 1, self.ends[index])
+        while child < end:
+            yield child
+            child = self.ends[child]
+
+    def diffs(self, indices: Iterable[int] | None = None) -> list[Diff]:
+        """Build Diff objects for some of the entries.
+
+        Each selected entry is built along with the directories enclosing it and, for a move, its other half, so
+        paths and moves resolve as usual. The built directories only hold built entries as children.
+
+        :param indices: The indexes of the entries to build, such as `numpy.flatnonzero(mask)`, or None for all.
+        :return: The top level diffs, with their children and the two halves of every move linked up.
+        :raises IndexError: If an index is out of range."""
+        if indices is None:
+            selected: Iterable[int] = range(len(self))
+        else:
+            seen: set[int] = set()
+            stack = [int(index) for index in indices]
+            while stack:
+                index = stack.pop()
+                if not 0 <= index < len(self):
+                    msg = f'Diff entry index {index} out of range'
+                    raise IndexError(msg)
+                if index in seen:
+                    continue
+
+                seen.add(index)
+                for related in (self.parents[index], self.partners[index]):
+                    if related >= 0:
+                        stack.append(related)
+            # Ascending indexes are in depth-first order, so parents come first and children stay sorted by name
+            selected = sorted(seen)
+
+        top_level_diff = Diff(TreeRecord(TreeRecordType.TREE, '', ''), None, [])
+        built: dict[int, Diff] = {}
+        for index in selected:
+            parent_index = self.parents[index]
+            parent = built[parent_index] if parent_index >= 0 else top_level_diff
+            kind = self.kinds[index]
+            record_hash = self.old_hash(index) or self.new_hash(index)
+            record = TreeRecord(_RECORD_TYPES[self.types[index]], record_hash, self.path(index).rpartition('/')[2])
+
+            diff_class = _DIFF_CLASSES[kind]
+            diff = (diff_class(record, parent, [], None) if kind >= TreeDiffKind.MOVED_TO.value
+                    else diff_class(record, parent, []))
+            parent.children.append(diff)
+            built[index] = diff
+
+        for index, diff in built.items():
+            if isinstance(diff, MovedToDiff):
+                diff.moved_to = built[self.partners[index]]
+            elif isinstance(diff, MovedFromDiff):
+                diff.moved_from = built[self.partners[index]]
+
+        return top_level_diff.children
+
+    def _hash(self, hash_index: int) -> str | None:
+        if hash_index < 0:
+            return None
+        return self.hashes[hash_index * HASH_LENGTH:(hash_index + 1) * HASH_LENGTH].decode('ascii')
+
+
+@dataclass
+class _DirFrame:
+    """A directory on the stack of the working directory walk, waiting for its subdirectories' tree hashes."""
+
+    path: Path
+    key: str
+    matcher: IgnoreMatcher
+    rules_same: bool
+    previous: CachedDir | None
+    signature: DirSignature
+    files: dict[str, tuple[FileSignature, str]]
+    dirs: dict[str, str]
+    pending: list[str]
+
+
+class _MoveCandidates:
+    """Added or removed diffs waiting for the other half of a move, indexed by hash and then by name.
+
+    Each diff is kept with its position in its parent's children, so pairing it up replaces it in place."""
+
+    def __init__(self) -> None:
+        self._by_hash: dict[str, dict[str, deque[tuple[Diff, int]]]] = {}
+
+    def add(self, diff: Diff, index: int) -> None:
+        self._by_hash.setdefault(diff.record.hash, {}).setdefault(diff.record.name, deque()).append((diff, index))
+
+    def pop(self, record: TreeRecord) -> tuple[Diff, int] | None:
+        """Take the diff to pair with a record of the same hash.
+
+        A diff with the same name is preferred, so a directory of duplicate files that is moved as a whole pairs
+        each file with its namesake. Otherwise the diff that was seen first is taken.
+
+        :param record: The record to pair.
+        :return: The diff and its position in its parent's children, or None if no diff has the record's hash."""
+        by_name = self._by_hash.get(record.hash)
+        if by_name is None:
+            return None
+
+        name = record.name if record.name in by_name else next(iter(by_name))
+        candidates = by_name[name]
+        candidate = candidates.popleft()
+
+        if not candidates:
+            del by_name[name]
+            if not by_name:
+                del self._by_hash[record.hash]
+
+        return candidate
+
+
 class Repository:
     """Represents a libcaf repository.
 
@@ -88,6 +338,8 @@ class Repository:
         else:
             self.repo_dir = Path(repo_dir)
 
+        self._ref_table: RefTable | None = None
+
     def init(self, default_branch: str = DEFAULT_BRANCH) -> None:
         """Initialize a new CAF repository in the working directory.
 
@@ -194,9 +446,10 @@ class Repository:
 
     @requires_repo
     def refs(self) -> list[SymRef]:
-        """Get a list of all symbolic references in the repository.
+        """Get a list of all symbolic references in the repository, loose and packed.
 
-        :return: A list of SymRef objects representing the symbolic references.
+        :return: A list of SymRef objects with the names of the references relative to the refs directory, such
+            as `heads/main`, sorted.
         :raises RepositoryError: If the refs directory does not exist or is not a directory.
         :raises RepositoryNotFoundError: If the repository does not exist."""
         refs_dir = self.refs_dir()
@@ -204,17 +457,16 @@ class Repository:
             msg = f'Refs directory does not exist or is not a directory: {refs_dir}'
             raise RepositoryError(msg)
 
-        refs: list[SymRef] = [SymRef(ref_file.name) for ref_file in refs_dir.rglob('*')
-                              if ref_file.is_file()]
-
-        return refs
+        return [SymRef(name) for name in sorted(self._refs().names())]
 
     @requires_repo
     def resolve_ref(self, ref: Ref | str | None) -> HashRef | None:
         """Resolve a reference to a HashRef, following symbolic references if necessary.
 
-        :param ref: The reference to resolve. This can be a HashRef, SymRef, or a string.
+        :param ref: The reference to resolve. This can be a HashRef, SymRef, or a string. A string can also be a
+            hash abbreviated to at least MIN_ABBREV_LENGTH characters.
         :return: The resolved HashRef or None if the reference does not exist.
+        :raises AmbiguousRefError: If the reference is an abbreviated hash that matches more than one object.
         :raises RefError: If the reference is invalid or cannot be resolved.
         :raises RepositoryNotFoundError: If the repository does not exist."""
         match ref:
@@ -224,15 +476,25 @@ class Repository:
                 if ref.upper() == 'HEAD':
                     return self.resolve_ref(self.head_ref())
 
-                ref = read_ref(self.refs_dir() / ref)
-                return self.resolve_ref(ref)
+                return self.resolve_ref(self._read_ref(ref))
             case str():
-                # Try to figure out what kind of ref it is by looking at the list of refs
-                # in the refs directory
-                if ref.upper() == 'HEAD' or ref in self.refs():
+                # Try the name as a full reference name, then as a branch, then as a tag
+                if ref.upper() == 'HEAD':
                     return self.resolve_ref(SymRef(ref))
+                for name in (ref, f'{HEADS_DIR}/{ref}', f'{TAGS_DIR}/{ref}'):
+                    if self._ref_exists(name):
+                        return self.resolve_ref(SymRef(name))
                 if len(ref) == HASH_LENGTH and all(c in HASH_CHARSET for c in ref):
                     return HashRef(ref)
+                if len(ref) >= MIN_ABBREV_LENGTH and all(c in HASH_CHARSET for c in ref):
+                    matches = self._object_index().lookup(ref, limit=_AMBIGUOUS_LISTED)
+                    if len(matches) == 1:
+                        return HashRef(matches[0])
+                    if matches:
+                        msg = f'Ambiguous hash prefix {ref}, which matches {", ".join(matches)}'
+                        if len(matches) == _AMBIGUOUS_LISTED:
+                            msg += ' and possibly more'
+                        raise AmbiguousRefError(msg)
 
                 msg = f'Invalid reference: {ref}'
                 raise RefError(msg)
@@ -243,20 +505,32 @@ class Repository:
                 raise RefError(msg)
 
     @requires_repo
-    def update_ref(self, ref_name: str, new_ref: Ref) -> None:
-        """Update a symbolic reference in the repository.
+    def update_ref(self, ref_name: str, new_ref: Ref, expected: Ref | None = None) -> None:
+        """Update a symbolic reference in the repository atomically.
 
         :param ref_name: The name of the symbolic reference to update.
         :param new_ref: The new reference value to set.
+        :param expected: The value the reference must hold for the update to apply, '' for an empty reference,
+            or None to not check it.
+        :raises RefConflictError: If the reference does not hold the expected value.
         :raises RepositoryError: If the reference does not exist.
         :raises RepositoryNotFoundError: If the repository does not exist."""
-        ref_path = self.refs_dir() / ref_name
-
-        if not ref_path.exists():
+        if not self._ref_exists(ref_name):
             msg = f'Reference "{ref_name}" does not exist.'
             raise RepositoryError(msg)
 
-        write_ref(ref_path, new_ref)
+        # The loose file overrides the packed reference, if there is one
+        transaction = self.ref_transaction()
+        transaction.update(ref_name, new_ref, expected)
+        transaction.commit()
+
+    @requires_repo
+    def ref_transaction(self) -> RefTransaction:
+        """Start a transaction that updates or deletes several references together.
+
+        :return: An empty transaction. Nothing is changed until it is committed.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        return RefTransaction(self._refs())
 
     @requires_repo
     def delete_repo(self) -> None:
@@ -264,6 +538,7 @@ class Repository:
 
         :raises RepositoryNotFoundError: If the repository does not exist."""
         shutil.rmtree(self.repo_path())
+        self._ref_table = None
 
     @requires_repo
     def save_file_content(self, file: Path) -> Blob:
@@ -310,9 +585,68 @@ class Repository:
             raise RepositoryError(msg)
         
         tag_path = self.tags_dir() / tag
+        was_current = self._refs().is_current()
         write_ref(tag_path, commit_hash)
-            
-        
+        self._refs().loose_written(f'{TAGS_DIR}/{tag}', was_current)
+
+    @requires_repo
+    def create_tags_bulk(self, tags: Mapping[str, str]) -> dict[str, str]:
+        """Create many tags at once, each pointing to a commit.
+
+        Every entry is checked before anything is written, with each distinct commit reference resolved once.
+        The valid tags are then written in one ref transaction, whose files are flushed to disk together. An
+        invalid entry does not keep the others from being created.
+
+        :param tags: The commit reference each tag points to, by tag name.
+        :return: The reason each tag that was not created failed, by tag name.
+        :raises RefError: If a tag cannot be locked in time.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        existing = self._refs().names()
+        resolved: dict[str, HashRef | None | RefError] = {}
+        failures = {}
+        pending = {}
+
+        for tag, commit in tags.items():
+            if not tag or '/' in tag or '\n' in tag or tag in ('.', '..') or tag.endswith(REF_LOCK_SUFFIX):
+                failures[tag] = f'Invalid tag name {tag!r}'
+                continue
+            if f'{TAGS_DIR}/{tag}' in existing:
+                failures[tag] = f'Tag "{tag}" already exists'
+                continue
+            if not commit:
+                failures[tag] = 'Commit hash is required'
+                continue
+
+            if commit not in resolved:
+                try:
+                    resolved[commit] = self.resolve_ref(commit)
+                except RefError as e:
+                    resolved[commit] = e
+            commit_hash = resolved[commit]
+
+            if isinstance(commit_hash, RefError):
+                failures[tag] = str(commit_hash)
+            elif commit_hash is None:
+                failures[tag] = f'Cannot resolve reference {commit}'
+            else:
+                pending[tag] = commit_hash
+
+        while pending:
+            transaction = self.ref_transaction()
+            for tag, commit_hash in pending.items():
+                transaction.update(f'{TAGS_DIR}/{tag}', commit_hash, expected='')
+            try:
+                transaction.commit()
+                break
+            except RefConflictError as e:
+                # Another writer created some of the tags since they were checked, the rest are tried again
+                for name in e.names:
+                    tag = name.removeprefix(f'{TAGS_DIR}/')
+                    del pending[tag]
+                    failures[tag] = f'Tag "{tag}" already exists'
+
+        return failures
+
     @requires_repo
     def delete_tag(self, tag:str) -> None:
         """ Delete a tag form the repository.
@@ -324,13 +658,11 @@ class Repository:
         if not tag:
             msg = 'Tag name is required'
             raise ValueError(msg)
-        tag_path = self.tags_dir() / tag
-
-        if not tag_path.exists():
+        if not self.tag_exists(tag):
             msg = f'Tag "{tag}" does not exist.'
             raise RepositoryError(msg)
         
-        tag_path.unlink()
+        self._delete_ref(tag_ref(tag))
     
     @requires_repo
     def tags(self) -> list[str]:
@@ -338,7 +670,7 @@ class Repository:
 
         :return: A list of tag names.
         :raises RepositoryNotFoundError: If the repository does not exist."""
-        return [x.name for x in self.tags_dir().iterdir() if x.is_file()]
+        return self._ref_names(TAGS_DIR)
         
     @requires_repo
     def tag_exists(self, tag_ref: Ref) -> bool:
@@ -347,7 +679,7 @@ class Repository:
         :param tag_ref: The reference to the tag to check.
         :return: True if the tag exists, False otherwise.
         :raises RepositoryNotFoundError: If the repository does not exist."""
-        return (self.tags_dir() / tag_ref).exists()
+        return self._ref_exists(f'{TAGS_DIR}/{tag_ref}')
 
     @requires_repo
     def add_branch(self, branch: str) -> None:
@@ -364,7 +696,9 @@ class Repository:
             msg = f'Branch "{branch}" already exists'
             raise RepositoryError(msg)
 
+        was_current = self._refs().is_current()
         (self.heads_dir() / branch).touch()
+        self._refs().loose_written(f'{HEADS_DIR}/{branch}', was_current)
 
     @requires_repo
     def delete_branch(self, branch: str) -> None:
@@ -377,16 +711,14 @@ class Repository:
         if not branch:
             msg = 'Branch name is required'
             raise ValueError(msg)
-        branch_path = self.heads_dir() / branch
-
-        if not branch_path.exists():
+        if not self.branch_exists(branch):
             msg = f'Branch "{branch}" does not exist.'
             raise RepositoryError(msg)
         if len(self.branches()) == 1:
             msg = f'Cannot delete the last branch "{branch}".'
             raise RepositoryError(msg)
 
-        branch_path.unlink()
+        self._delete_ref(branch_ref(branch))
 
     @requires_repo
     def branch_exists(self, branch_ref: Ref) -> bool:
@@ -395,7 +727,7 @@ class Repository:
         :param branch_ref: The reference to the branch to check.
         :return: True if the branch exists, False otherwise.
         :raises RepositoryNotFoundError: If the repository does not exist."""
-        return (self.heads_dir() / branch_ref).exists()
+        return self._ref_exists(f'{HEADS_DIR}/{branch_ref}')
 
     @requires_repo
     def branches(self) -> list[str]:
@@ -403,7 +735,121 @@ class Repository:
 
         :return: A list of branch names.
         :raises RepositoryNotFoundError: If the repository does not exist."""
-        return [x.name for x in self.heads_dir().iterdir() if x.is_file()]
+        return self._ref_names(HEADS_DIR)
+
+    @requires_repo
+    def pack_refs(self) -> int:
+        """Move the loose branch and tag files that hold a commit hash into the packed-refs file.
+
+        Branches without a commit stay loose. A loose file written later, such as by a commit on a branch,
+        overrides the packed reference until the next packing.
+
+        :return: The number of references packed.
+        :raises RefError: If a reference file is malformed.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        refs_dir = self.refs_dir()
+        names = sorted(ref_file.relative_to(refs_dir).as_posix() for ref_file in refs_dir.rglob('*')
+                       if ref_file.is_file() and not ref_file.name.endswith(REF_LOCK_SUFFIX))
+        locks = []
+        loose = {}
+
+        try:
+            # The loose files are locked before the packed-refs file is written, in name order like a transaction,
+            # so a file deleted or changed since the scan is read as it is now and a deleted one is not packed
+            for name in names:
+                lock = RefLock(refs_dir / name)
+                lock.acquire()
+                locks.append(lock)
+                try:
+                    ref = read_ref(lock.ref_file)
+                except FileNotFoundError:
+                    continue
+                if isinstance(ref, HashRef):
+                    loose[name] = (lock.ref_file, ref)
+
+            with RefLock(self.packed_refs_file()) as packed_lock:
+                packed_lock.acquire()
+                packed = read_packed_refs(self.packed_refs_file())
+                packed.update((name, ref) for name, (_, ref) in loose.items())
+                write_packed_refs(self.packed_refs_file(), packed)
+
+            # The loose files are only removed once the packed-refs file holds their references
+            for ref_file, _ in loose.values():
+                ref_file.unlink()
+        finally:
+            for lock in locks:
+                lock.release()
+        self._ref_table = None
+
+        return len(loose)
+
+    @requires_repo
+    def abbreviate_hash(self, object_hash: str, min_length: int = MIN_ABBREV_LENGTH) -> str:
+        """Abbreviate a hash to the shortest prefix that no other stored object shares.
+
+        :param object_hash: The full hash.
+        :param min_length: The shortest abbreviation to return.
+        :return: The abbreviated hash, which resolve_ref resolves back to the full hash.
+        :raises ValueError: If the hash is not a full hash.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        return self._object_index().shortest_prefix(object_hash, min_length)
+
+    def _object_index(self) -> ObjectIndex:
+        return ObjectIndex(self.objects_dir(), self.objindex_dir())
+
+    def _refs(self) -> RefTable:
+        """Get the ref table of the repository, which is created on first use and checks itself for changes.
+
+        :return: The ref table."""
+        if self._ref_table is None:
+            self._ref_table = RefTable(self.refs_dir(), self.packed_refs_file())
+
+        return self._ref_table
+
+    def _read_ref(self, name: str) -> Ref | None:
+        """Read a reference from its loose file, or else from the packed references.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :return: The reference, or None if its loose file is empty.
+        :raises RefError: If the reference does not exist or is malformed."""
+        try:
+            return read_ref(self.refs_dir() / name)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+        ref = self._refs().packed_ref(name)
+        if ref is None:
+            msg = f'Reference {name} does not exist'
+            raise RefError(msg)
+
+        return ref
+
+    def _ref_exists(self, name: str) -> bool:
+        """Check whether a reference has a loose file or a packed entry.
+
+        :param name: The name of the reference, relative to the refs directory.
+        :return: True if the reference exists."""
+        return (self.refs_dir() / name).is_file() or self._refs().packed_ref(name) is not None
+
+    def _ref_names(self, prefix: str) -> list[str]:
+        """List the references of a refs subdirectory, loose and packed.
+
+        :param prefix: The name of the subdirectory, relative to the refs directory.
+        :return: The reference names, relative to the subdirectory, sorted."""
+        prefix = f'{prefix}/'
+        table = self._refs()
+        names = {name for name in table.loose() if name.startswith(prefix)}
+        names.update(table.packed_names(prefix))
+
+        return sorted(name.removeprefix(prefix) for name in names)
+
+    def _delete_ref(self, name: str) -> None:
+        """Delete a reference, removing both its loose file and its packed entry.
+
+        :param name: The name of the reference, relative to the refs directory."""
+        transaction = self.ref_transaction()
+        transaction.delete(name)
+        transaction.commit()
 
     @requires_repo
     def save_dir(self, path: Path) -> HashRef:
@@ -417,33 +863,186 @@ class Repository:
             msg = f'{path} is not a directory'
             raise NotADirectoryError(msg)
 
-        stack = deque([path])
-        hashes: dict[Path, str] = {}
+        tree_hash, _ = self._snapshot_dir(path, write=True)
+        return tree_hash
 
-        while stack:
-            current_path = stack.pop()
-            tree_records: dict[str, TreeRecord] = {}
+    def _snapshot_dir(self, path: Path, *, write: bool) -> tuple[HashRef, DirCache]:
+        """Compute the tree of a directory, reusing the directory cache and the change tracker.
+
+        When writing, blobs and trees are saved to the object store, and the cache and the change tracker are
+        updated. Otherwise nothing is written and the updated cache is only returned, since its entries would
+        name blobs that are not in the object store.
+
+        :param path: The path to the directory.
+        :param write: Whether to save the objects and the cache.
+        :return: The hash of the directory's tree and the cache, holding an entry for every directory below `path`."""
+        cache = DirCache.load(self.dircache_file())
+        root_key = self._dircache_key(path)
+
+        # A running watcher tells us which directories changed since the last walk of the working directory,
+        # so everything else can be taken from the cache without even a stat. The watcher is synced with first,
+        # so that changes whose events it has not journaled yet are not missed
+        tracker = self.change_tracker() if root_key == '' else None
+        dirty, journal_offset = tracker.pending(self.working_dir) if tracker else (None, 0)
+        affected = dirty_with_ancestors(dirty) if dirty is not None else None
+
+        objects_dir = self.objects_dir()
+
+        def enter(dir_path: Path, key: str, parent_matcher: IgnoreMatcher, parent_rules_same: bool) -> _DirFrame | str:
+            """List a directory once and hash its files, or take its tree hash from the cache if it is unchanged."""
+            previous = cache.entries.get(key)
 
-            for item in current_path.iterdir():
-                if item.name == self.repo_dir.name:
+            if previous is not None and parent_rules_same and affected is not None and key not in affected:
+                return previous.tree_hash
+
+            # A listing that was filtered with different ignore rules cannot be reused
+            matcher = parent_matcher.child(key, dir_path, IGNORE_FILE)
+            rules_same = previous is not None and previous.ignore_fp == matcher.fingerprint
+
+            # Only a directory below this one changed, so its own listing and files are as cached
+            if rules_same and dirty is not None and key not in dirty:
+                return _DirFrame(dir_path, key, matcher, True, previous, previous.signature, dict(previous.files), {},
+                                 list(previous.dirs))
+
+            signature = dir_signature(dir_path.stat())
+            listing = cache.lookup_dir(key, signature) if rules_same else None
+            files: dict[str, tuple[FileSignature, str]] = {}
+            subdirs: list[str] = []
+
+            for name, is_dir, entry in self._list_dir(dir_path, key, listing, matcher):
+                if is_dir:
+                    subdirs.append(name)
                     continue
-                if item.is_file():
-                    blob = self.save_file_content(item)
-                    tree_records[item.name] = TreeRecord(TreeRecordType.BLOB, blob.hash, item.name)
-                elif item.is_dir():
-                    if item in hashes:  # If the directory has already been processed, use its hash
-                        subtree_hash = hashes[item]
-                        tree_records[item.name] = TreeRecord(TreeRecordType.TREE, subtree_hash, item.name)
-                    else:
-                        stack.append(current_path)
-                        stack.append(item)
-                        break
+
+                file_path = entry.path if entry is not None else os.path.join(dir_path, name)
+                file_sig = file_signature(entry.stat() if entry is not None else os.stat(file_path))
+                blob_hash = cache.lookup_file(key, name, file_sig)
+                if blob_hash is None:
+                    blob_hash = save_file_content(objects_dir, file_path).hash if write else hash_file(file_path)
+                files[name] = (file_sig, blob_hash)
+
+            return _DirFrame(dir_path, key, matcher, rules_same, previous, signature, files, {}, subdirs)
+
+        # Post-order walk: a directory's tree is built once all of its subdirectories have been,
+        # so the stack never holds more than one frame per level of the tree
+        root = enter(path, root_key, self._inherited_ignore_matcher(path), True)
+        stack = [root] if isinstance(root, _DirFrame) else []
+        tree_hash = root if isinstance(root, str) else ''
+
+        while stack:
+            frame = stack[-1]
+
+            if frame.pending:
+                name = frame.pending.pop()
+                child = enter(frame.path / name, child_key(frame.key, name), frame.matcher, frame.rules_same)
+                if isinstance(child, _DirFrame):
+                    stack.append(child)
+                else:
+                    frame.dirs[name] = child
+                continue
+
+            stack.pop()
+            previous = frame.previous
+            entry = CachedDir(frame.signature, '', frame.files, frame.dirs, frame.matcher.fingerprint)
+
+            # If every entry hashes the same as in the cached snapshot, so does the tree
+            # and it is already in the object store
+            if (previous is not None and previous.dirs == frame.dirs and
+                    {n: h for n, (_, h) in previous.files.items()} == {n: h for n, (_, h) in frame.files.items()}):
+                entry.tree_hash = previous.tree_hash
             else:
-                tree = Tree(tree_records)
-                save_tree(self.objects_dir(), tree)
-                hashes[current_path] = hash_object(tree)
+                tree = cached_tree(entry)
+                if write:
+                    save_tree(objects_dir, tree)
+                entry.tree_hash = hash_object(tree)
+
+            if previous is not None:
+                for name in previous.dirs.keys() - frame.dirs.keys():
+                    cache.discard_subtree(child_key(frame.key, name))
+
+            cache.entries[frame.key] = entry
+            tree_hash = entry.tree_hash
+            if stack:
+                stack[-1].dirs[frame.path.name] = tree_hash
+
+        if write:
+            cache.save()
+            if tracker:
+                tracker.consume(journal_offset)
+
+        return HashRef(tree_hash), cache
+
+    def _list_dir(self, path: Path, key: str, cached: CachedDir | None,
+                  matcher: IgnoreMatcher) -> Generator[tuple[str, bool, os.DirEntry | None], None, None]:
+        """List the files and subdirectories of a directory that are not ignored.
+
+        Entry types come from the directory listing itself, so no entry is stat'ed here.
+
+        :param path: The directory to list.
+        :param key: The cache key of the directory.
+        :param cached: The cached snapshot of the directory, if its listing is known to be unchanged.
+        :param matcher: The ignore matcher in effect in the directory.
+        :return: A generator yielding (name, is_dir, entry) triples. The entry is None for a cached listing."""
+        if cached is not None:
+            yield from ((name, False, None) for name in cached.files)
+            yield from ((name, True, None) for name in cached.dirs)
+            return
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    is_dir = False
+                elif entry.is_dir():
+                    is_dir = True
+                else:
+                    continue
+
+                # The sync cookies of change tracker consumers come and go at the top of the working directory
+                if not key and entry.name.startswith(SYNC_COOKIE_PREFIX):
+                    continue
+
+                if not matcher.is_ignored(key, entry.name, is_dir=is_dir):
+                    yield entry.name, is_dir, entry
+
+    def ignore_matcher(self) -> IgnoreMatcher:
+        """Get the ignore matcher of the top of the working directory, before its own ignore file is applied.
+
+        Every working directory walker descends from this matcher with `IgnoreMatcher.child`, so the repository
+        directory and the entries matched by ignore files are skipped consistently.
+
+        :return: The ignore matcher."""
+        return IgnoreMatcher(frozenset({self.repo_dir.name}))
+
+    def _inherited_ignore_matcher(self, path: Path) -> IgnoreMatcher:
+        """Get the ignore matcher in effect in the parent of a directory.
+
+        :param path: The directory.
+        :return: The matcher combining the ignore files of every ancestor of `path` inside the working directory."""
+        matcher = self.ignore_matcher()
+
+        try:
+            relative = path.relative_to(self.working_dir)
+        except ValueError:
+            return matcher
 
-        return HashRef(hashes[path])
+        current, key = self.working_dir, ''
+        for part in relative.parts:
+            matcher = matcher.child(key, current, IGNORE_FILE)
+            current, key = current / part, child_key(key, part)
+
+        return matcher
+
+    def _dircache_key(self, path: Path) -> str:
+        """Get the directory cache key of a path, relative to the working directory when possible.
+
+        :param path: The directory path.
+        :return: The cache key."""
+        try:
+            relative = path.relative_to(self.working_dir)
+        except ValueError:
+            return path.absolute().as_posix()
+
+        return '' if relative == Path() else relative.as_posix()
 
     @requires_repo
     def commit_working_dir(self, author: str, message: str) -> HashRef:
@@ -480,40 +1079,495 @@ class Repository:
         save_commit(self.objects_dir(), commit)
 
         if branch:
-            self.update_ref(branch, commit_ref)
+            # The branch only moves if it still holds the parent, so a concurrent commit on it is never lost
+            try:
+                self.update_ref(branch, commit_ref, expected=parent_commit_ref or '')
+            except RefConflictError as e:
+                msg = f'Branch "{branch.branch_name()}" moved during the commit, commit {commit_ref} was not recorded'
+                raise RepositoryError(msg) from e
 
         return commit_ref
 
     @requires_repo
-    def log(self, tip: Ref | None = None) -> Generator[LogEntry, None, None]:
+    def log(self, tip: Ref | None = None, pathspec: Sequence[str] | None = None) -> Generator[LogEntry, None, None]:
         """Generate a log of commits in the repository, starting from the specified tip.
 
         :param tip: The reference to the commit to start from. If None, defaults to the current HEAD.
+        :param pathspec: Glob patterns limiting the log to commits that change the paths they select. Subtrees
+            that cannot hold a selected path are never loaded.
         :return: A generator yielding LogEntry objects representing the commits in the log.
         :raises RepositoryError: If a commit cannot be loaded.
         :raises RepositoryNotFoundError: If the repository does not exist."""
         tip = tip or self.head_ref()
         current_hash = self.resolve_ref(tip)
+        selection = Pathspec(pathspec) if pathspec else None
 
         try:
+            commit = load_commit(self.objects_dir(), current_hash) if current_hash else None
             while current_hash:
-                commit = load_commit(self.objects_dir(), current_hash)
-                yield LogEntry(HashRef(current_hash), commit)
+                parent = load_commit(self.objects_dir(), commit.parent) if commit.parent else None
+                if selection is None or self._touches(parent.tree_hash if parent else None, commit.tree_hash,
+                                                      selection):
+                    yield LogEntry(HashRef(current_hash), commit)
 
                 current_hash = HashRef(commit.parent) if commit.parent else None
+                commit = parent
         except Exception as e:
             msg = f'Error loading commit {current_hash}'
             raise RepositoryError(msg) from e
 
     @requires_repo
-    def diff_commits(self, commit_ref1: Ref | None = None, commit_ref2: Ref | None = None) -> Sequence[Diff]:
+    def diff_commits(self, commit_ref1: Ref | None = None, commit_ref2: Ref | None = None,
+                     pathspec: Sequence[str] | None = None, rename_threshold: float | None = None, *,
+                     use_cache: bool = False) -> Sequence[Diff]:
         """Generate a diff between two commits in the repository.
 
         :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
         :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :param pathspec: Glob patterns limiting the diff to the paths they match and everything below them.
+            Subtrees that cannot hold a matching path are never loaded.
+        :param rename_threshold: If given, removed and added files whose contents are at least this similar,
+            between 0 and 1, are reported as moves even when their hashes differ.
+        :param use_cache: Whether to read and fill the persistent tree diff cache at every level of the diff,
+            so that later diffs sharing any pair of subtrees with this one skip comparing them.
         :return: A list of Diff objects representing the differences between the two commits.
+        :raises ValueError: If the rename threshold is not above 0 and at most 1.
+        :raises RepositoryError: If a commit, tree or blob cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        _check_rename_threshold(rename_threshold)
+        tree_hash1, tree_hash2 = self._commit_tree_hashes(commit_ref1, commit_ref2)
+        if tree_hash1 == tree_hash2:
+            return []
+
+        if use_cache:
+            diffs = self._diff_trees_cached(tree_hash1, tree_hash2, Pathspec(pathspec) if pathspec else None)
+        elif pathspec:
+            trees = self._load_trees(tree_hash1, tree_hash2)
+            diffs = self._diff_trees(*trees, self._load_stored_tree, self._load_stored_tree, Pathspec(pathspec))
+        else:
+            # Without a pathspec, the trees are walked natively and only the differences cross into Python
+            try:
+                tree_diff = diff_trees(self.objects_dir(), tree_hash1, tree_hash2)
+            except Exception as e:
+                msg = 'Error loading trees for diff'
+                raise RepositoryError(msg) from e
+            diffs = diffs_from_tree_diff(tree_diff)
+
+        if rename_threshold is not None:
+            self._pair_similar_diffs(diffs, rename_threshold)
+
+        return diffs
+
+    @requires_repo
+    def diff_commits_columnar(self, commit_ref1: Ref | None = None, commit_ref2: Ref | None = None) -> ColumnarDiff:
+        """Generate a diff between two commits as parallel columns rather than Diff objects.
+
+        The diff is computed natively, like `diff_commits` without a pathspec, and converted to columns without
+        creating a Python object per entry, so very large diffs stay compact and can be filtered in bulk.
+
+        :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
+        :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :return: The differences, with moves paired up as in `diff_commits`.
         :raises RepositoryError: If a commit or tree cannot be loaded.
         :raises RepositoryNotFoundError: If the repository does not exist."""
+        tree_hash1, tree_hash2 = self._commit_tree_hashes(commit_ref1, commit_ref2)
+
+        try:
+            tree_diff = diff_trees(self.objects_dir(), tree_hash1, tree_hash2)
+        except Exception as e:
+            msg = 'Error loading trees for diff'
+            raise RepositoryError(msg) from e
+
+        return ColumnarDiff(diff_columns(tree_diff))
+
+    @requires_repo
+    def diff_range(self, from_ref: Ref | None, to_ref: Ref | None = None, *, pathspec: Sequence[str] | None = None,
+                   tree_cache_size: int = DEFAULT_TREE_CACHE_SIZE) -> Iterator[tuple[LogEntry, Sequence[Diff]]]:
+        """Diff every commit of a range against its parent, walking the log from the newest commit.
+
+        Each commit is loaded once, and trees are kept in a cache shared by all comparisons, so a tree loaded for
+        a commit is reused when that commit is the parent side of the next comparison. Identical subtrees are
+        skipped by hash, so a range costs about one tree load per changed directory.
+
+        :param from_ref: The reference to the oldest commit, which is excluded from the range. If None, the range
+            runs to the first commit, which is diffed against an empty tree.
+        :param to_ref: The reference to the newest commit. If None, defaults to the current HEAD.
+        :param pathspec: Glob patterns limiting the diffs to the paths they match and everything below them.
+        :param tree_cache_size: The maximum number of trees kept between comparisons.
+        :return: An iterator over each commit of the range and its diff from its parent, newest first.
+        :raises RepositoryError: If a reference cannot be resolved, a commit or tree cannot be loaded, or `from_ref`
+            is not an ancestor of `to_ref`, which is found before any diff is yielded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        to_ref = to_ref or self.head_ref()
+        to_hash = self.resolve_ref(to_ref)
+        if to_hash is None:
+            msg = f'Cannot resolve reference {to_ref}'
+            raise RepositoryError(msg)
+
+        from_hash = None
+        if from_ref is not None:
+            from_hash = self.resolve_ref(from_ref)
+            if from_hash is None:
+                msg = f'Cannot resolve reference {from_ref}'
+                raise RepositoryError(msg)
+
+        selection = Pathspec(pathspec) if pathspec else None
+        trees: OrderedDict[str, Tree] = OrderedDict()
+
+        def load(tree_hash: str) -> Tree:
+            tree = trees.get(tree_hash)
+            if tree is None:
+                tree = self._load_stored_tree(tree_hash)
+                trees[tree_hash] = tree
+                if len(trees) > tree_cache_size:
+                    trees.popitem(last=False)
+            else:
+                trees.move_to_end(tree_hash)
+            return tree
+
+        commits = self._commit_chain(to_hash, from_hash)
+        if from_hash is not None:
+            # Only the commits are loaded, which is cheap next to diffing their trees, so that a `from_ref` that is
+            # not an ancestor fails before any diff is yielded
+            commits = list(commits)
+
+        for commit_hash, commit, parent in commits:
+            try:
+                parent_tree_hash = parent.tree_hash if parent else None
+                if parent_tree_hash == commit.tree_hash:
+                    diffs = []
+                else:
+                    tree2 = load(commit.tree_hash)
+                    tree1 = load(parent_tree_hash) if parent_tree_hash else None
+                    diffs = self._diff_trees(tree1, tree2, load, load, selection)
+            except RepositoryError:
+                raise
+            except Exception as e:
+                msg = f'Error loading the trees of commit {commit_hash}'
+                raise RepositoryError(msg) from e
+
+            yield LogEntry(HashRef(commit_hash), commit), diffs
+
+    def _commit_chain(self, to_hash: str, from_hash: str | None) -> Iterator[tuple[str, Commit, Commit | None]]:
+        """Walk the first parents from a commit down to, but excluding, another commit.
+
+        :param to_hash: The hash of the newest commit.
+        :param from_hash: The hash of the commit to stop at, or None to walk to the first commit.
+        :return: An iterator over the hash of each commit, the commit and its parent, or None for the first commit.
+        :raises RepositoryError: If a commit cannot be loaded, or the first commit is reached before `from_hash`."""
+        commit_hash = to_hash
+        try:
+            commit = load_commit(self.objects_dir(), commit_hash)
+        except Exception as e:
+            msg = f'Error loading commit {commit_hash}'
+            raise RepositoryError(msg) from e
+
+        while commit_hash != from_hash:
+            if commit.parent is None and from_hash is not None:
+                msg = f'Commit {from_hash} is not an ancestor of {to_hash}'
+                raise RepositoryError(msg)
+
+            try:
+                parent = load_commit(self.objects_dir(), commit.parent) if commit.parent else None
+            except Exception as e:
+                msg = f'Error loading the parent of commit {commit_hash}'
+                raise RepositoryError(msg) from e
+
+            yield commit_hash, commit, parent
+
+            if parent is None:
+                break
+            commit_hash, commit = commit.parent, parent
+
+    @requires_repo
+    def iter_diff(self, commit_ref1: Ref | None = None, commit_ref2: Ref | None = None, *,
+                  detect_moves: bool = False, move_window: int = DEFAULT_MOVE_WINDOW, memory_limit: int | None = None,
+                  pathspec: Sequence[str] | None = None, rename_threshold: float | None = None) -> Iterator[DiffEntry]:
+        """Stream the differences between two commits, one path at a time, while the trees are traversed.
+
+        Entries come in depth-first order with siblings sorted by name, and a modified directory comes before
+        the entries below it. Subtrees are only loaded once the entries before them have been consumed.
+
+        With move detection, added and removed entries are held back until an entry with the same hash on the
+        other side turns them into a moved entry, which is yielded in place of the later one. At most
+        `move_window` entries are held back; beyond that the oldest one is yielded as it is, and the rest are
+        yielded once the traversal ends.
+
+        With a memory limit, move detection is exact instead: added and removed entries are spilled to sorted run
+        files under the repository directory, and once the traversal ends they are paired by a merge join on
+        their hashes and yielded in traversal order. At most `memory_limit` entries are held in memory, besides a
+        small chunk per run file being merged.
+
+        With a rename threshold, added and removed files that are left unpaired are held back until the traversal
+        ends, and those whose contents are similar enough are then yielded as moves.
+
+        :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
+        :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :param detect_moves: Whether to pair added and removed entries with the same hash into moves.
+        :param move_window: The maximum number of entries held back for move detection.
+        :param memory_limit: If given, the maximum number of entries held in memory by exact move detection,
+            which spills the rest to disk. `move_window` is then ignored.
+        :param pathspec: Glob patterns limiting the diff to the paths they match and everything below them.
+        :param rename_threshold: The minimum similarity, between 0 and 1, of files paired into moves by content.
+            None disables similarity-based move detection.
+        :return: An iterator over the differences.
+        :raises ValueError: If the rename threshold is not above 0 and at most 1, or the memory limit is below 1.
+        :raises RepositoryError: If a commit, tree or blob cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        _check_rename_threshold(rename_threshold)
+        if memory_limit is not None and memory_limit < 1:
+            msg = 'The memory limit must be at least 1'
+            raise ValueError(msg)
+
+        trees = self._load_commit_trees(commit_ref1, commit_ref2)
+        if trees is None:
+            return iter(())
+
+        entries = iter_tree_changes(*trees, self._load_stored_tree, self._load_stored_tree,
+                                    Pathspec(pathspec) if pathspec else None)
+        if detect_moves and memory_limit is not None:
+            entries = pair_moves_external(entries, self.repo_path(), memory_limit)
+        elif detect_moves:
+            entries = pair_moves(entries, move_window)
+        if rename_threshold is not None:
+            entries = pair_similar(entries, lambda removed, added: self._similar_pairs(removed, added,
+                                                                                         rename_threshold))
+
+        return entries
+
+    @requires_repo
+    def diff_blobs(self, old_hash: str | None, new_hash: str | None, context: int = 3) -> LineDiff:
+        """Diff the contents of two blobs line by line.
+
+        :param old_hash: The hash of the old blob, or None for an empty blob.
+        :param new_hash: The hash of the new blob, or None for an empty blob.
+        :param context: The number of unchanged lines to show around each change.
+        :return: The unified diff hunks and line counts of the change.
+        :raises RepositoryError: If a blob cannot be read.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        try:
+            return diff_blobs(self.objects_dir(), old_hash, new_hash, context)
+        except Exception as e:
+            msg = 'Error diffing blobs'
+            raise RepositoryError(msg) from e
+
+    @requires_repo
+    def diff_stat(self, commit_ref1: Ref | None = None, commit_ref2: Ref | None = None, *,
+                  workers: int | None = None, pathspec: Sequence[str] | None = None,
+                  rename_threshold: float | None = None) -> list[FileStat]:
+        """Count the lines inserted and deleted in each file changed between two commits, without building patches.
+
+        Added and removed directories are expanded into their files, and moves are detected. The line counts are
+        computed natively on a thread pool, since the native code does not hold the GIL.
+
+        :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
+        :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :param workers: The number of threads counting lines. Defaults to the thread pool's default.
+        :param pathspec: Glob patterns limiting the statistics to the paths they match and everything below them.
+        :param rename_threshold: The minimum similarity, between 0 and 1, of files paired into moves by content.
+            None only pairs files with identical contents.
+        :return: The statistics of every changed file, sorted by path.
+        :raises ValueError: If the rename threshold is not above 0 and at most 1.
+        :raises RepositoryError: If a commit, tree or blob cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        selection = Pathspec(pathspec) if pathspec else None
+        entries = self.iter_diff(commit_ref1, commit_ref2, detect_moves=True, pathspec=pathspec,
+                                 rename_threshold=rename_threshold)
+        changes = [change for entry in entries for change in self._file_changes(entry, selection)]
+        changes.sort(key=lambda change: change[1] if change[1] is not None else change[0])
+        objects_dir = self.objects_dir()
+
+        def stat(change: tuple[str | None, str | None, str | None, str | None]) -> FileStat:
+            old_path, new_path, old_hash, new_hash = change
+            if old_hash == new_hash:
+                return FileStat(new_path, 0, 0, old_path=old_path)
+
+            line_stat = stat_blobs(objects_dir, old_hash, new_hash)
+            if old_path is not None and new_path is not None and old_path != new_path:
+                # A move of a file whose contents changed as well
+                return FileStat(new_path, line_stat.additions, line_stat.deletions, line_stat.binary, old_path)
+
+            return FileStat(new_path if new_path is not None else old_path, line_stat.additions, line_stat.deletions,
+                            line_stat.binary)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(stat, changes))
+        except Exception as e:
+            msg = 'Error counting changed lines'
+            raise RepositoryError(msg) from e
+
+    @requires_repo
+    def file_changes(self, entry: DiffEntry,
+                     pathspec: Pathspec | None = None) -> Iterator[tuple[str | None, str | None, str | None, str | None]]:
+        """Expand an entry yielded by `iter_diff` into the files it changes.
+
+        Added and removed directories are expanded into their files, and a file replaced by a directory, or the
+        other way around, into the removal and the additions. A modified directory changes no file by itself.
+
+        :param entry: The diff entry.
+        :param pathspec: Limits the files of added and removed directories to the selected paths.
+        :return: An iterator over the old path, new path, old blob hash and new blob hash of each changed file. The
+            paths and hashes of the side a file is missing from are None.
+        :raises RepositoryError: If a subtree cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        return self._file_changes(entry, pathspec)
+
+    def _file_changes(self, entry: DiffEntry,
+                      pathspec: Pathspec | None) -> Iterator[tuple[str | None, str | None, str | None, str | None]]:
+        """Expand a diff entry into the files it changes.
+
+        :param entry: The diff entry.
+        :param pathspec: Limits the files of added and removed directories to the selected paths.
+        :return: An iterator over the old path, new path, old blob hash and new blob hash of each changed file."""
+        if entry.kind == DiffKind.MOVED:
+            if entry.old_record.type == TreeRecordType.TREE:
+                for path, blob_hash in self._tree_blobs('', entry.old_record.hash, None):
+                    yield child_key(entry.old_path, path), child_key(entry.new_path, path), blob_hash, blob_hash
+            else:
+                yield entry.old_path, entry.new_path, entry.old_record.hash, entry.new_record.hash
+            return
+
+        old_is_tree = entry.old_record is not None and entry.old_record.type == TreeRecordType.TREE
+        new_is_tree = entry.new_record is not None and entry.new_record.type == TreeRecordType.TREE
+
+        # Both sides are directories, so their changed files are entries of their own
+        if old_is_tree and new_is_tree:
+            return
+
+        if entry.old_record is not None:
+            if old_is_tree:
+                for path, blob_hash in self._tree_blobs(entry.old_path, entry.old_record.hash, pathspec):
+                    yield path, None, blob_hash, None
+            elif entry.new_record is None or new_is_tree:
+                yield entry.old_path, None, entry.old_record.hash, None
+
+        if entry.new_record is not None:
+            if new_is_tree:
+                for path, blob_hash in self._tree_blobs(entry.new_path, entry.new_record.hash, pathspec):
+                    yield None, path, None, blob_hash
+            elif entry.old_record is None or old_is_tree:
+                yield None, entry.new_path, None, entry.new_record.hash
+            else:
+                yield entry.old_path, entry.new_path, entry.old_record.hash, entry.new_record.hash
+
+    def _tree_blobs(self, key: str, tree_hash: str, pathspec: Pathspec | None) -> Iterator[tuple[str, str]]:
+        """List every blob below a stored tree.
+
+        :param key: The path of the tree.
+        :param tree_hash: The hash of the tree.
+        :param pathspec: Limits the blobs to the selected paths, or None for all of them.
+        :return: An iterator over the path and hash of each blob.
+        :raises RepositoryError: If a subtree cannot be loaded."""
+        stack = [(key, tree_hash)]
+
+        while stack:
+            current_key, current_hash = stack.pop()
+            try:
+                tree = self._load_stored_tree(current_hash)
+            except Exception as e:
+                msg = 'Error loading subtree for diff'
+                raise RepositoryError(msg) from e
+
+            # Below a selected directory every entry is selected
+            selected = pathspec is None or (current_key and pathspec.matches(current_key))
+            for name, record in tree.records.items():
+                path = child_key(current_key, name)
+                is_dir = record.type == TreeRecordType.TREE
+                if not selected and not pathspec.selects(path, is_dir):
+                    continue
+
+                if is_dir:
+                    stack.append((path, record.hash))
+                else:
+                    yield path, record.hash
+
+    def _pair_similar_diffs(self, diffs: list[Diff], threshold: float) -> None:
+        """Replace removed and added files with similar contents by the two halves of a move, in place.
+
+        :param diffs: The top level diffs.
+        :param threshold: The minimum similarity of a pair.
+        :raises RepositoryError: If a blob cannot be read."""
+        removed: list[tuple[list[Diff], int]] = []
+        added: list[tuple[list[Diff], int]] = []
+        stack = [diffs]
+
+        while stack:
+            siblings = stack.pop()
+            for index, diff in enumerate(siblings):
+                if isinstance(diff, RemovedDiff) and diff.record.type == TreeRecordType.BLOB:
+                    removed.append((siblings, index))
+                elif isinstance(diff, AddedDiff) and diff.record.type == TreeRecordType.BLOB:
+                    added.append((siblings, index))
+                elif diff.children:
+                    stack.append(diff.children)
+
+        pairs = self._similar_pairs([siblings[index].record.hash for siblings, index in removed],
+                                    [siblings[index].record.hash for siblings, index in added], threshold)
+
+        for i, j, _ in pairs:
+            (removed_siblings, removed_index), (added_siblings, added_index) = removed[i], added[j]
+            removed_diff, added_diff = removed_siblings[removed_index], added_siblings[added_index]
+            moved_to_diff = MovedToDiff(removed_diff.record, removed_diff.parent, [], None)
+            moved_from_diff = MovedFromDiff(added_diff.record, added_diff.parent, [], moved_to_diff)
+            moved_to_diff.moved_to = moved_from_diff
+
+            removed_siblings[removed_index] = moved_to_diff
+            added_siblings[added_index] = moved_from_diff
+
+    def _similar_pairs(self, removed_hashes: Sequence[str], added_hashes: Sequence[str],
+                       threshold: float) -> list[tuple[int, int, float]]:
+        """Pair removed and added blobs by the similarity of their contents.
+
+        Signatures are cached per blob hash in the signature cache file, and missing ones are computed natively
+        on a thread pool.
+
+        :param removed_hashes: The hashes of the removed blobs.
+        :param added_hashes: The hashes of the added blobs.
+        :param threshold: The minimum similarity of a pair.
+        :return: The index of the removed blob, the index of the added blob and their similarity for each pair.
+        :raises RepositoryError: If a blob cannot be read."""
+        if not removed_hashes or not added_hashes:
+            return []
+
+        cache = SignatureCache.load(self.signatures_file(), MINHASH_SIZE)
+        missing = list(dict.fromkeys(blob_hash for blob_hash in (*removed_hashes, *added_hashes)
+                                     if cache.get(blob_hash) is None))
+        objects_dir = self.objects_dir()
+
+        try:
+            with ThreadPoolExecutor() as pool:
+                signatures = pool.map(lambda blob_hash: minhash_blob(objects_dir, blob_hash, MINHASH_SIZE), missing)
+                for blob_hash, signature in zip(missing, signatures, strict=True):
+                    cache.add(blob_hash, signature)
+        except Exception as e:
+            msg = 'Error computing blob signatures'
+            raise RepositoryError(msg) from e
+        cache.save()
+
+        return find_similar_pairs([cache.get(blob_hash) for blob_hash in removed_hashes],
+                                  [cache.get(blob_hash) for blob_hash in added_hashes], threshold)
+
+    def _load_commit_trees(self, commit_ref1: Ref | None, commit_ref2: Ref | None) -> tuple[Tree, Tree] | None:
+        """Load the trees of two commits.
+
+        :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
+        :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :return: The two trees, or None if the commits have the same tree.
+        :raises RepositoryError: If a commit or tree cannot be loaded."""
+        tree_hash1, tree_hash2 = self._commit_tree_hashes(commit_ref1, commit_ref2)
+        if tree_hash1 == tree_hash2:
+            return None
+
+        return self._load_trees(tree_hash1, tree_hash2)
+
+    def _commit_tree_hashes(self, commit_ref1: Ref | None, commit_ref2: Ref | None) -> tuple[str, str]:
+        """Get the tree hashes of two commits.
+
+        :param commit_ref1: The reference to the first commit. If None, defaults to the current HEAD.
+        :param commit_ref2: The reference to the second commit. If None, defaults to the current HEAD.
+        :return: The hashes of the two trees.
+        :raises RepositoryError: If a commit cannot be loaded."""
         if commit_ref1 is None:
             commit_ref1 = self.head_ref()
         if commit_ref2 is None:
@@ -536,50 +1590,400 @@ class Repository:
             msg = 'Error loading commit'
             raise RepositoryError(msg) from e
 
-        if commit1.tree_hash == commit2.tree_hash:
+        return commit1.tree_hash, commit2.tree_hash
+
+    def _diff_trees_cached(self, tree_hash1: str, tree_hash2: str, pathspec: Pathspec | None) -> list[Diff]:
+        """Generate a diff between two stored trees through the tree diff cache.
+
+        Each level is read from the cache, or compared from the records of its two trees and then cached. Moves
+        are paired up once the whole diff is built, in the same order as `_diff_trees`, so the result is the same.
+
+        :param tree_hash1: The hash of the first tree.
+        :param tree_hash2: The hash of the second tree.
+        :param pathspec: Limits the diff to the selected paths, or None for the whole diff.
+        :return: A list of Diff objects representing the differences between the two trees.
+        :raises RepositoryError: If a tree cannot be loaded."""
+        cache = TreeDiffCache(self.diffcache_dir(), DEFAULT_DIFF_CACHE_SIZE)
+        top_level_diff = Diff(TreeRecord(TreeRecordType.TREE, '', ''), None, [])
+        stack = [('', tree_hash1, tree_hash2, top_level_diff)]
+
+        while stack:
+            key, level_hash1, level_hash2, parent_diff = stack.pop()
+            changes = cache.get(level_hash1, level_hash2)
+            if changes is None:
+                changes = self._level_changes(level_hash1, level_hash2)
+                cache.put(level_hash1, level_hash2, changes)
+
+            # Below a selected directory every entry is selected
+            selected = pathspec is None or (key and pathspec.matches(key))
+            for kind, name, type1, hash1, type2, hash2 in changes:
+                path = child_key(key, name)
+                is_dir = TreeRecordType.TREE.value in (type1, type2)
+                if not selected and not pathspec.selects(path, is_dir):
+                    continue
+
+                diff: Diff
+                if kind == 'A':
+                    diff = AddedDiff(TreeRecord(_RECORD_TYPES[type2], hash2, name), parent_diff, [])
+                elif kind == 'R':
+                    diff = RemovedDiff(TreeRecord(_RECORD_TYPES[type1], hash1, name), parent_diff, [])
+                else:
+                    diff = ModifiedDiff(TreeRecord(_RECORD_TYPES[type1], hash1, name), parent_diff, [])
+                    if type1 == type2 == TreeRecordType.TREE.value:
+                        stack.append((path, hash1, hash2, diff))
+                parent_diff.children.append(diff)
+
+        pair_diff_moves(top_level_diff)
+        return top_level_diff.children
+
+    def _level_changes(self, tree_hash1: str, tree_hash2: str) -> list[LevelChange]:
+        """Compare the records of two stored trees, without descending into subtrees.
+
+        :param tree_hash1: The hash of the first tree.
+        :param tree_hash2: The hash of the second tree.
+        :return: The changes between the records, sorted by name.
+        :raises RepositoryError: If a tree cannot be loaded."""
+        try:
+            records1 = self._load_stored_tree(tree_hash1).records
+            records2 = self._load_stored_tree(tree_hash2).records
+        except Exception as e:
+            msg = 'Error loading subtree for diff'
+            raise RepositoryError(msg) from e
+
+        changes: list[LevelChange] = []
+        for name in sorted(records1.keys() | records2.keys()):
+            record1 = records1.get(name)
+            record2 = records2.get(name)
+            if record1 is None:
+                changes.append(('A', name, -1, '', record2.type.value, record2.hash))
+            elif record2 is None:
+                changes.append(('R', name, record1.type.value, record1.hash, -1, ''))
+            elif record1.hash != record2.hash:
+                changes.append(('M', name, record1.type.value, record1.hash, record2.type.value, record2.hash))
+
+        return changes
+
+    def _load_trees(self, tree_hash1: str, tree_hash2: str) -> tuple[Tree, Tree]:
+        try:
+            tree1 = load_tree(self.objects_dir(), tree_hash1)
+            tree2 = load_tree(self.objects_dir(), tree_hash2)
+        except Exception as e:
+            msg = 'Error loading tree'
+            raise RepositoryError(msg) from e
+
+        return tree1, tree2
+
+    @requires_repo
+    def status(self) -> Sequence[Diff]:
+        """Compare the working directory against the tree of the HEAD commit, without writing any objects.
+
+        :return: A list of Diff objects representing the changes from HEAD to the working directory.
+        :raises RepositoryError: If the HEAD commit or one of its trees cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        try:
+            head_hash = self.head_commit()
+        except Exception as e:
+            msg = 'Error loading HEAD commit'
+            raise RepositoryError(msg) from e
+
+        return self._diff_working_dir(head_hash)
+
+    @requires_repo
+    def diff_working_dir(self, ref: Ref | str | None = None) -> Sequence[Diff]:
+        """Compare the working directory against the tree of a commit, without writing any objects.
+
+        Only files whose stat data differs from the directory cache are hashed, and subtrees whose hash
+        matches the commit's tree are not compared any further.
+
+        :param ref: A branch name, a tag name or any reference resolving to a commit. Defaults to HEAD.
+        :return: A list of Diff objects representing the changes from the commit to the working directory.
+        :raises RepositoryError: If the reference cannot be resolved, or the commit or one of its trees
+            cannot be loaded.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        if ref is None:
+            return self.status()
+
+        return self._diff_working_dir(self._resolve_commit(ref))
+
+    def _diff_working_dir(self, commit_hash: str | None) -> Sequence[Diff]:
+        """Compare the working directory against the tree of a commit, without writing any objects.
+
+        :param commit_hash: The hash of the commit, or None to compare against an empty tree.
+        :return: A list of Diff objects representing the changes from the commit to the working directory.
+        :raises RepositoryError: If the commit or one of its trees cannot be loaded."""
+        commit_tree = None
+
+        try:
+            if commit_hash is not None:
+                commit_tree = load_tree(self.objects_dir(), load_commit(self.objects_dir(), commit_hash).tree_hash)
+        except Exception as e:
+            msg = 'Error loading commit'
+            raise RepositoryError(msg) from e
+
+        working_hash, cache = self._snapshot_dir(self.working_dir, write=False)
+        if commit_tree is not None and hash_object(commit_tree) == working_hash:
             return []
 
+        working_dirs = {entry.tree_hash: entry for key, entry in cache.entries.items() if is_below(key, '')}
+
+        def load_working_tree(tree_hash: str) -> Tree:
+            return cached_tree(working_dirs[tree_hash])
+
+        return self._diff_trees(commit_tree, load_working_tree(working_hash), self._load_stored_tree,
+                                load_working_tree)
+
+    def _resolve_commit(self, ref: Ref | str) -> HashRef:
+        """Resolve a branch name, a tag name or any other reference to a commit hash.
+
+        :param ref: The reference to resolve. Branch names win over tag names.
+        :return: The commit hash.
+        :raises RepositoryError: If the reference cannot be resolved."""
         try:
-            tree1 = load_tree(self.objects_dir(), commit1.tree_hash)
-            tree2 = load_tree(self.objects_dir(), commit2.tree_hash)
+            if not isinstance(ref, HashRef) and self.branch_exists(ref):
+                commit_hash = self.resolve_ref(branch_ref(ref))
+            elif not isinstance(ref, HashRef) and self.tag_exists(ref):
+                commit_hash = self.resolve_ref(tag_ref(ref))
+            else:
+                commit_hash = self.resolve_ref(ref)
+        except RefError as e:
+            msg = f'Cannot resolve reference {ref}: {e}'
+            raise RepositoryError(msg) from e
+
+        if commit_hash is None:
+            msg = f'Reference {ref} does not point to a commit'
+            raise RepositoryError(msg)
+
+        return commit_hash
+
+    @requires_repo
+    def checkout(self, ref: Ref | str, *, force: bool = False, workers: int | None = None) -> CheckoutResult:
+        """Check out a commit into the working directory and move HEAD to it.
+
+        Only the paths that differ between the HEAD tree and the target tree are written or removed, and
+        subtrees with equal hashes are never loaded. Files are written on a thread pool, and their fresh
+        stat data is recorded in the directory cache so the next commit does not hash them again.
+
+        :param ref: A branch name, a tag name or any reference resolving to a commit. Checking out a branch
+            points HEAD at the branch, anything else detaches HEAD.
+        :param force: Overwrite local changes and untracked files in the way of the checkout.
+        :param workers: The number of writer threads. Defaults to the thread pool's default.
+        :return: The checked out commit, the branch HEAD now points to, and the number of files written and removed.
+        :raises RepositoryError: If the reference cannot be resolved, a tree cannot be loaded, or the checkout
+            would overwrite local changes and `force` is not set.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        branch = ref if not isinstance(ref, HashRef) and self.branch_exists(ref) else None
+        commit_hash = self._resolve_commit(ref)
+
+        try:
+            head_hash = self.head_commit()
+            head_tree_hash = load_commit(self.objects_dir(), head_hash).tree_hash if head_hash else None
+            target_tree_hash = load_commit(self.objects_dir(), commit_hash).tree_hash
+        except Exception as e:
+            msg = 'Error loading commit'
+            raise RepositoryError(msg) from e
+
+        try:
+            if head_tree_hash == target_tree_hash:
+                plan = CheckoutPlan()
+            else:
+                head_tree = self._load_stored_tree(head_tree_hash) if head_tree_hash else None
+                plan = plan_checkout(head_tree, self._load_stored_tree(target_tree_hash), target_tree_hash,
+                                     self._load_stored_tree)
         except Exception as e:
             msg = 'Error loading tree'
             raise RepositoryError(msg) from e
 
+        cache = DirCache.load(self.dircache_file())
+
+        if not force:
+            conflicts = self._checkout_conflicts(plan, cache)
+            if conflicts:
+                msg = f'Checkout would overwrite local changes in: {", ".join(sorted(conflicts))}'
+                raise RepositoryError(msg)
+
+        remove_paths(self.working_dir, plan.removed_files, plan.removed_dirs)
+        if force:
+            # A directory left in the way of a file, by untracked files in it or by the user, is removed as well
+            for key in plan.writes:
+                path = self.working_dir / key
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+        for key in plan.created_dirs:
+            (self.working_dir / key).mkdir(parents=True, exist_ok=True)
+
+        try:
+            written = write_blobs(self.working_dir, self.objects_dir(), plan.writes, workers)
+        except Exception as e:
+            msg = 'Error writing files to the working directory'
+            raise RepositoryError(msg) from e
+
+        self._record_checkout(cache, plan, written)
+
+        write_ref(self.head_file(), branch_ref(branch) if branch is not None else commit_hash)
+
+        return CheckoutResult(commit_hash, branch, len(written), len(plan.removed_files))
+
+    def _checkout_conflicts(self, plan: CheckoutPlan, cache: DirCache) -> list[str]:
+        """Find the paths a checkout would clobber.
+
+        A tracked file conflicts if its content differs from the HEAD tree, and a new file conflicts if
+        something already exists at its path, except a tracked directory the checkout removes that holds no
+        untracked entries. Only the paths touched by the checkout are examined.
+
+        :param plan: The checkout plan.
+        :param cache: The directory cache, used to avoid hashing files with unchanged stat data.
+        :return: The keys of the conflicting paths."""
+        conflicts = []
+
+        for key, head_hash in plan.tracked.items():
+            path = self.working_dir / key
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+
+            if path.is_dir():
+                conflicts.append(key)
+                continue
+
+            parent, _, name = key.rpartition('/')
+            current_hash = cache.lookup_file(parent, name, file_signature(st)) or hash_file(path)
+            if current_hash != head_hash:
+                conflicts.append(key)
+
+        removed_dirs = set(plan.removed_dirs)
+        for key in plan.writes.keys() - plan.tracked.keys():
+            path = self.working_dir / key
+            if key in removed_dirs and path.is_dir() and not path.is_symlink():
+                if self._holds_untracked(key, plan.tracked, removed_dirs):
+                    conflicts.append(key)
+            elif os.path.lexists(path):
+                conflicts.append(key)
+
+        return conflicts
+
+    def _holds_untracked(self, key: str, tracked: Mapping[str, str], removed_dirs: set[str]) -> bool:
+        """Check whether a directory the checkout removes holds entries that are not removed with it.
+
+        :param key: The key of the directory.
+        :param tracked: The tracked files of the checkout plan.
+        :param removed_dirs: The directories the checkout removes.
+        :return: True if an entry below the directory is neither a tracked file nor a removed directory."""
+        stack = [key]
+        while stack:
+            current = stack.pop()
+            with os.scandir(self.working_dir / current) as entries:
+                for entry in entries:
+                    entry_key = child_key(current, entry.name)
+                    if entry_key in removed_dirs and entry.is_dir(follow_symlinks=False):
+                        stack.append(entry_key)
+                    elif entry_key not in tracked or entry.is_dir(follow_symlinks=False):
+                        return True
+
+        return False
+
+    def _record_checkout(self, cache: DirCache, plan: CheckoutPlan, written: dict[str, FileSignature]) -> None:
+        """Record the checked out trees and the fresh stat data of the written files in the directory cache.
+
+        The directory signatures are left unknown, so every touched directory is listed again by the next walk
+        and untracked files in it are not missed. Its files are not hashed again unless they changed since.
+
+        :param cache: The directory cache.
+        :param plan: The checkout plan.
+        :param written: The stat signatures of the written files."""
+        for key in plan.removed_dirs:
+            cache.discard_subtree(key)
+
+        for key, (tree, tree_hash) in plan.trees.items():
+            previous = cache.entries.get(key)
+            files: dict[str, tuple[FileSignature, str]] = {}
+            dirs: dict[str, str] = {}
+
+            for name, record in tree.records.items():
+                if record.type == TreeRecordType.TREE:
+                    dirs[name] = record.hash
+                    continue
+
+                path = child_key(key, name)
+                if path in written:
+                    files[name] = (written[path], record.hash)
+                elif previous is not None and name in previous.files and previous.files[name][1] == record.hash:
+                    files[name] = previous.files[name]
+                else:
+                    files[name] = (UNKNOWN_FILE_SIGNATURE, record.hash)
+
+            cache.entries[key] = CachedDir(UNKNOWN_DIR_SIGNATURE, tree_hash, files, dirs,
+                                           previous.ignore_fp if previous is not None else '')
+
+        cache.save()
+
+    def _load_stored_tree(self, tree_hash: str) -> Tree:
+        return load_tree(self.objects_dir(), tree_hash)
+
+    def _touches(self, tree_hash1: str | None, tree_hash2: str, pathspec: Pathspec) -> bool:
+        """Check whether two stored trees differ within a pathspec, stopping at the first difference.
+
+        :param tree_hash1: The hash of the first tree, or None for an empty tree.
+        :param tree_hash2: The hash of the second tree.
+        :param pathspec: The pathspec.
+        :return: True if a selected path differs."""
+        if tree_hash1 == tree_hash2:
+            return False
+
+        tree1 = self._load_stored_tree(tree_hash1) if tree_hash1 else None
+        tree2 = self._load_stored_tree(tree_hash2)
+        changes = iter_tree_changes(tree1, tree2, self._load_stored_tree, self._load_stored_tree, pathspec)
+
+        return next(changes, None) is not None
+
+    def _diff_trees(self, tree1: Tree | None, tree2: Tree | None, load_tree1: Callable[[str], Tree],
+                    load_tree2: Callable[[str], Tree], pathspec: Pathspec | None = None) -> list[Diff]:
+        """Generate a diff between two trees.
+
+        :param tree1: The first tree, or None for an empty tree.
+        :param tree2: The second tree, or None for an empty tree.
+        :param load_tree1: Loads a subtree of the first tree by hash.
+        :param load_tree2: Loads a subtree of the second tree by hash.
+        :param pathspec: Limits the diff to the selected paths. Subtrees that cannot hold selected paths are
+            never loaded.
+        :return: A list of Diff objects representing the differences between the two trees.
+        :raises RepositoryError: If a subtree cannot be loaded."""
         top_level_diff = Diff(TreeRecord(TreeRecordType.TREE, '', ''), None, [])
-        stack = [(tree1, tree2, top_level_diff)]
+        stack = [('', tree1, tree2, top_level_diff)]
 
-        potentially_added: dict[str, Diff] = {}
-        potentially_removed: dict[str, Diff] = {}
+        # Moves are paired up through per-hash indexes, and each half of a move is replaced in place through its
+        # position in its parent's children, so a mass move costs O(N) rather than rebuilding the children per move
+        potentially_added = _MoveCandidates()
+        potentially_removed = _MoveCandidates()
 
         while stack:
-            current_tree1, current_tree2, parent_diff = stack.pop()
+            key, current_tree1, current_tree2, parent_diff = stack.pop()
             records1 = current_tree1.records if current_tree1 else {}
             records2 = current_tree2.records if current_tree2 else {}
 
+            if pathspec is not None:
+                records1, records2 = select_records(pathspec, key, records1, records2)
+
             for name, record1 in records1.items():
                 if name not in records2:
                     local_diff: Diff
 
                     # This name is no longer in the tree, so it was either moved or removed
                     # Have we seen this hash before as a potentially-added record?
-                    if record1.hash in potentially_added:
-                        added_diff = potentially_added[record1.hash]
-                        del potentially_added[record1.hash]
+                    match = potentially_added.pop(record1)
+                    if match is not None:
+                        added_diff, index = match
 
                         local_diff = MovedToDiff(record1, parent_diff, [], None)
                         moved_from_diff = MovedFromDiff(added_diff.record, added_diff.parent, [], local_diff)
                         local_diff.moved_to = moved_from_diff
 
                         # Replace the original added diff with a moved-from diff
-                        added_diff.parent.children = (
-                            [_ if _.record.hash != record1.hash
-                             else moved_from_diff
-                             for _ in added_diff.parent.children])
+                        added_diff.parent.children[index] = moved_from_diff
 
                     else:
                         local_diff = RemovedDiff(record1, parent_diff, [])
-                        potentially_removed[record1.hash] = local_diff
+                        potentially_removed.add(local_diff, len(parent_diff.children))
 
                     parent_diff.children.append(local_diff)
                 else:
@@ -594,13 +1998,13 @@ class Repository:
                         subtree_diff = ModifiedDiff(record1, parent_diff, [])
 
                         try:
-                            tree1 = load_tree(self.objects_dir(), record1.hash)
-                            tree2 = load_tree(self.objects_dir(), record2.hash)
+                            subtree1 = load_tree1(record1.hash)
+                            subtree2 = load_tree2(record2.hash)
                         except Exception as e:
                             msg = 'Error loading subtree for diff'
                             raise RepositoryError(msg) from e
 
-                        stack.append((tree1, tree2, subtree_diff))
+                        stack.append((child_key(key, name), subtree1, subtree2, subtree_diff))
                         parent_diff.children.append(subtree_diff)
                     else:
                         modified_diff = ModifiedDiff(record1, parent_diff, [])
@@ -611,24 +2015,21 @@ class Repository:
                     # This name is in the new tree but not in the old tree, so it was either
                     # added or moved
                     # If we've already seen this hash, it was moved, so convert the original
-                    # added diff to a moved diff
-                    if record2.hash in potentially_removed:
-                        removed_diff = potentially_removed[record2.hash]
-                        del potentially_removed[record2.hash]
+                    # removed diff to a moved diff
+                    match = potentially_removed.pop(record2)
+                    if match is not None:
+                        removed_diff, index = match
 
                         local_diff = MovedFromDiff(record2, parent_diff, [], None)
                         moved_to_diff = MovedToDiff(removed_diff.record, removed_diff.parent, [], local_diff)
                         local_diff.moved_from = moved_to_diff
 
-                        # Create a new diff for the moved record
-                        removed_diff.parent.children = (
-                            [_ if _.record.hash != record2.hash
-                             else moved_to_diff
-                             for _ in removed_diff.parent.children])
+                        # Replace the original removed diff with a moved-to diff
+                        removed_diff.parent.children[index] = moved_to_diff
 
                     else:
                         local_diff = AddedDiff(record2, parent_diff, [])
-                        potentially_added[record2.hash] = local_diff
+                        potentially_added.add(local_diff, len(parent_diff.children))
 
                     parent_diff.children.append(local_diff)
 
@@ -645,6 +2046,52 @@ class Repository:
 
         :return: The path to the HEAD file."""
         return self.repo_path() / HEAD_FILE
+
+    def dircache_file(self) -> Path:
+        """Get the path to the directory cache file within the repository.
+
+        :return: The path to the directory cache file."""
+        return self.repo_path() / DIRCACHE_FILE
+
+    def packed_refs_file(self) -> Path:
+        """Get the path to the packed-refs file within the repository.
+
+        :return: The path to the packed-refs file."""
+        return self.repo_path() / PACKED_REFS_FILE
+
+    def objindex_dir(self) -> Path:
+        """Get the path to the object index directory within the repository.
+
+        :return: The path to the object index directory."""
+        return self.repo_path() / OBJINDEX_DIR
+
+    def diffcache_dir(self) -> Path:
+        """Get the path to the tree diff cache directory within the repository.
+
+        :return: The path to the tree diff cache directory."""
+        return self.repo_path() / DIFFCACHE_DIR
+
+    def signatures_file(self) -> Path:
+        """Get the path to the MinHash signature cache file within the repository.
+
+        :return: The path to the signature cache file."""
+        return self.repo_path() / SIGNATURES_FILE
+
+    @requires_repo
+    def change_tracker(self) -> ChangeTracker:
+        """Get the tracker of changed directories maintained by `caf watch`.
+
+        :return: The change tracker of the working directory.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        return ChangeTracker(self.repo_path() / WATCH_DIR)
+
+    @requires_repo
+    def watcher(self) -> Watcher:
+        """Create an inotify watcher that keeps the change tracker of the working directory up to date.
+
+        :return: The watcher. Call its `run` method to start watching.
+        :raises RepositoryNotFoundError: If the repository does not exist."""
+        return Watcher(self.working_dir, self.change_tracker(), self.ignore_matcher(), IGNORE_FILE)
     
     def users_dir(self) -> Path:
         """Get the path to the users directory within the repository.
@@ -830,6 +2277,330 @@ class Repository:
         rebuild_commit_likes_cache(self.repo_path())
 
 
+def iter_tree_changes(tree1: Tree | None, tree2: Tree | None, load_tree1: Callable[[str], Tree],
+                      load_tree2: Callable[[str], Tree], pathspec: Pathspec | None = None) -> Iterator[DiffEntry]:
+    """Stream the differences between two trees in depth-first order, with siblings sorted by name.
+
+    Added and removed directories are reported as a single entry. A modified directory is reported before the
+    entries below it, and its subtrees are loaded only when the traversal reaches them.
+
+    :param tree1: The first tree, or None for an empty tree.
+    :param tree2: The second tree, or None for an empty tree.
+    :param load_tree1: Loads a subtree of the first tree by hash.
+    :param load_tree2: Loads a subtree of the second tree by hash.
+    :param pathspec: Limits the differences to the selected paths. Subtrees that cannot hold selected paths are
+        never loaded.
+    :return: An iterator over the differences, without move detection.
+    :raises RepositoryError: If a subtree cannot be loaded."""
+
+    def level(key: str, level_tree1: Tree | None,
+              level_tree2: Tree | None) -> Iterator[tuple[str, TreeRecord | None, TreeRecord | None]]:
+        records1 = level_tree1.records if level_tree1 else {}
+        records2 = level_tree2.records if level_tree2 else {}
+        if pathspec is not None:
+            records1, records2 = select_records(pathspec, key, records1, records2)
+
+        for name in sorted(records1.keys() | records2.keys()):
+            yield child_key(key, name), records1.get(name), records2.get(name)
+
+    stack = [level('', tree1, tree2)]
+
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            continue
+
+        path, record1, record2 = item
+        if record1 is None:
+            yield DiffEntry(DiffKind.ADDED, None, path, None, record2)
+        elif record2 is None:
+            yield DiffEntry(DiffKind.REMOVED, path, None, record1, None)
+        elif record1.hash != record2.hash:
+            yield DiffEntry(DiffKind.MODIFIED, path, path, record1, record2)
+
+            if record1.type == TreeRecordType.TREE and record2.type == TreeRecordType.TREE:
+                try:
+                    subtree1 = load_tree1(record1.hash)
+                    subtree2 = load_tree2(record2.hash)
+                except Exception as e:
+                    msg = 'Error loading subtree for diff'
+                    raise RepositoryError(msg) from e
+
+                stack.append(level(path, subtree1, subtree2))
+
+
+def pair_moves(entries: Iterable[DiffEntry], window: int = DEFAULT_MOVE_WINDOW) -> Iterator[DiffEntry]:
+    """Turn added and removed entries with the same hash into moved entries, holding back a bounded number of them.
+
+    Every other entry passes through at once. An added or removed entry is held back until an entry of the other
+    kind with the same hash arrives, and the moved entry is yielded in its place. When more than `window` entries
+    are held back, the oldest one is yielded unpaired; the rest are yielded in order once the input ends.
+
+    :param entries: The entries to pair up.
+    :param window: The maximum number of entries to hold back.
+    :return: An iterator over the entries, with moves paired up."""
+    # Held back entries in arrival order, and their sequence numbers by kind and hash, oldest first
+    pending: OrderedDict[int, DiffEntry] = OrderedDict()
+    by_hash: dict[tuple[DiffKind, str], deque[int]] = {}
+
+    def take(key: tuple[DiffKind, str]) -> DiffEntry:
+        candidates = by_hash[key]
+        entry = pending.pop(candidates.popleft())
+        if not candidates:
+            del by_hash[key]
+        return entry
+
+    for seq, entry in enumerate(entries):
+        if entry.kind == DiffKind.ADDED:
+            entry_hash = entry.new_record.hash
+            other = (DiffKind.REMOVED, entry_hash)
+        elif entry.kind == DiffKind.REMOVED:
+            entry_hash = entry.old_record.hash
+            other = (DiffKind.ADDED, entry_hash)
+        else:
+            yield entry
+            continue
+
+        if other in by_hash:
+            partner = take(other)
+            removed, added = (partner, entry) if entry.kind == DiffKind.ADDED else (entry, partner)
+            yield DiffEntry(DiffKind.MOVED, removed.old_path, added.new_path, removed.old_record, added.new_record)
+            continue
+
+        pending[seq] = entry
+        by_hash.setdefault((entry.kind, entry_hash), deque()).append(seq)
+
+        if len(pending) > window:
+            # The oldest held back entry is always the first of its own queue
+            oldest = next(iter(pending.values()))
+            oldest_hash = (oldest.new_record or oldest.old_record).hash
+            yield take((oldest.kind, oldest_hash))
+
+    yield from pending.values()
+
+
+def pair_moves_external(entries: Iterable[DiffEntry], spill_dir: Path,
+                        memory_limit: int = DEFAULT_DIFF_MEMORY_LIMIT) -> Iterator[DiffEntry]:
+    """Turn every added and removed entry with the same hash into moved entries, holding a bounded number of
+    entries in memory.
+
+    Every other entry passes through at once. Added and removed entries are sorted by hash and arrival on disk,
+    then merge joined, pairing the n-th removed entry of a hash with the n-th added one as `pair_moves` does with
+    an unbounded window. The moved and unpaired entries are sorted back into arrival order on disk, where a move
+    takes the place of the later of its two entries, and yielded once the input ends.
+
+    :param entries: The entries to pair up.
+    :param spill_dir: The directory in which a temporary directory for run files is created.
+    :param memory_limit: The maximum number of entries held in memory, besides a chunk per run being merged.
+    :return: An iterator over the entries, with moves paired up."""
+    with tempfile.TemporaryDirectory(prefix='diff-', dir=spill_dir) as tmp:
+        # Rows are (hash, sequence number, path, record type), so runs sort by hash and then by arrival
+        removed = ExternalSorter(Path(tmp), max(memory_limit // 2, 1))
+        added = ExternalSorter(Path(tmp), max(memory_limit // 2, 1))
+
+        for seq, entry in enumerate(entries):
+            if entry.kind == DiffKind.REMOVED:
+                removed.add((entry.old_record.hash, seq, entry.old_path, entry.old_record.type.value))
+            elif entry.kind == DiffKind.ADDED:
+                added.add((entry.new_record.hash, seq, entry.new_path, entry.new_record.type.value))
+            else:
+                yield entry
+
+        if removed.runs or added.runs:
+            # The buffers of both sides would otherwise be held in memory through the whole join
+            removed.spill()
+            added.spill()
+
+        # Rows are (sequence number, kind, old path, new path, old type, old hash, new type, new hash)
+        joined = ExternalSorter(Path(tmp), memory_limit)
+        removed_rows = removed.sorted()
+        added_rows = added.sorted()
+        removed_row = next(removed_rows, None)
+        added_row = next(added_rows, None)
+
+        while removed_row is not None or added_row is not None:
+            if added_row is None or (removed_row is not None and removed_row[0] < added_row[0]):
+                removed_hash, seq, path, record_type = removed_row
+                joined.add((seq, DiffKind.REMOVED.value, path, None, record_type, removed_hash, None, None))
+                removed_row = next(removed_rows, None)
+            elif removed_row is None or added_row[0] < removed_row[0]:
+                added_hash, seq, path, record_type = added_row
+                joined.add((seq, DiffKind.ADDED.value, None, path, None, None, record_type, added_hash))
+                added_row = next(added_rows, None)
+            else:
+                entry_hash, removed_seq, old_path, old_type = removed_row
+                _, added_seq, new_path, new_type = added_row
+                joined.add((max(removed_seq, added_seq), DiffKind.MOVED.value, old_path, new_path, old_type,
+                            entry_hash, new_type, entry_hash))
+                removed_row = next(removed_rows, None)
+                added_row = next(added_rows, None)
+
+        for _, kind, old_path, new_path, old_type, old_hash, new_type, new_hash in joined.sorted():
+            old_record = None if old_path is None else TreeRecord(_RECORD_TYPES[old_type], old_hash,
+                                                                  old_path.rpartition('/')[2])
+            new_record = None if new_path is None else TreeRecord(_RECORD_TYPES[new_type], new_hash,
+                                                                  new_path.rpartition('/')[2])
+            yield DiffEntry(DiffKind(kind), old_path, new_path, old_record, new_record)
+
+
+def pair_diff_moves(top_level_diff: Diff) -> None:
+    """Pair removed and added diffs with the same hash into moves, in place.
+
+    Levels and entries are visited in the order `_diff_trees` visits them while comparing, so a diff built
+    without pairing moves ends up paired exactly as `_diff_trees` would have paired it.
+
+    :param top_level_diff: The diff holding the top level diffs as its children."""
+    potentially_added = _MoveCandidates()
+    potentially_removed = _MoveCandidates()
+    stack = [top_level_diff]
+
+    while stack:
+        parent_diff = stack.pop()
+        children = parent_diff.children
+
+        for index, diff in enumerate(children):
+            if isinstance(diff, ModifiedDiff):
+                stack.append(diff)
+            elif isinstance(diff, RemovedDiff):
+                match = potentially_added.pop(diff.record)
+                if match is None:
+                    potentially_removed.add(diff, index)
+                    continue
+
+                added_diff, added_index = match
+                moved_to_diff = MovedToDiff(diff.record, parent_diff, [], None)
+                moved_from_diff = MovedFromDiff(added_diff.record, added_diff.parent, [], moved_to_diff)
+                moved_to_diff.moved_to = moved_from_diff
+                children[index] = moved_to_diff
+                added_diff.parent.children[added_index] = moved_from_diff
+
+        for index, diff in enumerate(children):
+            if not isinstance(diff, AddedDiff):
+                continue
+
+            match = potentially_removed.pop(diff.record)
+            if match is None:
+                potentially_added.add(diff, index)
+                continue
+
+            removed_diff, removed_index = match
+            moved_from_diff = MovedFromDiff(diff.record, parent_diff, [], None)
+            moved_to_diff = MovedToDiff(removed_diff.record, removed_diff.parent, [], moved_from_diff)
+            moved_from_diff.moved_from = moved_to_diff
+            children[index] = moved_from_diff
+            removed_diff.parent.children[removed_index] = moved_to_diff
+
+
+def diffs_from_tree_diff(tree_diff: TreeDiff) -> list[Diff]:
+    """Build the Diff objects of a native tree diff.
+
+    :param tree_diff: The native tree diff.
+    :return: The top level diffs, with their children and the two halves of every move linked up."""
+    top_level_diff = Diff(TreeRecord(TreeRecordType.TREE, '', ''), None, [])
+    # The last diff seen at each depth, so the parent of an entry is the one a level up
+    parents = [top_level_diff]
+    diffs: list[Diff] = []
+
+    for kind, depth, record_type, record_hash, name in zip(tree_diff.kinds, tree_diff.depths, tree_diff.types,
+                                                            tree_diff.hashes, tree_diff.names, strict=True):
+        parent = parents[depth]
+        diff_class = _DIFF_CLASSES[kind]
+        record = TreeRecord(_RECORD_TYPES[record_type], record_hash, name)
+        diff = (diff_class(record, parent, [], None) if kind >= TreeDiffKind.MOVED_TO.value
+                else diff_class(record, parent, []))
+        parent.children.append(diff)
+        diffs.append(diff)
+
+        del parents[depth + 1:]
+        parents.append(diff)
+
+    for diff, partner in zip(diffs, tree_diff.partners, strict=True):
+        if isinstance(diff, MovedToDiff):
+            diff.moved_to = diffs[partner]
+        elif isinstance(diff, MovedFromDiff):
+            diff.moved_from = diffs[partner]
+
+    return top_level_diff.children
+
+
+def pair_similar(entries: Iterable[DiffEntry],
+                 similar_pairs: Callable[[list[str], list[str]], list[tuple[int, int, float]]]) -> Iterator[DiffEntry]:
+    """Turn added and removed files with similar contents into moved entries.
+
+    Every other entry passes through at once. Added and removed files are held back until the input ends, then
+    paired up and yielded in their original order, each move in place of its removed half.
+
+    :param entries: The entries to pair up.
+    :param similar_pairs: Pairs removed and added blob hashes by similarity, returning the indexes of each pair.
+    :return: An iterator over the entries, with similar files paired up into moves."""
+    held: list[DiffEntry | None] = []
+    removed: list[int] = []
+    added: list[int] = []
+
+    for entry in entries:
+        if entry.kind == DiffKind.REMOVED and entry.old_record.type == TreeRecordType.BLOB:
+            removed.append(len(held))
+        elif entry.kind == DiffKind.ADDED and entry.new_record.type == TreeRecordType.BLOB:
+            added.append(len(held))
+        else:
+            yield entry
+            continue
+        held.append(entry)
+
+    pairs = similar_pairs([held[i].old_record.hash for i in removed], [held[i].new_record.hash for i in added])
+    for i, j, _ in pairs:
+        removed_entry, added_entry = held[removed[i]], held[added[j]]
+        held[removed[i]] = DiffEntry(DiffKind.MOVED, removed_entry.old_path, added_entry.new_path,
+                                     removed_entry.old_record, added_entry.new_record)
+        held[added[j]] = None
+
+    yield from (entry for entry in held if entry is not None)
+
+
+def _check_rename_threshold(threshold: float | None) -> None:
+    if threshold is not None and not 0 < threshold <= 1:
+        msg = f'The rename threshold must be above 0 and at most 1, got {threshold}'
+        raise ValueError(msg)
+
+
+def select_records(pathspec: Pathspec, key: str, records1: dict[str, TreeRecord],
+                   records2: dict[str, TreeRecord]) -> tuple[dict[str, TreeRecord], dict[str, TreeRecord]]:
+    """Keep the records of two versions of a directory that a pathspec selects.
+
+    A name is a directory if it is a tree on either side, so it is kept or dropped on both sides at once.
+
+    :param pathspec: The pathspec.
+    :param key: The path of the directory.
+    :param records1: The records of the first version.
+    :param records2: The records of the second version.
+    :return: The kept records of both versions."""
+    if key and pathspec.matches(key):
+        # Everything below a selected directory is selected too
+        return records1, records2
+
+    def selected(name: str) -> bool:
+        is_dir = any(records.get(name) is not None and records[name].type == TreeRecordType.TREE
+                     for records in (records1, records2))
+        return pathspec.selects(child_key(key, name), is_dir)
+
+    kept = {name for name in records1.keys() | records2.keys() if selected(name)}
+
+    return ({name: record for name, record in records1.items() if name in kept},
+            {name: record for name, record in records2.items() if name in kept})
+
+
+def cached_tree(entry: CachedDir) -> Tree:
+    """Build the tree of a directory from its directory cache entry.
+
+    :param entry: The cache entry of the directory.
+    :return: The Tree object whose hash is `entry.tree_hash`."""
+    records = {name: TreeRecord(TreeRecordType.BLOB, blob_hash, name) for name, (_, blob_hash) in entry.files.items()}
+    records.update({name: TreeRecord(TreeRecordType.TREE, tree_hash, name) for name, tree_hash in entry.dirs.items()})
+
+    return Tree(records)
+
+
 def branch_ref(branch: str) -> SymRef:
     """Create a symbolic reference for a branch name.
 
@@ -0,0 +1,169 @@
+"""Similarity-based rename detection with MinHash signatures and locality-sensitive hashing."""
+
+import os
+import struct
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+
+from .constants import HASH_LENGTH, MINHASH_BANDS
+
+SIGNATURE_CACHE_MAGIC = b'CAFSIG'
+SIGNATURE_CACHE_VERSION = 1
+
+# The MinHash signature of a blob, empty for blobs that cannot be compared
+Signature = tuple[int, ...]
+
+_HEADER = struct.Struct('<6sHI')
+
+
+class SignatureCache:
+    """A persistent cache of MinHash signatures keyed by blob hash.
+
+    Blobs never change, so an entry never goes stale. The file starts with a header holding the signature size,
+    followed by fixed-size records of a hash, a flag for empty signatures and the signature values. New entries
+    are appended, and a truncated last record, left by an interrupted write, is ignored."""
+
+    def __init__(self, cache_file: Path, num_hashes: int) -> None:
+        """Initialize an empty cache bound to a file. Use `SignatureCache.load` to read an existing cache.
+
+        :param cache_file: The path to the cache file.
+        :param num_hashes: The number of values in each signature."""
+        self.cache_file = cache_file
+        self.num_hashes = num_hashes
+        self._record = struct.Struct(f'<{HASH_LENGTH}s?{num_hashes}Q')
+        self._signatures: dict[str, Signature] = {}
+        self._new: list[str] = []
+        self._appendable = False
+
+    @classmethod
+    def load(cls, cache_file: Path, num_hashes: int) -> 'SignatureCache':
+        """Load a cache from disk. A missing or unreadable file, or one with another signature size, yields an
+        empty cache.
+
+        :param cache_file: The path to the cache file.
+        :param num_hashes: The number of values in each signature.
+        :return: The loaded cache."""
+        cache = cls(cache_file, num_hashes)
+
+        try:
+            data = cache_file.read_bytes()
+        except OSError:
+            return cache
+
+        if len(data) < _HEADER.size or _HEADER.unpack_from(data) != (SIGNATURE_CACHE_MAGIC, SIGNATURE_CACHE_VERSION,
+                                                                      num_hashes):
+            return cache
+
+        record_size = cache._record.size
+        end = _HEADER.size + (len(data) - _HEADER.size) // record_size * record_size
+        for blob_hash, empty, *values in cache._record.iter_unpack(data[_HEADER.size:end]):
+            cache._signatures[blob_hash.decode('ascii')] = () if empty else tuple(values)
+        # Appending after a truncated record would misalign every later record
+        cache._appendable = end == len(data)
+
+        return cache
+
+    def get(self, blob_hash: str) -> Signature | None:
+        """Get the cached signature of a blob.
+
+        :param blob_hash: The hash of the blob.
+        :return: The signature, or None if it is not cached."""
+        return self._signatures.get(blob_hash)
+
+    def add(self, blob_hash: str, signature: Sequence[int]) -> None:
+        """Cache the signature of a blob.
+
+        :param blob_hash: The hash of the blob.
+        :param signature: The signature, or an empty one for a blob that cannot be compared."""
+        if blob_hash not in self._signatures:
+            self._signatures[blob_hash] = tuple(signature)
+            self._new.append(blob_hash)
+
+    def save(self) -> None:
+        """Write the entries added since the cache was loaded to disk."""
+        if not self._new:
+            return
+
+        if self._appendable:
+            with self.cache_file.open('ab') as f:
+                f.write(b''.join(self._pack(blob_hash) for blob_hash in self._new))
+        else:
+            header = _HEADER.pack(SIGNATURE_CACHE_MAGIC, SIGNATURE_CACHE_VERSION, self.num_hashes)
+            data = header + b''.join(self._pack(blob_hash) for blob_hash in self._signatures)
+            # A unique temporary name keeps concurrent writers from renaming each other's files
+            fd, tmp_name = tempfile.mkstemp(prefix=f'{self.cache_file.name}.', suffix='.tmp',
+                                            dir=self.cache_file.parent)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_name, self.cache_file)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+            self._appendable = True
+
+        self._new.clear()
+
+    def _pack(self, blob_hash: str) -> bytes:
+        signature = self._signatures[blob_hash]
+        return self._record.pack(blob_hash.encode('ascii'), not signature, *(signature or (0,) * self.num_hashes))
+
+
+def estimate_similarity(signature1: Signature, signature2: Signature) -> float:
+    """Estimate the Jaccard similarity of the line sets behind two signatures.
+
+    :param signature1: The first signature.
+    :param signature2: The second signature.
+    :return: The fraction of matching signature values, or 0 if either signature is empty."""
+    if not signature1 or not signature2:
+        return 0.0
+
+    return sum(value1 == value2 for value1, value2 in zip(signature1, signature2, strict=True)) / len(signature1)
+
+
+def find_similar_pairs(removed: Sequence[Signature], added: Sequence[Signature], threshold: float,
+                       bands: int = MINHASH_BANDS) -> list[tuple[int, int, float]]:
+    """Pair removed and added blobs whose contents are similar, without comparing every pair.
+
+    Each signature is split into bands, and only blobs that agree on a whole band become candidates. The
+    candidates are confirmed against the threshold, then paired one to one, most similar first.
+
+    :param removed: The signatures of the removed blobs.
+    :param added: The signatures of the added blobs.
+    :param threshold: The minimum estimated similarity of a pair, between 0 and 1.
+    :param bands: The number of bands the signatures are split into.
+    :return: The index of the removed blob, the index of the added blob and their similarity for each pair."""
+    buckets: dict[tuple[int, tuple[int, ...]], list[int]] = {}
+    for i, signature in enumerate(removed):
+        if signature:
+            rows = len(signature) // bands
+            for band in range(bands):
+                buckets.setdefault((band, signature[band * rows:(band + 1) * rows]), []).append(i)
+
+    scored: list[tuple[float, int, int]] = []
+    for j, signature in enumerate(added):
+        if not signature:
+            continue
+
+        rows = len(signature) // bands
+        candidates = set()
+        for band in range(bands):
+            candidates.update(buckets.get((band, signature[band * rows:(band + 1) * rows]), ()))
+
+        for i in candidates:
+            similarity = estimate_similarity(removed[i], signature)
+            if similarity >= threshold:
+                scored.append((similarity, i, j))
+
+    scored.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    paired_removed: set[int] = set()
+    paired_added: set[int] = set()
+    pairs = []
+    for similarity, i, j in scored:
+        if i not in paired_removed and j not in paired_added:
+            paired_removed.add(i)
+            paired_added.add(j)
+            pairs.append((i, j, similarity))
+
+    return pairs
@@ -0,0 +1,437 @@
+"""inotify-backed tracking of changed directories in the working directory."""
+
+import ctypes
+import ctypes.util
+import fcntl
+import json
+import os
+import select
+import struct
+import tempfile
+import termios
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from .dircache import child_key, is_below
+from .ignore import IgnoreMatcher
+
+# Marker written to the journal when the dirty set is incomplete and consumers must walk everything.
+# Directory keys are relative paths, so they never start with a slash.
+FULL_WALK = '/'
+ROOT_KEY = '.'
+
+# Consumers create a cookie file with this prefix at the top of the working directory, and the watcher journals
+# its name after a slash once it sees the file, so every change made before the cookie is in the journal too
+SYNC_COOKIE_PREFIX = '.caf-sync-'
+SYNC_TIMEOUT_NS = 2 * 1_000_000_000
+
+# A watcher whose heartbeat is older than this is considered hung
+STALE_HEARTBEAT_NS = 5 * 1_000_000_000
+HEARTBEAT_INTERVAL_NS = 1_000_000_000
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+class WatchError(Exception):
+    """Exception raised for change tracker errors."""
+
+
+class ChangeTracker:
+    """The persistent dirty-directory set shared by the watcher and its consumers.
+
+    The watcher appends the cache keys of directories whose entries changed to a journal file.
+    Consumers read the journal, revisit only those directories, and then drop the part they consumed."""
+
+    def __init__(self, watch_dir: Path) -> None:
+        """Initialize a tracker stored in the given directory.
+
+        :param watch_dir: The directory holding the journal and state files."""
+        self.watch_dir = watch_dir
+
+    def journal_file(self) -> Path:
+        """Get the path of the journal of dirty directory keys."""
+        return self.watch_dir / 'dirty'
+
+    def state_file(self) -> Path:
+        """Get the path of the state published by the watcher."""
+        return self.watch_dir / 'state'
+
+    def read_state(self) -> dict | None:
+        """Read the last state published by the watcher.
+
+        :return: The state, or None if no watcher ever ran."""
+        try:
+            return json.loads(self.state_file().read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def write_state(self, state: dict) -> None:
+        """Atomically publish the watcher state.
+
+        :param state: The state to publish."""
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file().with_name('state.tmp')
+        tmp_file.write_text(json.dumps(state), encoding='utf-8')
+        os.replace(tmp_file, self.state_file())
+
+    def is_active(self) -> bool:
+        """Check whether a live watcher is keeping the journal up to date.
+
+        :return: True if the watcher process is alive and its heartbeat is recent."""
+        state = self.read_state()
+        if state is None or not state.get('running'):
+            return False
+
+        try:
+            os.kill(state['pid'], 0)
+        except (OSError, KeyError):
+            return False
+
+        return time.time_ns() - state.get('heartbeat_ns', 0) < STALE_HEARTBEAT_NS
+
+    def mark(self, keys: Iterable[str]) -> None:
+        """Append directory keys to the journal.
+
+        :param keys: The cache keys of the changed directories, or FULL_WALK."""
+        lines = ''.join(f'{key or ROOT_KEY}\n' for key in keys)
+        if not lines:
+            return
+
+        with self._lock():
+            with self.journal_file().open('a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def pending(self, working_dir: Path | None = None,
+                timeout_ns: int = SYNC_TIMEOUT_NS) -> tuple[set[str] | None, int]:
+        """Read the dirty set accumulated since it was last consumed.
+
+        Events reach the journal some time after the changes behind them. Given the working directory, a cookie
+        file is created in it and the journal is only read once the watcher has journaled the cookie, so that
+        every change made before the call is in the dirty set.
+
+        :param working_dir: The watched working directory, or None to read the journal as it is.
+        :param timeout_ns: The longest time to wait for the watcher to journal the cookie.
+        :return: The set of dirty directory keys, or None if a full walk is required, and the journal
+            offset to pass to `consume` once the dirty directories have been revisited."""
+        if not self.is_active():
+            return None, 0
+
+        if working_dir is None:
+            data = self._read_journal()
+        else:
+            data = self._sync(working_dir, timeout_ns)
+            if data is None:
+                return None, 0
+
+        keys = {'' if line == ROOT_KEY else line for line in data.decode('utf-8').splitlines()}
+        if FULL_WALK in keys:
+            return None, len(data)
+
+        return {key for key in keys if not key.startswith(FULL_WALK)}, len(data)
+
+    def consume(self, offset: int) -> None:
+        """Drop the part of the journal that has been consumed, keeping entries appended since.
+
+        :param offset: The offset returned by `pending`."""
+        with self._lock():
+            try:
+                with self.journal_file().open('rb') as f:
+                    f.seek(offset)
+                    rest = f.read()
+            except FileNotFoundError:
+                return
+
+            tmp_file = self.journal_file().with_name('dirty.tmp')
+            tmp_file.write_bytes(rest)
+            os.replace(tmp_file, self.journal_file())
+
+    def pending_count(self) -> int:
+        """Count the distinct directories waiting in the journal.
+
+        :return: The number of dirty directory keys."""
+        try:
+            lines = set(self.journal_file().read_text(encoding='utf-8').splitlines())
+        except FileNotFoundError:
+            return 0
+
+        return len({line for line in lines if line == FULL_WALK or not line.startswith(FULL_WALK)})
+
+    def _read_journal(self) -> bytes:
+        with self._lock():
+            try:
+                with self.journal_file().open('rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                return b''
+
+    def _sync(self, working_dir: Path, timeout_ns: int) -> bytes | None:
+        """Wait until the watcher journals a new cookie file, or give up after a timeout.
+
+        :return: The journal once it holds the cookie, or None if the cookie could not be created or the watcher
+            did not journal it in time."""
+        try:
+            fd, cookie = tempfile.mkstemp(prefix=SYNC_COOKIE_PREFIX, dir=working_dir)
+        except OSError:
+            return None
+
+        try:
+            os.close(fd)
+            marker = f'{FULL_WALK}{os.path.basename(cookie)}\n'.encode()
+            deadline = time.time_ns() + timeout_ns
+            delay = 0.0005
+            while True:
+                data = self._read_journal()
+                if marker in data:
+                    return data
+                if time.time_ns() >= deadline:
+                    return None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.02)
+        finally:
+            try:
+                os.unlink(cookie)
+            except OSError:
+                pass
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.watch_dir / 'lock', os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+
+def dirty_with_ancestors(keys: Iterable[str]) -> set[str]:
+    """Expand a set of dirty directory keys with all of their ancestors.
+
+    :param keys: The dirty directory keys.
+    :return: The keys of every directory on a path from the root to a dirty directory."""
+    affected = {''}
+    for key in keys:
+        while key and key not in affected:
+            affected.add(key)
+            key = key.rpartition('/')[0]
+    return affected
+
+
+class Watcher:
+    """Watch a working directory with inotify and record changed directories in a ChangeTracker."""
+
+    def __init__(self, working_dir: Path, tracker: ChangeTracker, matcher: IgnoreMatcher,
+                 ignore_file_name: str) -> None:
+        """Initialize a watcher. Call `run` to start watching.
+
+        :param working_dir: The working directory to watch.
+        :param tracker: The tracker to record changes in.
+        :param matcher: The ignore matcher of the top of the working directory. Ignored directories are not watched.
+        :param ignore_file_name: The name of ignore files. Changing one re-applies the rules below it."""
+        self.working_dir = working_dir
+        self.tracker = tracker
+        self.matcher = matcher
+        self.ignore_file_name = ignore_file_name
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = -1
+        self._keys: dict[int, str] = {}
+        self._wds: dict[str, int] = {}
+        self._matchers: dict[str, IgnoreMatcher] = {}
+        self.queue_bytes = 0
+        # How long the oldest event of the last batch waited before it was journaled, at most
+        self.lag_ns = 0
+        self.overflows = 0
+
+    def run(self, should_stop: Callable[[], bool], poll_interval_ms: int = 200) -> None:
+        """Watch until `should_stop` returns True.
+
+        Consumers are told to do a full walk when the watcher starts, since changes made while no watcher
+        was running were missed, and again after every queue overflow.
+
+        :param should_stop: Polled between batches of events.
+        :param poll_interval_ms: The maximum time to wait for events between polls.
+        :raises WatchError: If inotify is not available."""
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            msg = f'inotify_init1 failed: {os.strerror(ctypes.get_errno())}'
+            raise WatchError(msg)
+
+        started_ns = time.time_ns()
+        try:
+            self._add_tree('')
+            self.tracker.mark([FULL_WALK])
+
+            poller = select.poll()
+            poller.register(self._fd, select.POLLIN)
+            last_heartbeat = 0
+            drained_ns = time.time_ns()
+
+            while not should_stop():
+                # Events already queued before the wait arrived after the last drain at the earliest; otherwise
+                # the wait ends as soon as the first one arrives
+                queued = self._queued_bytes() > 0
+                if poller.poll(poll_interval_ms):
+                    oldest_ns = drained_ns if queued else time.time_ns()
+                    self.queue_bytes = self._queued_bytes()
+                    dirty = self._read_events()
+                    drained_ns = time.time_ns()
+                    self.tracker.mark(dirty)
+                    self.lag_ns = time.time_ns() - oldest_ns
+                else:
+                    self.queue_bytes = 0
+                    self.lag_ns = 0
+                    drained_ns = time.time_ns()
+
+                now = time.time_ns()
+                if now - last_heartbeat >= HEARTBEAT_INTERVAL_NS:
+                    self._publish(started_ns, now, running=True)
+                    last_heartbeat = now
+        finally:
+            self._publish(started_ns, time.time_ns(), running=False)
+            os.close(self._fd)
+            self._fd = -1
+
+    def _publish(self, started_ns: int, now: int, *, running: bool) -> None:
+        self.tracker.write_state({
+            'pid': os.getpid(),
+            'running': running,
+            'started_ns': started_ns,
+            'heartbeat_ns': now,
+            'watches': len(self._wds),
+            'queue_bytes': self.queue_bytes,
+            'lag_ns': self.lag_ns,
+            'overflows': self.overflows,
+        })
+
+    def _queued_bytes(self) -> int:
+        buf = bytearray(4)
+        fcntl.ioctl(self._fd, termios.FIONREAD, buf)
+        return int.from_bytes(buf, 'little')
+
+    def _read_events(self) -> set[str]:
+        dirty: set[str] = set()
+
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+                offset += name_len
+
+                dirty.update(self._handle_event(wd, mask, name))
+
+        return dirty
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> set[str]:
+        if mask & IN_Q_OVERFLOW:
+            self.overflows += 1
+            return {FULL_WALK}
+
+        key = self._keys.get(wd)
+        if key is None:
+            return set()
+
+        if mask & IN_IGNORED:
+            self._forget(key)
+            return set()
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # The root itself went away, nothing below it can be trusted anymore
+            return {FULL_WALK} if not key else set()
+        if not key and name.startswith(SYNC_COOKIE_PREFIX):
+            # Cookies are not part of the working directory, only their creation is journaled
+            return {f'{FULL_WALK}{name}'} if mask & IN_CREATE else set()
+        if name == self.ignore_file_name:
+            # Directories below may have been ignored or un-ignored, so watch them again and revisit them all
+            self._remove_tree(key)
+            return {key} | self._add_tree(key)
+        if self._matchers[key].is_ignored(key, name, is_dir=bool(mask & IN_ISDIR)):
+            return set()
+
+        dirty = {key}
+        if mask & IN_ISDIR:
+            sub_key = child_key(key, name)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove_tree(sub_key)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                # Entries created before the watch was added produce no events, so the whole new
+                # subtree is dirty
+                dirty.update(self._add_tree(sub_key))
+
+        return dirty
+
+    def _add_tree(self, key: str) -> set[str]:
+        added: set[str] = set()
+        stack = [key]
+
+        while stack:
+            current = stack.pop()
+            path = self.working_dir / current if current else self.working_dir
+            parent = current.rpartition('/')[0]
+            matcher = self._matchers.get(parent, self.matcher) if current else self.matcher
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if errno in {2, 20}:  # ENOENT, ENOTDIR: removed or replaced before we got to it
+                    continue
+                msg = f'Cannot watch {path}: {os.strerror(errno)}'
+                raise WatchError(msg)
+
+            matcher = matcher.child(current, path, self.ignore_file_name)
+            self._keys[wd] = current
+            self._wds[current] = wd
+            self._matchers[current] = matcher
+            added.add(current)
+
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if (entry.is_dir(follow_symlinks=False) and
+                                not matcher.is_ignored(current, entry.name, is_dir=True)):
+                            stack.append(child_key(current, entry.name))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+        return added
+
+    def _remove_tree(self, key: str) -> None:
+        for sub_key in [k for k in self._wds if is_below(k, key)]:
+            self._libc.inotify_rm_watch(self._fd, self._wds[sub_key])
+            self._forget(sub_key)
+
+    def _forget(self, key: str) -> None:
+        wd = self._wds.pop(key, None)
+        if wd is not None:
+            self._keys.pop(wd, None)
+        self._matchers.pop(key, None)
@@ -3,10 +3,17 @@
 #include "caf.h"
 #include "hash_types.h"
 #include "object_io.h" 
+#include "line_diff.h"
+#include "tree_diff.h"
 
 using namespace std;
 namespace py = pybind11;
 
+template <typename T>
+static py::bytes column_bytes(const vector<T>& column) {
+    return py::bytes(reinterpret_cast<const char*>(column.data()), column.size() * sizeof(T));
+}
+
 PYBIND11_MODULE(_libcaf, m) {
     // caf
     m.def("hash_file", hash_file);
@@ -16,6 +23,10 @@ PYBIND11_MODULE(_libcaf, m) {
     m.def("open_content_for_writing", open_content_for_writing);
     m.def("delete_content", delete_content);
     m.def("open_content_for_reading", open_content_for_reading);
+    m.def("copy_stats", copy_stats);
+    m.def("reset_copy_stats", reset_copy_stats);
+    m.def("large_file_threshold", large_file_threshold);
+    m.def("set_large_file_threshold", set_large_file_threshold);
 
     // hash_types
     m.def("hash_object", py::overload_cast<const Blob&>(&hash_object), py::arg("blob"));
@@ -28,6 +39,73 @@ PYBIND11_MODULE(_libcaf, m) {
     m.def("save_tree", &save_tree);
     m.def("load_tree", &load_tree);
 
+    // tree_diff
+    m.def("diff_trees", &diff_trees, py::call_guard<py::gil_scoped_release>());
+    m.def("diff_columns", &diff_columns, py::call_guard<py::gil_scoped_release>());
+
+    // line_diff
+    // The diffs run without the GIL, so several files can be diffed at once from a thread pool
+    m.def("diff_files", &diff_files, py::call_guard<py::gil_scoped_release>());
+    m.def("diff_blobs", &diff_blobs, py::call_guard<py::gil_scoped_release>());
+    m.def("stat_blobs", &stat_blobs, py::call_guard<py::gil_scoped_release>());
+    m.def("minhash_blob", &minhash_blob, py::call_guard<py::gil_scoped_release>());
+
+    py::class_<DiffHunk>(m, "DiffHunk")
+    .def_readonly("old_start", &DiffHunk::old_start)
+    .def_readonly("old_count", &DiffHunk::old_count)
+    .def_readonly("new_start", &DiffHunk::new_start)
+    .def_readonly("new_count", &DiffHunk::new_count)
+    .def_property_readonly("lines", [](const DiffHunk &self) {
+        // Lines are returned as bytes, since blobs need not be valid UTF-8
+        py::list lines;
+        for (const std::string &line : self.lines)
+            lines.append(py::bytes(line));
+        return lines;
+    });
+
+    py::class_<LineDiff>(m, "LineDiff")
+    .def_readonly("binary", &LineDiff::binary)
+    .def_readonly("additions", &LineDiff::additions)
+    .def_readonly("deletions", &LineDiff::deletions)
+    .def_readonly("hunks", &LineDiff::hunks);
+
+    py::class_<LineStat>(m, "LineStat")
+    .def_readonly("binary", &LineStat::binary)
+    .def_readonly("additions", &LineStat::additions)
+    .def_readonly("deletions", &LineStat::deletions);
+
+    py::enum_<TreeDiffKind>(m, "TreeDiffKind")
+    .value("ADDED", TreeDiffKind::ADDED)
+    .value("REMOVED", TreeDiffKind::REMOVED)
+    .value("MODIFIED", TreeDiffKind::MODIFIED)
+    .value("MOVED_TO", TreeDiffKind::MOVED_TO)
+    .value("MOVED_FROM", TreeDiffKind::MOVED_FROM);
+
+    // Each column is converted to a list when it is read, so read every column once
+    py::class_<TreeDiff>(m, "TreeDiff")
+    .def_readonly("kinds", &TreeDiff::kinds)
+    .def_readonly("depths", &TreeDiff::depths)
+    .def_readonly("types", &TreeDiff::types)
+    .def_readonly("hashes", &TreeDiff::hashes)
+    .def_readonly("new_hashes", &TreeDiff::new_hashes)
+    .def_readonly("names", &TreeDiff::names)
+    .def_readonly("partners", &TreeDiff::partners)
+    .def("__len__", [](const TreeDiff &self) { return self.kinds.size(); });
+
+    // Each column is copied into a bytes object of native-endian values when it is read, so read every column once
+    py::class_<DiffColumns>(m, "DiffColumns")
+    .def_property_readonly("kinds", [](const DiffColumns &self) { return column_bytes(self.kinds); })
+    .def_property_readonly("types", [](const DiffColumns &self) { return column_bytes(self.types); })
+    .def_property_readonly("parents", [](const DiffColumns &self) { return column_bytes(self.parents); })
+    .def_property_readonly("ends", [](const DiffColumns &self) { return column_bytes(self.ends); })
+    .def_property_readonly("partners", [](const DiffColumns &self) { return column_bytes(self.partners); })
+    .def_property_readonly("path_offsets", [](const DiffColumns &self) { return column_bytes(self.path_offsets); })
+    .def_property_readonly("paths", [](const DiffColumns &self) { return py::bytes(self.paths); })
+    .def_property_readonly("old_hashes", [](const DiffColumns &self) { return column_bytes(self.old_hashes); })
+    .def_property_readonly("new_hashes", [](const DiffColumns &self) { return column_bytes(self.new_hashes); })
+    .def_property_readonly("hashes", [](const DiffColumns &self) { return py::bytes(self.hashes); })
+    .def("__len__", [](const DiffColumns &self) { return self.kinds.size(); });
+
     py::class_<Blob>(m, "Blob")
     .def(py::init<std::string>())
     .def_readonly("hash", &Blob::hash);
@@ -17,60 +17,109 @@
 #include <vector>
 #include <chrono>
 #include <thread>
+#include <atomic>
+#include <map>
+#include <sys/ioctl.h>
+#include <linux/fs.h>
 
 #include "caf.h"
 
-constexpr size_t BUFFER_SIZE = 4096;
+constexpr size_t BUFFER_SIZE = 64 * 1024;
+constexpr size_t LARGE_BUFFER_SIZE = 8 * 1024 * 1024;
+constexpr uint64_t DEFAULT_LARGE_FILE_THRESHOLD = 16 * 1024 * 1024;
+constexpr size_t COPY_CHUNK_SIZE = 1 << 30;
 constexpr size_t DIR_NAME_SIZE = 2;
 
 std::string create_sub_dir(const std::string& content_root_dir, const std::string& hash);
 void lock_file_with_timeout(int fd, int operation, int timeout_sec);
-void copy_file(const std::string& src, const std::string& dest);
+CopyMethod copy_file(int src_fd, int dest_fd, off_t size);
+std::string hash_fd(int fd, off_t size);
+uint64_t initial_large_file_threshold();
+
+// How many times each copy method was used, indexed by CopyMethod
+std::atomic<uint64_t> copy_method_counts[3];
+
 void create_content_path(const std::string& content_root_dir, const std::string& hash, std::string& output_path);
 
-std::string hash_file(const std::string& filename) {
+// Files of at least this size take the large file path
+std::atomic<uint64_t> large_file_threshold_bytes{initial_large_file_threshold()};
+
+uint64_t large_file_threshold() {
+    return large_file_threshold_bytes.load();
+}
+
+void set_large_file_threshold(uint64_t threshold) {
+    large_file_threshold_bytes = threshold;
+}
+
+// Read the large file threshold from CAF_LARGE_FILE_THRESHOLD once, when the module is loaded
+uint64_t initial_large_file_threshold() {
+    const char* value = std::getenv("CAF_LARGE_FILE_THRESHOLD");
+    if (value != nullptr && *value != '\0') {
+        char* end = nullptr;
+        unsigned long long threshold = std::strtoull(value, &end, 10);
+        if (end != nullptr && *end == '\0')
+            return threshold;
+    }
+    return DEFAULT_LARGE_FILE_THRESHOLD;
+}
+
+bool is_large_file(off_t size) {
+    return static_cast<uint64_t>(size) >= large_file_threshold();
+}
+
+// Tell the kernel that a large file is about to be read from start to end, so it reads ahead aggressively
+void advise_sequential(int fd, off_t size) {
+    if (is_large_file(size))
+        posix_fadvise(fd, 0, 0, POSIX_FADV_SEQUENTIAL);
+}
+
+// Drop the cached pages of a large file once it has been read or written, so ingesting it
+// does not evict the rest of the page cache. The kernel keeps dirty pages, so a written file
+// is first written back, waiting for the writeback to finish before its pages are dropped.
+void drop_cached_pages(int fd, off_t size, bool written) {
+    if (!is_large_file(size))
+        return;
+    if (written)
+        sync_file_range(fd, 0, 0, SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER);
+    posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED);
+}
+
+std::string hash_fd(int fd, off_t size) {
     unsigned char hash[EVP_MAX_MD_SIZE];
     unsigned int hash_len;
 
-    EVP_MD_CTX *mdctx = EVP_MD_CTX_new();
+    std::unique_ptr<EVP_MD_CTX, decltype(&EVP_MD_CTX_free)> mdctx(EVP_MD_CTX_new(), EVP_MD_CTX_free);
     if (!mdctx){
         throw std::runtime_error("Failed to create EVP_MD_CTX");
     }
 
-    if (EVP_DigestInit_ex(mdctx, EVP_sha1(), nullptr) != 1){
-        EVP_MD_CTX_free(mdctx);
+    if (EVP_DigestInit_ex(mdctx.get(), EVP_sha1(), nullptr) != 1){
         throw std::runtime_error("Failed to initialize digest");
     }
 
-    std::ifstream file(filename, std::ios::binary);
-    if (!file){
-        EVP_MD_CTX_free(mdctx);
-        throw std::runtime_error("Failed to open file");
-    }
-
-    std::vector<char> buffer(BUFFER_SIZE);
-    while (file.read(buffer.data(), BUFFER_SIZE)) {
-        if (EVP_DigestUpdate(mdctx, buffer.data(), BUFFER_SIZE) != 1){
-            EVP_MD_CTX_free(mdctx);
-            throw std::runtime_error("Failed to update digest");
+    // Large files are read in multi-megabyte chunks. They are not memory mapped, since a working directory file
+    // truncated while it is mapped would kill the process with SIGBUS.
+    std::vector<char> buffer(is_large_file(size) ? LARGE_BUFFER_SIZE : BUFFER_SIZE);
+    while (true) {
+        ssize_t bytes_read = read(fd, buffer.data(), buffer.size());
+        if (bytes_read == 0)
+            break;
+        if (bytes_read < 0) {
+            if (errno == EINTR)
+                continue;
+            throw std::runtime_error("Failed to read file");
         }
-    }
 
-    // Handle the last partial read
-    if (file.gcount() > 0) {
-        if (EVP_DigestUpdate(mdctx, buffer.data(), file.gcount()) != 1){
-            EVP_MD_CTX_free(mdctx);
+        if (EVP_DigestUpdate(mdctx.get(), buffer.data(), bytes_read) != 1){
             throw std::runtime_error("Failed to update digest");
         }
     }
 
-    if (EVP_DigestFinal_ex(mdctx, hash, &hash_len) != 1){
-        EVP_MD_CTX_free(mdctx);
+    if (EVP_DigestFinal_ex(mdctx.get(), hash, &hash_len) != 1){
         throw std::runtime_error("Failed to finalize digest");
     }
 
-    EVP_MD_CTX_free(mdctx);
-
     std::ostringstream oss;
     oss << std::hex << std::setfill('0');
     for (unsigned int i = 0; i < hash_len; ++i) {
@@ -80,6 +129,30 @@ std::string hash_file(const std::string& filename) {
     return oss.str();
 }
 
+std::string hash_file(const std::string& filename) {
+    int fd = open(filename.c_str(), O_RDONLY | O_CLOEXEC);
+    if (fd < 0){
+        throw std::runtime_error("Failed to open file");
+    }
+
+    struct stat st;
+    if (fstat(fd, &st) != 0) {
+        close(fd);
+        throw std::runtime_error("Failed to stat file");
+    }
+
+    try {
+        advise_sequential(fd, st.st_size);
+        std::string file_hash = hash_fd(fd, st.st_size);
+        drop_cached_pages(fd, st.st_size, false);
+        close(fd);
+        return file_hash;
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
+    }
+}
+
 std::string hash_string(const std::string& content) {
     EVP_MD_CTX* mdctx = EVP_MD_CTX_new();
     if (mdctx == nullptr) {
@@ -134,35 +207,55 @@ Blob save_file_content(const std::string& content_root_dir, const std::string& f
         std::filesystem::perms::owner_all | std::filesystem::perms::group_read |
         std::filesystem::perms::others_read, ec);
 
-    std::string file_hash = hash_file(file_path);
+    // The source is opened once, hashed and then copied, so a large file is read from disk only once
+    int src_fd = open(file_path.c_str(), O_RDONLY | O_CLOEXEC);
+    if (src_fd < 0)
+        throw std::runtime_error("Failed to open file");
+
+    struct stat st;
+    std::string file_hash;
+    try {
+        if (fstat(src_fd, &st) != 0)
+            throw std::runtime_error("Failed to stat file");
+        advise_sequential(src_fd, st.st_size);
+        file_hash = hash_fd(src_fd, st.st_size);
+        if (lseek(src_fd, 0, SEEK_SET) != 0)
+            throw std::runtime_error("Failed to rewind file");
+    } catch (const std::exception& e) {
+        close(src_fd);
+        throw;
+    }
 
     std::string content_path;
     create_content_path(content_root_dir, file_hash, content_path);
 
-    int fd = open(content_path.c_str(), O_WRONLY | O_CREAT, 0644);
+    // The content is written to a new file that is renamed into place, so an existing object is replaced as a
+    // whole and never rewritten in place under a reader that has it mapped
+    std::string tmp_path = content_path + ".XXXXXX";
+    int fd = mkstemp(tmp_path.data());
 
-    if (fd < 0)
-        throw std::runtime_error("Failed to open file");
-
-    try{
-        lock_file_with_timeout(fd, LOCK_EX, 10);
-    } catch (const std::exception& e){
-        close(fd);
-        throw;
+    if (fd < 0) {
+        close(src_fd);
+        throw std::runtime_error("Failed to create temporary file");
     }
 
     try {
-        copy_file(file_path, content_path);
+        if (fchmod(fd, 0644) != 0)
+            throw std::runtime_error("Failed to set file permissions");
+        copy_file(src_fd, fd, st.st_size);
+        drop_cached_pages(src_fd, st.st_size, false);
+        drop_cached_pages(fd, st.st_size, true);
+        if (rename(tmp_path.c_str(), content_path.c_str()) != 0)
+            throw std::runtime_error("Failed to rename file");
     } catch (const std::exception& e) {
-        std::error_code ec;
-        std::filesystem::remove(content_path, ec);
-        flock(fd, LOCK_UN);
+        unlink(tmp_path.c_str());
         close(fd);
+        close(src_fd);
         throw;
     }
 
-    flock(fd, LOCK_UN);
     close(fd);
+    close(src_fd);
 
     return Blob(file_hash);
 }
@@ -239,7 +332,7 @@ int open_content_for_reading(const std::string& content_root_dir, const std::str
         throw std::runtime_error("Failed to open file");
 
     try{
-        lock_file_with_timeout(fd, LOCK_EX, 10);
+        lock_file_with_timeout(fd, LOCK_SH, 10);
     } catch (const std::exception& e){
         close(fd);
         throw;
@@ -248,43 +341,103 @@ int open_content_for_reading(const std::string& content_root_dir, const std::str
     return fd;
 }
 
-void copy_file(const std::string& src, const std::string& dest) {
-    std::ifstream source_file(src, std::ios::binary);
-    if (!source_file) {
-        throw std::runtime_error("Failed to open source file");
-    }
+// The fastest copy method that copy_file may try, from the CAF_COPY_METHOD environment variable
+CopyMethod fastest_copy_method() {
+    const char* method = std::getenv("CAF_COPY_METHOD");
+    if (method == nullptr)
+        return CopyMethod::REFLINK;
+    if (std::strcmp(method, "copy_file_range") == 0)
+        return CopyMethod::COPY_FILE_RANGE;
+    if (std::strcmp(method, "buffered") == 0)
+        return CopyMethod::BUFFERED;
+    return CopyMethod::REFLINK;
+}
 
-    std::ofstream dest_file(dest, std::ios::binary);
-    if (!dest_file) {
-        throw std::runtime_error("Failed to open destination file");
+// Errors meaning that a copy method is not available for this pair of files, rather than that the copy failed
+bool copy_method_unsupported(int error) {
+    return error == EOPNOTSUPP || error == ENOTTY || error == EXDEV || error == EINVAL || error == ENOSYS ||
+           error == EPERM || error == EBADF;
+}
+
+CopyMethod copy_file(int src_fd, int dest_fd, off_t size) {
+    auto fail = [](const std::string& message) {
+        throw std::runtime_error(message);
+    };
+
+    if (ftruncate(dest_fd, 0) != 0 || lseek(dest_fd, 0, SEEK_SET) != 0) {
+        fail("Failed to truncate destination file");
     }
 
-    std::vector<char> buffer(BUFFER_SIZE);
-    while (source_file.read(buffer.data(), BUFFER_SIZE)) {
-        if (!dest_file.write(buffer.data(), BUFFER_SIZE)) {
-            throw std::runtime_error("Failed to write to destination file");
-        }
+    const CopyMethod fastest = fastest_copy_method();
 
-        if (dest_file.fail()) {
-            throw std::runtime_error("Error while writing to destination file");
-        }
+#ifdef FICLONE
+    // Share the source's extents on copy-on-write filesystems such as btrfs and XFS
+    if (fastest == CopyMethod::REFLINK && ioctl(dest_fd, FICLONE, src_fd) == 0) {
+        copy_method_counts[static_cast<size_t>(CopyMethod::REFLINK)]++;
+        return CopyMethod::REFLINK;
+    }
+#endif
+
+    // Copy inside the kernel, which may still share extents or offload the copy
+    CopyMethod method = CopyMethod::COPY_FILE_RANGE;
+    if (fastest == CopyMethod::BUFFERED) {
+        method = CopyMethod::BUFFERED;
     }
 
-    // Handle the last partial read
-    if (source_file.gcount() > 0) {
-        if (!dest_file.write(buffer.data(), source_file.gcount())) {
-            throw std::runtime_error("Failed to write to destination file");
+    while (method == CopyMethod::COPY_FILE_RANGE) {
+        ssize_t copied = copy_file_range(src_fd, nullptr, dest_fd, nullptr, COPY_CHUNK_SIZE, 0);
+        if (copied == 0) {
+            break;
         }
+        if (copied < 0) {
+            if (errno == EINTR)
+                continue;
+            if (!copy_method_unsupported(errno))
+                fail("Failed to copy file");
+            // Both offsets have advanced past what was copied, so the buffered copy picks up from there
+            method = CopyMethod::BUFFERED;
+        }
+    }
 
-        if (dest_file.fail()) {
-            throw std::runtime_error("Error while writing to destination file");
+    if (method == CopyMethod::BUFFERED) {
+        std::vector<char> buffer(is_large_file(size) ? LARGE_BUFFER_SIZE : BUFFER_SIZE);
+        while (true) {
+            ssize_t bytes_read = read(src_fd, buffer.data(), buffer.size());
+            if (bytes_read == 0)
+                break;
+            if (bytes_read < 0) {
+                if (errno == EINTR)
+                    continue;
+                fail("Failed to read source file");
+            }
+
+            for (ssize_t written = 0; written < bytes_read;) {
+                ssize_t n = write(dest_fd, buffer.data() + written, bytes_read - written);
+                if (n < 0) {
+                    if (errno == EINTR)
+                        continue;
+                    fail("Failed to write to destination file");
+                }
+                written += n;
+            }
         }
     }
 
-    // Explicit flush to ensure all data is written
-    dest_file.flush();
-    if (dest_file.fail()) {
-        throw std::runtime_error("Failed to flush destination file");
+    copy_method_counts[static_cast<size_t>(method)]++;
+    return method;
+}
+
+std::map<std::string, uint64_t> copy_stats() {
+    return {
+        {"reflink", copy_method_counts[static_cast<size_t>(CopyMethod::REFLINK)].load()},
+        {"copy_file_range", copy_method_counts[static_cast<size_t>(CopyMethod::COPY_FILE_RANGE)].load()},
+        {"buffered", copy_method_counts[static_cast<size_t>(CopyMethod::BUFFERED)].load()},
+    };
+}
+
+void reset_copy_stats() {
+    for (auto& count : copy_method_counts) {
+        count = 0;
     }
 }
 
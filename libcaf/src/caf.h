@@ -4,11 +4,18 @@
 #include <unistd.h>
 #include <string>
 #include <cstddef>
+#include <cstdint>
+#include <map>
 
 #include "blob.h"
 
 unsigned int hash_length();
 
+// Files of at least this many bytes are read with large buffers and sequential access hints,
+// and their pages are dropped from the page cache once hashed or ingested
+uint64_t large_file_threshold();
+void set_large_file_threshold(uint64_t threshold);
+
 std::string hash_file(const std::string& file_path);
 std::string hash_string(const std::string& content);
 
@@ -18,4 +25,11 @@ int open_content_for_writing(const std::string& content_root_dir, const std::str
 
 void delete_content(const std::string& content_root_dir, const std::string& content_hash);
 
+// The ways save_file_content can copy a file into the object store, fastest first
+enum class CopyMethod { REFLINK = 0, COPY_FILE_RANGE = 1, BUFFERED = 2 };
+
+// How many files were copied with each method since the last reset
+std::map<std::string, uint64_t> copy_stats();
+void reset_copy_stats();
+
 #endif // CAF_H
\ No newline at end of file
@@ -0,0 +1,544 @@
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <cstring>
+#include <stdexcept>
+#include <string_view>
+#include <unordered_map>
+#include <unordered_set>
+#include <algorithm>
+
+#include "caf.h"
+#include "line_diff.h"
+
+// Only this many leading bytes are searched for a NUL byte when telling binary files apart
+constexpr size_t BINARY_CHECK_SIZE = 8000;
+// Lines that occur more often than this in a region are not used as histogram anchors
+constexpr int MAX_CHAIN_LENGTH = 64;
+// Deeper than this, the histogram recursion falls back to Myers
+constexpr int MAX_HISTOGRAM_DEPTH = 64;
+
+constexpr const char* NO_NEWLINE_MARKER = "\\ No newline at end of file";
+
+namespace {
+
+// A read-only mapping of a whole file, or an empty view for an empty or missing side
+class MappedFile {
+public:
+    MappedFile() = default;
+
+    explicit MappedFile(int fd) {
+        struct stat st;
+        if (fstat(fd, &st) != 0) {
+            close(fd);
+            throw std::runtime_error("Failed to stat file");
+        }
+
+        size = st.st_size;
+        if (size > 0) {
+            void* addr = mmap(nullptr, size, PROT_READ, MAP_PRIVATE, fd, 0);
+            if (addr == MAP_FAILED) {
+                close(fd);
+                throw std::runtime_error("Failed to map file");
+            }
+            madvise(addr, size, MADV_SEQUENTIAL);
+            data = static_cast<const char*>(addr);
+        }
+
+        // The mapping stays valid once the file is closed
+        close(fd);
+    }
+
+    ~MappedFile() {
+        if (data != nullptr)
+            munmap(const_cast<char*>(data), size);
+    }
+
+    MappedFile(const MappedFile&) = delete;
+    MappedFile& operator=(const MappedFile&) = delete;
+
+    std::string_view view() const {
+        return {data, size};
+    }
+
+private:
+    const char* data = nullptr;
+    size_t size = 0;
+};
+
+std::vector<std::string_view> split_lines(std::string_view text) {
+    std::vector<std::string_view> lines;
+    size_t start = 0;
+
+    while (start < text.size()) {
+        size_t end = text.find('\n', start);
+        if (end == std::string_view::npos) {
+            lines.push_back(text.substr(start));
+            break;
+        }
+        // Lines keep their newline, so a last line without one differs from the same line with one
+        lines.push_back(text.substr(start, end - start + 1));
+        start = end + 1;
+    }
+
+    return lines;
+}
+
+bool is_binary(std::string_view text) {
+    return std::memchr(text.data(), '\0', std::min(text.size(), BINARY_CHECK_SIZE)) != nullptr;
+}
+
+// Computes which lines of two sequences of interned line ids are removed and which are inserted,
+// with the histogram heuristic, falling back to linear space Myers where it finds no good anchor
+class LineDiffer {
+public:
+    LineDiffer(const std::vector<int>& a, const std::vector<int>& b, size_t unique_lines)
+        : a(a), b(b), removed(a.size(), 0), inserted(b.size(), 0), head(unique_lines, -1), count(unique_lines, 0),
+          next(a.size(), -1) {}
+
+    void run() {
+        histogram(0, static_cast<int>(a.size()), 0, static_cast<int>(b.size()), 0);
+    }
+
+    const std::vector<int>& a;
+    const std::vector<int>& b;
+    std::vector<char> removed;
+    std::vector<char> inserted;
+
+private:
+    std::vector<int> head;
+    std::vector<int> count;
+    std::vector<int> next;
+    std::vector<int> forward;
+    std::vector<int> backward;
+
+    void mark(int a_lo, int a_hi, int b_lo, int b_hi) {
+        std::fill(removed.begin() + a_lo, removed.begin() + a_hi, 1);
+        std::fill(inserted.begin() + b_lo, inserted.begin() + b_hi, 1);
+    }
+
+    void trim(int& a_lo, int& a_hi, int& b_lo, int& b_hi) const {
+        while (a_lo < a_hi && b_lo < b_hi && a[a_lo] == b[b_lo]) {
+            ++a_lo;
+            ++b_lo;
+        }
+        while (a_lo < a_hi && b_lo < b_hi && a[a_hi - 1] == b[b_hi - 1]) {
+            --a_hi;
+            --b_hi;
+        }
+    }
+
+    // Split the regions around the longest common run that contains the rarest line of the first region,
+    // which lines up unique lines such as function headers rather than braces and blank lines
+    void histogram(int a_lo, int a_hi, int b_lo, int b_hi, int depth) {
+        while (true) {
+            trim(a_lo, a_hi, b_lo, b_hi);
+            if (a_lo == a_hi || b_lo == b_hi) {
+                mark(a_lo, a_hi, b_lo, b_hi);
+                return;
+            }
+            if (depth >= MAX_HISTOGRAM_DEPTH) {
+                myers(a_lo, a_hi, b_lo, b_hi);
+                return;
+            }
+
+            for (int i = a_hi - 1; i >= a_lo; --i) {
+                next[i] = head[a[i]];
+                head[a[i]] = i;
+                ++count[a[i]];
+            }
+
+            bool any_common = false;
+            int best_count = MAX_CHAIN_LENGTH + 1;
+            int best_a = -1, best_b = -1, best_length = 0;
+
+            for (int j = b_lo; j < b_hi;) {
+                int line = b[j];
+                int next_j = j + 1;
+
+                if (count[line] > 0)
+                    any_common = true;
+
+                if (count[line] > 0 && count[line] <= best_count) {
+                    for (int i = head[line]; i != -1; i = next[i]) {
+                        int a_start = i, b_start = j;
+                        while (a_start > a_lo && b_start > b_lo && a[a_start - 1] == b[b_start - 1]) {
+                            --a_start;
+                            --b_start;
+                        }
+                        int a_end = i + 1, b_end = j + 1;
+                        while (a_end < a_hi && b_end < b_hi && a[a_end] == b[b_end]) {
+                            ++a_end;
+                            ++b_end;
+                        }
+
+                        int length = a_end - a_start;
+                        if (count[line] < best_count || length > best_length) {
+                            best_count = count[line];
+                            best_a = a_start;
+                            best_b = b_start;
+                            best_length = length;
+                        }
+                        next_j = std::max(next_j, b_end);
+                    }
+                }
+
+                j = next_j;
+            }
+
+            for (int i = a_lo; i < a_hi; ++i) {
+                head[a[i]] = -1;
+                count[a[i]] = 0;
+            }
+
+            if (best_a < 0) {
+                if (any_common)
+                    myers(a_lo, a_hi, b_lo, b_hi);
+                else
+                    mark(a_lo, a_hi, b_lo, b_hi);
+                return;
+            }
+
+            histogram(a_lo, best_a, b_lo, best_b, depth + 1);
+            a_lo = best_a + best_length;
+            b_lo = best_b + best_length;
+            ++depth;
+        }
+    }
+
+    // Linear space Myers: find the middle snake of the shortest edit script, then diff both halves
+    void myers(int a_lo, int a_hi, int b_lo, int b_hi) {
+        trim(a_lo, a_hi, b_lo, b_hi);
+        if (a_lo == a_hi || b_lo == b_hi) {
+            mark(a_lo, a_hi, b_lo, b_hi);
+            return;
+        }
+
+        int x, y;
+        if (!middle_snake(a_lo, a_hi, b_lo, b_hi, x, y)) {
+            mark(a_lo, a_hi, b_lo, b_hi);
+            return;
+        }
+
+        myers(a_lo, a_lo + x, b_lo, b_lo + y);
+        myers(a_lo + x, a_hi, b_lo + y, b_hi);
+    }
+
+    bool middle_snake(int a_lo, int a_hi, int b_lo, int b_hi, int& split_x, int& split_y) {
+        const int n = a_hi - a_lo;
+        const int m = b_hi - b_lo;
+        const int max_d = (n + m + 1) / 2;
+        const int offset = max_d + 1;
+        const int delta = n - m;
+        const bool front = (delta % 2) != 0;
+
+        forward.assign(2 * max_d + 3, -1);
+        backward.assign(2 * max_d + 3, -1);
+        forward[offset + 1] = 0;
+        backward[offset + 1] = 0;
+
+        int k1_start = 0, k1_end = 0, k2_start = 0, k2_end = 0;
+
+        for (int d = 0; d < max_d; ++d) {
+            for (int k1 = -d + k1_start; k1 <= d - k1_end; k1 += 2) {
+                int k1_offset = offset + k1;
+                int x1 = (k1 == -d || (k1 != d && forward[k1_offset - 1] < forward[k1_offset + 1]))
+                             ? forward[k1_offset + 1]
+                             : forward[k1_offset - 1] + 1;
+                int y1 = x1 - k1;
+                while (x1 < n && y1 < m && a[a_lo + x1] == b[b_lo + y1]) {
+                    ++x1;
+                    ++y1;
+                }
+                forward[k1_offset] = x1;
+
+                if (x1 > n) {
+                    k1_end += 2;
+                } else if (y1 > m) {
+                    k1_start += 2;
+                } else if (front) {
+                    int k2_offset = offset + delta - k1;
+                    if (k2_offset >= 0 && k2_offset < static_cast<int>(backward.size()) && backward[k2_offset] != -1 &&
+                        x1 >= n - backward[k2_offset]) {
+                        split_x = x1;
+                        split_y = y1;
+                        return true;
+                    }
+                }
+            }
+
+            for (int k2 = -d + k2_start; k2 <= d - k2_end; k2 += 2) {
+                int k2_offset = offset + k2;
+                int x2 = (k2 == -d || (k2 != d && backward[k2_offset - 1] < backward[k2_offset + 1]))
+                             ? backward[k2_offset + 1]
+                             : backward[k2_offset - 1] + 1;
+                int y2 = x2 - k2;
+                while (x2 < n && y2 < m && a[a_hi - 1 - x2] == b[b_hi - 1 - y2]) {
+                    ++x2;
+                    ++y2;
+                }
+                backward[k2_offset] = x2;
+
+                if (x2 > n) {
+                    k2_end += 2;
+                } else if (y2 > m) {
+                    k2_start += 2;
+                } else if (!front) {
+                    int k1_offset = offset + delta - k2;
+                    if (k1_offset >= 0 && k1_offset < static_cast<int>(forward.size()) && forward[k1_offset] != -1) {
+                        int x1 = forward[k1_offset];
+                        int y1 = offset + x1 - k1_offset;
+                        if (x1 >= n - x2) {
+                            split_x = x1;
+                            split_y = y1;
+                            return true;
+                        }
+                    }
+                }
+            }
+        }
+
+        return false;
+    }
+};
+
+struct Change {
+    size_t a_start, a_end, b_start, b_end;
+};
+
+void append_lines(DiffHunk& hunk, char prefix, const std::vector<std::string_view>& lines, size_t start, size_t end) {
+    for (size_t i = start; i < end; ++i) {
+        std::string_view line = lines[i];
+        bool has_newline = !line.empty() && line.back() == '\n';
+        if (has_newline)
+            line.remove_suffix(1);
+
+        std::string text;
+        text.reserve(line.size() + 1);
+        text.push_back(prefix);
+        text.append(line);
+        hunk.lines.push_back(std::move(text));
+
+        if (!has_newline)
+            hunk.lines.emplace_back(NO_NEWLINE_MARKER);
+    }
+}
+
+// The lines of two texts, interned so that equal lines have equal ids, and the lines removed and inserted between them
+struct LineChanges {
+    std::vector<std::string_view> old_lines;
+    std::vector<std::string_view> new_lines;
+    std::vector<char> removed;
+    std::vector<char> inserted;
+};
+
+LineChanges compute_changes(std::string_view old_text, std::string_view new_text) {
+    LineChanges changes;
+    changes.old_lines = split_lines(old_text);
+    changes.new_lines = split_lines(new_text);
+
+    // Only one side has lines, so every line is removed or inserted
+    if (changes.old_lines.empty() || changes.new_lines.empty()) {
+        changes.removed.assign(changes.old_lines.size(), 1);
+        changes.inserted.assign(changes.new_lines.size(), 1);
+        return changes;
+    }
+
+    std::unordered_map<std::string_view, int> ids;
+    ids.reserve(changes.old_lines.size() + changes.new_lines.size());
+    auto intern = [&ids](const std::vector<std::string_view>& lines) {
+        std::vector<int> interned;
+        interned.reserve(lines.size());
+        for (std::string_view line : lines)
+            interned.push_back(ids.emplace(line, static_cast<int>(ids.size())).first->second);
+        return interned;
+    };
+    std::vector<int> a = intern(changes.old_lines);
+    std::vector<int> b = intern(changes.new_lines);
+
+    LineDiffer differ(a, b, ids.size());
+    differ.run();
+    changes.removed = std::move(differ.removed);
+    changes.inserted = std::move(differ.inserted);
+
+    return changes;
+}
+
+LineStat stat_texts(std::string_view old_text, std::string_view new_text) {
+    LineStat result;
+    if (is_binary(old_text) || is_binary(new_text)) {
+        result.binary = true;
+        return result;
+    }
+
+    LineChanges changes = compute_changes(old_text, new_text);
+    result.deletions = std::count(changes.removed.begin(), changes.removed.end(), 1);
+    result.additions = std::count(changes.inserted.begin(), changes.inserted.end(), 1);
+
+    return result;
+}
+
+LineDiff diff_texts(std::string_view old_text, std::string_view new_text, size_t context) {
+    LineDiff result;
+    if (is_binary(old_text) || is_binary(new_text)) {
+        result.binary = true;
+        return result;
+    }
+
+    LineChanges line_changes = compute_changes(old_text, new_text);
+    const std::vector<std::string_view>& old_lines = line_changes.old_lines;
+    const std::vector<std::string_view>& new_lines = line_changes.new_lines;
+    const std::vector<char>& removed = line_changes.removed;
+    const std::vector<char>& inserted = line_changes.inserted;
+
+    // Group the edit script into runs of removed and inserted lines
+    std::vector<Change> changes;
+    for (size_t i = 0, j = 0; i < old_lines.size() || j < new_lines.size();) {
+        if (i < old_lines.size() && j < new_lines.size() && !removed[i] && !inserted[j]) {
+            ++i;
+            ++j;
+            continue;
+        }
+
+        Change change{i, i, j, j};
+        while (i < old_lines.size() && removed[i])
+            ++i;
+        while (j < new_lines.size() && inserted[j])
+            ++j;
+        change.a_end = i;
+        change.b_end = j;
+        changes.push_back(change);
+
+        result.deletions += change.a_end - change.a_start;
+        result.additions += change.b_end - change.b_start;
+    }
+
+    // Merge changes whose context overlaps into hunks
+    for (size_t first = 0; first < changes.size();) {
+        size_t last = first;
+        while (last + 1 < changes.size() && changes[last + 1].a_start - changes[last].a_end <= 2 * context)
+            ++last;
+
+        size_t leading = std::min(context, changes[first].a_start);
+        size_t trailing = std::min(context, old_lines.size() - changes[last].a_end);
+
+        DiffHunk hunk;
+        size_t a_start = changes[first].a_start - leading;
+        size_t b_start = changes[first].b_start - leading;
+        hunk.old_count = changes[last].a_end + trailing - a_start;
+        hunk.new_count = changes[last].b_end + trailing - b_start;
+        hunk.old_start = hunk.old_count > 0 ? a_start + 1 : a_start;
+        hunk.new_start = hunk.new_count > 0 ? b_start + 1 : b_start;
+
+        size_t a_pos = a_start;
+        for (size_t c = first; c <= last; ++c) {
+            append_lines(hunk, ' ', old_lines, a_pos, changes[c].a_start);
+            append_lines(hunk, '-', old_lines, changes[c].a_start, changes[c].a_end);
+            append_lines(hunk, '+', new_lines, changes[c].b_start, changes[c].b_end);
+            a_pos = changes[c].a_end;
+        }
+        append_lines(hunk, ' ', old_lines, a_pos, a_pos + trailing);
+
+        result.hunks.push_back(std::move(hunk));
+        first = last + 1;
+    }
+
+    return result;
+}
+
+MappedFile map_path(const std::string& path) {
+    if (path.empty())
+        return MappedFile();
+
+    int fd = open(path.c_str(), O_RDONLY | O_CLOEXEC);
+    if (fd < 0)
+        throw std::runtime_error("Failed to open file " + path);
+
+    return MappedFile(fd);
+}
+
+MappedFile map_blob(const std::string& content_root_dir, const std::string& hash) {
+    if (hash.empty())
+        return MappedFile();
+
+    return MappedFile(open_content_for_reading(content_root_dir, hash));
+}
+
+uint64_t splitmix64(uint64_t x) {
+    x += 0x9e3779b97f4a7c15ULL;
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+    return x ^ (x >> 31);
+}
+
+// FNV-1a, which unlike std::hash gives the same value on every platform and run
+uint64_t fnv1a64(std::string_view text) {
+    uint64_t hash = 0xcbf29ce484222325ULL;
+    for (unsigned char c : text) {
+        hash ^= c;
+        hash *= 0x100000001b3ULL;
+    }
+    return hash;
+}
+
+std::string_view trim(std::string_view line) {
+    constexpr const char* WHITESPACE = " \t\r\n\v\f";
+    size_t start = line.find_first_not_of(WHITESPACE);
+    if (start == std::string_view::npos)
+        return {};
+    return line.substr(start, line.find_last_not_of(WHITESPACE) - start + 1);
+}
+
+}  // namespace
+
+LineDiff diff_files(const std::string& old_path, const std::string& new_path, size_t context) {
+    MappedFile old_file = map_path(old_path);
+    MappedFile new_file = map_path(new_path);
+
+    return diff_texts(old_file.view(), new_file.view(), context);
+}
+
+LineDiff diff_blobs(const std::string& content_root_dir, const std::string& old_hash, const std::string& new_hash,
+                    size_t context) {
+    MappedFile old_blob = map_blob(content_root_dir, old_hash);
+    MappedFile new_blob = map_blob(content_root_dir, new_hash);
+
+    return diff_texts(old_blob.view(), new_blob.view(), context);
+}
+
+LineStat stat_blobs(const std::string& content_root_dir, const std::string& old_hash, const std::string& new_hash) {
+    MappedFile old_blob = map_blob(content_root_dir, old_hash);
+    MappedFile new_blob = map_blob(content_root_dir, new_hash);
+
+    return stat_texts(old_blob.view(), new_blob.view());
+}
+
+std::vector<uint64_t> minhash_blob(const std::string& content_root_dir, const std::string& hash, size_t num_hashes) {
+    MappedFile blob = map_blob(content_root_dir, hash);
+    std::string_view text = blob.view();
+    if (is_binary(text))
+        return {};
+
+    std::unordered_set<uint64_t> shingles;
+    for (std::string_view line : split_lines(text)) {
+        std::string_view trimmed = trim(line);
+        if (!trimmed.empty())
+            shingles.insert(fnv1a64(trimmed));
+    }
+    if (shingles.empty())
+        return {};
+
+    // Each hash function mixes the shingle with its own seed, which behaves like a random permutation
+    std::vector<uint64_t> seeds(num_hashes);
+    for (size_t i = 0; i < num_hashes; ++i)
+        seeds[i] = splitmix64(i + 1);
+
+    std::vector<uint64_t> signature(num_hashes, UINT64_MAX);
+    for (uint64_t shingle : shingles) {
+        for (size_t i = 0; i < num_hashes; ++i)
+            signature[i] = std::min(signature[i], splitmix64(shingle ^ seeds[i]));
+    }
+
+    return signature;
+}
@@ -0,0 +1,51 @@
+#ifndef LINE_DIFF_H
+#define LINE_DIFF_H
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// A unified diff hunk. Starts are 1-based, or the line before the hunk when a side is empty.
+// Each line starts with ' ', '-' or '+' and has no trailing newline. A line that lacks a newline
+// in its file is followed by the "\ No newline at end of file" marker line.
+struct DiffHunk {
+    size_t old_start = 0;
+    size_t old_count = 0;
+    size_t new_start = 0;
+    size_t new_count = 0;
+    std::vector<std::string> lines;
+};
+
+struct LineDiff {
+    bool binary = false;
+    size_t additions = 0;
+    size_t deletions = 0;
+    std::vector<DiffHunk> hunks;
+};
+
+// Inserted and deleted line counts of a change, without its hunks
+struct LineStat {
+    bool binary = false;
+    size_t additions = 0;
+    size_t deletions = 0;
+};
+
+// Diff two files line by line into unified diff hunks with `context` lines around each change.
+// An empty path stands for an empty file. Files with a NUL byte near their start are reported as binary.
+LineDiff diff_files(const std::string& old_path, const std::string& new_path, size_t context);
+
+// Diff two blobs of an object store. An empty hash stands for an empty blob.
+LineDiff diff_blobs(const std::string& content_root_dir, const std::string& old_hash, const std::string& new_hash,
+                    size_t context);
+
+// Count the lines inserted and deleted between two blobs, without building hunks.
+// Lines are compared by interned hash, and binary blobs are skipped.
+LineStat stat_blobs(const std::string& content_root_dir, const std::string& old_hash, const std::string& new_hash);
+
+// MinHash signature of the set of lines of a blob, with `num_hashes` values. Lines are compared without
+// surrounding whitespace and blank lines are ignored. The hash functions are fixed, so signatures can be
+// stored and compared across runs. Binary blobs and blobs without any non-blank line get an empty signature.
+std::vector<uint64_t> minhash_blob(const std::string& content_root_dir, const std::string& hash, size_t num_hashes);
+
+#endif // LINE_DIFF_H
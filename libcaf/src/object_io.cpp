@@ -2,10 +2,12 @@
 #include <unistd.h>
 #include <fcntl.h>
 #include <sys/file.h>
+#include <sys/stat.h>
 #include <vector>
 #include <cstring>
 #include <stdexcept>
-#include <unordered_map>
+#include <string_view>
+#include <map>
 
 #include "caf.h"
 #include "object_io.h"
@@ -17,7 +19,6 @@ constexpr uint32_t MAX_LENGTH = 1024 * 1024;  // 1 MB limit for strings
 std::string read_length_prefixed_string(int fd); // Helper function to read a length-prefixed string safely
 void write_with_length(int fd, const std::string &data); // Helper function to write a length-prefixed string safely
 void save_tree_record(int fd, const TreeRecord &record); // Helper function to serialize a TreeRecord
-TreeRecord load_tree_record(int fd); // Helper function to deserialize a TreeRecord
 
 // Serialize Commit to disk
 void save_commit(const std::string &root_dir, const Commit &commit) {
@@ -92,23 +93,83 @@ void save_tree(const std::string &root_dir, const Tree &tree) {
     }
 }
 
-Tree load_tree(const std::string &root_dir, const std::string &tree_hash) {
-    int fd = open_content_for_reading(root_dir.c_str(), tree_hash.c_str());
+// Reads a whole object into memory, so its records can be parsed without a system call per field
+std::string read_object(int fd) {
+    struct stat st;
+    if (fstat(fd, &st) != 0)
+        throw std::runtime_error("Failed to stat object");
+
+    std::string data(st.st_size, '\0');
+    size_t total = 0;
+    while (total < data.size()) {
+        ssize_t n = read(fd, &data[total], data.size() - total);
+        if (n <= 0)
+            throw std::runtime_error("Failed to read object");
+        total += n;
+    }
 
-    uint32_t num_records;
-    if (read(fd, &num_records, sizeof(num_records)) != sizeof(num_records))
-        throw std::runtime_error("Failed to read the number of records");
+    return data;
+}
 
-    std::unordered_map<std::string, TreeRecord> records;
-    for (uint32_t i = 0; i < num_records; ++i) {
-        TreeRecord record = load_tree_record(fd);
-        records.emplace(record.name, record);
+// Parses the fields of a serialized object in order, checking every length against the end of the data
+class ObjectParser {
+public:
+    explicit ObjectParser(std::string_view data): data(data) {}
+
+    template <typename T>
+    T read_value(const char* what) {
+        T value;
+        if (data.size() - pos < sizeof(value))
+            throw std::runtime_error(std::string("Failed to read ") + what);
+        std::memcpy(&value, data.data() + pos, sizeof(value));
+        pos += sizeof(value);
+        return value;
+    }
+
+    std::string read_string() {
+        uint32_t length = read_value<uint32_t>("length");
+        if (length > MAX_LENGTH)
+            throw std::runtime_error("Length exceeds maximum");
+        if (data.size() - pos < length)
+            throw std::runtime_error("Failed to read string");
+
+        std::string result(data.substr(pos, length));
+        pos += length;
+        return result;
     }
 
+private:
+    std::string_view data;
+    size_t pos = 0;
+};
+
+Tree load_tree(const std::string &root_dir, const std::string &tree_hash) {
+    int fd = open_content_for_reading(root_dir.c_str(), tree_hash.c_str());
+
+    std::string data;
+    try {
+        data = read_object(fd);
+    } catch (const std::exception &e) {
+        flock(fd, LOCK_UN);
+        close(fd);
+        throw;
+    }
     flock(fd, LOCK_UN);
     close(fd);
 
-    return Tree(records);
+    ObjectParser parser(data);
+    uint32_t num_records = parser.read_value<uint32_t>("the number of records");
+
+    std::map<std::string, TreeRecord> records;
+    for (uint32_t i = 0; i < num_records; ++i) {
+        auto type = static_cast<TreeRecord::Type>(parser.read_value<uint8_t>("TreeRecord type"));
+        std::string hash = parser.read_string();
+        std::string name = parser.read_string();
+        // Records are saved in name order, so each one is inserted at the end in constant time
+        records.emplace_hint(records.end(), name, TreeRecord(type, std::move(hash), name));
+    }
+
+    return Tree(std::move(records));
 }
 
 std::string read_length_prefixed_string(int fd) {
@@ -142,17 +203,3 @@ void save_tree_record(int fd, const TreeRecord &record) {
     write_with_length(fd, record.hash);
     write_with_length(fd, record.name);
 }
-
-TreeRecord load_tree_record(int fd) {
-    uint8_t type;
-
-    if (read(fd, &type, sizeof(type)) != sizeof(type)) {
-        throw std::runtime_error("Failed to read TreeRecord type");
-    }
-
-    TreeRecord::Type record_type = static_cast<TreeRecord::Type>(type);
-    std::string hash = read_length_prefixed_string(fd);
-    std::string name = read_length_prefixed_string(fd);
-
-    return TreeRecord(record_type, hash, name);
-}
\ No newline at end of file
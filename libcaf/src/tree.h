@@ -13,6 +13,7 @@ public:
     const std::map<std::string, TreeRecord> records;
 
     explicit Tree(const std::unordered_map<std::string, TreeRecord>& input): records(input.begin(), input.end()) {}
+    explicit Tree(std::map<std::string, TreeRecord>&& input): records(std::move(input)) {}
 
     std::map<std::string, TreeRecord>::const_iterator record(const std::string& key) const {
         return records.find(key);
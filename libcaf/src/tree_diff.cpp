@@ -0,0 +1,281 @@
+#include <algorithm>
+#include <deque>
+#include <map>
+#include <memory>
+#include <string_view>
+#include <unordered_map>
+#include <utility>
+
+#include "object_io.h"
+#include "tree_diff.h"
+
+namespace {
+
+struct Node {
+    TreeDiffKind kind;
+    const TreeRecord* record;
+    std::vector<size_t> children;
+    int64_t partner = -1;
+    const TreeRecord* new_record = nullptr;
+};
+
+// Removed or added entries waiting for the other half of a move, indexed by hash and then by name. Names are
+// kept in insertion order, so an entry without a namesake pairs with the entry whose name was seen first.
+class MoveCandidates {
+public:
+    void add(const TreeRecord& record, size_t node) {
+        ByName& by_name = by_hash[record.hash];
+        auto it = by_name.queues.find(record.name);
+        if (it == by_name.queues.end()) {
+            uint64_t generation = by_name.next_generation++;
+            by_name.queues.emplace(record.name, Queue{generation, {node}});
+            by_name.order.emplace_back(record.name, generation);
+        } else {
+            it->second.nodes.push_back(node);
+        }
+    }
+
+    // Take the node to pair with a record of the same hash, or -1 if there is none
+    int64_t pop(const TreeRecord& record) {
+        auto by_hash_it = by_hash.find(record.hash);
+        if (by_hash_it == by_hash.end())
+            return -1;
+
+        ByName& by_name = by_hash_it->second;
+        auto it = by_name.queues.find(record.name);
+        if (it == by_name.queues.end()) {
+            // Names whose queues were emptied, or emptied and started again, are dropped from the order lazily
+            while (true) {
+                const auto& [name, generation] = by_name.order.front();
+                it = by_name.queues.find(name);
+                if (it != by_name.queues.end() && it->second.generation == generation)
+                    break;
+                by_name.order.pop_front();
+            }
+        }
+
+        size_t node = it->second.nodes.front();
+        it->second.nodes.pop_front();
+        if (it->second.nodes.empty()) {
+            by_name.queues.erase(it);
+            if (by_name.queues.empty())
+                by_hash.erase(by_hash_it);
+        }
+
+        return static_cast<int64_t>(node);
+    }
+
+private:
+    struct Queue {
+        uint64_t generation;
+        std::deque<size_t> nodes;
+    };
+
+    struct ByName {
+        std::unordered_map<std::string, Queue> queues;
+        std::deque<std::pair<std::string, uint64_t>> order;
+        uint64_t next_generation = 0;
+    };
+
+    std::unordered_map<std::string, ByName> by_hash;
+};
+
+class TreeDiffer {
+public:
+    explicit TreeDiffer(const std::string& content_root_dir): content_root_dir(content_root_dir) {
+        // The top level node stands for the two root trees and is not part of the result
+        nodes.push_back(Node{TreeDiffKind::MODIFIED, nullptr, {}});
+    }
+
+    TreeDiff diff(const std::string& tree_hash1, const std::string& tree_hash2) {
+        if (tree_hash1 != tree_hash2)
+            compare(load(tree_hash1), load(tree_hash2));
+
+        TreeDiff result;
+        std::vector<int64_t> positions(nodes.size(), -1);
+        emit(0, 0, positions, result);
+        for (int64_t& partner : result.partners) {
+            if (partner >= 0)
+                partner = positions[partner];
+        }
+
+        return result;
+    }
+
+private:
+    struct Frame {
+        const Tree* tree1;
+        const Tree* tree2;
+        size_t parent;
+    };
+
+    const Tree* load(const std::string& tree_hash) {
+        if (tree_hash.empty())
+            return nullptr;
+
+        // Records are referenced by pointer until the end of the diff, so every loaded tree is kept
+        trees.emplace_back(new Tree(load_tree(content_root_dir, tree_hash)));
+        return trees.back().get();
+    }
+
+    size_t add_node(size_t parent, TreeDiffKind kind, const TreeRecord& record) {
+        nodes.push_back(Node{kind, &record, {}});
+        nodes[parent].children.push_back(nodes.size() - 1);
+        return nodes.size() - 1;
+    }
+
+    void pair(size_t moved_to, size_t moved_from) {
+        nodes[moved_to].kind = TreeDiffKind::MOVED_TO;
+        nodes[moved_to].partner = static_cast<int64_t>(moved_from);
+        nodes[moved_from].kind = TreeDiffKind::MOVED_FROM;
+        nodes[moved_from].partner = static_cast<int64_t>(moved_to);
+    }
+
+    // Follows the traversal of Repository._diff_trees, so moves are paired up the same way
+    void compare(const Tree* root1, const Tree* root2) {
+        static const std::map<std::string, TreeRecord> no_records;
+        std::vector<Frame> stack{{root1, root2, 0}};
+
+        while (!stack.empty()) {
+            Frame frame = stack.back();
+            stack.pop_back();
+            const auto& records1 = frame.tree1 ? frame.tree1->records : no_records;
+            const auto& records2 = frame.tree2 ? frame.tree2->records : no_records;
+
+            for (const auto& [name, record1] : records1) {
+                auto it2 = records2.find(name);
+                if (it2 == records2.end()) {
+                    size_t node = add_node(frame.parent, TreeDiffKind::REMOVED, record1);
+                    int64_t match = potentially_added.pop(record1);
+                    if (match >= 0)
+                        pair(node, static_cast<size_t>(match));
+                    else
+                        potentially_removed.add(record1, node);
+                    continue;
+                }
+
+                const TreeRecord& record2 = it2->second;
+                if (record1.hash == record2.hash)
+                    continue;
+
+                size_t node = add_node(frame.parent, TreeDiffKind::MODIFIED, record1);
+                nodes[node].new_record = &record2;
+                if (record1.type == TreeRecord::Type::TREE && record2.type == TreeRecord::Type::TREE)
+                    stack.push_back({load(record1.hash), load(record2.hash), node});
+            }
+
+            for (const auto& [name, record2] : records2) {
+                if (records1.count(name) != 0)
+                    continue;
+
+                size_t node = add_node(frame.parent, TreeDiffKind::ADDED, record2);
+                int64_t match = potentially_removed.pop(record2);
+                if (match >= 0)
+                    pair(static_cast<size_t>(match), node);
+                else
+                    potentially_added.add(record2, node);
+            }
+        }
+    }
+
+    void emit(size_t node, uint32_t depth, std::vector<int64_t>& positions, TreeDiff& result) {
+        std::vector<size_t>& children = nodes[node].children;
+        std::sort(children.begin(), children.end(), [this](size_t a, size_t b) {
+            return nodes[a].record->name < nodes[b].record->name;
+        });
+
+        for (size_t child : children) {
+            const Node& entry = nodes[child];
+            positions[child] = static_cast<int64_t>(result.kinds.size());
+            result.kinds.push_back(static_cast<uint8_t>(entry.kind));
+            result.depths.push_back(depth);
+            result.types.push_back(static_cast<uint8_t>(entry.record->type));
+            result.hashes.push_back(entry.record->hash);
+            result.new_hashes.push_back(entry.new_record ? entry.new_record->hash : std::string());
+            result.names.push_back(entry.record->name);
+            result.partners.push_back(entry.partner);
+
+            emit(child, depth + 1, positions, result);
+        }
+    }
+
+    const std::string& content_root_dir;
+    std::vector<std::unique_ptr<Tree>> trees;
+    std::vector<Node> nodes;
+    MoveCandidates potentially_added;
+    MoveCandidates potentially_removed;
+};
+
+}  // namespace
+
+TreeDiff diff_trees(const std::string& content_root_dir, const std::string& tree_hash1,
+                    const std::string& tree_hash2) {
+    return TreeDiffer(content_root_dir).diff(tree_hash1, tree_hash2);
+}
+
+DiffColumns diff_columns(const TreeDiff& diff) {
+    const size_t count = diff.kinds.size();
+    DiffColumns columns;
+    columns.kinds = diff.kinds;
+    columns.types = diff.types;
+    columns.partners = diff.partners;
+    columns.parents.reserve(count);
+    columns.ends.assign(count, static_cast<int64_t>(count));
+    columns.path_offsets.reserve(count + 1);
+    columns.path_offsets.push_back(0);
+    columns.old_hashes.reserve(count);
+    columns.new_hashes.reserve(count);
+
+    // Views into the records of `diff`, which outlives the map
+    std::unordered_map<std::string_view, int64_t> hash_indexes;
+    auto intern = [&](const std::string& hash) -> int64_t {
+        auto [it, inserted] = hash_indexes.emplace(hash, static_cast<int64_t>(hash_indexes.size()));
+        if (inserted)
+            columns.hashes += hash;
+        return it->second;
+    };
+
+    // The enclosing entries of the current one, innermost last, and the path of the innermost one with a slash
+    std::vector<size_t> ancestors;
+    std::vector<size_t> dir_lengths;
+    std::string dir;
+
+    for (size_t i = 0; i < count; ++i) {
+        while (ancestors.size() > diff.depths[i]) {
+            columns.ends[ancestors.back()] = static_cast<int64_t>(i);
+            ancestors.pop_back();
+            dir_lengths.pop_back();
+        }
+        dir.resize(dir_lengths.empty() ? 0 : dir_lengths.back());
+
+        columns.parents.push_back(ancestors.empty() ? -1 : static_cast<int64_t>(ancestors.back()));
+        columns.paths += dir;
+        columns.paths += diff.names[i];
+        columns.path_offsets.push_back(static_cast<int64_t>(columns.paths.size()));
+
+        int64_t hash = intern(diff.hashes[i]);
+        switch (static_cast<TreeDiffKind>(diff.kinds[i])) {
+            case TreeDiffKind::ADDED:
+            case TreeDiffKind::MOVED_FROM:
+                columns.old_hashes.push_back(-1);
+                columns.new_hashes.push_back(hash);
+                break;
+            case TreeDiffKind::REMOVED:
+            case TreeDiffKind::MOVED_TO:
+                columns.old_hashes.push_back(hash);
+                columns.new_hashes.push_back(-1);
+                break;
+            case TreeDiffKind::MODIFIED:
+                columns.old_hashes.push_back(hash);
+                columns.new_hashes.push_back(intern(diff.new_hashes[i]));
+                break;
+        }
+
+        dir += diff.names[i];
+        dir += '/';
+        ancestors.push_back(i);
+        dir_lengths.push_back(dir.size());
+    }
+
+    return columns;
+}
@@ -0,0 +1,56 @@
+#ifndef TREE_DIFF_H
+#define TREE_DIFF_H
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// The kinds of tree diff entries, in the order of the Diff classes of libcaf.repository
+enum class TreeDiffKind : uint8_t {
+    ADDED,
+    REMOVED,
+    MODIFIED,
+    MOVED_TO,
+    MOVED_FROM
+};
+
+// The diff of two trees as parallel arrays with one element per entry, in depth-first order with siblings
+// sorted by name. The parent of an entry is the closest earlier entry one level less deep. Each half of a
+// move holds the index of the other half in `partners`, and every other entry holds -1. `hashes` holds the
+// hash of the entry's record, and `new_hashes` the hash of the new record of a modified entry, or is empty.
+struct TreeDiff {
+    std::vector<uint8_t> kinds;
+    std::vector<uint32_t> depths;
+    std::vector<uint8_t> types;
+    std::vector<std::string> hashes;
+    std::vector<std::string> new_hashes;
+    std::vector<std::string> names;
+    std::vector<int64_t> partners;
+};
+
+// A tree diff in flat columns without per-entry strings, for bulk processing. Entries are in the order of the
+// TreeDiff. The full path of entry i is paths[path_offsets[i], path_offsets[i + 1]), and the entries below it
+// are those from i + 1 up to ends[i]. Distinct hashes are stored once, back to back in `hashes`, and entries
+// refer to them by index in `old_hashes` and `new_hashes`, with -1 for a side that has no record.
+struct DiffColumns {
+    std::vector<uint8_t> kinds;
+    std::vector<uint8_t> types;
+    std::vector<int64_t> parents;
+    std::vector<int64_t> ends;
+    std::vector<int64_t> partners;
+    std::vector<int64_t> path_offsets;
+    std::string paths;
+    std::vector<int64_t> old_hashes;
+    std::vector<int64_t> new_hashes;
+    std::string hashes;
+};
+
+// Diff two stored trees recursively, skipping identical subtrees by hash and pairing removed and added records
+// with the same hash into moves, preferring records with the same name. An empty hash stands for an empty tree.
+TreeDiff diff_trees(const std::string& content_root_dir, const std::string& tree_hash1,
+                    const std::string& tree_hash2);
+
+// Convert a tree diff to flat columns, joining names into full paths and interning hashes.
+DiffColumns diff_columns(const TreeDiff& diff);
+
+#endif // TREE_DIFF_H
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from libcaf.repository import Repository, branch_ref
+from pytest import CaptureFixture
+
+from caf import cli_commands
+
+
+def test_checkout_branch(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    file = temp_repo.working_dir / 'file.txt'
+    file.write_text('main')
+    main_commit = temp_repo.commit_working_dir('Tester', 'Main commit')
+    temp_repo.add_branch('feature')
+    temp_repo.update_ref(branch_ref('feature'), main_commit)
+
+    assert cli_commands.checkout(working_dir_path=temp_repo.working_dir, ref='feature') == 0
+    file.write_text('feature')
+    temp_repo.commit_working_dir('Tester', 'Feature commit')
+    capsys.readouterr()
+
+    assert cli_commands.checkout(working_dir_path=temp_repo.working_dir, ref='main') == 0
+
+    output = capsys.readouterr().out
+    assert f'Switched to branch "main" at {main_commit}' in output
+    assert 'Updated 1 files, removed 0 files' in output
+    assert file.read_text() == 'main'
+
+
+def test_checkout_local_changes(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    file = temp_repo.working_dir / 'file.txt'
+    file.write_text('first')
+    first = temp_repo.commit_working_dir('Tester', 'First commit')
+    file.write_text('second')
+    temp_repo.commit_working_dir('Tester', 'Second commit')
+    file.write_text('local')
+
+    assert cli_commands.checkout(working_dir_path=temp_repo.working_dir, ref=first) == -1
+    assert 'would overwrite local changes' in capsys.readouterr().err
+
+    assert cli_commands.checkout(working_dir_path=temp_repo.working_dir, ref=first, force=True) == 0
+    assert 'HEAD is now detached' in capsys.readouterr().out
+    assert file.read_text() == 'first'
+
+
+def test_checkout_no_repo(temp_repo_dir: Path, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.checkout(working_dir_path=temp_repo_dir, ref='main') == -1
+    assert 'No repository found' in capsys.readouterr().err
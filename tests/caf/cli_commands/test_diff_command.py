@@ -214,3 +214,218 @@ def test_diff_nested_children_indentation(temp_repo: Repository, parse_commit_ha
 
     assert found_directory_diff, 'Directory modification should be detected'
     assert found_nested_indentation, 'Nested children should be indented by 3 spaces'
+
+
+def test_diff_prints_full_paths_of_nested_changes(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                                                  capsys: CaptureFixture[str]) -> None:
+    for name in ('src', 'dst'):
+        (temp_repo.working_dir / name).mkdir()
+        (temp_repo.working_dir / name / 'keep.txt').write_text(name)
+    (temp_repo.working_dir / 'src' / 'moved.txt').write_text('Moved content')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (temp_repo.working_dir / 'src' / 'moved.txt').rename(temp_repo.working_dir / 'dst' / 'moved.txt')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Moved a file') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2) == 0
+
+    output = capsys.readouterr().out
+    assert 'Modified: dst\n' in output
+    assert '   Moved: src/moved.txt -> dst/moved.txt\n' in output
+
+
+def test_diff_patch(temp_repo: Repository, parse_commit_hash: Callable[[], str], capsys: CaptureFixture[str]) -> None:
+    file1 = temp_repo.working_dir / 'file1.txt'
+    file1.write_text('one\ntwo\nthree\n')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\1\2')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    file1.write_text('one\n2\nthree\n')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\1\3')
+    (temp_repo.working_dir / 'new.txt').write_text('new\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Second commit') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             patch=True) == 0
+
+    output = capsys.readouterr().out
+    assert 'Modified: file1.txt\n--- a/file1.txt\n+++ b/file1.txt\n@@ -1,3 +1,3 @@\n one\n-two\n+2\n three\n' in output
+    assert 'Binary files a/image.bin and b/image.bin differ' in output
+    assert '--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,1 @@\n+new\n' in output
+
+
+def test_diff_patch_expands_directories(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                                        capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'a.txt').write_text('a\n')
+    (temp_repo.working_dir / 'olddir').mkdir()
+    (temp_repo.working_dir / 'olddir' / 'gone.txt').write_text('gone\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (temp_repo.working_dir / 'olddir' / 'gone.txt').unlink()
+    (temp_repo.working_dir / 'olddir').rmdir()
+    (temp_repo.working_dir / 'newdir' / 'sub').mkdir(parents=True)
+    (temp_repo.working_dir / 'newdir' / 'sub' / 'f.txt').write_text('f\n')
+    (temp_repo.working_dir / 'a.txt').unlink()
+    (temp_repo.working_dir / 'a.txt').mkdir()
+    (temp_repo.working_dir / 'a.txt' / 'g').write_text('g\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Second commit') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             patch=True) == 0
+
+    output = capsys.readouterr().out
+    assert '--- /dev/null\n+++ b/newdir/sub/f.txt\n@@ -0,0 +1,1 @@\n+f\n' in output
+    assert '--- a/olddir/gone.txt\n+++ /dev/null\n@@ -1,1 +0,0 @@\n-gone\n' in output
+    assert '--- a/a.txt\n+++ /dev/null\n@@ -1,1 +0,0 @@\n-a\n' in output
+    assert '--- /dev/null\n+++ b/a.txt/g\n@@ -0,0 +1,1 @@\n+g\n' in output
+
+
+def test_diff_stat_and_numstat(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                               capsys: CaptureFixture[str]) -> None:
+    file1 = temp_repo.working_dir / 'file1.txt'
+    file1.write_text('one\ntwo\nthree\n')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\1')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    file1.write_text('one\n2\nthree\nfour\n')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\2')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Second commit') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             numstat=True) == 0
+    assert capsys.readouterr().out == '2\t1\tfile1.txt\n-\t-\timage.bin\n'
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             stat=True) == 0
+    assert capsys.readouterr().out == (' file1.txt | 3 ++-\n'
+                                       ' image.bin | Bin\n'
+                                       ' 2 files changed, 2 insertions(+), 1 deletions(-)\n')
+
+
+def test_diff_worktree(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                       capsys: CaptureFixture[str]) -> None:
+    file1 = temp_repo.working_dir / 'file1.txt'
+    file1.write_text('Original content')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash = parse_commit_hash()
+
+    file1.write_text('Uncommitted content')
+    (temp_repo.working_dir / 'new.txt').write_text('New file')
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash, commit2=None,
+                             worktree=True) == 0
+
+    output = capsys.readouterr().out
+    assert 'Modified: file1.txt' in output
+    assert 'Added: new.txt' in output
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash, commit2=commit_hash,
+                             worktree=True) == -1
+    assert 'Exactly one commit' in capsys.readouterr().err
+
+
+def test_diff_pathspec(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                       capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'src').mkdir()
+    (temp_repo.working_dir / 'src' / 'main.py').write_text('one\n')
+    (temp_repo.working_dir / 'notes.txt').write_text('one\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (temp_repo.working_dir / 'src' / 'main.py').write_text('two\n')
+    (temp_repo.working_dir / 'notes.txt').write_text('two\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Second commit') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             path=['src/*.py']) == 0
+    output = capsys.readouterr().out
+    assert 'Modified: src/main.py' in output
+    assert 'notes.txt' not in output
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             numstat=True, path=['*.txt']) == 0
+    assert capsys.readouterr().out == '1\t1\tnotes.txt\n'
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=None,
+                             worktree=True, path=['src']) == -1
+    assert 'not supported with --worktree' in capsys.readouterr().err
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             path=['[]']) == 0
+    assert 'No changes detected' in capsys.readouterr().out
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             path=['[z-a]']) == -1
+    assert 'Invalid pathspec pattern' in capsys.readouterr().err
+
+
+def test_diff_find_renames(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                           capsys: CaptureFixture[str]) -> None:
+    lines = ''.join(f'line {i}\n' for i in range(40))
+    (temp_repo.working_dir / 'old.txt').write_text(lines)
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (temp_repo.working_dir / 'old.txt').unlink()
+    (temp_repo.working_dir / 'new.txt').write_text(lines + 'one more line\n')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Rename and edit') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2) == 0
+    assert 'Moved' not in capsys.readouterr().out
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             find_renames=True) == 0
+    assert 'Moved: old.txt -> new.txt' in capsys.readouterr().out
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             find_renames=True, numstat=True) == 0
+    assert capsys.readouterr().out == '1\t0\told.txt => new.txt\n'
+
+
+def test_diff_low_memory(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                         capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'dir').mkdir()
+    (temp_repo.working_dir / 'dir' / 'file.txt').write_text('moved')
+    (temp_repo.working_dir / 'other.txt').write_text('old')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Initial commit') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (temp_repo.working_dir / 'dir' / 'file.txt').rename(temp_repo.working_dir / 'file.txt')
+    (temp_repo.working_dir / 'other.txt').write_text('new')
+
+    assert cli_commands.commit(working_dir_path=temp_repo.working_dir, author='Test', message='Move a file') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             low_memory=True) == 0
+    output = capsys.readouterr().out
+    assert 'Moved: dir/file.txt -> file.txt' in output
+    assert 'Modified: other.txt' in output
+
+    assert cli_commands.diff(working_dir_path=temp_repo.working_dir, commit1=commit_hash1, commit2=commit_hash2,
+                             low_memory=True, stat=True) == -1
+    assert 'not supported with --stat' in capsys.readouterr().err
@@ -31,6 +31,7 @@ def test_hash_file_with_write(temp_repo: Repository, temp_content: tuple[Path, s
     output = capsys.readouterr().out
     assert f'Hash: {expected_hash}' in output
     assert f'Saved file {temp_file} to CAF repository' in output
+    assert 'Copy methods: ' in output
 
     with open_content_for_reading(temp_repo.working_dir / DEFAULT_REPO_DIR / OBJECTS_SUBDIR, expected_hash) as f:
         saved_content = f.read()
@@ -48,3 +48,32 @@ def test_log_repo_error(temp_repo: Repository, capsys: CaptureFixture[str]) -> N
 def test_log_no_commits(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
     assert cli_commands.log(working_dir_path=temp_repo.working_dir) == 0
     assert 'No commits in the repository' in capsys.readouterr().out
+
+
+def test_log_pathspec(temp_repo: Repository, parse_commit_hash: Callable[[], str],
+                      capsys: CaptureFixture[str]) -> None:
+    working_dir = temp_repo.working_dir
+    (working_dir / 'a.txt').write_text('a')
+    assert cli_commands.commit(working_dir_path=working_dir, author='Log Tester', message='Add a') == 0
+    commit_hash1 = parse_commit_hash()
+
+    (working_dir / 'b.txt').write_text('b')
+    assert cli_commands.commit(working_dir_path=working_dir, author='Log Tester', message='Add b') == 0
+    commit_hash2 = parse_commit_hash()
+
+    assert cli_commands.log(working_dir_path=working_dir, path=['a.txt']) == 0
+
+    output = capsys.readouterr().out
+    assert commit_hash1 in output
+    assert commit_hash2 not in output
+
+
+def test_log_abbrev_commit(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'log_test.txt').write_text('First commit content')
+    commit_hash = temp_repo.commit_working_dir('Log Tester', 'First commit')
+
+    assert cli_commands.log(working_dir_path=temp_repo.working_dir, abbrev_commit=True) == 0
+
+    output: str = capsys.readouterr().out
+    assert commit_hash not in output
+    assert f'Commit: {commit_hash[:4]}\n' in output
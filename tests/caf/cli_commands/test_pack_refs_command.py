@@ -0,0 +1,21 @@
+from libcaf.repository import Repository
+from pytest import CaptureFixture
+
+from caf import cli_commands
+
+
+def test_pack_refs_command(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    commit = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    temp_repo.create_tag('v1', commit)
+
+    assert cli_commands.pack_refs(working_dir_path=temp_repo.working_dir) == 0
+    assert 'Packed 2 references' in capsys.readouterr().out
+
+    assert cli_commands.tags(working_dir_path=temp_repo.working_dir) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == 'v1'
+
+
+def test_pack_refs_command_without_repo(temp_repo_dir, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.pack_refs(working_dir_path=temp_repo_dir) == -1
+    assert 'No repository found' in capsys.readouterr().err
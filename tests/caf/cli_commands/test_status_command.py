@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from libcaf.repository import Repository
+from pytest import CaptureFixture
+
+from caf import cli_commands
+
+
+def test_status_clean(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    assert cli_commands.status(working_dir_path=temp_repo.working_dir) == 0
+    assert 'No changes in the working directory.' in capsys.readouterr().out
+
+
+def test_status_prints_changes(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    (temp_repo.working_dir / 'old.txt').write_text('old')
+    (temp_repo.working_dir / 'gone.txt').write_text('gone')
+    temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    (temp_repo.working_dir / 'file.txt').write_text('changed')
+    (temp_repo.working_dir / 'old.txt').rename(temp_repo.working_dir / 'new.txt')
+    (temp_repo.working_dir / 'gone.txt').unlink()
+    (temp_repo.working_dir / 'added.txt').write_text('added')
+
+    assert cli_commands.status(working_dir_path=temp_repo.working_dir) == 0
+
+    output = capsys.readouterr().out
+    assert 'Modified: file.txt' in output
+    assert 'Moved: old.txt -> new.txt' in output
+    assert 'Removed: gone.txt' in output
+    assert 'Added: added.txt' in output
+
+
+def test_status_no_repo(temp_repo_dir: Path, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.status(working_dir_path=temp_repo_dir) == -1
+    assert 'No repository found' in capsys.readouterr().err
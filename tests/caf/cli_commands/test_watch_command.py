@@ -0,0 +1,39 @@
+import os
+import time
+from pathlib import Path
+
+from libcaf.repository import Repository
+from pytest import CaptureFixture
+
+from caf import cli_commands
+
+
+def test_watch_status_without_watcher(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.watch_status(working_dir_path=temp_repo.working_dir) == 0
+    assert 'No watcher has run' in capsys.readouterr().out
+
+
+def test_watch_status_reports_queue_and_lag(temp_repo: Repository, capsys: CaptureFixture[str]) -> None:
+    tracker = temp_repo.change_tracker()
+    tracker.write_state({'pid': os.getpid(), 'running': True, 'started_ns': time.time_ns(),
+                         'heartbeat_ns': time.time_ns(), 'watches': 3, 'queue_bytes': 128,
+                         'lag_ns': 2_500_000, 'overflows': 1})
+    tracker.mark(['a', 'b', 'a'])
+
+    assert cli_commands.watch_status(working_dir_path=temp_repo.working_dir) == 0
+
+    output = capsys.readouterr().out
+    assert 'Watcher: active' in output
+    assert 'Queue depth: 128 bytes' in output
+    assert 'Lag: 2.50 ms' in output
+    assert 'Pending directories: 2' in output
+
+
+def test_watch_status_no_repo(temp_repo_dir: Path, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.watch_status(working_dir_path=temp_repo_dir) == -1
+    assert 'No repository found' in capsys.readouterr().err
+
+
+def test_watch_no_repo(temp_repo_dir: Path, capsys: CaptureFixture[str]) -> None:
+    assert cli_commands.watch(working_dir_path=temp_repo_dir) == -1
+    assert 'No repository found' in capsys.readouterr().err
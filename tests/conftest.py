@@ -2,8 +2,9 @@ from collections.abc import Callable
 from pathlib import Path
 from random import choice
 
+from libcaf import repository as repository_module
 from libcaf.repository import Repository
-from pytest import CaptureFixture, FixtureRequest, TempPathFactory, fixture
+from pytest import CaptureFixture, FixtureRequest, MonkeyPatch, TempPathFactory, fixture
 
 
 def _random_string(length: int) -> str:
@@ -71,3 +72,19 @@ def parse_commit_hash(capsys: CaptureFixture[str]) -> Callable[[], str]:
         return commit_hash
 
     return _parse
+
+
+@fixture
+def count_saves(monkeypatch: MonkeyPatch) -> Callable[[], list[str]]:
+    def _count() -> list[str]:
+        saved: list[str] = []
+        original = repository_module.save_file_content
+
+        def _save(root_dir: str | Path, file_path: str | Path):
+            saved.append(Path(file_path).name)
+            return original(root_dir, file_path)
+
+        monkeypatch.setattr(repository_module, 'save_file_content', _save)
+        return saved
+
+    return _count
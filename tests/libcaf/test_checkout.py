@@ -0,0 +1,204 @@
+from pathlib import Path
+
+from libcaf import checkout as checkout_module
+from libcaf import repository as repository_module
+from libcaf.dircache import DirCache, file_signature
+from libcaf.ref import HashRef, SymRef
+from libcaf.repository import Repository, RepositoryError, branch_ref
+from pytest import MonkeyPatch, raises
+
+
+def _count_writes(monkeypatch: MonkeyPatch) -> list[str]:
+    opened: list[str] = []
+    original = checkout_module.open_content_for_reading
+
+    def _open(root_dir: str | Path, hash_value: str):
+        opened.append(hash_value)
+        return original(root_dir, hash_value)
+
+    monkeypatch.setattr(checkout_module, 'open_content_for_reading', _open)
+    return opened
+
+
+def _two_branches(repo: Repository) -> tuple[HashRef, HashRef]:
+    wd = repo.working_dir
+    for i in range(20):
+        (wd / 'src' / f'pkg{i % 4}').mkdir(parents=True, exist_ok=True)
+        (wd / 'src' / f'pkg{i % 4}' / f'file{i}.txt').write_text(f'file {i}')
+    (wd / 'old_dir').mkdir()
+    (wd / 'old_dir' / 'old.txt').write_text('old')
+    main_commit = repo.commit_working_dir('Tester', 'Main commit')
+
+    repo.add_branch('feature')
+    repo.update_ref(branch_ref('feature'), main_commit)
+    repo.checkout('feature')
+
+    (wd / 'src' / 'pkg1' / 'file1.txt').write_text('changed on feature')
+    (wd / 'old_dir' / 'old.txt').unlink()
+    (wd / 'old_dir').rmdir()
+    (wd / 'new_dir' / 'deep').mkdir(parents=True)
+    (wd / 'new_dir' / 'deep' / 'new.txt').write_text('new')
+    feature_commit = repo.commit_working_dir('Tester', 'Feature commit')
+
+    return main_commit, feature_commit
+
+
+def test_checkout_switches_branches(temp_repo: Repository) -> None:
+    main_commit, feature_commit = _two_branches(temp_repo)
+    wd = temp_repo.working_dir
+
+    result = temp_repo.checkout('main')
+
+    assert result.branch == 'main'
+    assert temp_repo.head_ref() == SymRef('heads/main')
+    assert (wd / 'src' / 'pkg1' / 'file1.txt').read_text() == 'file 1'
+    assert (wd / 'old_dir' / 'old.txt').read_text() == 'old'
+    assert not (wd / 'new_dir').exists()
+    assert temp_repo.save_dir(wd) == next(temp_repo.log()).commit.tree_hash
+
+    temp_repo.checkout('feature')
+    assert (wd / 'src' / 'pkg1' / 'file1.txt').read_text() == 'changed on feature'
+    assert not (wd / 'old_dir').exists()
+    assert temp_repo.head_commit() == feature_commit
+    assert temp_repo.status() == []
+
+
+def test_checkout_writes_only_differing_files(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    _two_branches(temp_repo)
+    opened = _count_writes(monkeypatch)
+
+    result = temp_repo.checkout('main')
+
+    assert result.written == 2
+    assert result.removed == 1
+    assert len(opened) == 2
+
+
+def test_checkout_records_stat_data(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    _two_branches(temp_repo)
+    temp_repo.checkout('main')
+
+    cache = DirCache.load(temp_repo.dircache_file())
+    file_sig = file_signature((temp_repo.working_dir / 'src' / 'pkg1' / 'file1.txt').stat())
+    assert cache.lookup_file('src/pkg1', 'file1.txt', file_sig) is not None
+
+    saved: list[str] = []
+    original = repository_module.save_file_content
+
+    def _save(root_dir: str | Path, file_path: str | Path):
+        saved.append(Path(file_path).name)
+        return original(root_dir, file_path)
+
+    monkeypatch.setattr(repository_module, 'save_file_content', _save)
+    temp_repo.commit_working_dir('Tester', 'No changes')
+    assert saved == []
+
+
+def test_checkout_detached_commit(temp_repo: Repository) -> None:
+    main_commit, _ = _two_branches(temp_repo)
+
+    result = temp_repo.checkout(main_commit)
+
+    assert result.branch is None
+    assert temp_repo.head_ref() == main_commit
+
+
+def test_checkout_refuses_to_overwrite_local_changes(temp_repo: Repository) -> None:
+    _two_branches(temp_repo)
+    changed = temp_repo.working_dir / 'src' / 'pkg1' / 'file1.txt'
+    changed.write_text('local edit')
+
+    with raises(RepositoryError, match='src/pkg1/file1.txt'):
+        temp_repo.checkout('main')
+    assert changed.read_text() == 'local edit'
+
+    temp_repo.checkout('main', force=True)
+    assert changed.read_text() == 'file 1'
+
+
+def test_checkout_refuses_to_overwrite_untracked_files(temp_repo: Repository) -> None:
+    _two_branches(temp_repo)
+    temp_repo.checkout('main')
+    (temp_repo.working_dir / 'new_dir').mkdir()
+    (temp_repo.working_dir / 'new_dir' / 'deep').mkdir()
+    (temp_repo.working_dir / 'new_dir' / 'deep' / 'new.txt').write_text('untracked')
+
+    with raises(RepositoryError, match='new_dir/deep/new.txt'):
+        temp_repo.checkout('feature')
+
+
+def test_checkout_keeps_untracked_files(temp_repo: Repository) -> None:
+    _two_branches(temp_repo)
+    untracked = temp_repo.working_dir / 'new_dir' / 'untracked.txt'
+    untracked.write_text('untracked')
+
+    temp_repo.checkout('main')
+
+    assert untracked.read_text() == 'untracked'
+    assert not (temp_repo.working_dir / 'new_dir' / 'deep').exists()
+
+
+def test_checkout_unknown_reference(temp_repo: Repository) -> None:
+    with raises(RepositoryError):
+        temp_repo.checkout('no-such-branch')
+
+
+def test_checkout_branch_without_commits(temp_repo: Repository) -> None:
+    with raises(RepositoryError, match='does not point to a commit'):
+        temp_repo.checkout('main')
+
+
+def _directory_becomes_file(repo: Repository) -> tuple[HashRef, HashRef]:
+    wd = repo.working_dir
+    (wd / 'd' / 'sub').mkdir(parents=True)
+    (wd / 'd' / 'f.txt').write_text('f')
+    (wd / 'd' / 'sub' / 'g.txt').write_text('g')
+    dir_commit = repo.commit_working_dir('Tester', 'Directory')
+
+    (wd / 'd' / 'sub' / 'g.txt').unlink()
+    (wd / 'd' / 'sub').rmdir()
+    (wd / 'd' / 'f.txt').unlink()
+    (wd / 'd').rmdir()
+    (wd / 'd').write_text('now a file')
+    file_commit = repo.commit_working_dir('Tester', 'File')
+
+    repo.checkout(dir_commit)
+    return dir_commit, file_commit
+
+
+def test_checkout_directory_becomes_file(temp_repo: Repository) -> None:
+    _, file_commit = _directory_becomes_file(temp_repo)
+
+    temp_repo.checkout(file_commit)
+
+    assert (temp_repo.working_dir / 'd').read_text() == 'now a file'
+    assert temp_repo.save_dir(temp_repo.working_dir) == next(temp_repo.log()).commit.tree_hash
+
+
+def test_checkout_directory_with_untracked_files_becomes_file(temp_repo: Repository) -> None:
+    dir_commit, file_commit = _directory_becomes_file(temp_repo)
+    (temp_repo.working_dir / 'd' / 'sub' / 'untracked.txt').write_text('untracked')
+
+    with raises(RepositoryError, match='d'):
+        temp_repo.checkout(file_commit)
+    assert (temp_repo.working_dir / 'd' / 'f.txt').read_text() == 'f'
+
+    temp_repo.checkout(file_commit, force=True)
+
+    assert (temp_repo.working_dir / 'd').read_text() == 'now a file'
+    assert temp_repo.head_ref() == file_commit
+    assert not list(temp_repo.working_dir.glob('.*.caf-tmp'))
+
+
+def test_failed_write_leaves_no_temporary_file(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    _two_branches(temp_repo)
+
+    def _copy(src, dst) -> None:
+        dst.write(b'partial')
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(checkout_module.shutil, 'copyfileobj', _copy)
+    with raises(RepositoryError):
+        temp_repo.checkout('main')
+
+    assert not list(temp_repo.working_dir.rglob('*.caf-tmp'))
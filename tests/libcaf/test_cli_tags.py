@@ -61,3 +61,33 @@ def test_cli_create_tag_missing_arguments(temp_repo, capsys):
     captured = capsys.readouterr()
     assert "Tag name is required" in captured.err or \
            "Commit hash is required" in captured.err
+
+
+def test_create_tags_from_file(temp_repo: Repository, tmp_path, capsys: CaptureFixture[str]) -> None:
+    commit_hash = _make_commit(temp_repo)
+    manifest = tmp_path / "tags.txt"
+    manifest.write_text(f"# release tags\nv1.0 {commit_hash}\nv1.1 main\n\nv1.2\nv1.0 main\nv2.0 missing\n")
+
+    assert cli_commands.create_tags(working_dir_path=temp_repo.working_dir, from_file=str(manifest)) == -1
+
+    captured = capsys.readouterr()
+    assert "Added 2 of 5 tags." in captured.out
+    assert "line 5" in captured.err
+    assert "line 6" in captured.err
+    assert "v2.0" in captured.err
+    assert sorted(temp_repo.tags()) == ["v1.0", "v1.1"]
+
+
+def test_create_tags_reports_write_errors(temp_repo: Repository, tmp_path, monkeypatch,
+                                         capsys: CaptureFixture[str]) -> None:
+    commit_hash = _make_commit(temp_repo)
+    manifest = tmp_path / "tags.txt"
+    manifest.write_text(f"v1.0 {commit_hash}\n")
+
+    def _fail(*args, **kwargs):
+        raise OSError(24, "Too many open files")
+
+    monkeypatch.setattr(Repository, "create_tags_bulk", _fail)
+
+    assert cli_commands.create_tags(working_dir_path=temp_repo.working_dir, from_file=str(manifest)) == -1
+    assert "Too many open files" in capsys.readouterr().err
@@ -0,0 +1,134 @@
+import random
+
+from libcaf import TreeDiffKind, TreeRecordType
+from libcaf.constants import HASH_LENGTH
+from libcaf.repository import Diff, MovedFromDiff, MovedToDiff, Repository
+from pytest import importorskip, raises
+
+
+def _path(diff: Diff) -> str:
+    names = []
+    while diff.parent is not None:
+        names.append(diff.record.name)
+        diff = diff.parent
+    return '/'.join(reversed(names))
+
+
+def _describe(diffs: list[Diff]) -> list[tuple]:
+    described = []
+    for diff in diffs:
+        partner = None
+        if isinstance(diff, MovedToDiff):
+            partner = _path(diff.moved_to)
+        elif isinstance(diff, MovedFromDiff):
+            partner = _path(diff.moved_from)
+        described.append((type(diff).__name__, diff.record.name, diff.record.hash, diff.record.type, partner,
+                          _describe(diff.children)))
+    return described
+
+
+def _commits(repo: Repository) -> tuple[str, str]:
+    root = repo.working_dir
+    (root / 'dir' / 'sub').mkdir(parents=True)
+    (root / 'dir' / 'sub' / 'moved.txt').write_text('moved')
+    (root / 'dir' / 'changed.txt').write_text('old')
+    (root / 'removed.txt').write_text('removed')
+    commit1 = repo.commit_working_dir('Tester', 'Initial commit')
+
+    (root / 'dir' / 'sub' / 'moved.txt').rename(root / 'dir' / 'moved.txt')
+    (root / 'dir' / 'sub' / 'kept.txt').write_text('same')
+    (root / 'dir' / 'changed.txt').write_text('new')
+    (root / 'removed.txt').unlink()
+    (root / 'added.txt').write_text('same')
+    commit2 = repo.commit_working_dir('Tester', 'Second commit')
+
+    return commit1, commit2
+
+
+def test_columns(temp_repo: Repository) -> None:
+    commit1, commit2 = _commits(temp_repo)
+
+    diff = temp_repo.diff_commits_columnar(commit1, commit2)
+
+    paths = [diff.path(i) for i in range(len(diff))]
+    assert paths == ['added.txt', 'dir', 'dir/changed.txt', 'dir/moved.txt', 'dir/sub', 'dir/sub/kept.txt',
+                     'dir/sub/moved.txt', 'removed.txt']
+    assert [diff.kind(i) for i in range(len(diff))] == [
+        TreeDiffKind.ADDED, TreeDiffKind.MODIFIED, TreeDiffKind.MODIFIED, TreeDiffKind.MOVED_FROM,
+        TreeDiffKind.MODIFIED, TreeDiffKind.ADDED, TreeDiffKind.MOVED_TO, TreeDiffKind.REMOVED]
+    assert list(diff.parents) == [-1, -1, 1, 1, 1, 4, 4, -1]
+    assert list(diff.partners) == [-1, -1, -1, 6, -1, -1, 3, -1]
+    assert list(diff.children()) == [0, 1, 7]
+    assert list(diff.children(1)) == [2, 3, 4]
+    assert diff.types[1] == TreeRecordType.TREE.value
+
+    assert diff.old_hash(0) is None
+    assert diff.new_hash(7) is None
+    assert diff.old_hash(2) != diff.new_hash(2)
+    assert diff.old_hash(6) == diff.new_hash(3)
+    # Files with the same contents share one stored hash
+    assert diff.new_hashes[0] == diff.new_hashes[5]
+    assert len(diff.hashes) % HASH_LENGTH == 0
+
+
+def test_diffs_match_diff_commits(temp_repo: Repository) -> None:
+    rng = random.Random(0)
+    root = temp_repo.working_dir
+    commits = []
+
+    for _ in range(8):
+        for _ in range(8):
+            directory = root / rng.choice(['', 'a', 'a/b', 'c'])
+            directory.mkdir(parents=True, exist_ok=True)
+            files = [path for path in directory.iterdir() if path.is_file()]
+            if files and rng.random() < 0.4:
+                rng.choice(files).unlink()
+            else:
+                (directory / f'f{rng.randrange(6)}.txt').write_text(rng.choice(['same', 'dup', 'x', 'y']))
+        commits.append(temp_repo.commit_working_dir('Tester', 'Random commit'))
+
+    for commit1, commit2 in zip(commits, commits[2:]):
+        expected = _describe(temp_repo.diff_commits(commit1, commit2))
+        assert _describe(temp_repo.diff_commits_columnar(commit1, commit2).diffs()) == expected
+
+
+def test_diffs_of_selected_entries(temp_repo: Repository) -> None:
+    commit1, commit2 = _commits(temp_repo)
+    diff = temp_repo.diff_commits_columnar(commit1, commit2)
+
+    top_level = diff.diffs([3, 7])
+
+    # The enclosing directories and the other half of the move are built, nothing else
+    assert [entry[1] for entry in _describe(top_level)] == ['dir', 'removed.txt']
+    directory = top_level[0]
+    assert [child.record.name for child in directory.children] == ['moved.txt', 'sub']
+    moved_from = directory.children[0]
+    assert isinstance(moved_from, MovedFromDiff)
+    assert _path(moved_from.moved_from) == 'dir/sub/moved.txt'
+    assert directory.children[1].children == [moved_from.moved_from]
+
+    with raises(IndexError):
+        diff.diffs([len(diff)])
+
+
+def test_identical_commits(temp_repo: Repository) -> None:
+    commit1, _ = _commits(temp_repo)
+
+    diff = temp_repo.diff_commits_columnar(commit1, commit1)
+
+    assert len(diff) == 0
+    assert diff.diffs() == []
+    assert list(diff.children()) == []
+
+
+def test_bulk_filtering_with_numpy(temp_repo: Repository) -> None:
+    numpy = importorskip('numpy')
+    commit1, commit2 = _commits(temp_repo)
+    diff = temp_repo.diff_commits_columnar(commit1, commit2)
+
+    added = numpy.flatnonzero(numpy.asarray(diff.kinds) == TreeDiffKind.ADDED.value)
+    hashes = numpy.frombuffer(diff.hashes, f'S{HASH_LENGTH}')
+
+    assert [diff.path(i) for i in added] == ['added.txt', 'dir/sub/kept.txt']
+    assert hashes[numpy.asarray(diff.new_hashes)[added[0]]].decode() == diff.new_hash(0)
+    assert [entry.record.name for entry in diff.diffs(added)] == ['added.txt', 'dir']
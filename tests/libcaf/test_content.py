@@ -1,9 +1,10 @@
 import hashlib
+import os
 from pathlib import Path
 
-from libcaf.plumbing import (delete_content, hash_file, open_content_for_reading, open_content_for_writing,
-                             save_file_content)
-from pytest import mark, raises
+from libcaf.plumbing import (copy_stats, delete_content, hash_file, large_file_threshold, open_content_for_reading,
+                             open_content_for_writing, reset_copy_stats, save_file_content, set_large_file_threshold)
+from pytest import MonkeyPatch, mark, raises
 
 
 class TestNonExistentContent:
@@ -72,3 +73,89 @@ class TestContent:
 
         delete_content(temp_repo_dir, blob.hash)
         assert not saved_file_path.exists()
+
+
+@mark.parametrize('method', ['copy_file_range', 'buffered'])
+def test_save_file_content_copy_methods(temp_repo_dir: Path, temp_content_file_factory, monkeypatch: MonkeyPatch,
+                                        method: str) -> None:
+    monkeypatch.setenv('CAF_COPY_METHOD', method)
+    file, expected_content = temp_content_file_factory(length=300000)
+    reset_copy_stats()
+
+    blob = save_file_content(temp_repo_dir, file)
+
+    assert (temp_repo_dir / blob.hash[:2] / blob.hash).read_bytes() == expected_content
+    assert copy_stats()[method] == 1
+    assert sum(copy_stats().values()) == 1
+
+
+def test_save_file_content_overwrites_longer_content(temp_repo_dir: Path, temp_content: tuple[Path, str]) -> None:
+    file, expected_content = temp_content
+    blob = save_file_content(temp_repo_dir, file)
+    saved_file = temp_repo_dir / blob.hash[:2] / blob.hash
+    saved_file.write_bytes(expected_content + b'stale tail')
+
+    save_file_content(temp_repo_dir, file)
+
+    assert saved_file.read_bytes() == expected_content
+
+
+def test_save_file_content_never_rewrites_an_object_in_place(temp_repo_dir: Path,
+                                                             temp_content: tuple[Path, str]) -> None:
+    file, expected_content = temp_content
+    blob = save_file_content(temp_repo_dir, file)
+    saved_file = temp_repo_dir / blob.hash[:2] / blob.hash
+
+    # A reader that opened the object before it was saved again keeps the old file, which is never truncated
+    with saved_file.open('rb') as reader:
+        save_file_content(temp_repo_dir, file)
+        assert os.fstat(reader.fileno()).st_ino != saved_file.stat().st_ino
+        assert reader.read() == expected_content
+
+    assert saved_file.read_bytes() == expected_content
+    assert sorted(path.name for path in saved_file.parent.iterdir()) == [blob.hash]
+
+
+def test_copy_stats_report_a_method_per_copy(temp_repo_dir: Path, temp_content: tuple[Path, str]) -> None:
+    file, _ = temp_content
+    reset_copy_stats()
+
+    save_file_content(temp_repo_dir, file)
+
+    assert set(copy_stats()) == {'reflink', 'copy_file_range', 'buffered'}
+    assert sum(copy_stats().values()) == 1
+
+
+@mark.parametrize('method', ['copy_file_range', 'buffered'])
+@mark.parametrize('length', [0, 1, 5 * 1024 * 1024 + 7])
+def test_large_file_mode_hashes_and_saves_the_same_content(temp_repo_dir: Path, temp_content_file_factory,
+                                                           monkeypatch: MonkeyPatch, method: str, length: int) -> None:
+    monkeypatch.setenv('CAF_COPY_METHOD', method)
+    file, expected_content = temp_content_file_factory(length=length)
+    expected_hash = hashlib.sha1(expected_content).hexdigest()
+    original_threshold = large_file_threshold()
+
+    try:
+        set_large_file_threshold(0)
+        assert hash_file(file) == expected_hash
+        blob = save_file_content(temp_repo_dir, file)
+    finally:
+        set_large_file_threshold(original_threshold)
+
+    assert blob.hash == expected_hash
+    assert (temp_repo_dir / blob.hash[:2] / blob.hash).read_bytes() == expected_content
+
+
+def test_large_file_threshold_can_be_changed() -> None:
+    original_threshold = large_file_threshold()
+
+    try:
+        set_large_file_threshold(1234)
+        assert large_file_threshold() == 1234
+    finally:
+        set_large_file_threshold(original_threshold)
+
+    assert large_file_threshold() == original_threshold
+
+    with raises(ValueError):
+        set_large_file_threshold(-1)
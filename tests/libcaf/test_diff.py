@@ -279,3 +279,64 @@ def test_diff_moved_file_removed_first(temp_repo: Repository) -> None:
     assert len(modified_child.moved_to.parent.children) == 1
     assert modified_child.moved_to.parent.record.name == 'dir1'
     assert modified_child.moved_to.record.name == 'file_c.txt'
+
+
+def test_diff_move_leaves_siblings_with_the_same_content(temp_repo: Repository) -> None:
+    src = temp_repo.working_dir / 'src'
+    src.mkdir()
+    (src / 'a.txt').write_text('same')
+    (src / 'b.txt').write_text('same')
+    (src / 'keep.txt').write_text('same')
+    (temp_repo.working_dir / 'dst').mkdir()
+    (temp_repo.working_dir / 'dst' / 'other.txt').write_text('other')
+
+    commit1 = temp_repo.commit_working_dir('Tester', 'Duplicates')
+
+    (src / 'a.txt').rename(temp_repo.working_dir / 'dst' / 'a.txt')
+    (src / 'b.txt').rename(src / 'c.txt')
+
+    commit2 = temp_repo.commit_working_dir('Tester', 'Move two duplicates')
+
+    diffs = {diff.record.name: diff for diff in temp_repo.diff_commits(commit1, commit2)}
+    src_children = {child.record.name: child for child in diffs['src'].children}
+    dst_children = {child.record.name: child for child in diffs['dst'].children}
+
+    # Duplicate content may be paired either way, but every half of a move is paired exactly once
+    assert src_children.keys() == {'a.txt', 'b.txt', 'c.txt'}
+    assert dst_children.keys() == {'a.txt'}
+    assert isinstance(src_children['a.txt'], MovedToDiff)
+    assert isinstance(src_children['b.txt'], MovedToDiff)
+    assert isinstance(src_children['c.txt'], MovedFromDiff)
+    assert isinstance(dst_children['a.txt'], MovedFromDiff)
+
+    moved_to = [src_children['a.txt'], src_children['b.txt']]
+    moved_from = [src_children['c.txt'], dst_children['a.txt']]
+    assert {id(diff.moved_to) for diff in moved_to} == {id(diff) for diff in moved_from}
+    assert all(diff.moved_from.moved_to is diff for diff in moved_from)
+
+
+def test_diff_mass_move_of_duplicates_pairs_files_by_name(temp_repo: Repository) -> None:
+    src = temp_repo.working_dir / 'src'
+    dst = temp_repo.working_dir / 'dst'
+    src.mkdir()
+    dst.mkdir()
+    (src / 'keep.txt').write_text('kept')
+    (dst / 'other.txt').write_text('other')
+    for i in range(50):
+        (src / f'file{i}.txt').write_text('same')
+
+    commit1 = temp_repo.commit_working_dir('Tester', 'Duplicates')
+
+    for i in range(50):
+        (src / f'file{i}.txt').rename(dst / f'file{i}.txt')
+
+    commit2 = temp_repo.commit_working_dir('Tester', 'Move the files')
+
+    diffs = {diff.record.name: diff for diff in temp_repo.diff_commits(commit1, commit2)}
+
+    assert len(diffs['src'].children) == 50
+    assert len(diffs['dst'].children) == 50
+    for diff in diffs['src'].children:
+        assert isinstance(diff, MovedToDiff)
+        assert diff.moved_to.record.name == diff.record.name
+        assert diff.moved_to.moved_from is diff
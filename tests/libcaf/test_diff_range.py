@@ -0,0 +1,92 @@
+from collections import Counter
+
+from libcaf.repository import Repository, RepositoryError
+from pytest import raises
+
+
+def _write(repo: Repository, paths: dict[str, str]) -> None:
+    for path, content in paths.items():
+        (repo.working_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo.working_dir / path).write_text(content)
+
+
+def _names(diffs) -> list[str]:
+    return [diff.record.name for diff in diffs]
+
+
+def _commits(repo: Repository) -> list[str]:
+    _write(repo, {'a/one.txt': '1', 'b/two.txt': '2'})
+    commits = [repo.commit_working_dir('Tester', 'Initial commit')]
+    _write(repo, {'a/one.txt': 'changed'})
+    commits.append(repo.commit_working_dir('Tester', 'Change a'))
+    _write(repo, {'b/two.txt': 'changed'})
+    commits.append(repo.commit_working_dir('Tester', 'Change b'))
+    commits.append(repo.commit_working_dir('Tester', 'Empty commit'))
+    _write(repo, {'a/one.txt': 'changed again', 'c.txt': 'c'})
+    commits.append(repo.commit_working_dir('Tester', 'Change a and add c'))
+    return commits
+
+
+def test_diff_range_matches_diff_commits(temp_repo: Repository) -> None:
+    commits = _commits(temp_repo)
+
+    results = list(temp_repo.diff_range(commits[0], commits[-1]))
+
+    assert [entry.commit_ref for entry, _ in results] == commits[:0:-1]
+    for (entry, diffs), parent in zip(results, commits[-2::-1]):
+        assert _names(diffs) == _names(temp_repo.diff_commits(parent, entry.commit_ref))
+    assert results[1][1] == []
+
+
+def test_diff_range_to_first_commit(temp_repo: Repository) -> None:
+    commits = _commits(temp_repo)
+
+    results = list(temp_repo.diff_range(None))
+
+    assert [entry.commit_ref for entry, _ in results] == commits[::-1]
+    assert sorted(_names(results[-1][1])) == ['a', 'b']
+
+
+def test_diff_range_loads_each_tree_once(temp_repo: Repository) -> None:
+    _commits(temp_repo)
+
+    loaded: list[str] = []
+    original = temp_repo._load_stored_tree
+
+    def _load(tree_hash: str):
+        loaded.append(tree_hash)
+        return original(tree_hash)
+
+    temp_repo._load_stored_tree = _load
+    list(temp_repo.diff_range(None))
+
+    assert loaded
+    assert max(Counter(loaded).values()) == 1
+
+
+def test_diff_range_pathspec(temp_repo: Repository) -> None:
+    commits = _commits(temp_repo)
+
+    results = list(temp_repo.diff_range(commits[0], pathspec=['b']))
+
+    assert [_names(diffs) for _, diffs in results] == [[], [], ['b'], []]
+
+
+def test_diff_range_not_an_ancestor(temp_repo: Repository) -> None:
+    commits = _commits(temp_repo)
+
+    with raises(RepositoryError):
+        list(temp_repo.diff_range(commits[-1], commits[1]))
+
+    # The range is checked before the first diff is yielded
+    with raises(RepositoryError):
+        next(temp_repo.diff_range(commits[-1], commits[2]))
+
+
+def test_diff_range_small_tree_cache(temp_repo: Repository) -> None:
+    commits = _commits(temp_repo)
+
+    results = list(temp_repo.diff_range(None, tree_cache_size=1))
+
+    assert [entry.commit_ref for entry, _ in results] == commits[::-1]
+    assert _names(results[0][1]) == _names(temp_repo.diff_commits(commits[-2], commits[-1]))
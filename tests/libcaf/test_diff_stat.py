@@ -0,0 +1,49 @@
+from libcaf.plumbing import save_file_content, stat_blobs
+from libcaf.repository import FileStat, Repository
+
+
+def test_stat_blobs(temp_repo: Repository) -> None:
+    old = temp_repo.working_dir / 'old.txt'
+    new = temp_repo.working_dir / 'new.txt'
+    old.write_text('one\ntwo\nthree\n')
+    new.write_text('one\n2\nthree\nfour\n')
+    old_hash = save_file_content(temp_repo.objects_dir(), old).hash
+    new_hash = save_file_content(temp_repo.objects_dir(), new).hash
+
+    line_stat = stat_blobs(temp_repo.objects_dir(), old_hash, new_hash)
+
+    assert not line_stat.binary
+    assert (line_stat.additions, line_stat.deletions) == (2, 1)
+    assert stat_blobs(temp_repo.objects_dir(), None, new_hash).additions == 4
+
+
+def test_diff_stat(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'dir').mkdir()
+    (temp_repo.working_dir / 'dir' / 'modified.txt').write_text('a\nb\nc\n')
+    (temp_repo.working_dir / 'removed.txt').write_text('gone\n')
+    (temp_repo.working_dir / 'moved.txt').write_text('moved\n')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\1')
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    (temp_repo.working_dir / 'dir' / 'modified.txt').write_text('a\nB\nc\nd\n')
+    (temp_repo.working_dir / 'removed.txt').unlink()
+    (temp_repo.working_dir / 'moved.txt').rename(temp_repo.working_dir / 'renamed.txt')
+    (temp_repo.working_dir / 'image.bin').write_bytes(b'\0\2')
+    (temp_repo.working_dir / 'new_dir' / 'sub').mkdir(parents=True)
+    (temp_repo.working_dir / 'new_dir' / 'sub' / 'file.txt').write_text('1\n2\n')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    assert temp_repo.diff_stat(commit1, commit2, workers=2) == [
+        FileStat('dir/modified.txt', 2, 1),
+        FileStat('image.bin', 0, 0, binary=True),
+        FileStat('new_dir/sub/file.txt', 2, 0),
+        FileStat('removed.txt', 0, 1),
+        FileStat('renamed.txt', 0, 0, old_path='moved.txt'),
+    ]
+
+
+def test_diff_stat_identical_commits(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    commit = temp_repo.commit_working_dir('Tester', 'Commit')
+
+    assert temp_repo.diff_stat(commit, commit) == []
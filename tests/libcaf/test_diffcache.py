@@ -0,0 +1,169 @@
+import random
+import threading
+
+from libcaf.diffcache import TreeDiffCache
+from libcaf.repository import Diff, MovedFromDiff, MovedToDiff, Repository
+
+
+def _path(diff: Diff) -> str:
+    names = []
+    while diff.parent is not None:
+        names.append(diff.record.name)
+        diff = diff.parent
+    return '/'.join(reversed(names))
+
+
+def _describe(diffs: list[Diff]) -> list[tuple]:
+    described = []
+    for diff in diffs:
+        partner = None
+        if isinstance(diff, MovedToDiff):
+            partner = _path(diff.moved_to)
+        elif isinstance(diff, MovedFromDiff):
+            partner = _path(diff.moved_from)
+        described.append((type(diff).__name__, diff.record.name, diff.record.hash, partner,
+                          _describe(diff.children)))
+    return described
+
+
+def _write(repo: Repository, paths: dict[str, str]) -> None:
+    for path, content in paths.items():
+        (repo.working_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo.working_dir / path).write_text(content)
+
+
+def _count_loads(repo: Repository) -> list[str]:
+    loaded: list[str] = []
+    original = repo._load_stored_tree
+
+    def _load(tree_hash: str):
+        loaded.append(tree_hash)
+        return original(tree_hash)
+
+    repo._load_stored_tree = _load
+    return loaded
+
+
+def test_cached_diff_matches_diff_commits(temp_repo: Repository) -> None:
+    rng = random.Random(1)
+    root = temp_repo.working_dir
+    contents = ['same', 'dup', 'x', 'y', 'z']
+    commits = []
+
+    for _ in range(10):
+        for _ in range(8):
+            directory = root / rng.choice(['', 'a', 'a/b', 'c', 'c/d'])
+            directory.mkdir(parents=True, exist_ok=True)
+            files = [path for path in directory.iterdir() if path.is_file()]
+            if files and rng.random() < 0.4:
+                rng.choice(files).unlink()
+            else:
+                (directory / f'f{rng.randrange(6)}.txt').write_text(rng.choice(contents))
+        commits.append(temp_repo.commit_working_dir('Tester', 'Random commit'))
+
+    for commit1, commit2 in zip(commits, commits[3:]):
+        expected = _describe(temp_repo.diff_commits(commit1, commit2))
+        assert _describe(temp_repo.diff_commits(commit1, commit2, use_cache=True)) == expected
+        # The second time every level comes from the cache
+        assert _describe(temp_repo.diff_commits(commit1, commit2, use_cache=True)) == expected
+
+        expected = _describe(temp_repo.diff_commits(commit1, commit2, ['a/b', 'c/*.txt']))
+        assert _describe(temp_repo.diff_commits(commit1, commit2, ['a/b', 'c/*.txt'], use_cache=True)) == expected
+
+
+def test_cached_diff_skips_loading_trees(temp_repo: Repository) -> None:
+    _write(temp_repo, {'a/one.txt': '1', 'b/two.txt': '2'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'a/one.txt': 'changed', 'b/two.txt': 'changed'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Change a and b')
+    loaded = _count_loads(temp_repo)
+
+    temp_repo.diff_commits(commit1, commit2, use_cache=True)
+    assert len(loaded) == 6
+
+    loaded.clear()
+    diffs = temp_repo.diff_commits(commit1, commit2, use_cache=True)
+
+    assert loaded == []
+    assert [diff.record.name for diff in diffs] == ['a', 'b']
+
+
+def test_overlapping_diffs_share_subtree_entries(temp_repo: Repository) -> None:
+    _write(temp_repo, {'a/one.txt': '1', 'b/two.txt': '2'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'a/one.txt': 'changed'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Change a')
+    _write(temp_repo, {'c.txt': 'c'})
+    commit3 = temp_repo.commit_working_dir('Tester', 'Add c')
+    temp_repo.diff_commits(commit1, commit2, use_cache=True)
+    loaded = _count_loads(temp_repo)
+
+    temp_repo.diff_commits(commit1, commit3, use_cache=True)
+
+    # Only the root trees are compared again, the pair of `a` trees is the same as before
+    assert len(loaded) == 2
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path) -> None:
+    cache = TreeDiffCache(tmp_path / 'diffcache', 1000)
+    changes = [('M', f'file{i}.txt', 1, 'a' * 40, 1, 'b' * 40) for i in range(2)]
+
+    for i in range(10):
+        cache.put(f'{i:040x}', 'f' * 40, changes)
+        assert cache.get('0' * 40, 'f' * 40) is not None
+
+    assert cache.get('0' * 40, 'f' * 40) == changes
+    assert cache.get(f'{9:040x}', 'f' * 40) == changes
+    assert cache.get(f'{1:040x}', 'f' * 40) is None
+    assert sum(path.stat().st_size for path in (tmp_path / 'diffcache').rglob('*') if path.is_file()) <= 1000
+
+
+def test_cache_ignores_unreadable_entries(tmp_path) -> None:
+    cache = TreeDiffCache(tmp_path / 'diffcache', 1 << 20)
+    cache.put('a' * 40, 'b' * 40, [('A', 'new.txt', -1, '', 1, 'c' * 40)])
+
+    (tmp_path / 'diffcache' / 'aa' / ('a' * 40 + 'b' * 40)).write_text('{truncated')
+
+    assert cache.get('a' * 40, 'b' * 40) is None
+
+
+def test_concurrent_puts_of_the_same_entry(tmp_path) -> None:
+    cache = TreeDiffCache(tmp_path / 'diffcache', 1 << 20)
+    changes = [('A', 'new.txt', -1, '', 1, 'c' * 40)]
+
+    def _put() -> None:
+        for _ in range(50):
+            cache.put('a' * 40, 'b' * 40, changes)
+
+    threads = [threading.Thread(target=_put) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.get('a' * 40, 'b' * 40) == changes
+    assert not list((tmp_path / 'diffcache').rglob('*.tmp'))
+
+
+def test_new_cache_does_not_scan_entries_below_the_bound(tmp_path, monkeypatch) -> None:
+    changes = [('A', 'new.txt', -1, '', 1, 'c' * 40)]
+    TreeDiffCache(tmp_path / 'diffcache', 1 << 20).put('a' * 40, 'b' * 40, changes)
+
+    def _scan(self):
+        raise AssertionError('the cache was scanned')
+
+    monkeypatch.setattr(TreeDiffCache, '_scan', _scan)
+    for i in range(5):
+        TreeDiffCache(tmp_path / 'diffcache', 1 << 20).put(f'{i:040x}', 'b' * 40, changes)
+
+    assert TreeDiffCache(tmp_path / 'diffcache', 1 << 20).get(f'{4:040x}', 'b' * 40) == changes
+
+
+def test_failed_put_is_a_miss(tmp_path) -> None:
+    # A file where the cache directory should be makes every write fail
+    (tmp_path / 'diffcache').write_text('')
+    cache = TreeDiffCache(tmp_path / 'diffcache', 1 << 20)
+
+    cache.put('a' * 40, 'b' * 40, [('A', 'new.txt', -1, '', 1, 'c' * 40)])
+
+    assert cache.get('a' * 40, 'b' * 40) is None
@@ -0,0 +1,135 @@
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+from libcaf.dircache import DirCache
+from libcaf.repository import Repository
+from pytest import MonkeyPatch
+
+
+def _age(root: Path, seconds: int = 10) -> None:
+    """Move the mtime of every entry below root into the past, so cache entries are not racily clean."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            item = Path(dirpath) / name
+            st = item.stat()
+            os.utime(item, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+    st = root.stat()
+    os.utime(root, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+
+
+def _make_tree(repo: Repository) -> None:
+    (repo.working_dir / 'top.txt').write_text('top')
+    for d in ('a', 'b'):
+        sub = repo.working_dir / d / 'nested'
+        sub.mkdir(parents=True)
+        (sub / f'{d}1.txt').write_text(f'{d} one')
+        (sub / f'{d}2.txt').write_text(f'{d} two')
+
+
+def test_save_dir_records_cache(temp_repo: Repository) -> None:
+    _make_tree(temp_repo)
+    tree_ref = temp_repo.save_dir(temp_repo.working_dir)
+
+    cache = DirCache.load(temp_repo.dircache_file())
+    assert cache.entries[''].tree_hash == tree_ref
+    assert set(cache.entries) == {'', 'a', 'a/nested', 'b', 'b/nested'}
+    assert set(cache.entries['a/nested'].files) == {'a1.txt', 'a2.txt'}
+
+
+def test_unchanged_tree_skips_hashing(temp_repo: Repository, count_saves: Callable[[], list[str]]) -> None:
+    _make_tree(temp_repo)
+    _age(temp_repo.working_dir)
+    first = temp_repo.save_dir(temp_repo.working_dir)
+
+    saved = count_saves()
+    assert temp_repo.save_dir(temp_repo.working_dir) == first
+    assert saved == []
+
+
+def test_changed_file_rehashes_only_that_file(temp_repo: Repository, count_saves: Callable[[], list[str]]) -> None:
+    _make_tree(temp_repo)
+    _age(temp_repo.working_dir)
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    (temp_repo.working_dir / 'a' / 'nested' / 'a1.txt').write_text('a one, changed')
+
+    saved = count_saves()
+    cached_ref = temp_repo.save_dir(temp_repo.working_dir)
+    assert saved == ['a1.txt']
+
+    temp_repo.dircache_file().unlink()
+    assert temp_repo.save_dir(temp_repo.working_dir) == cached_ref
+
+
+def test_racily_clean_file_is_rehashed(temp_repo: Repository, count_saves: Callable[[], list[str]]) -> None:
+    file = temp_repo.working_dir / 'file.txt'
+    file.write_text('old')
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    # Same size, and possibly the same mtime tick as the cached signature
+    file.write_text('new')
+
+    saved = count_saves()
+    temp_repo.save_dir(temp_repo.working_dir)
+    assert saved == ['file.txt']
+
+
+def test_added_and_removed_entries(temp_repo: Repository) -> None:
+    _make_tree(temp_repo)
+    _age(temp_repo.working_dir)
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    (temp_repo.working_dir / 'b' / 'nested' / 'b2.txt').unlink()
+    (temp_repo.working_dir / 'a' / 'new.txt').write_text('new')
+    (temp_repo.working_dir / 'c').mkdir()
+    cached_ref = temp_repo.save_dir(temp_repo.working_dir)
+
+    cache = DirCache.load(temp_repo.dircache_file())
+    assert 'c' in cache.entries
+    assert set(cache.entries['b/nested'].files) == {'b1.txt'}
+
+    temp_repo.dircache_file().unlink()
+    assert temp_repo.save_dir(temp_repo.working_dir) == cached_ref
+
+
+def test_removed_directory_is_dropped(temp_repo: Repository) -> None:
+    _make_tree(temp_repo)
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    for file in (temp_repo.working_dir / 'b' / 'nested').iterdir():
+        file.unlink()
+    (temp_repo.working_dir / 'b' / 'nested').rmdir()
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    assert 'b/nested' not in DirCache.load(temp_repo.dircache_file()).entries
+
+
+def test_corrupted_cache_is_ignored(temp_repo: Repository) -> None:
+    _make_tree(temp_repo)
+    first = temp_repo.save_dir(temp_repo.working_dir)
+
+    temp_repo.dircache_file().write_text('not json')
+    assert temp_repo.save_dir(temp_repo.working_dir) == first
+
+
+def test_wide_directory_is_listed_and_saved_once(temp_repo: Repository, monkeypatch: MonkeyPatch,
+                                                 count_saves: Callable[[], list[str]]) -> None:
+    for i in range(5):
+        (temp_repo.working_dir / f'dir{i}').mkdir()
+        (temp_repo.working_dir / f'dir{i}' / 'inner.txt').write_text(f'inner {i}')
+        (temp_repo.working_dir / f'file{i}.txt').write_text(f'file {i}')
+
+    listed: list[str] = []
+    original_scandir = os.scandir
+
+    def _scandir(path: str | Path):
+        listed.append(Path(path).name)
+        return original_scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', _scandir)
+    saved = count_saves()
+    temp_repo.save_dir(temp_repo.working_dir)
+
+    assert sorted(listed) == sorted([temp_repo.working_dir.name] + [f'dir{i}' for i in range(5)])
+    assert sorted(saved) == sorted(['inner.txt'] * 5 + [f'file{i}.txt' for i in range(5)])
@@ -0,0 +1,41 @@
+import random
+
+from libcaf.extsort import MAX_MERGE_RUNS, ExternalSorter
+from pytest import raises
+
+
+def test_sorts_in_memory_without_spilling(tmp_path) -> None:
+    sorter = ExternalSorter(tmp_path, 10)
+    for item in [(3, 'c'), (1, 'a'), (2, 'b')]:
+        sorter.add(item)
+
+    assert list(sorter.sorted()) == [(1, 'a'), (2, 'b'), (3, 'c')]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spills_runs_and_merges_them(tmp_path) -> None:
+    rng = random.Random(0)
+    items = [(rng.randrange(1000), i) for i in range(5000)]
+    sorter = ExternalSorter(tmp_path, 100)
+
+    for item in items:
+        sorter.add(item)
+
+    assert 0 < sorter.runs < MAX_MERGE_RUNS
+    assert list(sorter.sorted()) == sorted(items)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_count_is_bounded(tmp_path) -> None:
+    sorter = ExternalSorter(tmp_path, 1)
+
+    for i in range(3 * MAX_MERGE_RUNS, 0, -1):
+        sorter.add((i,))
+        assert sorter.runs < MAX_MERGE_RUNS
+
+    assert list(sorter.sorted()) == [(i,) for i in range(1, 3 * MAX_MERGE_RUNS + 1)]
+
+
+def test_rejects_empty_memory_limit(tmp_path) -> None:
+    with raises(ValueError):
+        ExternalSorter(tmp_path, 0)
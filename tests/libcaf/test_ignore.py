@@ -0,0 +1,166 @@
+import os
+from pathlib import Path
+
+from libcaf.constants import IGNORE_FILE
+from libcaf.ignore import IgnoreMatcher
+from libcaf.plumbing import load_tree
+from libcaf.repository import Repository
+from pytest import MonkeyPatch, fixture, mark
+
+
+@fixture
+def matcher(tmp_path: Path) -> IgnoreMatcher:
+    (tmp_path / IGNORE_FILE).write_text('\n'.join([
+        '# build outputs',
+        '*.pyc',
+        '!keep.pyc',
+        'build/',
+        '/top.txt',
+        'docs/*.tmp',
+        'src/**/generated',
+        'log[0-9].txt',
+        '',
+    ]))
+    return IgnoreMatcher(frozenset({'.caf'})).child('', tmp_path, IGNORE_FILE)
+
+
+@mark.parametrize(('key', 'name', 'is_dir', 'ignored'), [
+    ('', 'module.pyc', False, True),
+    ('a/b', 'module.pyc', False, True),
+    ('a', 'keep.pyc', False, False),
+    ('', 'build', True, True),
+    ('x', 'build', True, True),
+    ('', 'build', False, False),
+    ('', 'top.txt', False, True),
+    ('a', 'top.txt', False, False),
+    ('docs', 'a.tmp', False, True),
+    ('x/docs', 'a.tmp', False, False),
+    ('src', 'generated', True, True),
+    ('src/a/b', 'generated', False, True),
+    ('', 'log1.txt', False, True),
+    ('', 'logA.txt', False, False),
+    ('', '.caf', True, True),
+    ('', 'main.py', False, False),
+])
+def test_matcher_rules(matcher: IgnoreMatcher, key: str, name: str, is_dir: bool, ignored: bool) -> None:
+    assert matcher.is_ignored(key, name, is_dir=is_dir) == ignored
+
+
+def test_nested_ignore_file_overrides_parent(matcher: IgnoreMatcher, tmp_path: Path) -> None:
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    (sub / IGNORE_FILE).write_text('!*.pyc\n/local.txt\n')
+    sub_matcher = matcher.child('sub', sub, IGNORE_FILE)
+
+    assert not sub_matcher.is_ignored('sub', 'module.pyc', is_dir=False)
+    assert sub_matcher.is_ignored('sub', 'local.txt', is_dir=False)
+    assert not sub_matcher.is_ignored('sub/deeper', 'local.txt', is_dir=False)
+    assert sub_matcher.fingerprint != matcher.fingerprint
+
+
+def test_directory_without_ignore_file_shares_matcher(matcher: IgnoreMatcher, tmp_path: Path) -> None:
+    (tmp_path / 'plain').mkdir()
+    assert matcher.child('plain', tmp_path / 'plain', IGNORE_FILE) is matcher
+
+
+def test_suffix_rules(tmp_path: Path) -> None:
+    (tmp_path / IGNORE_FILE).write_text('*.o\n*~\n!keep.o\n*\n!*.c\n')
+    matcher = IgnoreMatcher().child('', tmp_path, IGNORE_FILE)
+
+    assert matcher.is_ignored('', 'a.o', is_dir=False)
+    assert matcher.is_ignored('', 'notes~', is_dir=False)
+    assert matcher.is_ignored('', 'keep.o', is_dir=False)
+    assert not matcher.is_ignored('', 'main.c', is_dir=False)
+
+
+@mark.parametrize(('pattern', 'name', 'ignored'), [
+    ('[]', '[]', True),
+    ('[!]', '[!]', True),
+    ('[^]', '[^]', True),
+    ('a[', 'a[', True),
+    ('a[', 'a', False),
+    ('x[]]', 'x]', True),
+    ('x[!]]', 'xa', True),
+    ('x[!]]', 'x]', False),
+    ('[z-a]', 'z', False),
+])
+def test_malformed_character_classes(tmp_path: Path, pattern: str, name: str, ignored: bool) -> None:
+    (tmp_path / IGNORE_FILE).write_text(f'{pattern}\n')
+    matcher = IgnoreMatcher().child('', tmp_path, IGNORE_FILE)
+
+    assert matcher.is_ignored('', name, is_dir=False) == ignored
+
+
+def test_commit_with_malformed_character_classes(temp_repo: Repository) -> None:
+    wd = temp_repo.working_dir
+    (wd / IGNORE_FILE).write_text('[]\nx[!]\n[z-a]\n')
+    (wd / '[]').write_text('ignored')
+    (wd / 'z').write_text('kept')
+
+    temp_repo.commit_working_dir('Tester', 'Commit')
+
+    assert _tree_names(temp_repo, temp_repo.save_dir(wd)) == {IGNORE_FILE, 'z'}
+
+
+def _tree_names(repo: Repository, tree_hash: str) -> set[str]:
+    return set(load_tree(repo.objects_dir(), tree_hash).records)
+
+
+def test_save_dir_skips_ignored_entries(temp_repo: Repository) -> None:
+    wd = temp_repo.working_dir
+    (wd / IGNORE_FILE).write_text('node_modules/\n*.log\n')
+    (wd / 'node_modules' / 'pkg').mkdir(parents=True)
+    (wd / 'node_modules' / 'pkg' / 'index.js').write_text('js')
+    (wd / 'debug.log').write_text('log')
+    (wd / 'main.py').write_text('main')
+
+    tree_ref = temp_repo.save_dir(wd)
+
+    assert _tree_names(temp_repo, tree_ref) == {IGNORE_FILE, 'main.py'}
+
+
+def test_ignored_directories_are_never_listed(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    wd = temp_repo.working_dir
+    (wd / IGNORE_FILE).write_text('venv/\n')
+    (wd / 'venv' / 'lib').mkdir(parents=True)
+    (wd / 'src').mkdir()
+
+    listed: list[str] = []
+    original_scandir = os.scandir
+
+    def _scandir(path: str | Path):
+        listed.append(Path(path).name)
+        return original_scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', _scandir)
+    temp_repo.save_dir(wd)
+
+    assert 'src' in listed
+    assert 'venv' not in listed
+    assert 'lib' not in listed
+
+
+def test_changed_ignore_file_invalidates_cached_listing(temp_repo: Repository) -> None:
+    wd = temp_repo.working_dir
+    (wd / 'sub').mkdir()
+    (wd / 'sub' / 'data.bin').write_text('data')
+    (wd / IGNORE_FILE).write_text('*.bin\n')
+
+    first = temp_repo.save_dir(wd)
+    sub_hash = load_tree(temp_repo.objects_dir(), first).records['sub'].hash
+    assert _tree_names(temp_repo, sub_hash) == set()
+
+    (wd / IGNORE_FILE).write_text('*.tmp\n')
+    second = temp_repo.save_dir(wd)
+    sub_hash = load_tree(temp_repo.objects_dir(), second).records['sub'].hash
+    assert _tree_names(temp_repo, sub_hash) == {'data.bin'}
+
+
+def test_save_subdirectory_applies_ancestor_rules(temp_repo: Repository) -> None:
+    wd = temp_repo.working_dir
+    (wd / IGNORE_FILE).write_text('*.o\n')
+    (wd / 'lib').mkdir()
+    (wd / 'lib' / 'a.o').write_text('obj')
+    (wd / 'lib' / 'a.c').write_text('src')
+
+    assert _tree_names(temp_repo, temp_repo.save_dir(wd / 'lib')) == {'a.c'}
@@ -0,0 +1,186 @@
+import random
+
+from libcaf import TreeRecord, TreeRecordType
+from libcaf.repository import DiffEntry, DiffKind, Repository, pair_moves, pair_moves_external
+from pytest import raises
+
+
+def _entries(repo: Repository, commit1: str, commit2: str, **kwargs) -> list[tuple[DiffKind, str | None, str | None]]:
+    return [(entry.kind, entry.old_path, entry.new_path) for entry in repo.iter_diff(commit1, commit2, **kwargs)]
+
+
+def _blob(name: str, blob_hash: str) -> TreeRecord:
+    return TreeRecord(TreeRecordType.BLOB, blob_hash, name)
+
+
+def test_iter_diff_identical_commits(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    commit = temp_repo.commit_working_dir('Tester', 'Commit')
+
+    assert list(temp_repo.iter_diff(commit, commit)) == []
+
+
+def test_iter_diff_yields_full_paths_in_depth_first_order(temp_repo: Repository) -> None:
+    for path in ('b/nested/one.txt', 'b/two.txt', 'a.txt', 'c/three.txt'):
+        (temp_repo.working_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (temp_repo.working_dir / path).write_text(path)
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    (temp_repo.working_dir / 'b/nested/one.txt').write_text('changed')
+    (temp_repo.working_dir / 'b/new.txt').write_text('new')
+    (temp_repo.working_dir / 'a.txt').unlink()
+    (temp_repo.working_dir / 'c/three.txt').unlink()
+    (temp_repo.working_dir / 'c').rmdir()
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    assert _entries(temp_repo, commit1, commit2) == [
+        (DiffKind.REMOVED, 'a.txt', None),
+        (DiffKind.MODIFIED, 'b', 'b'),
+        (DiffKind.MODIFIED, 'b/nested', 'b/nested'),
+        (DiffKind.MODIFIED, 'b/nested/one.txt', 'b/nested/one.txt'),
+        (DiffKind.ADDED, None, 'b/new.txt'),
+        (DiffKind.REMOVED, 'c', None),
+    ]
+
+
+def test_iter_diff_loads_subtrees_lazily(temp_repo: Repository) -> None:
+    for name in ('a', 'b'):
+        (temp_repo.working_dir / name).mkdir()
+        (temp_repo.working_dir / name / 'file.txt').write_text(name)
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    for name in ('a', 'b'):
+        (temp_repo.working_dir / name / 'file.txt').write_text('changed')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    loaded: list[str] = []
+    original = temp_repo._load_stored_tree
+
+    def _load(tree_hash: str):
+        loaded.append(tree_hash)
+        return original(tree_hash)
+
+    temp_repo._load_stored_tree = _load
+    entries = temp_repo.iter_diff(commit1, commit2)
+
+    assert next(entries).path == 'a'
+    assert loaded == []
+    assert next(entries).path == 'a/file.txt'
+    assert len(loaded) == 2
+
+
+def test_iter_diff_detects_moves(temp_repo: Repository) -> None:
+    for name in ('src', 'dst'):
+        (temp_repo.working_dir / name).mkdir()
+        (temp_repo.working_dir / name / 'keep.txt').write_text(name)
+    (temp_repo.working_dir / 'src' / 'moved.txt').write_text('moved content')
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    (temp_repo.working_dir / 'src' / 'moved.txt').rename(temp_repo.working_dir / 'dst' / 'renamed.txt')
+    (temp_repo.working_dir / 'added.txt').write_text('added')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Move a file')
+
+    assert _entries(temp_repo, commit1, commit2, detect_moves=True) == [
+        (DiffKind.MODIFIED, 'dst', 'dst'),
+        (DiffKind.MODIFIED, 'src', 'src'),
+        (DiffKind.MOVED, 'src/moved.txt', 'dst/renamed.txt'),
+        (DiffKind.ADDED, None, 'added.txt'),
+    ]
+    assert (DiffKind.ADDED, None, 'dst/renamed.txt') in _entries(temp_repo, commit1, commit2)
+
+
+def test_pair_moves_pairs_duplicates_one_to_one() -> None:
+    entries = [
+        DiffEntry(DiffKind.REMOVED, 'a', None, _blob('a', '1'), None),
+        DiffEntry(DiffKind.REMOVED, 'b', None, _blob('b', '1'), None),
+        DiffEntry(DiffKind.ADDED, None, 'c', None, _blob('c', '1')),
+    ]
+
+    paired = [(entry.kind, entry.old_path, entry.new_path) for entry in pair_moves(entries)]
+
+    assert paired == [(DiffKind.MOVED, 'a', 'c'), (DiffKind.REMOVED, 'b', None)]
+
+
+def test_pair_moves_holds_back_a_bounded_number_of_entries() -> None:
+    entries = [DiffEntry(DiffKind.ADDED, None, f'file{i}', None, _blob(f'file{i}', str(i))) for i in range(5)]
+    entries.append(DiffEntry(DiffKind.REMOVED, 'old', None, _blob('old', '0'), None))
+    entries.append(DiffEntry(DiffKind.REMOVED, 'other', None, _blob('other', '4'), None))
+
+    consumed: list[str] = []
+
+    def _source():
+        for entry in entries:
+            consumed.append(entry.path)
+            yield entry
+
+    paired = pair_moves(_source(), window=2)
+
+    # The first entry is released once a third one is held back
+    assert next(paired).new_path == 'file0'
+    assert consumed == ['file0', 'file1', 'file2']
+
+    rest = [(entry.kind, entry.old_path, entry.new_path) for entry in paired]
+    assert rest == [
+        (DiffKind.ADDED, None, 'file1'),
+        (DiffKind.ADDED, None, 'file2'),
+        (DiffKind.ADDED, None, 'file3'),
+        (DiffKind.MOVED, 'other', 'file4'),
+        # Its partner was released before it arrived, so it is not paired
+        (DiffKind.REMOVED, 'old', None),
+    ]
+
+
+def test_pair_moves_external_matches_unbounded_window(tmp_path) -> None:
+    rng = random.Random(0)
+    entries = []
+    for i in range(500):
+        kind = rng.choice([DiffKind.ADDED, DiffKind.REMOVED, DiffKind.MODIFIED])
+        record = _blob(f'file{i}', str(rng.randrange(60)))
+        if kind == DiffKind.ADDED:
+            entries.append(DiffEntry(kind, None, f'dir/file{i}', None, record))
+        elif kind == DiffKind.REMOVED:
+            entries.append(DiffEntry(kind, f'dir/file{i}', None, record, None))
+        else:
+            entries.append(DiffEntry(kind, f'dir/file{i}', f'dir/file{i}', record, record))
+
+    def _describe(entry: DiffEntry) -> tuple:
+        return (entry.kind.value, entry.old_path or '', entry.new_path or '',
+                (entry.old_record or entry.new_record).hash, (entry.new_record or entry.old_record).name)
+
+    expected = [_describe(entry) for entry in pair_moves(entries, window=len(entries))]
+    paired = [_describe(entry) for entry in pair_moves_external(entries, tmp_path, memory_limit=16)]
+
+    assert sorted(paired) == sorted(expected)
+    # Modified entries stream through, the rest come after them in arrival order
+    modified = [entry for entry in paired if entry[0] == DiffKind.MODIFIED.value]
+    assert paired[:len(modified)] == modified
+    # A move arrives with the later of its two entries
+    arrivals = [max(int(path.removeprefix('dir/file')) for path in entry[1:3] if path)
+                for entry in paired[len(modified):]]
+    assert arrivals == sorted(arrivals)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_iter_diff_with_memory_limit(temp_repo: Repository) -> None:
+    for directory in ('src', 'dst'):
+        (temp_repo.working_dir / directory).mkdir()
+        (temp_repo.working_dir / directory / 'kept.txt').write_text(directory)
+    for i in range(20):
+        (temp_repo.working_dir / 'src' / f'file{i}.txt').write_text(f'content {i}')
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    for i in range(20):
+        (temp_repo.working_dir / 'src' / f'file{i}.txt').rename(temp_repo.working_dir / 'dst' / f'file{i}.txt')
+    (temp_repo.working_dir / 'dst' / 'file0.txt').write_text('changed')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Move and change')
+
+    expected = _entries(temp_repo, commit1, commit2, detect_moves=True)
+    entries = _entries(temp_repo, commit1, commit2, detect_moves=True, memory_limit=2)
+
+    assert sorted(entries, key=repr) == sorted(expected, key=repr)
+    assert (DiffKind.MOVED, 'src/file7.txt', 'dst/file7.txt') in entries
+    assert (DiffKind.ADDED, None, 'dst/file0.txt') in entries
+    assert not any(path.name.startswith('diff-') for path in temp_repo.repo_path().iterdir())
+
+    with raises(ValueError):
+        temp_repo.iter_diff(commit1, commit2, detect_moves=True, memory_limit=0)
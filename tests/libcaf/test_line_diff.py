@@ -0,0 +1,154 @@
+import random
+from pathlib import Path
+
+from libcaf import DiffHunk
+from libcaf.plumbing import diff_blobs, diff_files, save_file_content
+from libcaf.repository import Repository
+from pytest import raises
+
+
+def _write(path: Path, content: bytes) -> Path:
+    path.write_bytes(content)
+    return path
+
+
+def _apply(old: bytes, hunks: list[DiffHunk]) -> bytes:
+    old_lines = old.splitlines(keepends=True)
+    result: list[bytes] = []
+    position = 0
+
+    for hunk in hunks:
+        start = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+        result.extend(old_lines[position:start])
+        position = start
+
+        for i, line in enumerate(hunk.lines):
+            if line.startswith(b'\\'):
+                continue
+            ending = b'' if i + 1 < len(hunk.lines) and hunk.lines[i + 1].startswith(b'\\') else b'\n'
+            if line.startswith(b' '):
+                assert old_lines[position] == line[1:] + ending
+                result.append(old_lines[position])
+                position += 1
+            elif line.startswith(b'-'):
+                assert old_lines[position] == line[1:] + ending
+                position += 1
+            else:
+                result.append(line[1:] + ending)
+
+    result.extend(old_lines[position:])
+    return b''.join(result)
+
+
+def test_diff_files_modified_line(tmp_path: Path) -> None:
+    old = _write(tmp_path / 'old', b'one\ntwo\nthree\nfour\nfive\n')
+    new = _write(tmp_path / 'new', b'one\ntwo\nTHREE\nfour\nfive\n')
+
+    line_diff = diff_files(old, new, context=1)
+
+    assert not line_diff.binary
+    assert (line_diff.additions, line_diff.deletions) == (1, 1)
+    assert len(line_diff.hunks) == 1
+    hunk = line_diff.hunks[0]
+    assert (hunk.old_start, hunk.old_count, hunk.new_start, hunk.new_count) == (2, 3, 2, 3)
+    assert hunk.lines == [b' two', b'-three', b'+THREE', b' four']
+
+
+def test_diff_files_identical(tmp_path: Path) -> None:
+    path = _write(tmp_path / 'file', b'same\n')
+
+    line_diff = diff_files(path, path)
+
+    assert line_diff.hunks == []
+    assert (line_diff.additions, line_diff.deletions) == (0, 0)
+
+
+def test_diff_files_against_empty_side(tmp_path: Path) -> None:
+    path = _write(tmp_path / 'file', b'a\nb\n')
+
+    added = diff_files(None, path)
+    removed = diff_files(path, None)
+
+    assert (added.hunks[0].old_start, added.hunks[0].old_count) == (0, 0)
+    assert added.hunks[0].lines == [b'+a', b'+b']
+    assert (removed.hunks[0].new_start, removed.hunks[0].new_count) == (0, 0)
+    assert removed.deletions == 2
+
+
+def test_diff_files_missing_newline(tmp_path: Path) -> None:
+    old = _write(tmp_path / 'old', b'a\nb')
+    new = _write(tmp_path / 'new', b'a\nb\n')
+
+    hunk = diff_files(old, new).hunks[0]
+
+    assert hunk.lines == [b' a', b'-b', b'\\ No newline at end of file', b'+b']
+
+
+def test_diff_files_splits_distant_changes_into_hunks(tmp_path: Path) -> None:
+    lines = [f'line {i}\n'.encode() for i in range(40)]
+    old = _write(tmp_path / 'old', b''.join(lines))
+    lines[5] = b'changed\n'
+    lines[30] = b'changed\n'
+    new = _write(tmp_path / 'new', b''.join(lines))
+
+    assert len(diff_files(old, new, context=3).hunks) == 2
+    assert len(diff_files(old, new, context=13).hunks) == 1
+
+
+def test_diff_files_binary(tmp_path: Path) -> None:
+    old = _write(tmp_path / 'old', b'text\n')
+    new = _write(tmp_path / 'new', b'text\0binary\n')
+
+    line_diff = diff_files(old, new)
+
+    assert line_diff.binary
+    assert line_diff.hunks == []
+
+
+def test_diff_files_anchors_on_unique_lines(tmp_path: Path) -> None:
+    old = _write(tmp_path / 'old', b'def a():\n    pass\n\ndef b():\n    pass\n')
+    new = _write(tmp_path / 'new', b'def a():\n    pass\n\ndef c():\n    pass\n\ndef b():\n    pass\n')
+
+    line_diff = diff_files(old, new, context=0)
+
+    assert (line_diff.additions, line_diff.deletions) == (3, 0)
+    assert line_diff.hunks[0].lines == [b'+def c():', b'+    pass', b'+']
+
+
+def test_diff_files_patches_apply(tmp_path: Path) -> None:
+    rng = random.Random(0)
+    vocabulary = [b'{', b'}', b'', b'return x;'] + [f'statement {i};'.encode() for i in range(8)]
+
+    for _ in range(300):
+        old_lines = [rng.choice(vocabulary) for _ in range(rng.randint(0, 40))]
+        new_lines = list(old_lines)
+        for _ in range(rng.randint(0, 8)):
+            if new_lines and rng.random() < 0.5:
+                del new_lines[rng.randrange(len(new_lines))]
+            else:
+                new_lines.insert(rng.randint(0, len(new_lines)), rng.choice(vocabulary))
+
+        old = b''.join(line + b'\n' for line in old_lines)
+        new = b''.join(line + b'\n' for line in new_lines)
+        context = rng.randint(0, 3)
+
+        line_diff = diff_files(_write(tmp_path / 'old', old), _write(tmp_path / 'new', new), context)
+
+        assert _apply(old, line_diff.hunks) == new
+
+
+def test_diff_blobs(temp_repo: Repository) -> None:
+    old = _write(temp_repo.working_dir / 'old.txt', b'one\ntwo\n')
+    new = _write(temp_repo.working_dir / 'new.txt', b'one\n2\n')
+    old_blob = save_file_content(temp_repo.objects_dir(), old)
+    new_blob = save_file_content(temp_repo.objects_dir(), new)
+
+    line_diff = diff_blobs(temp_repo.objects_dir(), old_blob.hash, new_blob.hash)
+
+    assert line_diff.hunks[0].lines == [b' one', b'-two', b'+2']
+    assert diff_blobs(temp_repo.objects_dir(), None, new_blob.hash).additions == 2
+
+
+def test_diff_blobs_missing_blob(temp_repo: Repository) -> None:
+    with raises(RuntimeError):
+        diff_blobs(temp_repo.objects_dir(), '0' * 40, None)
@@ -0,0 +1,93 @@
+import os
+import time
+
+from libcaf.constants import HASH_LENGTH
+from libcaf.objindex import ObjectIndex
+from libcaf.ref import AmbiguousRefError, RefError
+from libcaf.repository import Repository
+from pytest import raises
+
+
+def _store(objects_dir, *hashes: str) -> None:
+    for object_hash in hashes:
+        (objects_dir / object_hash[:2]).mkdir(parents=True, exist_ok=True)
+        (objects_dir / object_hash[:2] / object_hash).write_text('')
+
+
+def _age(objects_dir, fanout: str) -> None:
+    # Old enough for the index of the directory to be saved
+    old = time.time_ns() - 60 * 10**9
+    os.utime(objects_dir / fanout, ns=(old, old))
+
+
+def test_lookup_and_shortest_prefix(tmp_path) -> None:
+    objects_dir = tmp_path / 'objects'
+    hash1 = 'ab12' + '0' * (HASH_LENGTH - 4)
+    hash2 = 'ab123' + '1' * (HASH_LENGTH - 5)
+    hash3 = 'ab9' + '2' * (HASH_LENGTH - 3)
+    _store(objects_dir, hash1, hash2, hash3)
+    (objects_dir / 'ab' / f'{hash1}.tmp').write_text('')
+    index = ObjectIndex(objects_dir, tmp_path / 'objindex')
+
+    assert index.lookup('ab12') == [hash1, hash2]
+    assert index.lookup('ab1200') == [hash1]
+    assert index.lookup('ab9') == [hash3]
+    assert index.lookup('cd') == []
+
+    assert index.shortest_prefix(hash1) == hash1[:5]
+    assert index.shortest_prefix(hash2) == hash2[:5]
+    assert index.shortest_prefix(hash3) == hash3[:4]
+    assert index.shortest_prefix(hash3, min_length=2) == hash3[:3]
+
+    with raises(ValueError):
+        index.lookup('a')
+    with raises(ValueError):
+        index.shortest_prefix('ab12')
+
+
+def test_index_is_saved_and_rebuilt_on_change(tmp_path) -> None:
+    objects_dir = tmp_path / 'objects'
+    hash1 = 'cd' + '0' * (HASH_LENGTH - 2)
+    hash2 = 'cd' + '1' * (HASH_LENGTH - 2)
+    _store(objects_dir, hash1)
+    _age(objects_dir, 'cd')
+    index = ObjectIndex(objects_dir, tmp_path / 'objindex')
+
+    assert index.lookup('cd') == [hash1]
+    assert (tmp_path / 'objindex' / 'cd').exists()
+
+    _store(objects_dir, hash2)
+    assert index.lookup('cd') == [hash1, hash2]
+
+
+def test_recently_changed_directories_are_not_saved(tmp_path) -> None:
+    objects_dir = tmp_path / 'objects'
+    _store(objects_dir, 'ef' + '0' * (HASH_LENGTH - 2))
+    index = ObjectIndex(objects_dir, tmp_path / 'objindex')
+
+    assert len(index.lookup('ef')) == 1
+    assert not (tmp_path / 'objindex' / 'ef').exists()
+
+
+def test_resolve_abbreviated_hash(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('one')
+    commit1 = temp_repo.commit_working_dir('Tester', 'One')
+    (temp_repo.working_dir / 'file.txt').write_text('two')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Two')
+
+    assert temp_repo.resolve_ref(temp_repo.abbreviate_hash(commit1)) == commit1
+    assert temp_repo.resolve_ref(commit2[:12]) == commit2
+    assert [entry.commit_ref for entry in temp_repo.log(commit1[:8])] == [commit1]
+
+    with raises(RefError):
+        temp_repo.resolve_ref(commit1[:3])
+
+
+def test_ambiguous_abbreviated_hash(temp_repo: Repository) -> None:
+    objects_dir = temp_repo.objects_dir()
+    _store(objects_dir, '1234' + '0' * (HASH_LENGTH - 4), '1234' + '1' * (HASH_LENGTH - 4))
+
+    with raises(AmbiguousRefError, match='Ambiguous hash prefix 1234'):
+        temp_repo.resolve_ref('1234')
+
+    assert temp_repo.resolve_ref('12340') == '1234' + '0' * (HASH_LENGTH - 4)
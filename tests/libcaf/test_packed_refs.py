@@ -0,0 +1,132 @@
+from pathlib import Path
+
+from libcaf import repository as repository_module
+from libcaf.constants import HASH_LENGTH
+from libcaf.packed_refs import (PACKED_REFS_HEADER, lookup_packed_ref, packed_ref_names, read_packed_refs,
+                                write_packed_refs)
+from libcaf.ref import HashRef, RefError, RefLock
+from libcaf.repository import Repository, RepositoryError, branch_ref, tag_ref
+from pytest import MonkeyPatch, raises
+
+
+def _hash(i: int) -> HashRef:
+    return HashRef(f'{i:0{HASH_LENGTH}x}')
+
+
+def _commit(repo: Repository, content: str) -> str:
+    (repo.working_dir / 'file.txt').write_text(content)
+    return repo.commit_working_dir('Tester', content)
+
+
+def test_lookup_and_list(tmp_path) -> None:
+    packed_file = tmp_path / 'packed-refs'
+    refs = {f'tags/v{i}': _hash(i) for i in range(500)}
+    refs['heads/main'] = _hash(1000)
+    write_packed_refs(packed_file, refs)
+
+    for name, ref_hash in refs.items():
+        assert lookup_packed_ref(packed_file, name) == ref_hash
+    assert lookup_packed_ref(packed_file, 'tags/v') is None
+    assert lookup_packed_ref(packed_file, 'tags/v9999') is None
+    assert lookup_packed_ref(packed_file, 'a') is None
+    assert lookup_packed_ref(packed_file, 'z') is None
+
+    assert packed_ref_names(packed_file, 'heads/') == ['heads/main']
+    assert packed_ref_names(packed_file, 'tags/') == sorted(name for name in refs if name.startswith('tags/'))
+    assert read_packed_refs(packed_file) == refs
+
+
+def test_missing_or_empty_file(tmp_path) -> None:
+    packed_file = tmp_path / 'packed-refs'
+
+    assert lookup_packed_ref(packed_file, 'tags/v1') is None
+    assert packed_ref_names(packed_file) == []
+
+    packed_file.write_bytes(b'')
+    assert read_packed_refs(packed_file) == {}
+
+    packed_file.write_bytes(PACKED_REFS_HEADER)
+    assert lookup_packed_ref(packed_file, 'tags/v1') is None
+
+
+def test_malformed_line_raises_ref_error(tmp_path) -> None:
+    packed_file = tmp_path / 'packed-refs'
+    packed_file.write_bytes(PACKED_REFS_HEADER + b'x' * HASH_LENGTH + b' tags/v1\n')
+
+    with raises(RefError):
+        lookup_packed_ref(packed_file, 'tags/v1')
+    with raises(RefError):
+        write_packed_refs(packed_file, {'tags/v1': HashRef('not a hash')})
+
+
+def test_pack_refs_keeps_refs_resolvable(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    temp_repo.create_tag('v2', commit1)
+    temp_repo.add_branch('empty')
+
+    assert temp_repo.pack_refs() == 3
+
+    # Branches without a commit cannot be packed
+    assert sorted(path.name for path in temp_repo.refs_dir().rglob('*') if path.is_file()) == ['empty']
+    assert sorted(temp_repo.tags()) == ['v1', 'v2']
+    assert sorted(temp_repo.branches()) == ['empty', 'main']
+    assert temp_repo.tag_exists('v1')
+    assert temp_repo.branch_exists('main')
+    assert temp_repo.resolve_ref(tag_ref('v1')) == commit1
+    assert temp_repo.resolve_ref('v2') == commit1
+    assert temp_repo.head_commit() == commit1
+
+
+def test_pack_refs_skips_refs_deleted_after_the_scan(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    temp_repo.create_tag('v2', commit1)
+
+    class DeletingLock(RefLock):
+        def __init__(self, ref_file: Path) -> None:
+            # Another writer deletes the tag between the scan and the lock
+            if ref_file.name == 'v2':
+                temp_repo.delete_tag('v2')
+            super().__init__(ref_file)
+
+    monkeypatch.setattr(repository_module, 'RefLock', DeletingLock)
+
+    assert temp_repo.pack_refs() == 2
+    assert sorted(temp_repo.tags()) == ['v1']
+    assert lookup_packed_ref(temp_repo.packed_refs_file(), 'tags/v2') is None
+    assert not list(temp_repo.refs_dir().rglob('*.lock'))
+
+
+def test_loose_refs_override_packed_refs(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.pack_refs()
+
+    commit2 = _commit(temp_repo, 'two')
+
+    assert temp_repo.resolve_ref(branch_ref('main')) == commit2
+    assert temp_repo.branches() == ['main']
+    assert lookup_packed_ref(temp_repo.packed_refs_file(), 'heads/main') == commit1
+
+    temp_repo.pack_refs()
+    assert lookup_packed_ref(temp_repo.packed_refs_file(), 'heads/main') == commit2
+
+
+def test_delete_packed_refs(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    temp_repo.add_branch('feature')
+    temp_repo.update_ref(branch_ref('feature'), commit1)
+    temp_repo.pack_refs()
+
+    temp_repo.delete_tag('v1')
+    temp_repo.delete_branch('feature')
+
+    assert temp_repo.tags() == []
+    assert temp_repo.branches() == ['main']
+    assert read_packed_refs(temp_repo.packed_refs_file()) == {'heads/main': commit1}
+    with raises(RepositoryError):
+        temp_repo.delete_tag('v1')
+
+    temp_repo.create_tag('v1', commit1)
+    assert temp_repo.tags() == ['v1']
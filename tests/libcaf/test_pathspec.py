@@ -0,0 +1,136 @@
+from libcaf.pathspec import Pathspec
+from libcaf.plumbing import load_commit, load_tree
+from libcaf.repository import DiffKind, Repository
+from pytest import raises
+
+
+def _write(repo: Repository, paths: dict[str, str]) -> None:
+    for path, content in paths.items():
+        (repo.working_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo.working_dir / path).write_text(content)
+
+
+def test_pathspec_literal_selects_path_and_below() -> None:
+    pathspec = Pathspec(['src/app'])
+
+    assert pathspec.matches('src/app')
+    assert pathspec.matches('src/app/main.py')
+    assert not pathspec.matches('src/application.py')
+    assert not pathspec.matches('src')
+    assert pathspec.may_contain('src')
+    assert not pathspec.may_contain('docs')
+
+
+def test_pathspec_glob_stays_within_segment() -> None:
+    pathspec = Pathspec(['src/*.py'])
+
+    assert pathspec.matches('src/main.py')
+    assert not pathspec.matches('src/pkg/main.py')
+    assert not pathspec.matches('main.py')
+    assert pathspec.may_contain('src')
+    assert not pathspec.may_contain('lib')
+
+
+def test_pathspec_double_star_crosses_segments() -> None:
+    pathspec = Pathspec(['**/test_*.py'])
+
+    assert pathspec.matches('test_a.py')
+    assert pathspec.matches('pkg/sub/test_b.py')
+    assert not pathspec.matches('pkg/sub/b.py')
+    assert pathspec.may_contain('anything/at/all')
+
+
+def test_pathspec_glob_directory_prefix() -> None:
+    pathspec = Pathspec(['services/*/api'])
+
+    assert pathspec.matches('services/payments/api/handler.py')
+    assert not pathspec.matches('services/payments/db.py')
+    assert pathspec.may_contain('services/payments')
+    assert not pathspec.may_contain('services/payments/db')
+    assert not pathspec.may_contain('docs')
+
+
+def test_pathspec_root_selects_everything() -> None:
+    for pattern in ('', '.', './', '**'):
+        assert Pathspec([pattern]).matches('any/path')
+
+
+def test_pathspec_any_pattern_selects() -> None:
+    pathspec = Pathspec(['docs', '*.md'])
+
+    assert pathspec.matches('docs/index.txt')
+    assert pathspec.matches('README.md')
+    assert not pathspec.matches('src/README.md')
+
+
+def test_pathspec_incomplete_classes_are_literal() -> None:
+    assert Pathspec(['[]']).matches('[]/file.txt')
+    assert not Pathspec(['[]']).matches('x')
+    assert Pathspec(['x[!]/y']).matches('x[!]/y')
+    assert Pathspec(['x[!]/y']).may_contain('x[!]')
+    assert Pathspec(['*[^]']).matches('a[^]')
+    assert Pathspec(['a[*']).matches('a[b')
+
+
+def test_pathspec_invalid_range_raises() -> None:
+    with raises(ValueError, match='Invalid pathspec pattern'):
+        Pathspec(['src/[z-a].py'])
+
+
+def test_diff_commits_pathspec(temp_repo: Repository) -> None:
+    _write(temp_repo, {'src/a.py': 'a', 'src/b.txt': 'b', 'docs/c.md': 'c'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'src/a.py': 'changed', 'src/b.txt': 'changed', 'docs/c.md': 'changed'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    diffs = temp_repo.diff_commits(commit1, commit2, pathspec=['src/*.py'])
+
+    assert [diff.record.name for diff in diffs] == ['src']
+    assert [diff.record.name for diff in diffs[0].children] == ['a.py']
+
+
+def test_iter_diff_pathspec_skips_unselected_subtrees(temp_repo: Repository) -> None:
+    _write(temp_repo, {'a/file.txt': 'a', 'b/file.txt': 'b'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'a/file.txt': 'changed a', 'b/file.txt': 'changed b'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+    tree = load_tree(temp_repo.objects_dir(), load_commit(temp_repo.objects_dir(), commit2).tree_hash)
+
+    loaded: list[str] = []
+    original = temp_repo._load_stored_tree
+
+    def _load(tree_hash: str):
+        loaded.append(tree_hash)
+        return original(tree_hash)
+
+    temp_repo._load_stored_tree = _load
+    entries = [(entry.kind, entry.path) for entry in temp_repo.iter_diff(commit1, commit2, pathspec=['a'])]
+
+    assert entries == [(DiffKind.MODIFIED, 'a'), (DiffKind.MODIFIED, 'a/file.txt')]
+    assert len(loaded) == 2
+    assert tree.records['b'].hash not in loaded
+
+
+def test_diff_stat_pathspec(temp_repo: Repository) -> None:
+    _write(temp_repo, {'keep.txt': 'one\n'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'keep.txt': 'two\n', 'new/a.txt': 'a\n', 'new/b.md': 'b\n'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    stats = temp_repo.diff_stat(commit1, commit2, pathspec=['**/*.txt'])
+
+    assert [stat.path for stat in stats] == ['keep.txt', 'new/a.txt']
+
+
+def test_log_pathspec(temp_repo: Repository) -> None:
+    _write(temp_repo, {'src/a.py': 'a', 'docs/b.md': 'b'})
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    _write(temp_repo, {'docs/b.md': 'changed'})
+    commit2 = temp_repo.commit_working_dir('Tester', 'Docs only')
+    _write(temp_repo, {'src/a.py': 'changed'})
+    commit3 = temp_repo.commit_working_dir('Tester', 'Source only')
+
+    assert [entry.commit_ref for entry in temp_repo.log(pathspec=['src'])] == [commit3, commit1]
+    assert [entry.commit_ref for entry in temp_repo.log(pathspec=['docs/*.md'])] == [commit2, commit1]
+    assert list(temp_repo.log(pathspec=['missing'])) == []
+    assert len(list(temp_repo.log())) == 3
@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from libcaf.constants import HASH_LENGTH
-from libcaf.ref import HashRef, RefError, SymRef, read_ref, write_ref
+from libcaf.ref import HashRef, RefError, RefLock, SymRef, read_ref, write_ref
 from pytest import fixture, raises
 
 
@@ -106,3 +106,28 @@ def test_write_symbolic_ref(ref_file: Path) -> None:
 def test_write_invalid_ref_type_raises_error(ref_file: Path) -> None:
     with raises(RefError):
         write_ref(ref_file, 123)
+
+
+def test_write_ref_replaces_file_and_releases_lock(ref_file: Path) -> None:
+    hash_ref = HashRef('a' * HASH_LENGTH)
+    write_ref(ref_file, HashRef('b' * HASH_LENGTH))
+
+    with raises(RefError):
+        write_ref(ref_file, 123)
+    write_ref(ref_file, hash_ref)
+
+    assert read_ref(ref_file) == hash_ref
+    assert sorted(path.name for path in ref_file.parent.iterdir()) == ['ref']
+
+
+def test_write_ref_times_out_on_held_lock(ref_file: Path) -> None:
+    lock = RefLock(ref_file)
+    lock.acquire()
+
+    with raises(RefError, match='Cannot lock'):
+        with RefLock(ref_file) as other:
+            other.acquire(timeout=0.05)
+
+    lock.release()
+    write_ref(ref_file, HashRef('a' * HASH_LENGTH))
+    assert read_ref(ref_file) == 'a' * HASH_LENGTH
@@ -0,0 +1,159 @@
+import os
+import threading
+
+from libcaf import ref_transaction as ref_transaction_module
+from libcaf.constants import HASH_LENGTH
+from libcaf.ref import HashRef, RefConflictError, RefError, RefLock, read_ref
+from libcaf.repository import Repository, RepositoryError
+from pytest import MonkeyPatch, mark, raises
+
+
+def _hash(i: int) -> HashRef:
+    return HashRef(f'{i:0{HASH_LENGTH}x}')
+
+
+def _commit(repo: Repository, content: str) -> str:
+    (repo.working_dir / 'file.txt').write_text(content)
+    return repo.commit_working_dir('Tester', content)
+
+
+def test_transaction_applies_every_update(temp_repo: Repository) -> None:
+    temp_repo.add_branch('feature')
+    transaction = temp_repo.ref_transaction()
+    transaction.update('heads/feature', _hash(1), expected='')
+    transaction.update('tags/v1', _hash(2))
+    transaction.commit()
+
+    assert temp_repo.resolve_ref('feature') == _hash(1)
+    assert temp_repo.resolve_ref('v1') == _hash(2)
+    assert temp_repo.tags() == ['v1']
+    assert not list(temp_repo.refs_dir().rglob('*.lock'))
+
+
+@mark.parametrize('has_syncfs', [True, False])
+def test_large_transaction_syncs_only_its_own_files(temp_repo: Repository, monkeypatch: MonkeyPatch,
+                                                    has_syncfs: bool) -> None:
+    def sync() -> None:
+        msg = 'os.sync flushes every file system'
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(os, 'sync', sync)
+    if not has_syncfs:
+        monkeypatch.setattr(ref_transaction_module, '_syncfs', None)
+
+    count = ref_transaction_module._SYNC_BARRIER_THRESHOLD * 2
+    transaction = temp_repo.ref_transaction()
+    for i in range(count):
+        transaction.update(f'tags/v{i}', _hash(i))
+    transaction.commit()
+
+    assert len(temp_repo.tags()) == count
+    assert temp_repo.resolve_ref(f'v{count - 1}') == _hash(count - 1)
+    assert not list(temp_repo.refs_dir().rglob('*.lock'))
+
+
+def test_conflicting_transaction_changes_nothing(temp_repo: Repository) -> None:
+    temp_repo.update_ref('heads/main', _hash(1))
+    temp_repo.add_branch('feature')
+    transaction = temp_repo.ref_transaction()
+    transaction.update('heads/feature', _hash(3), expected='')
+    transaction.update('heads/main', _hash(3), expected=_hash(2))
+
+    with raises(RefConflictError):
+        transaction.commit()
+
+    assert temp_repo.resolve_ref('main') == _hash(1)
+    assert read_ref(temp_repo.heads_dir() / 'feature') is None
+    assert not list(temp_repo.refs_dir().rglob('*.lock'))
+
+
+def test_held_lock_times_out(temp_repo: Repository) -> None:
+    temp_repo.update_ref('heads/main', _hash(1))
+    lock = RefLock(temp_repo.heads_dir() / 'main')
+    lock.acquire()
+
+    transaction = temp_repo.ref_transaction()
+    transaction.lock_timeout = 0.05
+    transaction.update('heads/main', _hash(2))
+    with raises(RefError, match='Cannot lock'):
+        transaction.commit()
+
+    lock.release()
+    assert temp_repo.resolve_ref('main') == _hash(1)
+
+
+def test_transaction_deletes_packed_refs(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    temp_repo.create_tag('v2', commit1)
+    temp_repo.pack_refs()
+
+    transaction = temp_repo.ref_transaction()
+    transaction.delete('tags/v1', expected=commit1)
+    transaction.commit()
+
+    assert temp_repo.tags() == ['v2']
+    assert not temp_repo.tag_exists('v1')
+
+
+def test_invalid_and_repeated_updates_are_rejected(temp_repo: Repository) -> None:
+    transaction = temp_repo.ref_transaction()
+    with raises(RefError):
+        transaction.update('heads/main', 'a' * HASH_LENGTH)
+
+    transaction.update('heads/main', _hash(1))
+    with raises(ValueError):
+        transaction.delete('heads/main')
+
+
+def test_concurrent_compare_and_swap_loses_no_update(temp_repo: Repository) -> None:
+    temp_repo.update_ref('heads/main', _hash(0))
+    applied: list[tuple[str, str]] = []
+
+    def _advance(worker: int) -> None:
+        repo = Repository(temp_repo.working_dir)
+        for i in range(20):
+            new_ref = _hash(1000 * (worker + 1) + i)
+            while True:
+                current = repo.resolve_ref('main')
+                transaction = repo.ref_transaction()
+                transaction.update('heads/main', new_ref, expected=current)
+                try:
+                    transaction.commit()
+                except RefConflictError:
+                    continue
+                applied.append((current, new_ref))
+                break
+
+    threads = [threading.Thread(target=_advance, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every applied update started from the value the previous one left, so they form a single chain
+    following = dict(applied)
+    chain = [_hash(0)]
+    while chain[-1] in following:
+        chain.append(following[chain[-1]])
+    assert len(chain) == len(applied) + 1 == 81
+    assert temp_repo.resolve_ref('main') == chain[-1]
+
+
+def test_commit_fails_if_branch_moves(temp_repo: Repository) -> None:
+    _commit(temp_repo, 'one')
+    other = HashRef('f' * HASH_LENGTH)
+    save_dir = temp_repo.save_dir
+
+    def _save_dir(path):
+        # Another committer moves the branch while the working directory is saved
+        tree_hash = save_dir(path)
+        temp_repo.update_ref('heads/main', other)
+        return tree_hash
+
+    temp_repo.save_dir = _save_dir
+    (temp_repo.working_dir / 'file.txt').write_text('two')
+    with raises(RepositoryError, match='moved during the commit'):
+        temp_repo.commit_working_dir('Tester', 'two')
+
+    assert temp_repo.resolve_ref('main') == other
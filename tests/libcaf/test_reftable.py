@@ -0,0 +1,141 @@
+import os
+
+from libcaf import reftable as reftable_module
+from libcaf.constants import HASH_LENGTH
+from libcaf.ref import HashRef, SymRef
+from libcaf.reftable import RefTable
+from libcaf.repository import Repository
+from pytest import MonkeyPatch
+
+
+def _commit(repo: Repository, content: str) -> str:
+    (repo.working_dir / 'file.txt').write_text(content)
+    return repo.commit_working_dir('Tester', content)
+
+
+def _count_scans(table: RefTable) -> list[int]:
+    scans: list[int] = []
+    original = table._scan_loose
+
+    def _scan() -> None:
+        scans.append(1)
+        original()
+
+    table._scan_loose = _scan
+    return scans
+
+
+def test_refs_have_full_names(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    temp_repo.add_branch('feature')
+
+    assert temp_repo.refs() == [SymRef('heads/feature'), SymRef('heads/main'), SymRef('tags/v1')]
+
+
+def test_resolve_branch_and_tag_names(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    commit2 = _commit(temp_repo, 'two')
+
+    assert temp_repo.resolve_ref('main') == commit2
+    assert temp_repo.resolve_ref('v1') == commit1
+    assert temp_repo.resolve_ref('tags/v1') == commit1
+
+    # A branch wins over a tag with the same name
+    temp_repo.create_tag('main', commit1)
+    assert temp_repo.resolve_ref('main') == commit2
+
+
+def test_lookups_do_not_rescan(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    # Every ref directory was just modified, so its mtime would not be trusted yet
+    monkeypatch.setattr(reftable_module, '_RACY_NS', 0)
+    commit1 = _commit(temp_repo, 'one')
+    for i in range(20):
+        temp_repo.create_tag(f'v{i}', commit1)
+    scans = _count_scans(temp_repo._refs())
+
+    temp_repo.tags()
+    for i in range(20):
+        assert temp_repo.resolve_ref(f'v{i}') == commit1
+        assert temp_repo.tag_exists(f'v{i}')
+    temp_repo.create_tag('v20', commit1)
+    temp_repo.delete_tag('v0')
+
+    assert len(scans) <= 1
+    assert sorted(temp_repo.tags()) == sorted(f'v{i}' for i in range(1, 21))
+    assert len(scans) <= 1
+
+
+def test_external_changes_are_seen(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    temp_repo.create_tag('v1', commit1)
+    assert temp_repo.tags() == ['v1']
+
+    # Another process creates a tag and removes one
+    (temp_repo.tags_dir() / 'v2').write_text(commit1)
+    (temp_repo.tags_dir() / 'v1').unlink()
+    os.utime(temp_repo.tags_dir(), ns=(0, 0))
+
+    assert temp_repo.tags() == ['v2']
+    assert temp_repo.resolve_ref('v2') == commit1
+
+
+def test_packed_refs_are_reloaded_when_replaced(tmp_path) -> None:
+    refs_dir = tmp_path / 'refs'
+    refs_dir.mkdir()
+    packed_file = tmp_path / 'packed-refs'
+    table = RefTable(refs_dir, packed_file)
+    assert table.packed() == {}
+
+    hash1 = HashRef('1' * HASH_LENGTH)
+    packed_file.write_text(f'{hash1} tags/v1\n')
+
+    assert table.packed() == {'tags/v1': hash1}
+    assert table.names() == {'tags/v1'}
+
+
+def test_single_lookups_do_not_load_packed_refs(temp_repo: Repository, monkeypatch) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    for i in range(50):
+        temp_repo.create_tag(f'v{i}', commit1)
+    temp_repo.add_branch('feature')
+    temp_repo.pack_refs()
+
+    def _read_packed_refs(packed_file):
+        raise AssertionError('packed-refs was loaded in full')
+
+    monkeypatch.setattr('libcaf.reftable.read_packed_refs', _read_packed_refs)
+    repo = Repository(temp_repo.working_dir)
+
+    assert repo.resolve_ref('v25') == commit1
+    assert repo.resolve_ref('tags/v49') == commit1
+    assert repo.tag_exists('v0')
+    assert not repo.tag_exists('v50')
+    assert repo.branches() == ['feature', 'main']
+
+
+def test_own_write_does_not_hide_refs_of_other_processes(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(reftable_module, '_RACY_NS', 0)
+    commit1 = _commit(temp_repo, 'one')
+    other = Repository(temp_repo.working_dir)
+    os.utime(temp_repo.tags_dir(), ns=(0, 0))
+    assert temp_repo.tags() == []
+
+    other.create_tag('from_other', commit1)
+    temp_repo.create_tag('from_this', commit1)
+
+    assert temp_repo.tags() == ['from_other', 'from_this']
+    assert SymRef('tags/from_other') in temp_repo.refs()
+
+
+def test_recently_modified_directories_are_rescanned(temp_repo: Repository) -> None:
+    commit1 = _commit(temp_repo, 'one')
+    assert temp_repo.tags() == []
+    mtime = temp_repo.tags_dir().stat().st_mtime_ns
+
+    # Another process creates a tag within the same timestamp tick, which leaves the mtime unchanged
+    (temp_repo.tags_dir() / 'v1').write_text(commit1)
+    os.utime(temp_repo.tags_dir(), ns=(mtime, mtime))
+
+    assert temp_repo.tags() == ['v1']
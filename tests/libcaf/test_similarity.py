@@ -0,0 +1,170 @@
+import threading
+from pathlib import Path
+
+from libcaf.constants import MINHASH_SIZE
+from libcaf.plumbing import minhash_blob, save_file_content
+from libcaf.repository import DiffKind, MovedFromDiff, MovedToDiff, RemovedDiff, Repository
+from libcaf.similarity import SignatureCache, estimate_similarity, find_similar_pairs
+from pytest import raises
+
+
+def _lines(count: int, prefix: str = 'line') -> str:
+    return ''.join(f'{prefix} {i}\n' for i in range(count))
+
+
+def _blob_hash(repo: Repository, name: str, content: bytes) -> str:
+    path = repo.working_dir / name
+    path.write_bytes(content)
+    return save_file_content(repo.objects_dir(), path).hash
+
+
+def test_minhash_blob_estimates_line_similarity(temp_repo: Repository) -> None:
+    original = _blob_hash(temp_repo, 'a.txt', _lines(100).encode())
+    edited = _blob_hash(temp_repo, 'b.txt', (_lines(90) + '  line 90\t\nnew\n').encode())
+    unrelated = _blob_hash(temp_repo, 'c.txt', _lines(100, 'other').encode())
+
+    signature = tuple(minhash_blob(temp_repo.objects_dir(), original, MINHASH_SIZE))
+
+    assert len(signature) == MINHASH_SIZE
+    assert estimate_similarity(signature, tuple(minhash_blob(temp_repo.objects_dir(), edited, MINHASH_SIZE))) > 0.8
+    assert estimate_similarity(signature, tuple(minhash_blob(temp_repo.objects_dir(), unrelated, MINHASH_SIZE))) < 0.2
+
+
+def test_minhash_blob_skips_binary_and_blank_blobs(temp_repo: Repository) -> None:
+    binary = _blob_hash(temp_repo, 'a.bin', b'\0\1\2')
+    blank = _blob_hash(temp_repo, 'blank.txt', b'\n  \n')
+
+    assert minhash_blob(temp_repo.objects_dir(), binary, MINHASH_SIZE) == []
+    assert minhash_blob(temp_repo.objects_dir(), blank, MINHASH_SIZE) == []
+
+
+def test_find_similar_pairs_one_to_one() -> None:
+    base = tuple(range(32))
+    close = base[:28] + (100, 101, 102, 103)
+    closer = base[:30] + (200, 201)
+
+    pairs = find_similar_pairs([base, tuple(range(500, 532))], [close, closer, ()], 0.5, bands=8)
+
+    assert pairs == [(0, 1, 30 / 32)]
+
+
+def test_signature_cache_round_trip(tmp_path: Path) -> None:
+    cache_file = tmp_path / 'signatures'
+    cache = SignatureCache.load(cache_file, 4)
+    cache.add('a' * 40, [1, 2, 3, 4])
+    cache.add('b' * 40, [])
+    cache.save()
+    cache.add('c' * 40, [5, 6, 7, 8])
+    cache.save()
+
+    loaded = SignatureCache.load(cache_file, 4)
+
+    assert loaded.get('a' * 40) == (1, 2, 3, 4)
+    assert loaded.get('b' * 40) == ()
+    assert loaded.get('c' * 40) == (5, 6, 7, 8)
+    assert SignatureCache.load(cache_file, 8).get('a' * 40) is None
+
+
+def test_signature_cache_ignores_truncated_record(tmp_path: Path) -> None:
+    cache_file = tmp_path / 'signatures'
+    cache = SignatureCache.load(cache_file, 4)
+    cache.add('a' * 40, [1, 2, 3, 4])
+    cache.add('b' * 40, [5, 6, 7, 8])
+    cache.save()
+    cache_file.write_bytes(cache_file.read_bytes()[:-3])
+
+    loaded = SignatureCache.load(cache_file, 4)
+    loaded.add('c' * 40, [9, 9, 9, 9])
+    loaded.save()
+
+    reloaded = SignatureCache.load(cache_file, 4)
+    assert reloaded.get('a' * 40) == (1, 2, 3, 4)
+    assert reloaded.get('b' * 40) is None
+    assert reloaded.get('c' * 40) == (9, 9, 9, 9)
+
+
+def test_signature_cache_concurrent_rewrites(tmp_path: Path) -> None:
+    cache_file = tmp_path / 'signatures'
+    errors: list[OSError] = []
+
+    def _save(i: int) -> None:
+        for j in range(20):
+            cache = SignatureCache(cache_file, 4)
+            cache.add(f'{i}{j:039x}', [i, j, 0, 0])
+            try:
+                cache.save()
+            except OSError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=_save, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(SignatureCache.load(cache_file, 4)._signatures) == 1
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def _edited_move(repo: Repository) -> tuple[str, str]:
+    for name in ('src', 'lib'):
+        (repo.working_dir / name).mkdir()
+        (repo.working_dir / name / 'keep.txt').write_text(name)
+    (repo.working_dir / 'src' / 'module.py').write_text(_lines(50))
+    (repo.working_dir / 'removed.txt').write_text(_lines(20, 'gone'))
+    commit1 = repo.commit_working_dir('Tester', 'Initial commit')
+
+    (repo.working_dir / 'src' / 'module.py').unlink()
+    (repo.working_dir / 'lib' / 'renamed.py').write_text(_lines(48) + 'edited\n')
+    (repo.working_dir / 'removed.txt').unlink()
+    commit2 = repo.commit_working_dir('Tester', 'Move and edit')
+
+    return commit1, commit2
+
+
+def test_diff_commits_detects_similar_moves(temp_repo: Repository) -> None:
+    commit1, commit2 = _edited_move(temp_repo)
+
+    diffs = {diff.record.name: diff for diff in temp_repo.diff_commits(commit1, commit2, rename_threshold=0.5)}
+
+    moved_to = diffs['src'].children[0]
+    assert isinstance(moved_to, MovedToDiff)
+    assert moved_to.record.name == 'module.py'
+    assert isinstance(moved_to.moved_to, MovedFromDiff)
+    assert moved_to.moved_to.record.name == 'renamed.py'
+    assert diffs['lib'].children == [moved_to.moved_to]
+    assert isinstance(diffs['removed.txt'], RemovedDiff)
+
+    assert not isinstance(temp_repo.diff_commits(commit1, commit2)[-1].children[0], MovedToDiff)
+    assert temp_repo.signatures_file().exists()
+
+
+def test_iter_diff_detects_similar_moves(temp_repo: Repository) -> None:
+    commit1, commit2 = _edited_move(temp_repo)
+
+    entries = [(entry.kind, entry.old_path, entry.new_path)
+               for entry in temp_repo.iter_diff(commit1, commit2, detect_moves=True, rename_threshold=0.5)]
+
+    assert (DiffKind.MOVED, 'src/module.py', 'lib/renamed.py') in entries
+    assert (DiffKind.REMOVED, 'removed.txt', None) in entries
+    assert all(kind != DiffKind.ADDED or new_path != 'lib/renamed.py' for kind, _, new_path in entries)
+    assert (DiffKind.MOVED, 'src/module.py', 'lib/renamed.py') not in [
+        (entry.kind, entry.old_path, entry.new_path) for entry in temp_repo.iter_diff(commit1, commit2,
+                                                                                         rename_threshold=0.99)]
+
+
+def test_diff_stat_reports_similar_moves(temp_repo: Repository) -> None:
+    commit1, commit2 = _edited_move(temp_repo)
+
+    stats = {stat.path: stat for stat in temp_repo.diff_stat(commit1, commit2, rename_threshold=0.5)}
+
+    assert stats['lib/renamed.py'].old_path == 'src/module.py'
+    assert (stats['lib/renamed.py'].additions, stats['lib/renamed.py'].deletions) == (1, 2)
+
+
+def test_rename_threshold_out_of_range(temp_repo: Repository) -> None:
+    with raises(ValueError):
+        temp_repo.diff_commits(rename_threshold=0)
+    with raises(ValueError):
+        temp_repo.iter_diff(rename_threshold=1.5)
@@ -0,0 +1,131 @@
+import os
+from pathlib import Path
+
+from libcaf import repository as repository_module
+from libcaf.constants import IGNORE_FILE
+from libcaf.repository import (AddedDiff, ModifiedDiff, MovedFromDiff, MovedToDiff, RemovedDiff, Repository,
+                               RepositoryError)
+from pytest import MonkeyPatch, raises
+
+
+def _object_count(repo: Repository) -> int:
+    return sum(len(files) for _, _, files in os.walk(repo.objects_dir()))
+
+
+def _commit_tree(repo: Repository) -> None:
+    (repo.working_dir / 'top.txt').write_text('top')
+    (repo.working_dir / 'src' / 'pkg').mkdir(parents=True)
+    (repo.working_dir / 'src' / 'pkg' / 'module.py').write_text('module')
+    (repo.working_dir / 'docs').mkdir()
+    (repo.working_dir / 'docs' / 'readme.md').write_text('readme')
+    repo.commit_working_dir('Tester', 'Initial commit')
+
+
+def test_status_clean(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+    assert temp_repo.status() == []
+
+
+def test_status_without_commits(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'new.txt').write_text('new')
+
+    diffs = temp_repo.status()
+
+    assert [type(d) for d in diffs] == [AddedDiff]
+    assert diffs[0].record.name == 'new.txt'
+
+
+def test_status_reports_changes(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+    (temp_repo.working_dir / 'top.txt').write_text('changed')
+    (temp_repo.working_dir / 'src' / 'pkg' / 'new.py').write_text('new')
+    (temp_repo.working_dir / 'docs' / 'readme.md').rename(temp_repo.working_dir / 'readme.md')
+
+    diffs = {d.record.name: d for d in temp_repo.status()}
+
+    assert isinstance(diffs['top.txt'], ModifiedDiff)
+    assert isinstance(diffs['readme.md'], MovedFromDiff)
+    assert isinstance(diffs['docs'], ModifiedDiff)
+    assert isinstance(diffs['docs'].children[0], MovedToDiff)
+    assert isinstance(diffs['src'], ModifiedDiff)
+    assert isinstance(diffs['src'].children[0].children[0], AddedDiff)
+
+    (temp_repo.working_dir / 'readme.md').unlink()
+    diffs = {d.record.name: d for d in temp_repo.status()}
+    assert isinstance(diffs['docs'].children[0], RemovedDiff)
+
+
+def test_status_writes_no_objects(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+    objects_before = _object_count(temp_repo)
+    cache_before = temp_repo.dircache_file().read_bytes()
+
+    (temp_repo.working_dir / 'src' / 'pkg' / 'module.py').write_text('changed module')
+    (temp_repo.working_dir / 'extra').mkdir()
+    (temp_repo.working_dir / 'extra' / 'file.txt').write_text('extra')
+    assert temp_repo.status() != []
+
+    assert _object_count(temp_repo) == objects_before
+    assert temp_repo.dircache_file().read_bytes() == cache_before
+
+
+def test_status_hashes_only_changed_files(temp_repo: Repository, monkeypatch: MonkeyPatch) -> None:
+    _commit_tree(temp_repo)
+    for dirpath, dirnames, filenames in os.walk(temp_repo.working_dir):
+        for name in dirnames + filenames:
+            st = (Path(dirpath) / name).stat()
+            os.utime(Path(dirpath) / name, ns=(st.st_atime_ns, st.st_mtime_ns - 10_000_000_000))
+    temp_repo.commit_working_dir('Tester', 'Refresh the cache')
+
+    (temp_repo.working_dir / 'top.txt').write_text('changed')
+
+    hashed: list[str] = []
+    original = repository_module.hash_file
+
+    def _hash_file(filename: str | Path) -> str:
+        hashed.append(Path(filename).name)
+        return original(filename)
+
+    monkeypatch.setattr(repository_module, 'hash_file', _hash_file)
+
+    assert [d.record.name for d in temp_repo.status()] == ['top.txt']
+    assert hashed == ['top.txt']
+
+
+def test_status_respects_ignore_file(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+    (temp_repo.working_dir / IGNORE_FILE).write_text('*.log\n')
+    (temp_repo.working_dir / 'debug.log').write_text('log')
+
+    assert [d.record.name for d in temp_repo.status()] == [IGNORE_FILE]
+
+
+def test_diff_working_dir_against_older_commit(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('v1')
+    first = temp_repo.commit_working_dir('Tester', 'First commit')
+    temp_repo.create_tag('v1', first)
+    (temp_repo.working_dir / 'file.txt').write_text('v2')
+    temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    (temp_repo.working_dir / 'untracked.txt').write_text('untracked')
+    objects_before = _object_count(temp_repo)
+
+    diffs = temp_repo.diff_working_dir(first)
+
+    assert _object_count(temp_repo) == objects_before
+    assert [(type(d), d.record.name) for d in diffs] == [(ModifiedDiff, 'file.txt'), (AddedDiff, 'untracked.txt')]
+    assert [d.record.name for d in temp_repo.diff_working_dir('v1')] == [d.record.name for d in diffs]
+    assert [d.record.name for d in temp_repo.diff_working_dir()] == ['untracked.txt']
+
+
+def test_diff_working_dir_matching_commit(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+
+    assert temp_repo.diff_working_dir(temp_repo.head_commit()) == []
+
+
+def test_diff_working_dir_unknown_ref(temp_repo: Repository) -> None:
+    _commit_tree(temp_repo)
+
+    with raises(RepositoryError):
+        temp_repo.diff_working_dir('no-such-branch')
@@ -1,3 +1,4 @@
+import resource
 from pathlib import Path
 
 from libcaf.repository import Repository, RepositoryError
@@ -62,4 +63,57 @@ def test_create_tag_invalid_commit_hash_raises(temp_repo: Repository):
     bad_hash = "deadbeef1234567890"
 
     with raises(RepositoryError):
-        temp_repo.create_tag("v1", bad_hash)
\ No newline at end of file
+        temp_repo.create_tag("v1", bad_hash)
+
+
+def test_create_tags_bulk(temp_repo: Repository) -> None:
+    commit_hash = _make_commit(temp_repo)
+    temp_repo.create_tag("v0", commit_hash)
+    resolved: list[str] = []
+    resolve_ref = temp_repo.resolve_ref
+
+    depth = [0]
+
+    def _resolve_ref(ref):
+        # Only the calls made for the entries, not those made while following a reference
+        if not depth[0]:
+            resolved.append(ref)
+        depth[0] += 1
+        try:
+            return resolve_ref(ref)
+        finally:
+            depth[0] -= 1
+
+    temp_repo.resolve_ref = _resolve_ref
+
+    failures = temp_repo.create_tags_bulk({
+        **{f"v{i}": commit_hash for i in range(1, 40)},
+        "latest": "main",
+        "v0": commit_hash,
+        "bad/name": commit_hash,
+        "missing": "no-such-ref",
+        "empty": "",
+    })
+
+    # Each distinct commit reference is resolved once
+    assert sorted(resolved) == sorted([commit_hash, "main", "no-such-ref"])
+    assert sorted(failures) == ["bad/name", "empty", "missing", "v0"]
+    assert "already exists" in failures["v0"]
+    assert sorted(temp_repo.tags()) == sorted(["latest", *(f"v{i}" for i in range(40))])
+    assert temp_repo.resolve_ref("v39") == commit_hash
+    assert temp_repo.resolve_ref("latest") == commit_hash
+    assert not list(temp_repo.tags_dir().glob("*.lock"))
+
+
+def test_create_tags_bulk_beyond_open_file_limit(temp_repo: Repository) -> None:
+    commit_hash = _make_commit(temp_repo)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (256, hard))
+
+    try:
+        failures = temp_repo.create_tags_bulk({f"v{i}": commit_hash for i in range(600)})
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    assert failures == {}
+    assert len(temp_repo.tags()) == 600
@@ -0,0 +1,100 @@
+import random
+import shutil
+
+from libcaf import TreeDiffKind, TreeRecordType
+from libcaf.plumbing import diff_trees, load_commit
+from libcaf.repository import Diff, MovedFromDiff, MovedToDiff, Repository
+
+
+def _path(diff: Diff) -> str:
+    names = []
+    while diff is not None:
+        names.append(diff.record.name)
+        diff = diff.parent
+    return '/'.join(reversed(names[:-1])) if names[-1] == '' else '/'.join(reversed(names))
+
+
+def _describe(diffs: list[Diff]) -> list[tuple]:
+    described = []
+    for diff in diffs:
+        partner = None
+        if isinstance(diff, MovedToDiff):
+            partner = _path(diff.moved_to)
+        elif isinstance(diff, MovedFromDiff):
+            partner = _path(diff.moved_from)
+        described.append((type(diff).__name__, diff.record.name, diff.record.hash, diff.record.type, partner,
+                          _describe(diff.children)))
+    return described
+
+
+def _python_diff(repo: Repository, commit1: str, commit2: str) -> list[Diff]:
+    trees = repo._load_commit_trees(commit1, commit2)
+    if trees is None:
+        return []
+    return repo._diff_trees(*trees, repo._load_stored_tree, repo._load_stored_tree)
+
+
+def test_diff_trees_columns(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'dir').mkdir()
+    (temp_repo.working_dir / 'dir' / 'moved.txt').write_text('moved')
+    (temp_repo.working_dir / 'changed.txt').write_text('old')
+    commit1 = temp_repo.commit_working_dir('Tester', 'Initial commit')
+
+    (temp_repo.working_dir / 'dir' / 'moved.txt').rename(temp_repo.working_dir / 'moved.txt')
+    (temp_repo.working_dir / 'changed.txt').write_text('new')
+    commit2 = temp_repo.commit_working_dir('Tester', 'Second commit')
+
+    objects_dir = temp_repo.objects_dir()
+    tree_diff = diff_trees(objects_dir, load_commit(objects_dir, commit1).tree_hash,
+                           load_commit(objects_dir, commit2).tree_hash)
+
+    assert len(tree_diff) == 4
+    assert tree_diff.names == ['changed.txt', 'dir', 'moved.txt', 'moved.txt']
+    assert tree_diff.depths == [0, 0, 1, 0]
+    assert tree_diff.kinds == [TreeDiffKind.MODIFIED.value, TreeDiffKind.MODIFIED.value,
+                               TreeDiffKind.MOVED_TO.value, TreeDiffKind.MOVED_FROM.value]
+    assert tree_diff.types[1] == TreeRecordType.TREE.value
+    assert tree_diff.partners == [-1, -1, 3, 2]
+
+
+def test_diff_trees_against_empty_tree(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'file.txt').write_text('content')
+    commit = temp_repo.commit_working_dir('Tester', 'Initial commit')
+    tree_hash = load_commit(temp_repo.objects_dir(), commit).tree_hash
+
+    added = diff_trees(temp_repo.objects_dir(), None, tree_hash)
+
+    assert added.names == ['file.txt']
+    assert added.kinds == [TreeDiffKind.ADDED.value]
+    assert len(diff_trees(temp_repo.objects_dir(), tree_hash, tree_hash)) == 0
+
+
+def test_native_diff_matches_python_diff(temp_repo: Repository) -> None:
+    rng = random.Random(0)
+    root = temp_repo.working_dir
+    contents = ['same', 'dup', 'x', 'y', 'z']
+    commits = []
+
+    for _ in range(12):
+        for _ in range(8):
+            directory = root / rng.choice(['', 'a', 'a/b', 'c', 'c/d'])
+            directory.mkdir(parents=True, exist_ok=True)
+            target = directory / rng.choice(['f1', 'f2', 'f3', 'b', 'd'])
+            operation = rng.random()
+            if operation < 0.5 and not target.is_dir():
+                target.write_text(rng.choice(contents))
+            elif operation < 0.7 and target.is_file():
+                target.unlink()
+            elif operation < 0.8 and target.is_dir():
+                shutil.rmtree(target)
+            elif target.exists():
+                destination = root / rng.choice(['a', 'c', '']) / f'moved{rng.randrange(4)}'
+                if not destination.exists() and not destination.is_relative_to(target):
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    target.rename(destination)
+        commits.append(temp_repo.commit_working_dir('Tester', 'Random change'))
+
+    for commit1 in commits:
+        for commit2 in commits:
+            assert (_describe(temp_repo.diff_commits(commit1, commit2))
+                    == _describe(_python_diff(temp_repo, commit1, commit2)))
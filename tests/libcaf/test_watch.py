@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from collections.abc import Callable, Generator
+from pathlib import Path
+
+from libcaf.constants import IGNORE_FILE
+from libcaf.plumbing import hash_file, load_commit, load_tree
+from libcaf.repository import Repository
+from libcaf.watch import FULL_WALK, SYNC_COOKIE_PREFIX, ChangeTracker, dirty_with_ancestors
+from pytest import MonkeyPatch, fixture
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out waiting for the watcher'
+        time.sleep(0.01)
+
+
+@fixture
+def watched_repo(temp_repo: Repository) -> Generator[Repository, None, None]:
+    for d in ('a/nested', 'b/nested'):
+        (temp_repo.working_dir / d).mkdir(parents=True)
+        (temp_repo.working_dir / d / 'file.txt').write_text(d)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=temp_repo.watcher().run, args=(stop.is_set, 20))
+    thread.start()
+    _wait_for(temp_repo.change_tracker().is_active)
+
+    yield temp_repo
+
+    stop.set()
+    thread.join()
+
+
+def test_dirty_with_ancestors() -> None:
+    assert dirty_with_ancestors(['a/b/c', 'a/d']) == {'', 'a', 'a/b', 'a/b/c', 'a/d'}
+    assert dirty_with_ancestors([]) == {''}
+
+
+def test_watcher_start_requires_full_walk(watched_repo: Repository) -> None:
+    dirty, _ = watched_repo.change_tracker().pending()
+    assert dirty is None
+
+
+def test_inactive_tracker_requires_full_walk(temp_repo: Repository) -> None:
+    tracker = temp_repo.change_tracker()
+    tracker.mark(['a'])
+
+    assert not tracker.is_active()
+    assert tracker.pending() == (None, 0)
+
+
+def test_watcher_records_changed_directories(watched_repo: Repository) -> None:
+    tracker = watched_repo.change_tracker()
+    _, offset = tracker.pending()
+    tracker.consume(offset)
+
+    (watched_repo.working_dir / 'a' / 'nested' / 'file.txt').write_text('changed')
+    (watched_repo.working_dir / 'b' / 'new_dir' / 'deep').mkdir(parents=True)
+
+    _wait_for(lambda: tracker.pending()[0] == {'a/nested', 'b', 'b/new_dir', 'b/new_dir/deep'})
+
+
+def test_save_dir_only_revisits_dirty_directories(watched_repo: Repository, monkeypatch: MonkeyPatch,
+                                                  count_saves: Callable[[], list[str]]) -> None:
+    tracker = watched_repo.change_tracker()
+    watched_repo.save_dir(watched_repo.working_dir)
+    assert tracker.pending()[0] == set()
+
+    changed = watched_repo.working_dir / 'a' / 'nested' / 'file.txt'
+    changed.write_text('changed')
+    _wait_for(lambda: tracker.pending()[0] == {'a/nested'})
+
+    saved = count_saves()
+    stats: list[str] = []
+    original_stat = Path.stat
+
+    def _stat(self: Path, *args, **kwargs):
+        stats.append(self.name)
+        return original_stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, 'stat', _stat)
+    tree_ref = watched_repo.save_dir(watched_repo.working_dir)
+    monkeypatch.undo()
+
+    assert saved == ['file.txt']
+    assert 'b' not in stats
+    # A late event for the same write may still arrive after the journal was read
+    assert tracker.pending()[0] <= {'a/nested'}
+
+    watched_repo.dircache_file().unlink()
+    assert watched_repo.save_dir(watched_repo.working_dir) == tree_ref
+
+
+def test_overflow_forces_full_walk(watched_repo: Repository) -> None:
+    tracker = watched_repo.change_tracker()
+    _, offset = tracker.pending()
+    tracker.consume(offset)
+
+    tracker.mark(['a', FULL_WALK])
+    assert tracker.pending()[0] is None
+
+
+def test_watcher_publishes_state(watched_repo: Repository) -> None:
+    state = watched_repo.change_tracker().read_state()
+
+    assert state is not None
+    assert state['running']
+    assert state['watches'] == 5
+    assert {'queue_bytes', 'lag_ns', 'overflows'} <= state.keys()
+
+
+def test_watcher_skips_ignored_directories(watched_repo: Repository) -> None:
+    tracker = watched_repo.change_tracker()
+    _, offset = tracker.pending()
+    tracker.consume(offset)
+
+    # Write the ignore file in one step, so the watcher never sees it empty
+    staged = watched_repo.repo_path() / IGNORE_FILE
+    staged.write_text('b/\n')
+    staged.replace(watched_repo.working_dir / IGNORE_FILE)
+    _wait_for(lambda: tracker.pending()[0] == {'', 'a', 'a/nested'})
+    _, offset = tracker.pending()
+    tracker.consume(offset)
+
+    (watched_repo.working_dir / 'b' / 'nested' / 'file.txt').write_text('changed')
+    (watched_repo.working_dir / 'a' / 'nested' / 'file.txt').write_text('changed')
+    _wait_for(lambda: 'a/nested' in tracker.pending()[0])
+    assert 'b/nested' not in tracker.pending()[0]
+
+
+
+def test_commit_right_after_a_write_sees_it(watched_repo: Repository) -> None:
+    changed = watched_repo.working_dir / 'a' / 'nested' / 'file.txt'
+    watched_repo.commit_working_dir('Tester', 'Initial commit')
+
+    for i in range(30):
+        changed.write_text(f'version {i}')
+        commit_hash = watched_repo.commit_working_dir('Tester', f'Version {i}')
+
+        tree_hash = load_commit(watched_repo.objects_dir(), commit_hash).tree_hash
+        for name in ('a', 'nested'):
+            tree_hash = load_tree(watched_repo.objects_dir(), tree_hash).records[name].hash
+        assert load_tree(watched_repo.objects_dir(), tree_hash).records['file.txt'].hash == hash_file(changed)
+
+    assert not list(watched_repo.working_dir.glob(f'{SYNC_COOKIE_PREFIX}*'))
+
+
+def test_unsynced_watcher_forces_full_walk(temp_repo: Repository) -> None:
+    tracker = temp_repo.change_tracker()
+    tracker.write_state({'pid': os.getpid(), 'running': True, 'heartbeat_ns': time.time_ns()})
+
+    # Nothing journals the cookie, so the dirty set cannot be trusted
+    assert tracker.pending(temp_repo.working_dir, timeout_ns=50_000_000) == (None, 0)
+    assert tracker.pending()[0] == set()
+
+
+def test_lag_counts_the_wait_behind_a_slow_batch(temp_repo: Repository) -> None:
+    (temp_repo.working_dir / 'a').mkdir()
+    watcher = temp_repo.watcher()
+    original_mark = watcher.tracker.mark
+    batches: list[set[str]] = []
+
+    def _mark(keys) -> None:
+        keys = set(keys)
+        if 'a' in keys and not batches:
+            batches.append(keys)
+            # Events keep arriving while the first batch is being journaled
+            (temp_repo.working_dir / 'b.txt').write_text('b')
+            time.sleep(0.3)
+        original_mark(keys)
+
+    watcher.tracker.mark = _mark
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop.is_set, 20))
+    thread.start()
+    try:
+        _wait_for(temp_repo.change_tracker().is_active)
+        (temp_repo.working_dir / 'a' / 'file.txt').write_text('a')
+        _wait_for(lambda: watcher.lag_ns >= 250_000_000)
+    finally:
+        stop.set()
+        thread.join()